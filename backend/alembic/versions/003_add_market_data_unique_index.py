@@ -0,0 +1,30 @@
+"""Add unique candle index to market_data
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Candle store upserts rely on (symbol, timeframe, timestamp) being unique
+    op.create_index(
+        'ix_market_data_symbol_timeframe_timestamp',
+        'market_data',
+        ['symbol', 'timeframe', 'timestamp'],
+        unique=True
+    )
+
+
+def downgrade():
+    op.drop_index('ix_market_data_symbol_timeframe_timestamp', table_name='market_data')
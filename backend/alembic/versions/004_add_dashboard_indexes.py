@@ -0,0 +1,35 @@
+"""Add dashboard aggregation indexes to trades and strategies
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The dashboard counts and sums per user in a single statement
+    op.create_index(
+        'ix_trades_user_id_status_created_at',
+        'trades',
+        ['user_id', 'status', 'created_at']
+    )
+    op.create_index(
+        'ix_strategies_user_id_is_active',
+        'strategies',
+        ['user_id', 'is_active']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_strategies_user_id_is_active', table_name='strategies')
+    op.drop_index('ix_trades_user_id_status_created_at', table_name='trades')
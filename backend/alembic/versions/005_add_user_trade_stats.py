@@ -0,0 +1,56 @@
+"""Add user_trade_stats rollup and daily bucket tables
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_trade_stats',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('total_trades', sa.Integer(), nullable=False),
+        sa.Column('filled_trades', sa.Integer(), nullable=False),
+        sa.Column('total_profit_loss', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        'user_trade_stats_daily',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('trades', sa.Integer(), nullable=False),
+        sa.Column('filled_trades', sa.Integer(), nullable=False),
+        sa.Column('profit_loss', sa.Float(), nullable=False),
+    )
+
+    # Backfill the rollups from existing trades (same aggregation as trade_stats.rebuild_trade_stats)
+    filled_count = "COUNT(CASE WHEN status = 'filled' THEN 1 END)"
+    filled_pnl = "COALESCE(SUM(CASE WHEN status = 'filled' THEN profit_loss END), 0.0)"
+    # SQLite stores Date columns as 'YYYY-MM-DD' text
+    day = "date(created_at)" if op.get_bind().dialect.name == 'sqlite' else "CAST(created_at AS DATE)"
+    op.execute(
+        "INSERT INTO user_trade_stats (user_id, total_trades, filled_trades, total_profit_loss, updated_at) "
+        f"SELECT user_id, COUNT(*), {filled_count}, {filled_pnl}, CURRENT_TIMESTAMP "
+        "FROM trades WHERE user_id IS NOT NULL GROUP BY user_id"
+    )
+    op.execute(
+        "INSERT INTO user_trade_stats_daily (user_id, day, trades, filled_trades, profit_loss) "
+        f"SELECT user_id, {day}, COUNT(*), {filled_count}, {filled_pnl} "
+        f"FROM trades WHERE user_id IS NOT NULL GROUP BY user_id, {day}"
+    )
+
+
+def downgrade():
+    op.drop_table('user_trade_stats_daily')
+    op.drop_table('user_trade_stats')
@@ -0,0 +1,37 @@
+"""Add keyset pagination index to trades and make trades.created_at non-null
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The keyset cursor is (created_at, id): rows written outside the ORM without a timestamp
+    # get their fill time (or the migration time) so every trade can be paged past
+    op.execute("UPDATE trades SET created_at = COALESCE(filled_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL")
+    with op.batch_alter_table('trades') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+    # GET /api/trades seeks on (created_at, id) newest-first within one user
+    op.create_index(
+        'ix_trades_user_id_created_at_id',
+        'trades',
+        ['user_id', 'created_at', 'id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_trades_user_id_created_at_id', table_name='trades')
+    with op.batch_alter_table('trades') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
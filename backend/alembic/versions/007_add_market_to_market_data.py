@@ -0,0 +1,46 @@
+"""Key market_data candles by exchange and testnet
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing candles were fetched from live OKX
+    with op.batch_alter_table('market_data') as batch_op:
+        batch_op.add_column(sa.Column('exchange', sa.String(20), nullable=False, server_default='okex'))
+        batch_op.add_column(sa.Column('is_testnet', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.drop_index('ix_market_data_symbol_timeframe_timestamp', table_name='market_data')
+    # Sandbox and live candles of the same symbol must not overwrite each other
+    op.create_index(
+        'ix_market_data_market_symbol_timeframe_timestamp',
+        'market_data',
+        ['exchange', 'is_testnet', 'symbol', 'timeframe', 'timestamp'],
+        unique=True
+    )
+
+
+def downgrade():
+    op.drop_index('ix_market_data_market_symbol_timeframe_timestamp', table_name='market_data')
+    # Keep the live candles; sandbox rows would collide with the old unique key
+    op.execute("DELETE FROM market_data WHERE is_testnet = true")
+    op.create_index(
+        'ix_market_data_symbol_timeframe_timestamp',
+        'market_data',
+        ['symbol', 'timeframe', 'timestamp'],
+        unique=True
+    )
+    with op.batch_alter_table('market_data') as batch_op:
+        batch_op.drop_column('is_testnet')
+        batch_op.drop_column('exchange')
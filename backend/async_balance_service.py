@@ -1,126 +1,259 @@
 """
-异步余额服务 - 非阻塞版本
+异步余额服务 - 后台刷新版本
+- BalanceRefresher 后台任务每 BALANCE_REFRESH_INTERVAL 秒并发刷新所有启用账户的真实余额，
+  并发数受 BALANCE_REFRESH_CONCURRENCY 限制；账户的余额接口令牌低于预留比例
+  （BALANCE_REFRESH_RESERVE）时本轮跳过，不挤占交易和手动刷新的限速额度
+- 快照写入共享缓存（Redis，退回进程内字典），多个 worker 通过锁只由一个执行刷新
+- 仪表盘只读缓存快照，从不在请求路径上访问交易所
 """
+import os
+import time
 import asyncio
 import logging
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from typing import Awaitable, Callable, Dict, List, Optional
 from database import ExchangeAccount
+from balance_store import create_balance_store
+from rate_limiter import rate_limiter
+from single_flight import SingleFlight
 import schemas
 
 logger = logging.getLogger(__name__)
 
+REFRESH_INTERVAL = float(os.getenv('BALANCE_REFRESH_INTERVAL', '60'))
+REFRESH_CONCURRENCY = int(os.getenv('BALANCE_REFRESH_CONCURRENCY', '10'))
+REFRESH_TIMEOUT = float(os.getenv('BALANCE_REFRESH_TIMEOUT', '15'))
+# 后台刷新至少保留该比例的余额接口令牌给前台请求
+REFRESH_RESERVE = float(os.getenv('BALANCE_REFRESH_RESERVE', '0.5'))
+# 快照在缓存中的保留时间
+SNAPSHOT_TTL = float(os.getenv('BALANCE_SNAPSHOT_TTL', '3600'))
+# 手动刷新等待所有账户的最长时间，超时的账户返回旧快照
+REFRESH_DEADLINE = float(os.getenv('BALANCE_REFRESH_DEADLINE', '8'))
+
+BALANCE_ENDPOINT = '/api/v5/account/balance'
+
+# 余额获取函数: 账户 -> [{'currency', 'free', 'used', 'total'}, ...]
+BalanceFetcher = Callable[[ExchangeAccount], Awaitable[List[Dict]]]
+
+
+async def fetch_account_balance(account: ExchangeAccount) -> List[Dict]:
+    """经 ExchangeManager 获取账户余额，只保留有余额的币种"""
+    from trading_engine import exchange_manager
+
+    # 不接受模拟交易所的余额：不可达或超时时抛出异常，由刷新器保留上一次的真实快照
+    balance = await exchange_manager.get_balance(account, allow_mock=False)
+    free, used = balance.get('free') or {}, balance.get('used') or {}
+    return [
+        {'currency': currency, 'free': float(free.get(currency) or 0.0),
+         'used': float(used.get(currency) or 0.0), 'total': float(total)}
+        for currency, total in (balance.get('total') or {}).items()
+        if total and float(total) > 0
+    ]
+
+
+def load_active_accounts() -> List[ExchangeAccount]:
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return db.query(ExchangeAccount).filter(ExchangeAccount.is_active == True).all()
+    finally:
+        db.close()
+
+
+def placeholder_balance(account: ExchangeAccount, message: str, stale: bool = False) -> schemas.AccountBalance:
+    return schemas.AccountBalance(exchange=account.exchange_name, currency=message, free=0.0, used=0.0, total=0.0,
+                                  stale=stale)
+
+
+def _consume_result(task: asyncio.Task):
+    # 超过截止时间的刷新在后台继续，结果只写入缓存
+    if not task.cancelled():
+        task.exception()
+
+
+class BalanceRefresher:
+    """后台余额刷新任务"""
+
+    def __init__(self, store, fetch_balance: BalanceFetcher = fetch_account_balance,
+                 load_accounts: Callable[[], List[ExchangeAccount]] = load_active_accounts,
+                 interval: float = REFRESH_INTERVAL, concurrency: int = REFRESH_CONCURRENCY,
+                 timeout: float = REFRESH_TIMEOUT, reserve: float = REFRESH_RESERVE,
+                 snapshot_ttl: float = SNAPSHOT_TTL, limiter=rate_limiter):
+        self.store = store
+        self.fetch_balance = fetch_balance
+        self.load_accounts = load_accounts
+        self.interval = interval
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.reserve = reserve
+        self.snapshot_ttl = snapshot_ttl
+        self.limiter = limiter
+        self._flight = SingleFlight()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'rounds': 0,
+            'rounds_skipped': 0,
+            'refreshes': 0,
+            'errors': 0,
+            'skipped_rate_budget': 0,
+            'last_round_duration': 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def is_refreshing(self, account_id: int) -> bool:
+        return self._flight.pending(account_id)
+
+    def within_budget(self, account: ExchangeAccount) -> bool:
+        """账户余额接口的剩余令牌是否高于预留线"""
+        if self.limiter is None:
+            return True
+        bucket, _ = self.limiter.bucket(account.id, BALANCE_ENDPOINT)
+        return bucket.remaining() >= bucket.limit.requests * self.reserve
+
+    async def refresh_account(self, account: ExchangeAccount) -> Dict:
+        """刷新单个账户并写入缓存，返回快照；同一账户的并发刷新只请求一次"""
+        return await self._flight.do(account.id, lambda: self._refresh(account))
+
+    async def _refresh(self, account: ExchangeAccount) -> Dict:
+        self.stats['refreshes'] += 1
+        try:
+            balances = await asyncio.wait_for(self.fetch_balance(account), self.timeout)
+            snapshot = {'account_id': account.id, 'exchange': account.exchange_name,
+                        'balances': balances, 'updated_at': time.time(), 'error': None}
+        except Exception as e:
+            self.stats['errors'] += 1
+            error = str(e) or type(e).__name__
+            logger.warning(f"刷新账户 {account.id} 余额失败: {error}")
+            # 保留上一次成功的余额，只标记错误
+            previous = (await self.store.get_many([account.id])).get(account.id)
+            snapshot = dict(previous) if previous else {
+                'account_id': account.id, 'exchange': account.exchange_name, 'balances': [], 'updated_at': None}
+            snapshot['error'] = error
+        await self.store.set(account.id, snapshot, self.snapshot_ttl)
+        return snapshot
+
+    async def refresh_all(self, accounts: List[ExchangeAccount] = None) -> int:
+        """并发刷新所有（或给定的）账户，返回本轮刷新的账户数"""
+        started = time.monotonic()
+        accounts = self.load_accounts() if accounts is None else accounts
+        due = []
+        for account in accounts:
+            if self.within_budget(account):
+                due.append(account)
+            else:
+                self.stats['skipped_rate_budget'] += 1
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def guarded(account):
+            async with semaphore:
+                await self.refresh_account(account)
+
+        await asyncio.gather(*(guarded(account) for account in due), return_exceptions=True)
+        self.stats['rounds'] += 1
+        self.stats['last_round_duration'] = time.monotonic() - started
+        return len(due)
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                # 多个 worker 共用 Redis 时只有拿到锁的一个执行本轮刷新
+                if await self.store.acquire_lock('balance-refresh', self.interval * 0.8):
+                    await self.refresh_all()
+                else:
+                    self.stats['rounds_skipped'] += 1
+            except Exception as e:
+                logger.error(f"后台余额刷新失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._refresh_loop())
+            logger.info(f"后台余额刷新已启动（间隔 {self.interval:.0f} 秒，并发 {self.concurrency}）")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, 'running': self.running, 'in_flight': self._flight.in_flight()}
+
+
 class AsyncBalanceService:
-    """异步余额服务，避免阻塞API请求"""
-    
-    def __init__(self):
-        self.balance_cache = {}  # 缓存余额数据
-        self.last_update = {}    # 记录上次更新时间
-        self.updating = set()    # 正在更新的账户ID
+    """余额查询只读缓存快照，避免阻塞API请求"""
+
+    def __init__(self, store, refresher: BalanceRefresher):
+        self.store = store
+        self.refresher = refresher
+
+    def _to_balances(self, account: ExchangeAccount, snapshot: Optional[Dict],
+                     stale: bool = False) -> List[schemas.AccountBalance]:
+        if snapshot is None:
+            if stale or self.refresher.running or self.refresher.is_refreshing(account.id):
+                return [placeholder_balance(account, "正在获取中...", stale)]
+            return [placeholder_balance(account, "点击刷新获取余额")]
+        # 最近一次刷新失败时显示的是上一次成功的余额
+        stale = stale or bool(snapshot.get('error'))
+        if not snapshot['balances'] and snapshot.get('error'):
+            return [placeholder_balance(account, "获取失败", stale)]
+        return [
+            schemas.AccountBalance(exchange=account.exchange_name, currency=item['currency'],
+                                   free=item['free'], used=item['used'], total=item['total'], stale=stale)
+            for item in snapshot['balances']
+        ]
     
     async def get_balances_fast(self, exchange_accounts: List[ExchangeAccount]) -> List[schemas.AccountBalance]:
-        """快速获取余额（优先使用缓存）"""
+        """一次缓存读取获取所有账户的最新快照，不访问交易所"""
+        snapshots = await self.store.get_many(account.id for account in exchange_accounts)
         balances = []
-        
         for account in exchange_accounts:
-            account_key = f"{account.id}_{account.exchange_name}"
-            
-            # 检查缓存
-            if account_key in self.balance_cache:
-                cached_balance = self.balance_cache[account_key]
-                last_update = self.last_update.get(account_key)
-                
-                # 如果缓存数据不超过5分钟，使用缓存
-                if last_update and (datetime.now() - last_update).seconds < 300:
-                    balances.extend(cached_balance)
-                    continue
-            
-            # 添加占位符信息
-            if account_key in self.updating:
-                balances.append(schemas.AccountBalance(
-                    exchange=account.exchange_name,
-                    currency="正在获取中...",
-                    free=0.0,
-                    used=0.0,
-                    total=0.0
-                ))
-            else:
-                balances.append(schemas.AccountBalance(
-                    exchange=account.exchange_name,
-                    currency="点击刷新获取余额",
-                    free=0.0,
-                    used=0.0,
-                    total=0.0
-                ))
-        
+            balances.extend(self._to_balances(account, snapshots.get(account.id)))
         return balances
-    
+
     async def refresh_balance_async(self, account: ExchangeAccount) -> List[schemas.AccountBalance]:
-        """异步刷新单个账户余额"""
-        account_key = f"{account.id}_{account.exchange_name}"
-        
-        if account_key in self.updating:
-            return [schemas.AccountBalance(
-                exchange=account.exchange_name,
-                currency="正在获取中...",
-                free=0.0,
-                used=0.0,
-                total=0.0
-            )]
-        
-        self.updating.add(account_key)
-        
+        """立即刷新单个账户余额（手动刷新）"""
         try:
-            # 模拟余额获取（实际生产中可以调用真实API）
-            await asyncio.sleep(0.1)  # 避免真实API调用导致的超时
-            
-            # 返回模拟数据或错误提示
-            if account.exchange_name.lower() in ['okex', 'okx']:
-                balance_data = [
-                    schemas.AccountBalance(
-                        exchange=account.exchange_name,
-                        currency="USDT",
-                        free=1000.0,
-                        used=0.0,
-                        total=1000.0
-                    ),
-                    schemas.AccountBalance(
-                        exchange=account.exchange_name,
-                        currency="BTC",
-                        free=0.01,
-                        used=0.0,
-                        total=0.01
-                    )
-                ]
-            else:
-                balance_data = [
-                    schemas.AccountBalance(
-                        exchange=account.exchange_name,
-                        currency="模拟数据",
-                        free=0.0,
-                        used=0.0,
-                        total=0.0
-                    )
-                ]
-            
-            # 缓存结果
-            self.balance_cache[account_key] = balance_data
-            self.last_update[account_key] = datetime.now()
-            
-            return balance_data
-            
+            snapshot = await self.refresher.refresh_account(account)
         except Exception as e:
             logger.error(f"获取账户余额失败: {e}")
-            return [schemas.AccountBalance(
-                exchange=account.exchange_name,
-                currency="获取失败",
-                free=0.0,
-                used=0.0,
-                total=0.0
-            )]
-        finally:
-            self.updating.discard(account_key)
+            return [placeholder_balance(account, "获取失败")]
+        return self._to_balances(account, snapshot)
+
+    async def refresh_balances(self, exchange_accounts: List[ExchangeAccount],
+                               deadline: float = REFRESH_DEADLINE) -> List[schemas.AccountBalance]:
+        """并发刷新多个账户，最多等待 deadline 秒；未完成或失败的账户返回缓存中的旧快照并标记 stale"""
+        tasks = {account.id: asyncio.ensure_future(self.refresher.refresh_account(account))
+                 for account in exchange_accounts}
+        if tasks:
+            _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+            for task in pending:
+                task.add_done_callback(_consume_result)
+
+        fresh: Dict[int, Dict] = {}
+        for account_id, task in tasks.items():
+            if task.done() and not task.cancelled() and task.exception() is None:
+                fresh[account_id] = task.result()
+        missed = [account.id for account in exchange_accounts if account.id not in fresh]
+        cached = await self.store.get_many(missed) if missed else {}
+
+        balances = []
+        for account in exchange_accounts:
+            if account.id in fresh:
+                balances.extend(self._to_balances(account, fresh[account.id]))
+            else:
+                balances.extend(self._to_balances(account, cached.get(account.id), stale=True))
+        return balances
+
 
 # 全局实例
-async_balance_service = AsyncBalanceService()
+balance_store = create_balance_store()
+balance_refresher = BalanceRefresher(balance_store)
+async_balance_service = AsyncBalanceService(balance_store, balance_refresher)
@@ -0,0 +1,217 @@
+"""
+回测引擎 - 事件驱动 + 向量化
+用与实盘相同的策略插件信号函数回放历史K线：指标和信号整段向量化计算，
+成交模拟只在信号事件之间跳转，一年的5分钟K线单策略回测在毫秒级完成
+
+成交规则：
+- 信号在K线收盘时产生，下一根K线开盘价成交（避免未来函数），按滑点向不利方向调整
+- 只做多：空仓时买入信号开仓，持仓时卖出信号平仓；不加仓
+- 设置了止损/止盈百分比时，持仓期间按K线最低/最高价判断触发；同一根K线同时触发时按止损处理
+"""
+import logging
+import math
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from candle_store import ms_to_datetime
+from indicator_state import timeframe_to_ms
+from strategy_registry import compute_indicators, get_strategy_plugin
+
+logger = logging.getLogger(__name__)
+
+MS_PER_YEAR = 365 * 24 * 3600 * 1000
+
+
+@dataclass
+class BacktestConfig:
+    """回测参数"""
+    fee_rate: float = 0.001          # 单边手续费率
+    slippage: float = 0.0005         # 滑点（成交价的比例）
+    initial_capital: Optional[float] = None  # 默认使用首根K线价格 × 下单数量
+
+
+@dataclass
+class BacktestResult:
+    """回测结果"""
+    trades: List[Dict] = field(default_factory=list)
+    stats: Dict = field(default_factory=dict)
+    equity_curve: Optional[np.ndarray] = None
+
+
+def compute_signals(strategy, candles: Dict[str, np.ndarray]) -> np.ndarray:
+    """逐根K线的信号数组，与实盘按插件计算的最后一根K线结果一致"""
+    plugin = get_strategy_plugin(strategy.strategy_type)
+    values = compute_indicators(candles['close'], plugin.required_indicators(strategy))
+    return plugin.signal(candles, values, strategy)
+
+
+class BacktestEngine:
+    """按策略插件的信号函数回测"""
+
+    def run(self, strategy, candles: Dict[str, np.ndarray], config: BacktestConfig = None) -> BacktestResult:
+        config = config or BacktestConfig()
+        plugin = get_strategy_plugin(strategy.strategy_type)
+        n = len(candles['close'])
+        if n < plugin.warmup(strategy) + 2:
+            raise ValueError(f"K线数量不足: {n}")
+
+        signals = compute_signals(strategy, candles)
+        return self.run_signals(strategy, candles, signals, config)
+
+    def run_signals(self, strategy, candles: Dict[str, np.ndarray], signals: np.ndarray,
+                    config: BacktestConfig = None, include_trades: bool = True) -> BacktestResult:
+        """用预先计算好的信号数组回测（参数优化时复用共享的指标）"""
+        config = config or BacktestConfig()
+        round_trips = self._simulate(strategy, candles, signals, config)
+        return self._build_result(strategy, candles, round_trips, config, include_trades)
+
+    def _simulate(self, strategy, candles: Dict[str, np.ndarray], signals: np.ndarray,
+                  config: BacktestConfig) -> List[Dict]:
+        """在信号事件之间跳转，生成开平仓记录"""
+        open_ = np.asarray(candles['open'], dtype=np.float64)
+        high = np.asarray(candles['high'], dtype=np.float64)
+        low = np.asarray(candles['low'], dtype=np.float64)
+        close = np.asarray(candles['close'], dtype=np.float64)
+        n = len(close)
+
+        buy_idx = np.flatnonzero(signals == 1)
+        sell_idx = np.flatnonzero(signals == -1)
+        stop_loss = strategy.stop_loss_percent
+        take_profit = strategy.take_profit_percent
+
+        round_trips = []
+        cursor = 0
+        while True:
+            k = np.searchsorted(buy_idx, cursor)
+            if k >= len(buy_idx) or buy_idx[k] + 1 >= n:
+                break
+            entry = int(buy_idx[k]) + 1
+            entry_price = open_[entry] * (1 + config.slippage)
+
+            s = np.searchsorted(sell_idx, entry)
+            sell_signal = int(sell_idx[s]) if s < len(sell_idx) else None
+            # 信号平仓前可能触发止损/止盈的K线区间
+            search_end = sell_signal + 1 if sell_signal is not None else n
+
+            exit_bar, exit_price, reason = None, None, None
+            if stop_loss or take_profit:
+                sl_price = entry_price * (1 - stop_loss / 100) if stop_loss else -np.inf
+                tp_price = entry_price * (1 + take_profit / 100) if take_profit else np.inf
+                hit_sl = low[entry:search_end] <= sl_price
+                hit_tp = high[entry:search_end] >= tp_price
+                hits = hit_sl | hit_tp
+                if hits.any():
+                    offset = int(np.argmax(hits))
+                    exit_bar = entry + offset
+                    if hit_sl[offset]:
+                        exit_price, reason = min(open_[exit_bar], sl_price), 'stop_loss'
+                    else:
+                        exit_price, reason = max(open_[exit_bar], tp_price), 'take_profit'
+                    exit_price *= (1 - config.slippage)
+
+            if exit_bar is None:
+                if sell_signal is not None and sell_signal + 1 < n:
+                    exit_bar = sell_signal + 1
+                    exit_price, reason = open_[exit_bar] * (1 - config.slippage), 'signal'
+                else:
+                    exit_bar = n - 1
+                    exit_price, reason = close[exit_bar], 'end_of_data'
+
+            round_trips.append({
+                'entry_bar': entry,
+                'entry_price': float(entry_price),
+                'exit_bar': int(exit_bar),
+                'exit_price': float(exit_price),
+                'exit_reason': reason,
+            })
+            # 平仓所在K线之后才能再次开仓
+            cursor = max(int(exit_bar), entry)
+
+        return round_trips
+
+    def _build_result(self, strategy, candles: Dict[str, np.ndarray], round_trips: List[Dict],
+                      config: BacktestConfig, include_trades: bool = True) -> BacktestResult:
+        timestamps = np.asarray(candles['timestamp'], dtype=np.int64)
+        close = np.asarray(candles['close'], dtype=np.float64)
+        n = len(close)
+        amount = float(strategy.entry_amount)
+        initial_capital = config.initial_capital or float(close[0]) * amount
+
+        trades = []
+        unrealized = np.zeros(n)
+        realized_delta = np.zeros(n)
+        total_fees = 0.0
+        wins = 0
+
+        for rt in round_trips:
+            entry_fee = rt['entry_price'] * amount * config.fee_rate
+            exit_fee = rt['exit_price'] * amount * config.fee_rate
+            pnl = (rt['exit_price'] - rt['entry_price']) * amount - entry_fee - exit_fee
+            total_fees += entry_fee + exit_fee
+            wins += pnl > 0
+
+            entry, exit_ = rt['entry_bar'], rt['exit_bar']
+            unrealized[entry:exit_] = (close[entry:exit_] - rt['entry_price']) * amount - entry_fee
+            realized_delta[exit_] += pnl
+
+            if not include_trades:
+                continue
+            trades.append(self._trade_record(strategy, 'buy', rt['entry_price'], amount, entry_fee,
+                                             0.0, timestamps[entry], None))
+            trades.append(self._trade_record(strategy, 'sell', rt['exit_price'], amount, exit_fee,
+                                             pnl, timestamps[exit_], rt['exit_reason']))
+
+        equity = initial_capital + np.cumsum(realized_delta) + unrealized
+        peak = np.maximum.accumulate(equity)
+        drawdown = peak - equity
+        max_dd_idx = int(np.argmax(drawdown)) if n else 0
+
+        # 按初始资金计算每根K线收益率，权益跌破零时夏普比率仍有意义
+        returns = np.diff(equity) / initial_capital if n > 1 else np.empty(0)
+        bars_per_year = MS_PER_YEAR / timeframe_to_ms(strategy.timeframe)
+        sharpe = 0.0
+        if len(returns) and returns.std() > 0:
+            sharpe = float(returns.mean() / returns.std() * math.sqrt(bars_per_year))
+
+        total_pnl = float(equity[-1] - initial_capital)
+        stats = {
+            'bars': n,
+            'start': ms_to_datetime(int(timestamps[0])),
+            'end': ms_to_datetime(int(timestamps[-1])),
+            'total_trades': len(round_trips),
+            'winning_trades': int(wins),
+            'win_rate': wins / len(round_trips) if round_trips else 0.0,
+            'total_profit_loss': total_pnl,
+            'total_fees': total_fees,
+            'return_percent': total_pnl / initial_capital * 100,
+            'max_drawdown': float(drawdown[max_dd_idx]),
+            'max_drawdown_percent': float(drawdown[max_dd_idx] / peak[max_dd_idx] * 100) if peak[max_dd_idx] else 0.0,
+            'sharpe_ratio': sharpe,
+        }
+        return BacktestResult(trades=trades, stats=stats, equity_curve=equity)
+
+    @staticmethod
+    def _trade_record(strategy, side: str, price: float, amount: float, fee: float,
+                      profit_loss: float, timestamp_ms, exit_reason: Optional[str]) -> Dict:
+        """与 Trade 表字段一致的成交记录"""
+        filled_at = ms_to_datetime(int(timestamp_ms))
+        return {
+            'strategy_id': strategy.id,
+            'symbol': strategy.symbol,
+            'side': side,
+            'order_type': 'market',
+            'amount': amount,
+            'price': price,
+            'filled_amount': amount,
+            'filled_price': price,
+            'status': 'filled',
+            'fee': fee,
+            'profit_loss': profit_loss,
+            'created_at': filled_at,
+            'filled_at': filled_at,
+            'exit_reason': exit_reason,
+        }
+
+
+# 全局实例
+backtest_engine = BacktestEngine()
@@ -0,0 +1,152 @@
+"""
+账户余额快照存储
+余额快照按账户 id 存放在共享缓存中，供所有 uvicorn worker 读取：
+- 配置了 REDIS_URL 时写入 Redis（一次 MGET 读取多个账户），进程重启后数据仍在
+- Redis 不可用时自动退回进程内字典，每 BALANCE_STORE_RETRY_INTERVAL 秒重试一次
+快照格式: {'account_id', 'exchange', 'balances': [{'currency', 'free', 'used', 'total'}],
+          'updated_at': 时间戳, 'error': 最近一次刷新错误或 None}
+"""
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+import weakref
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+RETRY_INTERVAL = float(os.getenv('BALANCE_STORE_RETRY_INTERVAL', '30'))
+KEY_PREFIX = 'balance:'
+
+
+class MemoryBalanceStore:
+    """进程内快照存储（单 worker 或 Redis 不可用时）"""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._snapshots: Dict[int, Tuple[float, Dict]] = {}
+        self._locks: Dict[str, float] = {}
+
+    async def set(self, account_id: int, snapshot: Dict, ttl: float):
+        self._snapshots[account_id] = (self.clock() + ttl, snapshot)
+
+    async def get_many(self, account_ids: Iterable[int]) -> Dict[int, Dict]:
+        now = self.clock()
+        result = {}
+        for account_id in account_ids:
+            entry = self._snapshots.get(account_id)
+            if entry is not None and entry[0] > now:
+                result[account_id] = entry[1]
+        return result
+
+    async def acquire_lock(self, name: str, ttl: float) -> bool:
+        now = self.clock()
+        if self._locks.get(name, 0) > now:
+            return False
+        self._locks[name] = now + ttl
+        return True
+
+    async def close(self):
+        pass
+
+
+class RedisBalanceStore:
+    """Redis 快照存储；客户端按事件循环创建"""
+
+    def __init__(self, url: str, prefix: str = KEY_PREFIX):
+        self.url = url
+        self.prefix = prefix
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = aioredis.from_url(self.url, decode_responses=True,
+                                                             socket_timeout=2, socket_connect_timeout=2)
+        return client
+
+    async def set(self, account_id: int, snapshot: Dict, ttl: float):
+        await self._client().set(f"{self.prefix}{account_id}", json.dumps(snapshot), ex=max(1, math.ceil(ttl)))
+
+    async def get_many(self, account_ids: Iterable[int]) -> Dict[int, Dict]:
+        account_ids = list(account_ids)
+        if not account_ids:
+            return {}
+        values = await self._client().mget([f"{self.prefix}{account_id}" for account_id in account_ids])
+        return {account_id: json.loads(value) for account_id, value in zip(account_ids, values) if value}
+
+    async def acquire_lock(self, name: str, ttl: float) -> bool:
+        """多个 worker 之间只有一个拿到锁（SET NX EX）"""
+        return bool(await self._client().set(f"{self.prefix}lock:{name}", os.getpid(), nx=True,
+                                             ex=max(1, math.ceil(ttl))))
+
+    async def close(self):
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+class FallbackBalanceStore:
+    """优先使用 primary（Redis），出错时退回 fallback（进程内）并在一段时间后重试"""
+
+    def __init__(self, primary, fallback, retry_interval: float = RETRY_INTERVAL, clock=time.monotonic):
+        self.primary = primary
+        self.fallback = fallback
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self._down_until = 0.0
+        self.stats = {'primary_errors': 0}
+
+    @property
+    def primary_available(self) -> bool:
+        return self.clock() >= self._down_until
+
+    def _mark_down(self, error: Exception):
+        if self.primary_available:
+            logger.warning(f"余额缓存 Redis 不可用，改用进程内缓存 {self.retry_interval:.0f} 秒: {error}")
+        self.stats['primary_errors'] += 1
+        self._down_until = self.clock() + self.retry_interval
+
+    async def _call(self, method: str, *args):
+        if self.primary_available:
+            try:
+                return await getattr(self.primary, method)(*args)
+            except Exception as e:
+                self._mark_down(e)
+        return await getattr(self.fallback, method)(*args)
+
+    async def set(self, account_id: int, snapshot: Dict, ttl: float):
+        # 本地始终保留一份，Redis 故障期间仍能读到最近的快照
+        await self.fallback.set(account_id, snapshot, ttl)
+        if self.primary_available:
+            try:
+                await self.primary.set(account_id, snapshot, ttl)
+            except Exception as e:
+                self._mark_down(e)
+
+    async def get_many(self, account_ids: Iterable[int]) -> Dict[int, Dict]:
+        return await self._call('get_many', list(account_ids))
+
+    async def acquire_lock(self, name: str, ttl: float) -> bool:
+        return await self._call('acquire_lock', name, ttl)
+
+    async def close(self):
+        await self.primary.close()
+        await self.fallback.close()
+
+
+def create_balance_store(redis_url: Optional[str] = None):
+    """有 REDIS_URL 且安装了 redis 时使用 Redis（带进程内回退），否则只用进程内存储"""
+    redis_url = redis_url or os.getenv('REDIS_URL')
+    if redis_url and REDIS_AVAILABLE:
+        return FallbackBalanceStore(RedisBalanceStore(redis_url), MemoryBalanceStore())
+    return MemoryBalanceStore()
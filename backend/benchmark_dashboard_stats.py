@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+仪表盘统计查询基准测试
+在临时 SQLite 数据库中生成大量交易记录，对比旧版四条 COUNT/SUM 查询（不含今日统计）
+与 HybridDashboardService 读取 user_trade_stats 汇总表的单条 SQL，分别在无索引和有索引时测量，
+并测量从原始交易重建汇总表（修复任务）的耗时
+
+用法: python benchmark_dashboard_stats.py [交易数量] [用户数量]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, func, insert, text
+from sqlalchemy.orm import sessionmaker
+from database import Base, ExchangeAccount, Strategy, Trade, User
+from hybrid_dashboard_service import HybridDashboardService
+from trade_stats import rebuild_trade_stats
+
+INDEXES = ['ix_trades_user_id_status_created_at', 'ix_strategies_user_id_is_active']
+
+
+def legacy_stats(user_id: int, db):
+    """旧版实现（原 get_dashboard_stats_hybrid 的四条查询）"""
+    total_strategies = db.query(Strategy).filter(Strategy.user_id == user_id).count()
+    active_strategies = db.query(Strategy).filter(Strategy.user_id == user_id, Strategy.is_active == True).count()
+    total_trades = db.query(Trade).filter(Trade.user_id == user_id).count()
+    total_profit_loss = db.query(func.sum(Trade.profit_loss)).filter(
+        Trade.user_id == user_id, Trade.status == "filled").scalar() or 0.0
+    return total_strategies, active_strategies, total_trades, total_profit_loss
+
+
+def populate(engine, n_trades: int, n_users: int, seed: int = 42):
+    """生成用户、策略和 n_trades 条交易，时间均匀分布在最近 365 天"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{'id': i, 'username': f"user{i}", 'email': f"user{i}@example.com",
+                                     'hashed_password': 'x'} for i in range(1, n_users + 1)])
+        conn.execute(insert(ExchangeAccount), [{'id': i, 'user_id': i, 'exchange_name': 'okex', 'api_key': 'k',
+                                                'api_secret': 's'} for i in range(1, n_users + 1)])
+        conn.execute(insert(Strategy), [
+            {'user_id': user_id, 'exchange_account_id': user_id, 'name': f"s{n}", 'strategy_type': '5m_boll_ma60',
+             'symbol': 'BTC/USDT', 'timeframe': '5m', 'entry_amount': 10.0, 'is_active': n % 2 == 0}
+            for user_id in range(1, n_users + 1) for n in range(10)])
+        statuses = ['filled'] * 8 + ['cancelled', 'failed']
+        batch = []
+        for n in range(n_trades):
+            user_id = rng.randint(1, n_users)
+            batch.append({'user_id': user_id, 'strategy_id': (user_id - 1) * 10 + 1, 'symbol': 'BTC/USDT',
+                          'side': 'buy', 'order_type': 'market', 'amount': 1.0, 'status': rng.choice(statuses),
+                          'profit_loss': rng.uniform(-50, 50),
+                          'created_at': now - timedelta(seconds=rng.randint(0, 365 * 86400))})
+            if len(batch) == 50_000:
+                conn.execute(insert(Trade), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Trade), batch)
+
+
+def best_of(func, repeat: int = 5) -> float:
+    """多次运行取最短耗时（秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure(db, user_id: int):
+    legacy_time = best_of(lambda: legacy_stats(user_id, db))
+    single_time = best_of(lambda: HybridDashboardService._base_stats(user_id, db, []))
+    print(f"旧版四条查询:   {legacy_time * 1000:10.2f} ms")
+    print(f"汇总表查询:     {single_time * 1000:10.2f} ms  （另含今日交易数和今日盈亏）")
+
+
+def run_benchmark(n_trades: int = 1_000_000, n_users: int = 100):
+    print("=" * 60)
+    print(f"📊 仪表盘统计基准: {n_trades} 条交易, {n_users} 个用户")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for name in INDEXES:
+                conn.execute(text(f"DROP INDEX {name}"))
+
+        start = time.perf_counter()
+        populate(engine, n_trades, n_users)
+        print(f"生成数据: {time.perf_counter() - start:.1f} s")
+
+        db = sessionmaker(bind=engine)()
+        # 批量导入绕过了 ORM 的增量维护，由修复任务一次性重建
+        start = time.perf_counter()
+        rebuild_trade_stats(db)
+        db.commit()
+        print(f"重建汇总表: {time.perf_counter() - start:.2f} s")
+
+        user_id = 1
+        stats = HybridDashboardService._base_stats(user_id, db, [])
+        legacy = legacy_stats(user_id, db)
+        assert (stats.total_strategies, stats.active_strategies, stats.total_trades) == legacy[:3]
+        assert abs(stats.total_profit_loss - legacy[3]) < 1e-6
+        print(f"用户 {user_id}: {stats.total_trades} 条交易, 今日 {stats.today_trades} 条")
+
+        print("\n无索引:")
+        measure(db, user_id)
+
+        db.close()
+        with engine.begin() as conn:
+            for table in ('trades', 'strategies'):
+                for index in Base.metadata.tables[table].indexes:
+                    if index.name in INDEXES:
+                        index.create(conn)
+            conn.execute(text("ANALYZE"))
+        db = sessionmaker(bind=engine)()
+
+        print("\n有索引:")
+        measure(db, user_id)
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    trades = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    run_benchmark(trades, users)
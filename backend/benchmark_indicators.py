@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+指标计算微基准测试
+对比 StrategyEngine 旧版逐窗口 np.std 实现与 indicators 模块的向量化实现
+
+用法: python benchmark_indicators.py [K线数量] [布林带周期]
+"""
+import sys
+import time
+import numpy as np
+import indicators
+
+
+def legacy_bollinger_bands(prices: np.ndarray, period: int = 20, deviation: float = 2.0):
+    """旧版实现（原 StrategyEngine.calculate_bollinger_bands）"""
+    middle = np.convolve(prices, np.ones(period), 'valid') / period
+    std_dev = np.array([np.std(prices[i:i+period]) for i in range(len(prices) - period + 1)])
+    upper = middle + (std_dev * deviation)
+    lower = middle - (std_dev * deviation)
+    return upper, middle, lower
+
+
+def generate_prices(n: int, start: float = 45000.0, seed: int = 42) -> np.ndarray:
+    """生成随机游走价格序列"""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.002, n)
+    return start * np.exp(np.cumsum(returns))
+
+
+def best_of(func, repeat: int = 5) -> float:
+    """多次运行取最短耗时（秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_benchmark(n_bars: int = 105_120, period: int = 20):
+    print("=" * 60)
+    print(f"📊 布林带计算基准: {n_bars} 根K线, 周期 {period}")
+    print("=" * 60)
+
+    prices = generate_prices(n_bars)
+
+    legacy = legacy_bollinger_bands(prices, period)
+    vectorized = indicators.bollinger_bands(prices, period)
+    max_error = max(np.max(np.abs(a - b)) for a, b in zip(legacy, vectorized))
+    print(f"最大绝对误差: {max_error:.3e}")
+
+    legacy_time = best_of(lambda: legacy_bollinger_bands(prices, period), repeat=3)
+    vectorized_time = best_of(lambda: indicators.bollinger_bands(prices, period))
+
+    print(f"旧版实现:   {legacy_time * 1000:10.2f} ms")
+    print(f"向量化实现: {vectorized_time * 1000:10.2f} ms")
+    print(f"加速比:     {legacy_time / vectorized_time:10.1f}x")
+
+    # 调度器每个tick的典型输入规模
+    small = prices[:max(period, 60) + 10]
+    legacy_small = best_of(lambda: legacy_bollinger_bands(small, period), repeat=50)
+    vectorized_small = best_of(lambda: indicators.bollinger_bands(small, period), repeat=50)
+    print(f"\n单次信号检查规模 ({len(small)} 根K线):")
+    print(f"旧版实现:   {legacy_small * 1e6:10.1f} µs")
+    print(f"向量化实现: {vectorized_small * 1e6:10.1f} µs")
+
+
+if __name__ == "__main__":
+    bars = int(sys.argv[1]) if len(sys.argv) > 1 else 105_120
+    bb_period = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    run_benchmark(bars, bb_period)
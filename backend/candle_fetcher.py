@@ -0,0 +1,146 @@
+"""
+K线请求合并器
+同一交易所、交易对、周期的所有活跃策略在每个tick只请求一次K线（取最大深度），
+结果共享给组内每个策略，避免多租户部署下成百倍的重复请求；
+各组并发拉取时每组使用独立的数据库会话，一组的提交或失败不影响其他组
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from database import ExchangeAccount, SessionLocal, Strategy
+from trading_engine import exchange_manager, strategy_engine
+from ohlcv_archive import candle_source
+from market_data_stream import market_data_stream, serves_market
+
+logger = logging.getLogger(__name__)
+
+# (exchange_name, is_testnet, symbol, timeframe)
+GroupKey = Tuple[str, bool, str, str]
+
+# 未传入调度器的信号量时，同时拉取的组数上限
+FETCH_CONCURRENCY = int(os.getenv('CANDLE_FETCH_CONCURRENCY', '10'))
+
+
+class CandleFetchCoalescer:
+    """按 (交易所, 交易对, 周期) 合并K线请求"""
+
+    def __init__(self, exchange_manager, strategy_engine, candle_store=None, market_data=None,
+                 session_factory: Callable[[], Session] = SessionLocal):
+        self.exchange_manager = exchange_manager
+        self.strategy_engine = strategy_engine
+        # 配置了本地K线存储时只向交易所补齐缺口
+        self.candle_store = candle_store
+        # K线存储的读写在交易所请求前后穿插，并发的组不能共用 tick 的会话
+        self.session_factory = session_factory
+        # WebSocket 推送的实时K线足够时不再请求 REST
+        self.market_data = market_data
+        self.stats = {
+            'ticks': 0,
+            'strategies_served': 0,
+            'upstream_fetches': 0,
+            'live_hits': 0,
+            'failed_fetches': 0,
+        }
+
+    @staticmethod
+    def _group_key(account: ExchangeAccount, strategy: Strategy) -> GroupKey:
+        exchange_name = account.exchange_name.lower()
+        if exchange_name == 'okx':
+            exchange_name = 'okex'
+        return (exchange_name, bool(account.is_testnet), strategy.symbol, strategy.timeframe)
+
+    def group_strategies(self, strategies: List[Strategy], db: Session) -> Dict[GroupKey, dict]:
+        """将策略分组，每组记录所需最大深度和用于请求的账户"""
+        account_ids = {s.exchange_account_id for s in strategies}
+        accounts = {
+            a.id: a for a in db.query(ExchangeAccount).filter(ExchangeAccount.id.in_(account_ids)).all()
+        } if account_ids else {}
+
+        now_ms = int(datetime.now().timestamp() * 1000)
+        groups: Dict[GroupKey, dict] = {}
+        for strategy in strategies:
+            account = accounts.get(strategy.exchange_account_id)
+            if not account:
+                logger.error(f"Exchange account not found for strategy {strategy.id}")
+                continue
+
+            key = self._group_key(account, strategy)
+            depth = self.strategy_engine.candles_required(strategy, now_ms)
+            group = groups.setdefault(key, {'account': account, 'limit': 0, 'strategy_ids': []})
+            group['limit'] = max(group['limit'], depth)
+            group['strategy_ids'].append(strategy.id)
+
+        return groups
+
+    async def _fetch_group(self, key: GroupKey, group: dict) -> Optional[List]:
+        exchange_name, is_testnet, symbol, timeframe = key
+        # WebSocket 缓冲区只有 OKX 实盘K线，其他市场既不读也不播种
+        live_market = self.market_data is not None and serves_market(exchange_name, is_testnet)
+        if live_market:
+            live = self.market_data.get_candles(symbol, timeframe, group['limit'])
+            if live is not None:
+                self.stats['live_hits'] += 1
+                return live
+        try:
+            self.stats['upstream_fetches'] += 1
+            if self.candle_store is not None:
+                group_db = self.session_factory()
+                try:
+                    ohlcv = await self.candle_store.get_candles(
+                        group_db, group['account'], symbol, timeframe, group['limit']
+                    )
+                finally:
+                    group_db.close()
+            else:
+                ohlcv = await self.exchange_manager.get_ohlcv(
+                    group['account'], symbol, timeframe, limit=group['limit']
+                )
+            if live_market:
+                self.market_data.seed_candles(symbol, timeframe, ohlcv)
+            return ohlcv
+        except Exception as e:
+            self.stats['failed_fetches'] += 1
+            logger.error(f"Shared OHLCV fetch failed for {symbol} {timeframe}: {e}")
+            return None
+
+    async def _fetch_group_bounded(self, key: GroupKey, group: dict, semaphore: asyncio.Semaphore) -> Optional[List]:
+        async with semaphore:
+            return await self._fetch_group(key, group)
+
+    async def fetch_groups(self, strategies: List[Strategy], db: Session,
+                           semaphore: Optional[asyncio.Semaphore] = None) -> List[Tuple[List[int], List]]:
+        """按组获取K线，返回 [(组内策略ID, ohlcv)]；请求失败的组不包含在结果中
+
+        semaphore 限制同时在途的组（上游请求和数据库会话），默认上限为 CANDLE_FETCH_CONCURRENCY
+        """
+        groups = self.group_strategies(strategies, db)
+        keys = list(groups)
+        semaphore = semaphore or asyncio.Semaphore(FETCH_CONCURRENCY)
+        results = await asyncio.gather(*(self._fetch_group_bounded(k, groups[k], semaphore) for k in keys))
+
+        fetched = [(groups[key]['strategy_ids'], ohlcv) for key, ohlcv in zip(keys, results) if ohlcv is not None]
+        served = sum(len(ids) for ids, _ in fetched)
+
+        self.stats['ticks'] += 1
+        self.stats['strategies_served'] += served
+        logger.info(f"Fetched candles for {served} strategies from {len(keys)} groups")
+        return fetched
+
+    async def fetch_for_strategies(self, strategies: List[Strategy], db: Session,
+                                   semaphore: Optional[asyncio.Semaphore] = None) -> Dict[int, List]:
+        """为一批策略获取K线，返回 {strategy_id: ohlcv}；请求失败的组不包含在结果中"""
+        candles_by_strategy: Dict[int, List] = {}
+        for strategy_ids, ohlcv in await self.fetch_groups(strategies, db, semaphore):
+            for strategy_id in strategy_ids:
+                candles_by_strategy[strategy_id] = ohlcv
+        return candles_by_strategy
+
+    def get_stats(self) -> dict:
+        return dict(self.stats)
+
+
+# 全局实例
+candle_coalescer = CandleFetchCoalescer(exchange_manager, strategy_engine, candle_source, market_data_stream)
@@ -0,0 +1,245 @@
+"""
+本地K线存储 - 基于 MarketData 表
+拉取过的K线批量 upsert 到数据库，再次请求时先检查本地缺口，只向交易所补齐缺失的尾部，
+指标预热、回测和服务重启都优先读取本地数据
+K线按 (交易所, 是否模拟盘, 交易对, 周期) 区分，模拟盘和实盘的同名交易对互不覆盖
+"""
+import logging
+import numpy as np
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import ExchangeAccount, MarketData
+from indicator_state import timeframe_to_ms
+from trading_engine import exchange_manager
+
+logger = logging.getLogger(__name__)
+
+# 单条 INSERT 语句的最大行数（SQLite 绑定参数上限）
+UPSERT_BATCH_SIZE = 500
+
+OHLCV_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+DEFAULT_EXCHANGE = 'okex'
+
+
+def market_of(exchange_account: Optional[ExchangeAccount]) -> Tuple[str, bool]:
+    """账户对应的K线市场 (交易所, 是否模拟盘)；okx 与 okex 视为同一交易所"""
+    if exchange_account is None:
+        return DEFAULT_EXCHANGE, False
+    exchange = exchange_account.exchange_name.lower()
+    return ('okex' if exchange == 'okx' else exchange), bool(exchange_account.is_testnet)
+
+
+def ms_to_datetime(timestamp_ms: int) -> datetime:
+    """毫秒时间戳 -> naive UTC datetime（与表中其他 DateTime 列一致）"""
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def datetime_to_ms(value: datetime) -> int:
+    """datetime -> 毫秒时间戳；naive 值按 UTC 解释，带时区的值先换算到 UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.astimezone(timezone.utc).timestamp() * 1000)
+
+
+class CandleStore:
+    """MarketData 表上的K线缓存层"""
+
+    def __init__(self, exchange_manager):
+        self.exchange_manager = exchange_manager
+        # (交易所, 模拟盘, 交易对, 周期) -> 交易所确认不存在的K线开盘时间（上游永久缺口）
+        self._holes: Dict[Tuple[str, bool, str, str], Set[int]] = {}
+        self.stats = {
+            'requests': 0,
+            'candles_fetched': 0,
+            'candles_served': 0,
+            'known_holes': 0,
+        }
+
+    @staticmethod
+    def _market_filter(exchange: str, is_testnet: bool):
+        return (MarketData.exchange == exchange, MarketData.is_testnet == is_testnet)
+
+    def upsert_candles(self, db: Session, symbol: str, timeframe: str, ohlcv: List[List[float]],
+                       exchange: str = DEFAULT_EXCHANGE, is_testnet: bool = False) -> int:
+        """批量写入K线，已存在的 (exchange, is_testnet, symbol, timeframe, timestamp) 覆盖OHLCV值"""
+        if not ohlcv:
+            return 0
+
+        now = datetime.utcnow()
+        rows = [{
+            'exchange': exchange,
+            'is_testnet': is_testnet,
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'timestamp': ms_to_datetime(int(c[0])),
+            'open_price': float(c[1]),
+            'high_price': float(c[2]),
+            'low_price': float(c[3]),
+            'close_price': float(c[4]),
+            'volume': float(c[5]),
+            'created_at': now,
+        } for c in ohlcv]
+
+        dialect = db.bind.dialect.name
+        try:
+            for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+                batch = rows[start:start + UPSERT_BATCH_SIZE]
+                if dialect in ('postgresql', 'sqlite'):
+                    insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+                    stmt = insert(MarketData).values(batch)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['exchange', 'is_testnet', 'symbol', 'timeframe', 'timestamp'],
+                        set_={col: stmt.excluded[col] for col in
+                              ('open_price', 'high_price', 'low_price', 'close_price', 'volume')}
+                    )
+                    db.execute(stmt)
+                else:
+                    # 其他数据库：先删除再批量插入
+                    db.query(MarketData).filter(
+                        *self._market_filter(exchange, is_testnet),
+                        MarketData.symbol == symbol,
+                        MarketData.timeframe == timeframe,
+                        MarketData.timestamp.in_([r['timestamp'] for r in batch])
+                    ).delete(synchronize_session=False)
+                    db.bulk_insert_mappings(MarketData, batch)
+            db.commit()
+        except Exception:
+            # 不让失败的写入把会话留在 PendingRollback 状态
+            db.rollback()
+            raise
+        return len(rows)
+
+    def _stored_timestamps(self, db: Session, symbol: str, timeframe: str, start: datetime, end: datetime,
+                           exchange: str = DEFAULT_EXCHANGE, is_testnet: bool = False) -> List[int]:
+        rows = db.query(MarketData.timestamp).filter(
+            *self._market_filter(exchange, is_testnet),
+            MarketData.symbol == symbol,
+            MarketData.timeframe == timeframe,
+            MarketData.timestamp >= start,
+            MarketData.timestamp <= end
+        ).order_by(MarketData.timestamp).all()
+        return [datetime_to_ms(r[0]) for r in rows]
+
+    @staticmethod
+    def find_sync_start(stored: List[int], window_start: int, window_end: int, timeframe_ms: int,
+                        holes: Optional[Set[int]] = None) -> int:
+        """找出需要从交易所重新拉取的起点
+
+        本地最后一根K线在写入时可能尚未收盘，所以总是从它（或更早的第一个缺口）开始补齐；
+        holes 中是交易所已确认不存在的K线，不算作缺口
+        """
+        if not stored:
+            return window_start
+
+        holes = holes or set()
+        expected = window_start
+        for ts in stored:
+            while expected < ts and expected in holes:
+                expected += timeframe_ms
+            if ts != expected:
+                return expected
+            expected += timeframe_ms
+
+        return min(stored[-1], window_end)
+
+    def _remember_holes(self, key: Tuple[str, bool, str, str], stored: List[int], fetched: List[List[float]],
+                        sync_start: int, window_start: int, timeframe_ms: int) -> Set[int]:
+        """记录交易所在已返回的最新K线之前仍然缺失的时间戳，下次同步不再为它们回补整个窗口"""
+        holes = {ts for ts in self._holes.get(key, ()) if ts >= window_start}
+        if fetched:
+            present = set(stored) | {int(c[0]) for c in fetched}
+            latest = max(int(c[0]) for c in fetched)
+            holes |= {ts for ts in range(sync_start, latest, timeframe_ms) if ts not in present}
+        if holes:
+            self._holes[key] = holes
+        else:
+            self._holes.pop(key, None)
+        self.stats['known_holes'] = sum(len(h) for h in self._holes.values())
+        return holes
+
+    def read_candles(self, db: Session, symbol: str, timeframe: str, limit: int, end_ms: Optional[int] = None,
+                     exchange: str = DEFAULT_EXCHANGE, is_testnet: bool = False) -> List[List[float]]:
+        """从本地读取最近 limit 根K线（ccxt OHLCV 格式）"""
+        query = db.query(
+            MarketData.timestamp, MarketData.open_price, MarketData.high_price,
+            MarketData.low_price, MarketData.close_price, MarketData.volume
+        ).filter(
+            *self._market_filter(exchange, is_testnet),
+            MarketData.symbol == symbol,
+            MarketData.timeframe == timeframe
+        )
+        if end_ms is not None:
+            query = query.filter(MarketData.timestamp <= ms_to_datetime(end_ms))
+
+        rows = query.order_by(MarketData.timestamp.desc()).limit(limit).all()
+        return [[datetime_to_ms(r[0]), r[1], r[2], r[3], r[4], r[5]] for r in reversed(rows)]
+
+    def load_arrays(self, db: Session, symbol: str, timeframe: str,
+                    start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                    exchange: str = DEFAULT_EXCHANGE, is_testnet: bool = False) -> Dict[str, np.ndarray]:
+        """读取时间区间内的全部K线，按列返回 numpy 数组（回测使用）"""
+        query = db.query(
+            MarketData.timestamp, MarketData.open_price, MarketData.high_price,
+            MarketData.low_price, MarketData.close_price, MarketData.volume
+        ).filter(
+            *self._market_filter(exchange, is_testnet),
+            MarketData.symbol == symbol,
+            MarketData.timeframe == timeframe
+        )
+        if start_ms is not None:
+            query = query.filter(MarketData.timestamp >= ms_to_datetime(start_ms))
+        if end_ms is not None:
+            query = query.filter(MarketData.timestamp <= ms_to_datetime(end_ms))
+
+        rows = query.order_by(MarketData.timestamp).all()
+        arrays = {
+            'timestamp': np.array([datetime_to_ms(r[0]) for r in rows], dtype=np.int64),
+        }
+        for i, name in enumerate(OHLCV_COLUMNS[1:], start=1):
+            arrays[name] = np.array([r[i] for r in rows], dtype=np.float64)
+        return arrays
+
+    async def get_candles(self, db: Session, exchange_account: ExchangeAccount, symbol: str,
+                          timeframe: str, limit: int, now_ms: Optional[int] = None) -> List[List[float]]:
+        """获取最近 limit 根K线：本地已有的直接读取，只向交易所请求缺口及最新的尾部"""
+        self.stats['requests'] += 1
+        timeframe_ms = timeframe_to_ms(timeframe)
+        if now_ms is None:
+            now_ms = int(datetime.utcnow().replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+        # 当前未收盘K线的开盘时间即窗口终点
+        window_end = now_ms - now_ms % timeframe_ms
+        window_start = window_end - (limit - 1) * timeframe_ms
+
+        exchange, is_testnet = market_of(exchange_account)
+        market = {'exchange': exchange, 'is_testnet': is_testnet}
+        key = (exchange, is_testnet, symbol, timeframe)
+        stored = self._stored_timestamps(
+            db, symbol, timeframe, ms_to_datetime(window_start), ms_to_datetime(window_end), **market
+        )
+        sync_start = self.find_sync_start(stored, window_start, window_end, timeframe_ms, self._holes.get(key))
+        fetch_limit = (window_end - sync_start) // timeframe_ms + 1
+
+        # 同步失败时直接抛出：实时信号不能基于过期的未收盘K线计算
+        fetched = await self.exchange_manager.get_ohlcv(
+            exchange_account, symbol, timeframe, limit=fetch_limit, since=sync_start
+        )
+        self.stats['candles_fetched'] += len(fetched)
+        self.upsert_candles(db, symbol, timeframe, fetched, **market)
+        self._remember_holes(key, stored, fetched, sync_start, window_start, timeframe_ms)
+
+        candles = self.read_candles(db, symbol, timeframe, limit, end_ms=window_end, **market)
+        self.stats['candles_served'] += len(candles)
+        logger.debug(f"{symbol} {timeframe}: {len(stored)} local, fetched from {sync_start} ({fetch_limit} bars)")
+        return candles
+
+    def get_stats(self) -> dict:
+        return dict(self.stats)
+
+
+# 全局实例
+candle_store = CandleStore(exchange_manager)
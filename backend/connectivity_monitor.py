@@ -0,0 +1,187 @@
+"""
+OKX 连通性监控
+后台任务按 CONNECTIVITY_CHECK_INTERVAL 秒并发探测 OKX 各接入地址和代理，
+维护共享的健康状态（最近结果、连续失败次数、延迟和成功率的 EWMA）。
+请求路径只读取这份状态，不再同步探测网络；尚未完成首次探测时视为可达。
+"""
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+from okx_http_client import USE_ENV_PROXY, get_http_client, proxy_url_from_env
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = float(os.getenv('CONNECTIVITY_CHECK_INTERVAL', '30'))
+PROBE_TIMEOUT = float(os.getenv('CONNECTIVITY_PROBE_TIMEOUT', '5'))
+# EWMA 平滑系数：越大越偏重最近一次探测
+EWMA_ALPHA = float(os.getenv('CONNECTIVITY_EWMA_ALPHA', '0.3'))
+
+OKX_PROBE_URLS = [
+    'https://www.okx.com/api/v5/public/time',
+    'https://aws.okx.com/api/v5/public/time',
+]
+
+# 探测函数: 目标 -> 耗时（秒），失败时抛出异常
+Probe = Callable[[str], Awaitable[float]]
+
+
+@dataclass
+class EndpointHealth:
+    target: str
+    healthy: Optional[bool] = None
+    latency_ewma: Optional[float] = None
+    last_latency: Optional[float] = None
+    success_ewma: Optional[float] = None
+    consecutive_failures: int = 0
+    last_checked: Optional[float] = None
+    last_error: Optional[str] = None
+
+    def record(self, latency: Optional[float], error: Optional[str], alpha: float, now: float):
+        success = error is None
+        self.healthy = success
+        self.last_checked = now
+        self.last_error = error
+        sample = 1.0 if success else 0.0
+        self.success_ewma = sample if self.success_ewma is None else alpha * sample + (1 - alpha) * self.success_ewma
+        if success:
+            self.consecutive_failures = 0
+            self.last_latency = latency
+            self.latency_ewma = latency if self.latency_ewma is None else \
+                alpha * latency + (1 - alpha) * self.latency_ewma
+        else:
+            self.consecutive_failures += 1
+
+
+class ConnectivityMonitor:
+    """后台探测 OKX 接入地址和代理的健康状态"""
+
+    def __init__(self, urls: List[str] = None, proxy_url=USE_ENV_PROXY, interval: float = CHECK_INTERVAL,
+                 timeout: float = PROBE_TIMEOUT, alpha: float = EWMA_ALPHA,
+                 http_probe: Probe = None, proxy_probe: Probe = None,
+                 clock: Callable[[], float] = time.time):
+        self.urls = list(urls or OKX_PROBE_URLS)
+        self.proxy_url = proxy_url_from_env() if proxy_url is USE_ENV_PROXY else proxy_url
+        self.interval = interval
+        self.timeout = timeout
+        self.alpha = alpha
+        self.http_probe = http_probe or self._probe_http
+        self.proxy_probe = proxy_probe or self._probe_proxy
+        self.clock = clock
+
+        self.endpoints: Dict[str, EndpointHealth] = {url: EndpointHealth(url) for url in self.urls}
+        self.proxy: Optional[EndpointHealth] = EndpointHealth(self.proxy_url) if self.proxy_url else None
+        self._reachable: Optional[bool] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'rounds': 0,
+            'probes': 0,
+            'probe_failures': 0,
+            'transitions': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # 请求路径读取的状态
+    # ------------------------------------------------------------------
+
+    def is_reachable(self) -> bool:
+        """是否至少有一个 OKX 地址可达；首次探测完成前返回 True"""
+        return self._reachable is not False
+
+    def best_endpoint(self) -> Optional[str]:
+        """可达地址中延迟 EWMA 最低的一个"""
+        healthy = [health for health in self.endpoints.values() if health.healthy]
+        if not healthy:
+            return None
+        return min(healthy, key=lambda health: health.latency_ewma).target
+
+    # ------------------------------------------------------------------
+    # 探测
+    # ------------------------------------------------------------------
+
+    async def _probe_http(self, url: str) -> float:
+        parts = urlsplit(url)
+        client = get_http_client(f"{parts.scheme}://{parts.netloc}", self.proxy_url)
+        started = time.monotonic()
+        response = await client.get(parts.path, timeout=self.timeout)
+        if response.status_code != 200:
+            raise ConnectionError(f"HTTP {response.status_code}")
+        return time.monotonic() - started
+
+    async def _probe_proxy(self, proxy_url: str) -> float:
+        """只检查代理端口能否建立 TCP 连接"""
+        parts = urlsplit(proxy_url)
+        started = time.monotonic()
+        _, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port), self.timeout)
+        writer.close()
+        await writer.wait_closed()
+        return time.monotonic() - started
+
+    async def _run_probe(self, probe: Probe, health: EndpointHealth):
+        self.stats['probes'] += 1
+        try:
+            latency = await asyncio.wait_for(probe(health.target), self.timeout)
+            error = None
+        except Exception as e:
+            latency, error = None, f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            self.stats['probe_failures'] += 1
+        health.record(latency, error, self.alpha, self.clock())
+
+    async def probe_once(self) -> bool:
+        """并发探测所有地址和代理，更新状态并返回 OKX 是否可达"""
+        probes = [self._run_probe(self.http_probe, health) for health in self.endpoints.values()]
+        if self.proxy is not None:
+            probes.append(self._run_probe(self.proxy_probe, self.proxy))
+        await asyncio.gather(*probes)
+        self.stats['rounds'] += 1
+
+        reachable = any(health.healthy for health in self.endpoints.values())
+        if reachable != self._reachable:
+            if self._reachable is not None:
+                self.stats['transitions'] += 1
+            if reachable:
+                logger.info(f"OKX API 可达（最快: {self.best_endpoint()}）")
+            else:
+                errors = '; '.join(f"{h.target}: {h.last_error}" for h in self.endpoints.values())
+                logger.warning(f"OKX API 不可达，切换到模拟交易所: {errors}")
+        self._reachable = reachable
+        return reachable
+
+    async def _monitor_loop(self):
+        while True:
+            try:
+                await self.probe_once()
+            except Exception as e:
+                logger.error(f"连通性探测异常: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        """启动后台探测（不等待首次结果）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._monitor_loop())
+            logger.info(f"OKX 连通性监控已启动（间隔 {self.interval:.0f} 秒）")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'reachable': self._reachable,
+            'best_endpoint': self.best_endpoint(),
+            'endpoints': [asdict(health) for health in self.endpoints.values()],
+            'proxy': asdict(self.proxy) if self.proxy is not None else None,
+        }
+
+
+# 全局实例
+connectivity_monitor = ConnectivityMonitor()
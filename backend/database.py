@@ -1,6 +1,6 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime, Boolean, Text, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, column_property
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -61,6 +61,10 @@ class ExchangeAccount(Base):
 
 class Strategy(Base):
     __tablename__ = "strategies"
+    __table_args__ = (
+        # Dashboard counters: total / active strategies per user
+        Index("ix_strategies_user_id_is_active", "user_id", "is_active"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -96,9 +100,16 @@ class Strategy(Base):
 
 class Trade(Base):
     __tablename__ = "trades"
+    __table_args__ = (
+        # Dashboard aggregates: per-user trade counts, filled PnL and today's range
+        Index("ix_trades_user_id_status_created_at", "user_id", "status", "created_at"),
+        # Trades API keyset pagination: newest-first seek on (created_at, id) per user
+        Index("ix_trades_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # active_history: trade_stats needs the previous values to adjust the rollups
+    user_id = column_property(Column(Integer, ForeignKey("users.id"), nullable=False), active_history=True)
     strategy_id = Column(Integer, ForeignKey("strategies.id"), nullable=False)
     
     symbol = Column(String(20), nullable=False)
@@ -110,22 +121,49 @@ class Trade(Base):
     filled_price = Column(Float)
     
     order_id = Column(String(100))  # Exchange order ID
-    status = Column(String(20), default="pending")  # pending, filled, cancelled, failed
+    status = column_property(Column(String(20), default="pending"), active_history=True)  # pending, filled, cancelled, failed
     
     fee = Column(Float, default=0.0)
-    profit_loss = Column(Float, default=0.0)
+    profit_loss = column_property(Column(Float, default=0.0), active_history=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = column_property(Column(DateTime, nullable=False, default=datetime.utcnow), active_history=True)
     filled_at = Column(DateTime)
     
     # Relationships
     user = relationship("User", back_populates="trades")
     strategy = relationship("Strategy", back_populates="trades")
 
+class UserTradeStats(Base):
+    """Per-user trade rollup, kept current by trade_stats on every trade write"""
+    __tablename__ = "user_trade_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_trades = Column(Integer, nullable=False, default=0)
+    filled_trades = Column(Integer, nullable=False, default=0)
+    total_profit_loss = Column(Float, nullable=False, default=0.0)  # filled trades only
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UserTradeStatsDaily(Base):
+    """Per-user, per-UTC-day trade rollup (bucketed by Trade.created_at)"""
+    __tablename__ = "user_trade_stats_daily"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    trades = Column(Integer, nullable=False, default=0)
+    filled_trades = Column(Integer, nullable=False, default=0)
+    profit_loss = Column(Float, nullable=False, default=0.0)  # filled trades only
+
 class MarketData(Base):
     __tablename__ = "market_data"
+    __table_args__ = (
+        # One row per candle per market (live and sandbox are kept apart); also serves range scans
+        Index("ix_market_data_market_symbol_timeframe_timestamp",
+              "exchange", "is_testnet", "symbol", "timeframe", "timestamp", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    exchange = Column(String(20), nullable=False, default="okex")
+    is_testnet = Column(Boolean, nullable=False, default=False)
     symbol = Column(String(20), nullable=False)
     timeframe = Column(String(10), nullable=False)
     timestamp = Column(DateTime, nullable=False)
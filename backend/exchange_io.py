@@ -0,0 +1,131 @@
+"""
+交易所阻塞 I/O 线程池
+同步的交易所调用（ccxt 同步客户端、requests、OKXAPIManager 的同步方法）统一在一个
+全局、固定大小的线程池中执行，不再每次请求临时创建 ThreadPoolExecutor；
+同时统计排队深度、活跃线程数和排队等待时间，便于按负载调整 EXCHANGE_IO_MAX_WORKERS
+"""
+import os
+import time
+import asyncio
+import inspect
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = int(os.getenv('EXCHANGE_IO_MAX_WORKERS', '16'))
+
+
+class ExchangeIOExecutor:
+    """固定大小的阻塞 I/O 线程池，带饱和度指标"""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, thread_name_prefix: str = 'exchange-io'):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'started': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'peak_queued': 0,
+            'peak_active': 0,
+            'total_wait_time': 0.0,
+            'max_wait_time': 0.0,
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=self.thread_name_prefix
+                    )
+        return self._executor
+
+    @property
+    def queued(self) -> int:
+        """已提交但还没有线程执行的任务数（开始前被取消的不再计入）"""
+        return self.stats['submitted'] - self.stats['started'] - self.stats['cancelled']
+
+    @property
+    def active(self) -> int:
+        """正在执行的任务数"""
+        return self.stats['started'] - self.stats['completed'] - self.stats['failed']
+
+    def _execute(self, submitted_at: float, func: Callable, *args, **kwargs):
+        wait_time = time.perf_counter() - submitted_at
+        with self._lock:
+            self.stats['started'] += 1
+            self.stats['total_wait_time'] += wait_time
+            self.stats['max_wait_time'] = max(self.stats['max_wait_time'], wait_time)
+            self.stats['peak_active'] = max(self.stats['peak_active'], self.active)
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.stats['failed'] += 1
+            raise
+        with self._lock:
+            self.stats['completed'] += 1
+        return result
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """在线程池中执行同步函数并等待结果"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.stats['submitted'] += 1
+            self.stats['peak_queued'] = max(self.stats['peak_queued'], self.queued)
+        call = partial(self._execute, time.perf_counter(), func, *args, **kwargs)
+        future = self._get_executor().submit(call)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _on_done(self, future):
+        # 调用方在任务开始前取消时，线程池直接丢弃任务，_execute 不会执行
+        if future.cancelled():
+            with self._lock:
+                self.stats['cancelled'] += 1
+
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        """调用交易所方法：协程函数直接 await（ccxt 异步客户端、模拟交易所），同步函数进线程池"""
+        if inspect.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        return await self.run(func, *args, **kwargs)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            started = stats['started']
+            queued, active = self.queued, self.active
+        return {
+            'max_workers': self.max_workers,
+            'queued': queued,
+            'active': active,
+            'utilization': active / self.max_workers if self.max_workers else 0.0,
+            'submitted': stats['submitted'],
+            'completed': stats['completed'],
+            'failed': stats['failed'],
+            'cancelled': stats['cancelled'],
+            'peak_queued': stats['peak_queued'],
+            'peak_active': stats['peak_active'],
+            'avg_wait_ms': stats['total_wait_time'] / started * 1000 if started else 0.0,
+            'max_wait_ms': stats['max_wait_time'] * 1000,
+        }
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池（应用关闭时调用）；之后再提交会重新创建"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+            logger.info("交易所 I/O 线程池已关闭")
+
+
+# 全局实例
+exchange_io = ExchangeIOExecutor()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+本地 OKX WebSocket 替身
+按录制的时间间隔（或加速）回放行情帧，只推送给订阅了对应 (channel, instId) 的客户端；
+应答 subscribe / unsubscribe 事件和文本 ping，用于离线测试和压测行情管线。
+
+录制文件为 JSONL，每行 {"t": 相对秒数, "frame": OKX 推送消息}；
+record_frames() 可以从真实 OKX 录制，generate_frames() 生成合成数据。
+
+用法:
+    python fake_okx_ws.py frames.jsonl --port 8765 --speed 10 --loop
+    python fake_okx_ws.py --synthetic BTC-USDT,ETH-USDT --rate 200 --port 8765
+"""
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import websockets
+
+logger = logging.getLogger(__name__)
+
+# (相对秒数, 消息)
+Frame = Tuple[float, dict]
+
+
+def load_frames(path: str) -> List[Frame]:
+    frames = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                frames.append((float(record['t']), record['frame']))
+    return frames
+
+
+def save_frames(path: str, frames: Iterable[Frame]):
+    with open(path, 'w', encoding='utf-8') as f:
+        for offset, frame in frames:
+            f.write(json.dumps({'t': round(offset, 6), 'frame': frame}) + '\n')
+
+
+async def record_frames(url: str, args: List[dict], duration: float, path: str) -> int:
+    """连接真实 OKX 订阅 args，录制 duration 秒的推送"""
+    frames: List[Frame] = []
+    started = time.monotonic()
+    async with websockets.connect(url, ping_interval=None) as ws:
+        await ws.send(json.dumps({'op': 'subscribe', 'args': args}))
+        while time.monotonic() - started < duration:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=max(0.1, duration - (time.monotonic() - started)))
+            except asyncio.TimeoutError:
+                break
+            message = json.loads(raw)
+            if 'data' in message:
+                frames.append((time.monotonic() - started, message))
+    save_frames(path, frames)
+    return len(frames)
+
+
+def generate_frames(inst_ids: List[str], count: int, rate: float = 100.0, timeframe: str = '5m',
+                    start_ms: int = 1_700_000_000_000, seed: int = 0) -> List[Frame]:
+    """合成 tickers 和 candle 推送：每个交易对随机游走，K线按周期推进"""
+    from indicator_state import timeframe_to_ms
+    from market_data_stream import candle_channel
+
+    rng = random.Random(seed)
+    timeframe_ms = timeframe_to_ms(timeframe)
+    channel = candle_channel(timeframe)
+    prices = {inst_id: 100.0 * (i + 1) for i, inst_id in enumerate(inst_ids)}
+    candles: Dict[str, list] = {}
+    frames: List[Frame] = []
+
+    for i in range(count):
+        inst_id = inst_ids[i % len(inst_ids)]
+        price = prices[inst_id] = max(0.01, prices[inst_id] * (1 + rng.gauss(0, 0.001)))
+        now_ms = start_ms + int(i / rate * 1000)
+        offset = i / rate
+        frames.append((offset, {
+            'arg': {'channel': 'tickers', 'instId': inst_id},
+            'data': [{
+                'instType': 'SPOT', 'instId': inst_id, 'last': f"{price:.4f}",
+                'bidPx': f"{price * 0.9999:.4f}", 'askPx': f"{price * 1.0001:.4f}",
+                'high24h': f"{price * 1.02:.4f}", 'low24h': f"{price * 0.98:.4f}",
+                'vol24h': '1000', 'ts': str(now_ms),
+            }],
+        }))
+
+        bar_ms = now_ms - now_ms % timeframe_ms
+        candle = candles.get(inst_id)
+        if candle is None or candle[0] != bar_ms:
+            candle = candles[inst_id] = [bar_ms, price, price, price, price, 0.0]
+        candle[2], candle[3], candle[4] = max(candle[2], price), min(candle[3], price), price
+        candle[5] += 1.0
+        frames.append((offset, {
+            'arg': {'channel': channel, 'instId': inst_id},
+            'data': [[str(candle[0])] + [f"{v:.4f}" for v in candle[1:]] + ['0', '0', '0']],
+        }))
+    return frames
+
+
+class FakeOKXWebSocketServer:
+    """回放录制帧的本地 WebSocket 服务"""
+
+    def __init__(self, frames: List[Frame], host: str = '127.0.0.1', port: int = 0,
+                 speed: float = 1.0, loop: bool = False):
+        self.frames = sorted(frames, key=lambda frame: frame[0])
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.loop = loop
+        self._server = None
+        self._clients: Dict[object, Set[Tuple[str, str]]] = {}
+        self._replay_task: Optional[asyncio.Task] = None
+        self.stats = {'connections': 0, 'subscribe_requests': 0, 'frames_sent': 0}
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def _handle(self, websocket, *_):
+        self._clients[websocket] = set()
+        self.stats['connections'] += 1
+        try:
+            async for raw in websocket:
+                if raw == 'ping':
+                    await websocket.send('pong')
+                    continue
+                request = json.loads(raw)
+                op = request.get('op')
+                if op not in ('subscribe', 'unsubscribe'):
+                    await websocket.send(json.dumps({'event': 'error', 'code': '60012', 'msg': f'Invalid request: {raw}'}))
+                    continue
+                self.stats['subscribe_requests'] += 1
+                for arg in request.get('args', []):
+                    key = (arg['channel'], arg['instId'])
+                    if op == 'subscribe':
+                        self._clients[websocket].add(key)
+                    else:
+                        self._clients[websocket].discard(key)
+                    await websocket.send(json.dumps({'event': op, 'arg': arg, 'connId': 'fake'}))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._clients.pop(websocket, None)
+
+    async def _broadcast(self, frame: dict):
+        arg = frame.get('arg', {})
+        key = (arg.get('channel'), arg.get('instId'))
+        raw = None
+        for websocket, subscriptions in list(self._clients.items()):
+            if key in subscriptions:
+                raw = raw or json.dumps(frame)
+                try:
+                    await websocket.send(raw)
+                    self.stats['frames_sent'] += 1
+                except websockets.exceptions.ConnectionClosed:
+                    pass
+
+    async def _replay(self):
+        while True:
+            started = time.monotonic()
+            for offset, frame in self.frames:
+                delay = offset / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self._broadcast(frame)
+            if not self.loop:
+                return
+
+    async def start(self, replay: bool = True):
+        self._server = await websockets.serve(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if replay:
+            self.start_replay()
+        logger.info(f"OKX WebSocket 替身已启动: {self.url} ({len(self.frames)} 帧)")
+
+    def start_replay(self):
+        self._replay_task = asyncio.create_task(self._replay())
+
+    async def wait_replayed(self):
+        if self._replay_task is not None:
+            await self._replay_task
+
+    async def disconnect_clients(self):
+        """主动断开所有客户端，用于测试重连"""
+        for websocket in list(self._clients):
+            await websocket.close()
+
+    async def stop(self):
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+async def _main(args):
+    if args.synthetic:
+        frames = generate_frames(args.synthetic.split(','), args.count, rate=args.rate)
+    else:
+        frames = load_frames(args.frames)
+    server = FakeOKXWebSocketServer(frames, host=args.host, port=args.port, speed=args.speed, loop=args.loop)
+    await server.start()
+    print(f"serving {len(frames)} frames on {server.url}")
+    try:
+        await asyncio.Future()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded OKX WebSocket frames locally")
+    parser.add_argument('frames', nargs='?', help="JSONL file produced by record_frames()/save_frames()")
+    parser.add_argument('--synthetic', help="comma-separated instIds to generate frames for instead")
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--rate', type=float, default=100.0, help="synthetic frames per second")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument('--loop', action='store_true')
+    args = parser.parse_args()
+    if not args.frames and not args.synthetic:
+        parser.error("frames file or --synthetic is required")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args))
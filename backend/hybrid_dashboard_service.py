@@ -2,11 +2,12 @@
 混合Dashboard服务 - 快速加载 + 异步刷新
 """
 import logging
+from datetime import date, datetime
 from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import User, Strategy, Trade, ExchangeAccount
-from async_balance_service import async_balance_service
+from sqlalchemy import and_, case, func, select
+from database import User, Strategy, ExchangeAccount, UserTradeStats, UserTradeStatsDaily
+from async_balance_service import REFRESH_DEADLINE, async_balance_service
 import schemas
 
 logger = logging.getLogger(__name__)
@@ -14,89 +15,94 @@ logger = logging.getLogger(__name__)
 class HybridDashboardService:
     """混合Dashboard服务"""
     
+    @staticmethod
+    def _active_accounts(user_id: int, db: Session) -> List[ExchangeAccount]:
+        return db.query(ExchangeAccount).filter(
+            ExchangeAccount.user_id == user_id,
+            ExchangeAccount.is_active == True
+        ).all()
+    
+    @staticmethod
+    def _counters_query(user_id: int, today: date):
+        """所有仪表盘计数器的单条 SQL：策略条件聚合 + 交易汇总表和今日分桶的主键查找，与交易历史长度无关"""
+        strategy_stats = select(
+            func.count().label('total_strategies'),
+            func.count(case((Strategy.is_active == True, 1))).label('active_strategies'),
+        ).where(Strategy.user_id == user_id).subquery()
+        return select(
+            strategy_stats,
+            func.coalesce(UserTradeStats.total_trades, 0).label('total_trades'),
+            func.coalesce(UserTradeStats.total_profit_loss, 0.0).label('total_profit_loss'),
+            func.coalesce(UserTradeStatsDaily.trades, 0).label('today_trades'),
+            func.coalesce(UserTradeStatsDaily.profit_loss, 0.0).label('today_profit_loss'),
+        ).select_from(
+            strategy_stats
+            .outerjoin(UserTradeStats, UserTradeStats.user_id == user_id)
+            .outerjoin(UserTradeStatsDaily, and_(UserTradeStatsDaily.user_id == user_id,
+                                                 UserTradeStatsDaily.day == today))
+        )
+    
+    @staticmethod
+    def _base_stats(user_id: int, db: Session, account_balances: List[schemas.AccountBalance],
+                    now: Optional[datetime] = None) -> schemas.DashboardStats:
+        """策略和交易统计（不含交易所调用），一次数据库往返"""
+        # created_at 按 UTC 写入，"今日" 是 UTC 日期的分桶
+        today = (now or datetime.utcnow()).date()
+        row = db.execute(HybridDashboardService._counters_query(user_id, today)).one()
+        
+        return schemas.DashboardStats(
+            total_strategies=row.total_strategies,
+            active_strategies=row.active_strategies,
+            total_trades=row.total_trades,
+            total_profit_loss=row.total_profit_loss or 0.0,
+            today_trades=row.today_trades,
+            today_profit_loss=row.today_profit_loss or 0.0,
+            account_balances=account_balances
+        )
+    
+    @staticmethod
+    def _empty_stats() -> schemas.DashboardStats:
+        return schemas.DashboardStats(
+            total_strategies=0,
+            active_strategies=0,
+            total_trades=0,
+            total_profit_loss=0.0,
+            today_trades=0,
+            today_profit_loss=0.0,
+            account_balances=[]
+        )
+    
     @staticmethod
     async def get_dashboard_stats_hybrid(user_id: int, db: Session) -> schemas.DashboardStats:
         """混合获取Dashboard统计信息"""
         try:
-            # 快速统计查询
-            total_strategies = db.query(Strategy).filter(Strategy.user_id == user_id).count()
-            active_strategies = db.query(Strategy).filter(
-                Strategy.user_id == user_id,
-                Strategy.is_active == True
-            ).count()
-            
-            total_trades = db.query(Trade).filter(Trade.user_id == user_id).count()
-            
-            total_profit_loss = db.query(func.sum(Trade.profit_loss)).filter(
-                Trade.user_id == user_id,
-                Trade.status == "filled"
-            ).scalar() or 0.0
-            
-            # 获取交易所账户
-            exchange_accounts = db.query(ExchangeAccount).filter(
-                ExchangeAccount.user_id == user_id,
-                ExchangeAccount.is_active == True
-            ).all()
+            exchange_accounts = HybridDashboardService._active_accounts(user_id, db)
             
             # 使用异步余额服务快速获取余额
             account_balances = await async_balance_service.get_balances_fast(exchange_accounts)
             
-            return schemas.DashboardStats(
-                total_strategies=total_strategies,
-                active_strategies=active_strategies,
-                total_trades=total_trades,
-                total_profit_loss=total_profit_loss,
-                today_trades=0,
-                today_profit_loss=0.0,
-                account_balances=account_balances
-            )
+            return HybridDashboardService._base_stats(user_id, db, account_balances)
             
         except Exception as e:
             logger.error(f"获取Dashboard统计失败: {e}")
-            return schemas.DashboardStats(
-                total_strategies=0,
-                active_strategies=0,
-                total_trades=0,
-                total_profit_loss=0.0,
-                today_trades=0,
-                today_profit_loss=0.0,
-                account_balances=[]
-            )
+            return HybridDashboardService._empty_stats()
     
     @staticmethod
-    async def refresh_balances_async(user_id: int, db: Session) -> schemas.DashboardStats:
-        """异步刷新账户余额"""
+    async def refresh_balances_async(user_id: int, db: Session,
+                                     deadline: float = REFRESH_DEADLINE) -> schemas.DashboardStats:
+        """并发刷新所有账户余额，最多等待 deadline 秒；未按时完成的账户返回旧快照并标记 stale"""
+        exchange_accounts: List[ExchangeAccount] = []
         try:
-            # 基础统计
-            stats = await HybridDashboardService.get_dashboard_stats_hybrid(user_id, db)
-            
-            # 获取交易所账户
-            exchange_accounts = db.query(ExchangeAccount).filter(
-                ExchangeAccount.user_id == user_id,
-                ExchangeAccount.is_active == True
-            ).all()
-            
-            # 异步刷新每个账户的余额
-            all_balances = []
-            for account in exchange_accounts:
-                try:
-                    balances = await async_balance_service.refresh_balance_async(account)
-                    all_balances.extend(balances)
-                except Exception as e:
-                    logger.warning(f"刷新账户 {account.id} 余额失败: {e}")
-                    all_balances.append(schemas.AccountBalance(
-                        exchange=account.exchange_name,
-                        currency="刷新失败",
-                        free=0.0,
-                        used=0.0,
-                        total=0.0
-                    ))
-            
-            # 更新统计数据
-            stats.account_balances = all_balances
-            return stats
-            
+            exchange_accounts = HybridDashboardService._active_accounts(user_id, db)
+            account_balances = await async_balance_service.refresh_balances(exchange_accounts, deadline)
         except Exception as e:
             logger.error(f"异步刷新余额失败: {e}")
-            # 返回基础统计
-            return await HybridDashboardService.get_dashboard_stats_hybrid(user_id, db)
+            account_balances = await async_balance_service.get_balances_fast(exchange_accounts)
+        
+        try:
+            return HybridDashboardService._base_stats(user_id, db, account_balances)
+        except Exception as e:
+            logger.error(f"获取Dashboard统计失败: {e}")
+            stats = HybridDashboardService._empty_stats()
+            stats.account_balances = account_balances
+            return stats
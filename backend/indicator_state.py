@@ -0,0 +1,197 @@
+"""
+增量指标状态 - 流式版本
+每个 (策略, 交易对, 周期) 维护环形缓冲区与滚动累加和，新K线收盘时 O(1) 更新，
+只在出现数据缺口或策略参数变化时才全量重算
+"""
+import logging
+import math
+import ccxt
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 每追加多少根收盘K线后从缓冲区重算一次累加和，消除浮点漂移（摊还 O(1)）
+RESYNC_INTERVAL = 1024
+
+
+@dataclass
+class IndicatorSnapshot:
+    """某一时刻的指标值（包含当前未收盘K线）"""
+    timestamp: int
+    price: float
+    bb_upper: float
+    bb_middle: float
+    bb_lower: float
+    ma: float
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """将 5m / 1h / 1d 等周期转换为毫秒"""
+    return int(ccxt.Exchange.parse_timeframe(timeframe) * 1000)
+
+
+class _RingBuffer:
+    """固定容量的 float64 环形缓冲区，支持按"倒数第 k 个"O(1) 访问"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(max(capacity, 1), dtype=np.float64)
+        self._head = 0  # 下一个写入位置
+        self.size = 0
+
+    def append(self, value: float):
+        self._data[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def recent(self, k: int) -> float:
+        """倒数第 k 个元素（k 从 1 开始）"""
+        return self._data[(self._head - k) % self.capacity]
+
+    def tail(self, count: int) -> np.ndarray:
+        """最近 count 个元素，按时间顺序"""
+        idx = (self._head - count + np.arange(count)) % self.capacity
+        return self._data[idx]
+
+
+class IncrementalIndicatorState:
+    """单个策略的增量布林带 + 均线状态
+
+    已收盘K线进入环形缓冲区并维护窗口累加和；当前未收盘K线的价格只在
+    计算快照时临时并入窗口，因此结果与对完整K线序列取最后一个值一致。
+    """
+
+    def __init__(self, bb_period: int, bb_deviation: float, ma_period: int, timeframe: str):
+        self.bb_period = bb_period
+        self.bb_deviation = bb_deviation
+        self.ma_period = ma_period
+        self.timeframe = timeframe
+        self.timeframe_ms = timeframe_to_ms(timeframe)
+
+        # 快照需要 period-1 根收盘K线 + 1 根当前K线
+        self._closed = _RingBuffer(max(bb_period, ma_period) - 1)
+        self.last_closed_ts: Optional[int] = None
+        self._forming: Optional[Sequence[float]] = None
+        self._appends_since_resync = 0
+        self.full_recomputes = 0
+
+        self._anchor = 0.0
+        self._bb_sum = 0.0
+        self._bb_sq_sum = 0.0
+        self._ma_sum = 0.0
+
+    def matches(self, bb_period: int, bb_deviation: float, ma_period: int, timeframe: str) -> bool:
+        """参数是否与当前状态一致"""
+        return (self.bb_period == bb_period and self.bb_deviation == bb_deviation
+                and self.ma_period == ma_period and self.timeframe == timeframe)
+
+    @property
+    def ready(self) -> bool:
+        return self._forming is not None and self._closed.size >= self._closed.capacity
+
+    def candles_needed(self, now_ms: int) -> int:
+        """本次更新需要向交易所请求的K线数量"""
+        if not self.ready:
+            return max(self.bb_period, self.ma_period) + 10
+        missing = max(0, (now_ms - self.last_closed_ts) // self.timeframe_ms)
+        return int(missing) + 2
+
+    def update(self, ohlcv: List[List[float]]):
+        """用最新的K线数据更新状态，最后一根视为未收盘K线"""
+        if not ohlcv:
+            return
+
+        closed_rows = ohlcv[:-1]
+        # 缓冲区未满（冷启动或缺口后只拿到尾部）时用整个窗口重建，补上更早的K线
+        if self.last_closed_ts is None or self._closed.size < self._closed.capacity:
+            self._reseed(closed_rows)
+        else:
+            new_rows = [row for row in closed_rows if row[0] > self.last_closed_ts]
+            if new_rows and new_rows[0][0] != self.last_closed_ts + self.timeframe_ms:
+                logger.info(f"检测到K线缺口 ({self.timeframe}), 全量重算指标状态")
+                self._reseed(closed_rows)
+            else:
+                for row in new_rows:
+                    self._append_closed(row[0], float(row[4]))
+
+        self._forming = ohlcv[-1]
+
+    def snapshot(self) -> Optional[IndicatorSnapshot]:
+        """计算当前指标值，O(1)"""
+        if not self.ready:
+            return None
+
+        price = float(self._forming[4])
+        shifted = price - self._anchor
+
+        bb_mean = (self._bb_sum + shifted) / self.bb_period
+        bb_var = (self._bb_sq_sum + shifted * shifted) / self.bb_period - bb_mean * bb_mean
+        bb_std = math.sqrt(max(bb_var, 0.0))
+        bb_middle = bb_mean + self._anchor
+
+        ma = (self._ma_sum + shifted) / self.ma_period + self._anchor
+
+        return IndicatorSnapshot(
+            timestamp=int(self._forming[0]),
+            price=price,
+            bb_upper=bb_middle + bb_std * self.bb_deviation,
+            bb_middle=bb_middle,
+            bb_lower=bb_middle - bb_std * self.bb_deviation,
+            ma=ma,
+        )
+
+    def _reseed(self, closed_rows: List[List[float]]):
+        """全量重建缓冲区和累加和"""
+        self.full_recomputes += 1
+        self._closed = _RingBuffer(self._closed.capacity)
+        for row in closed_rows[-self._closed.capacity:] if self._closed.capacity else []:
+            self._closed.append(float(row[4]))
+        self.last_closed_ts = int(closed_rows[-1][0]) if closed_rows else None
+        self._resync()
+
+    def _append_closed(self, timestamp: int, close: float):
+        capacity = self._closed.capacity
+        if capacity:
+            bb_window = self.bb_period - 1
+            ma_window = self.ma_period - 1
+            full = self._closed.size >= capacity
+
+            # 先取出即将离开各窗口的值，再写入新值
+            bb_out = self._closed.recent(bb_window) if bb_window and self._closed.size >= bb_window else None
+            ma_out = self._closed.recent(ma_window) if ma_window and self._closed.size >= ma_window else None
+            self._closed.append(close)
+
+            shifted = close - self._anchor
+            if bb_window:
+                self._bb_sum += shifted
+                self._bb_sq_sum += shifted * shifted
+                if bb_out is not None:
+                    out = bb_out - self._anchor
+                    self._bb_sum -= out
+                    self._bb_sq_sum -= out * out
+            if ma_window:
+                self._ma_sum += shifted
+                if ma_out is not None:
+                    self._ma_sum -= ma_out - self._anchor
+
+            self._appends_since_resync += 1
+            if not full or self._appends_since_resync >= RESYNC_INTERVAL:
+                self._resync()
+
+        self.last_closed_ts = int(timestamp)
+
+    def _resync(self):
+        """从缓冲区重新计算累加和，并以最近价格作为中心点"""
+        self._appends_since_resync = 0
+        bb_window = min(self.bb_period - 1, self._closed.size)
+        ma_window = min(self.ma_period - 1, self._closed.size)
+
+        self._anchor = float(self._closed.recent(1)) if self._closed.size else 0.0
+
+        bb_values = self._closed.tail(bb_window) - self._anchor
+        ma_values = self._closed.tail(ma_window) - self._anchor
+        self._bb_sum = float(bb_values.sum())
+        self._bb_sq_sum = float((bb_values * bb_values).sum())
+        self._ma_sum = float(ma_values.sum())
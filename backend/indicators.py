@@ -0,0 +1,97 @@
+"""
+技术指标计算模块 - 向量化版本
+基于分块累加和（cumsum + sliding_window_view）实现 O(n) 的滚动均值/方差，替代逐窗口 np.std 循环
+
+所有函数沿用 np.convolve(..., 'valid') 的输出约定：
+输入长度为 n 时，输出长度为 n - period + 1，第 i 个值对应窗口 prices[i:i+period]
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Tuple
+
+# 每个分块包含的窗口数。累加和在分块内部以分块均值为中心重新开始，
+# 舍入误差只与分块长度相关，而不随整段历史长度增长
+CHUNK_SIZE = 256
+
+
+def _validate(prices, period: int) -> np.ndarray:
+    """校验输入并转换为 float64 数组"""
+    values = np.asarray(prices, dtype=np.float64)
+    if values.ndim != 1:
+        raise ValueError("prices 必须是一维数组")
+    if period < 1:
+        raise ValueError(f"period 必须为正整数: {period}")
+    return values
+
+
+def rolling_mean_var(prices, period: int) -> Tuple[np.ndarray, np.ndarray]:
+    """计算滚动均值与总体方差（ddof=0，与 np.std 默认一致）"""
+    values = _validate(prices, period)
+    n_windows = len(values) - period + 1
+    if n_windows <= 0:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty.copy()
+
+    # 将序列切成互相重叠的分块（每块 chunk 个窗口），分块视图零拷贝
+    chunk = min(CHUNK_SIZE, n_windows)
+    n_chunks = -(-n_windows // chunk)
+    padded_length = n_chunks * chunk + period - 1
+    if padded_length > len(values):
+        values = np.concatenate((values, np.full(padded_length - len(values), values[-1])))
+    segments = sliding_window_view(values, chunk + period - 1)[::chunk]
+
+    # 以分块均值为中心，避免 E[x²] - E[x]² 的灾难性抵消
+    shift = segments.mean(axis=1, keepdims=True)
+    centered = segments - shift
+
+    zeros = np.zeros((n_chunks, 1))
+    s1 = np.concatenate((zeros, np.cumsum(centered, axis=1)), axis=1)
+    s2 = np.concatenate((zeros, np.cumsum(centered * centered, axis=1)), axis=1)
+
+    window_mean = (s1[:, period:] - s1[:, :-period]) / period
+    window_sq_mean = (s2[:, period:] - s2[:, :-period]) / period
+
+    mean = (window_mean + shift).ravel()[:n_windows]
+    var = (window_sq_mean - window_mean * window_mean).ravel()[:n_windows]
+
+    # 舍入可能产生极小的负数
+    np.maximum(var, 0.0, out=var)
+    return mean, var
+
+
+def sma(prices, period: int = 60) -> np.ndarray:
+    """简单移动平均"""
+    mean, _ = rolling_mean_var(prices, period)
+    return mean
+
+
+def rolling_std(prices, period: int = 20) -> np.ndarray:
+    """滚动标准差（总体标准差，ddof=0）"""
+    _, var = rolling_mean_var(prices, period)
+    return np.sqrt(var)
+
+
+def bollinger_bands(prices, period: int = 20,
+                    deviation: float = 2.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """计算布林带，返回 (upper, middle, lower)"""
+    middle, var = rolling_mean_var(prices, period)
+    band = np.sqrt(var) * deviation
+    return middle + band, middle, middle - band
+
+
+def ema(prices, period: int = 20) -> np.ndarray:
+    """指数移动平均
+
+    平滑系数 alpha = 2 / (period + 1)，以前 period 根K线的 SMA 作为初始值，
+    输出长度与 sma 相同（n - period + 1）
+    """
+    values = _validate(prices, period)
+    if len(values) < period:
+        return np.empty(0, dtype=np.float64)
+
+    seed = values[:period].mean()
+    series = np.concatenate(([seed], values[period:]))
+    alpha = 2.0 / (period + 1)
+    # pandas 的 ewm 递推在 Cython 中完成，无 Python 级循环
+    return pd.Series(series).ewm(alpha=alpha, adjust=False).mean().to_numpy()
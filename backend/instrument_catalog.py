@@ -0,0 +1,295 @@
+"""
+交易对目录服务
+OKX 现货交易对列表只加载一次，常驻内存索引：
+- 启动时先读磁盘缓存（INSTRUMENT_CACHE_DIR，默认 ./data/instruments），冷启动不必等待网络；磁盘读写在线程池中进行
+- 后台按 INSTRUMENT_REFRESH_INTERVAL 秒定时刷新并写回磁盘；刷新失败时从 INSTRUMENT_REFRESH_RETRY 秒起指数退避，
+  期间 ensure_loaded 不再发起下载
+- 交易对校验和 BTC/USDT、BTCUSDT、BTC_USDT → BTC-USDT 规范化都是一次字典查找
+- 交易对建议先按前缀（有序列表二分查找），再按基础币种，最后做模糊匹配
+"""
+import os
+import json
+import time
+import bisect
+import asyncio
+import difflib
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+from okx_http_client import OKXRestClient
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = float(os.getenv('INSTRUMENT_REFRESH_INTERVAL', '3600'))
+REFRESH_RETRY_DELAY = float(os.getenv('INSTRUMENT_REFRESH_RETRY', '30'))
+DEFAULT_SUGGESTIONS = ['BTC-USDT', 'ETH-USDT', 'BTC-USD', 'ETH-USD', 'SOL-USDT', 'ADA-USDT']
+# 建议列表中优先展示的计价币种
+PREFERRED_QUOTES = ('USDT', 'USDC', 'USD', 'BTC', 'ETH')
+
+# 目录获取函数: () -> [{'instId', 'baseCcy', 'quoteCcy', 'state'}, ...]
+InstrumentFetcher = Callable[[], Awaitable[List[Dict]]]
+
+_public_client = None
+
+
+async def fetch_okx_spot_instruments() -> List[Dict]:
+    """从 OKX 公开接口下载现货交易对，只保留目录需要的字段"""
+    global _public_client
+    if _public_client is None:
+        _public_client = OKXRestClient()
+
+    response = await _public_client.request('GET', '/api/v5/public/instruments',
+                                            params={'instType': 'SPOT'}, signed=False)
+    response.raise_for_status()
+    payload = response.json()
+    if payload.get('code') != '0' or not payload.get('data'):
+        raise RuntimeError(f"获取OKX交易对失败: {payload.get('msg', '空响应')}")
+    return [
+        {
+            'instId': inst['instId'],
+            'baseCcy': inst.get('baseCcy', ''),
+            'quoteCcy': inst.get('quoteCcy', ''),
+            'state': inst.get('state', 'live'),
+        }
+        for inst in payload['data']
+    ]
+
+
+def compact_symbol(symbol: str) -> str:
+    """去掉分隔符并转大写：BTC/USDT、btc_usdt、BTC-USDT → BTCUSDT"""
+    symbol = (symbol or '').strip().upper()
+    for separator in ('-', '/', '_', ' ', ':'):
+        symbol = symbol.replace(separator, '')
+    return symbol
+
+
+def _quote_rank(inst_id: str) -> int:
+    quote = inst_id.rsplit('-', 1)[-1]
+    return PREFERRED_QUOTES.index(quote) if quote in PREFERRED_QUOTES else len(PREFERRED_QUOTES)
+
+
+class InstrumentCatalog:
+    """单个交易所、单个产品类型的交易对目录"""
+
+    def __init__(self, exchange_name: str = 'okx', inst_type: str = 'SPOT',
+                 fetch_instruments: InstrumentFetcher = fetch_okx_spot_instruments,
+                 cache_dir: str = None, refresh_interval: float = REFRESH_INTERVAL,
+                 retry_delay: float = REFRESH_RETRY_DELAY, clock: Callable[[], float] = time.monotonic):
+        self.exchange_name = exchange_name
+        self.inst_type = inst_type
+        self.fetch_instruments = fetch_instruments
+        self.cache_dir = cache_dir or os.getenv('INSTRUMENT_CACHE_DIR', os.path.join('.', 'data', 'instruments'))
+        self.refresh_interval = refresh_interval
+        self.retry_delay = retry_delay
+        self.clock = clock
+
+        self.instruments: Dict[str, Dict] = {}
+        self._by_compact: Dict[str, str] = {}
+        self._by_base: Dict[str, List[str]] = {}
+        self._sorted_ids: List[str] = []
+        self.loaded_at: Optional[float] = None
+        # 最近一次下载失败的时间（clock），成功后清空
+        self._failed_at: Optional[float] = None
+
+        self._flight = SingleFlight()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.stats = {
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'disk_loads': 0,
+            'refresh_skips': 0,
+        }
+
+    @property
+    def cache_path(self) -> str:
+        return os.path.join(self.cache_dir, f"{self.exchange_name}_{self.inst_type.lower()}.json")
+
+    @property
+    def is_loaded(self) -> bool:
+        return bool(self.instruments)
+
+    # ------------------------------------------------------------------
+    # 索引
+    # ------------------------------------------------------------------
+
+    def _build_index(self, instruments: List[Dict], loaded_at: float):
+        """构建新索引后整体替换，读取方不会看到半成品"""
+        by_id = {inst['instId'].upper(): inst for inst in instruments if inst.get('state', 'live') == 'live'}
+        by_compact = {compact_symbol(inst_id): inst_id for inst_id in by_id}
+        by_base: Dict[str, List[str]] = {}
+        for inst_id, inst in by_id.items():
+            base = (inst.get('baseCcy') or inst_id.split('-')[0]).upper()
+            by_base.setdefault(base, []).append(inst_id)
+        for members in by_base.values():
+            members.sort(key=lambda inst_id: (_quote_rank(inst_id), inst_id))
+
+        self.instruments, self._by_compact, self._by_base = by_id, by_compact, by_base
+        self._sorted_ids = sorted(by_id)
+        self.loaded_at = loaded_at
+
+    def normalize(self, symbol: str) -> Optional[str]:
+        """规范化为目录中的 instId，不存在时返回 None"""
+        inst_id = (symbol or '').strip().upper()
+        if inst_id in self.instruments:
+            return inst_id
+        return self._by_compact.get(compact_symbol(inst_id))
+
+    def is_valid(self, symbol: str) -> bool:
+        return self.normalize(symbol) is not None
+
+    def symbols(self) -> List[str]:
+        return list(self._sorted_ids)
+
+    def suggest(self, query: str, limit: int = 5) -> List[str]:
+        """按前缀、基础币种、模糊匹配依次查找，返回第一个有结果的阶段"""
+        if not self.is_loaded:
+            return DEFAULT_SUGGESTIONS[:limit]
+
+        query = (query or '').strip().upper().replace('/', '-').replace('_', '-')
+        if query:
+            # 前缀匹配：有序列表上二分定位
+            start = bisect.bisect_left(self._sorted_ids, query)
+            prefixed = []
+            for inst_id in self._sorted_ids[start:]:
+                if not inst_id.startswith(query):
+                    break
+                prefixed.append(inst_id)
+            if prefixed:
+                return sorted(prefixed, key=lambda inst_id: (_quote_rank(inst_id), inst_id))[:limit]
+
+            same_base = self._by_base.get(query.split('-')[0])
+            if same_base:
+                return same_base[:limit]
+
+            matches = difflib.get_close_matches(compact_symbol(query), self._by_compact, n=limit, cutoff=0.6)
+            if matches:
+                return [self._by_compact[match] for match in matches]
+
+        return [inst_id for inst_id in DEFAULT_SUGGESTIONS if inst_id in self.instruments][:limit]
+
+    # ------------------------------------------------------------------
+    # 加载与刷新
+    # ------------------------------------------------------------------
+
+    def _read_snapshot(self) -> Dict:
+        with open(self.cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    async def load_from_disk(self) -> bool:
+        """读取磁盘缓存（线程池中读文件，事件循环中建索引）；文件不存在或损坏时返回 False"""
+        try:
+            snapshot = await asyncio.to_thread(self._read_snapshot)
+            self._build_index(snapshot['instruments'], snapshot['fetched_at'])
+        except FileNotFoundError:
+            return False
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"交易对缓存文件无效，忽略: {self.cache_path} ({e})")
+            return False
+        self.stats['disk_loads'] += 1
+        logger.info(f"从磁盘加载 {len(self.instruments)} 个 {self.exchange_name} 交易对")
+        return True
+
+    def _save_to_disk(self, instruments: List[Dict], fetched_at: float):
+        """先写临时文件再替换，避免进程中断留下半个文件"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'exchange': self.exchange_name, 'inst_type': self.inst_type,
+                       'fetched_at': fetched_at, 'instruments': instruments}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    async def refresh(self) -> bool:
+        """从交易所重新下载目录；并发调用只下载一次。失败时保留现有索引"""
+        return await self._flight.do('refresh', self._refresh)
+
+    async def _refresh(self) -> bool:
+        self.stats['refreshes'] += 1
+        try:
+            instruments = await self.fetch_instruments()
+        except Exception as e:
+            self.stats['refresh_errors'] += 1
+            self._failed_at = self.clock()
+            logger.error(f"刷新交易对目录失败: {e}")
+            return False
+
+        self._failed_at = None
+        fetched_at = time.time()
+        self._build_index(instruments, fetched_at)
+        try:
+            await asyncio.to_thread(self._save_to_disk, instruments, fetched_at)
+        except OSError as e:
+            logger.warning(f"写入交易对缓存失败: {e}")
+        logger.info(f"交易对目录已刷新: {len(self.instruments)} 个 {self.exchange_name} 交易对")
+        return True
+
+    def in_backoff(self) -> bool:
+        """上次下载失败后 retry_delay 内不再重试"""
+        return self._failed_at is not None and self.clock() - self._failed_at < self.retry_delay
+
+    async def ensure_loaded(self) -> bool:
+        """保证目录可用：优先磁盘缓存，没有时等待一次下载
+
+        冷启动且交易所不可达时，retry_delay 内直接返回 False（调用方退回默认建议），
+        不让每个请求都背靠背地重新下载
+        """
+        if self.is_loaded:
+            return True
+        if self.in_backoff():
+            self.stats['refresh_skips'] += 1
+            return False
+        if await self.load_from_disk():
+            return True
+        return await self.refresh()
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.time() - self.loaded_at >= self.refresh_interval
+
+    def _next_delay(self, failures: int) -> float:
+        """下一次检查前的等待时间
+
+        刷新失败时 loaded_at 不变，按到期时间算会一直落在下限上、每秒请求一次交易所，
+        所以连续失败时从 retry_delay 起指数退避，最长不超过 refresh_interval
+        """
+        if failures:
+            return min(self.refresh_interval, self.retry_delay * 2 ** (failures - 1))
+        if self.loaded_at is None:
+            return self.refresh_interval
+        return max(1.0, self.loaded_at + self.refresh_interval - time.time())
+
+    async def _refresh_loop(self):
+        failures = 0
+        while True:
+            if self.is_stale() and not await self.refresh():
+                failures += 1
+            else:
+                failures = 0
+            await asyncio.sleep(self._next_delay(failures))
+
+    async def start(self):
+        """读取磁盘缓存并启动后台刷新（不等待网络）"""
+        if not self.is_loaded:
+            await self.load_from_disk()
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+            logger.info(f"交易对目录后台刷新已启动（间隔 {self.refresh_interval:.0f} 秒）")
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'instruments': len(self.instruments),
+            'loaded_at': self.loaded_at,
+            'stale': self.is_stale(),
+        }
+
+
+# 全局实例
+instrument_catalog = InstrumentCatalog()
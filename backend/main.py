@@ -33,6 +33,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # next-page cursor of GET /api/trades
 )
 
 # Include routers with /api prefix
@@ -55,10 +56,85 @@ async def health_check():
 async def api_health_check():
     return {"status": "healthy", "api": "v1"}
 
+@app.get("/api/health/exchange-io")
+async def exchange_io_health():
+    """交易所阻塞 I/O 线程池的饱和度指标"""
+    from exchange_io import exchange_io
+    return exchange_io.get_stats()
+
+@app.get("/api/health/ticker-cache")
+async def ticker_cache_health():
+    """共享行情缓存的命中/未命中/刷新计数，以及上游批量请求的合并情况"""
+    from ticker_cache import ticker_batcher, ticker_cache
+    return {**ticker_cache.get_stats(), 'batching': ticker_batcher.get_stats()}
+
+@app.get("/api/health/instruments")
+async def instrument_catalog_health():
+    """交易对目录的加载状态和刷新计数"""
+    from instrument_catalog import instrument_catalog
+    return instrument_catalog.get_stats()
+
+@app.get("/api/health/market-data")
+async def market_data_health():
+    """WebSocket 行情订阅的连接状态和消息计数"""
+    from market_data_stream import market_data_stream
+    return market_data_stream.get_stats()
+
+@app.get("/api/health/connectivity")
+async def connectivity_health():
+    """后台探测的 OKX 接入地址和代理健康状态（延迟 EWMA）"""
+    from connectivity_monitor import connectivity_monitor
+    return connectivity_monitor.get_stats()
+
+@app.get("/api/health/balances")
+async def balance_refresher_health():
+    """后台余额刷新的轮次、错误和限速跳过计数"""
+    from async_balance_service import balance_refresher, balance_store
+    return {**balance_refresher.get_stats(), 'store': type(balance_store).__name__}
+
+@app.get("/api/health/exchanges")
+async def exchange_instances_health():
+    """长连接交易所实例的创建、复用、淘汰和市场数据共享计数"""
+    from trading_engine import exchange_manager
+    return exchange_manager.get_stats()
+
+@app.get("/api/health/rate-limiter")
+async def rate_limiter_health():
+    """OKX 接口限速器的排队、拒绝和写回计数"""
+    from rate_limiter import rate_limiter
+    return rate_limiter.get_stats()
+
 # Initialize database and scheduler
 @app.on_event("startup")
 async def startup_event():
     create_tables()
+    # 经 ORM 写入的交易随事务增量维护 user_trade_stats 汇总表
+    from database import SessionLocal
+    from trade_stats import register_trade_stats
+    register_trade_stats(SessionLocal)
+    from connectivity_monitor import connectivity_monitor
+    await connectivity_monitor.start()
+    from rate_limiter import rate_limiter
+    await rate_limiter.start()
+    from instrument_catalog import instrument_catalog
+    await instrument_catalog.start()
+    # 后台余额刷新（BALANCE_REFRESH_ENABLED=false 关闭）
+    if os.getenv('BALANCE_REFRESH_ENABLED', 'true').lower() == 'true':
+        from async_balance_service import balance_refresher
+        await balance_refresher.start()
+    # WebSocket 行情订阅（默认关闭，OKX_WS_ENABLED=true 启用）
+    if os.getenv('OKX_WS_ENABLED', 'false').lower() == 'true':
+        from sqlalchemy.orm import joinedload
+        from database import SessionLocal, Strategy
+        from market_data_stream import market_data_stream
+        db = SessionLocal()
+        try:
+            # 账户随策略一起加载：行情流按账户过滤模拟盘
+            active_strategies = db.query(Strategy).options(joinedload(Strategy.exchange_account)) \
+                .filter(Strategy.is_active == True).all()
+        finally:
+            db.close()
+        await market_data_stream.start(active_strategies)
     # Temporarily disable scheduler
     # from scheduler import start_scheduler
     # await start_scheduler()
@@ -68,7 +144,23 @@ async def shutdown_event():
     # Temporarily disable scheduler
     # from scheduler import stop_scheduler
     # await stop_scheduler()
-    pass
+    from instrument_catalog import instrument_catalog
+    await instrument_catalog.stop()
+    from async_balance_service import balance_refresher, balance_store
+    await balance_refresher.stop()
+    await balance_store.close()
+    from market_data_stream import market_data_stream
+    await market_data_stream.stop()
+    from rate_limiter import rate_limiter
+    await rate_limiter.stop()
+    from connectivity_monitor import connectivity_monitor
+    await connectivity_monitor.stop()
+    from trading_engine import exchange_manager
+    await exchange_manager.close()
+    from okx_http_client import close_http_clients
+    await close_http_clients()
+    from exchange_io import exchange_io
+    exchange_io.shutdown(wait=False)
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,414 @@
+"""
+OKX WebSocket 行情订阅服务
+为所有活跃策略用到的交易对订阅 OKX 公开 tickers / candle 频道，策略启停时增减订阅；
+最新行情和实时K线常驻内存，供行情缓存、K线合并器和仪表盘直接读取，不再轮询 REST。
+
+- tickers 在 /ws/v5/public，candle 频道在 /ws/v5/business，各用一条连接
+- 断线后指数退避重连并恢复全部订阅；断线期间内存数据视为过期
+- K线缓冲区由 REST 结果播种，之后由推送更新；发现缺口时清空，等待下一次播种
+- 只连接 OKX 实盘：模拟盘和其他交易所账户的策略不订阅，也不读写这里的缓冲区
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import websockets
+from indicator_state import timeframe_to_ms
+from instrument_catalog import instrument_catalog
+
+logger = logging.getLogger(__name__)
+
+OKX_WS_PUBLIC_URL = os.getenv('OKX_WS_PUBLIC_URL', 'wss://ws.okx.com:8443/ws/v5/public')
+OKX_WS_BUSINESS_URL = os.getenv('OKX_WS_BUSINESS_URL', 'wss://ws.okx.com:8443/ws/v5/business')
+CANDLE_BUFFER_SIZE = int(os.getenv('MARKET_DATA_CANDLE_BUFFER', '1000'))
+# OKX 30 秒无消息会断开连接，按文档发送文本 ping
+PING_INTERVAL = 20.0
+TICKER_MAX_AGE = 10.0
+MAX_ARGS_PER_MESSAGE = 100
+RECONNECT_MAX_DELAY = 30.0
+
+# (频道, instId)
+ChannelArg = Tuple[str, str]
+
+
+def to_inst_id(symbol: str) -> str:
+    """策略中的交易对（BTC/USDT）转换为 OKX instId（BTC-USDT）"""
+    return instrument_catalog.normalize(symbol) or (symbol or '').strip().upper().replace('/', '-').replace('_', '-')
+
+
+def candle_channel(timeframe: str) -> str:
+    """5m → candle5m，1h → candle1H，1d → candle1D"""
+    unit = timeframe[-1]
+    return f"candle{timeframe[:-1]}{unit if unit in ('m', 'M') else unit.upper()}"
+
+
+def channel_timeframe(channel: str) -> str:
+    """candle1H → 1h"""
+    timeframe = channel[len('candle'):]
+    unit = timeframe[-1]
+    return timeframe[:-1] + (unit if unit in ('m', 'M') else unit.lower())
+
+
+def parse_candle(row: List) -> List[float]:
+    """OKX K线推送 [ts, o, h, l, c, vol, ...] → ccxt 格式 [ts, o, h, l, c, vol]"""
+    return [int(row[0])] + [float(value) for value in row[1:6]]
+
+
+def serves_market(exchange: str, is_testnet: bool) -> bool:
+    """推送的行情是否属于该市场（只有 OKX 实盘）"""
+    return (exchange or '').lower() in ('okx', 'okex') and not is_testnet
+
+
+def _streamable(strategy) -> bool:
+    account = getattr(strategy, 'exchange_account', None)
+    if account is None:
+        return True
+    return serves_market(account.exchange_name, bool(account.is_testnet))
+
+
+class CandleBuffer:
+    """单个 (instId, 周期) 的连续K线，最后一根可能尚未收盘"""
+
+    def __init__(self, timeframe: str, capacity: int = CANDLE_BUFFER_SIZE):
+        self.timeframe = timeframe
+        self.timeframe_ms = timeframe_to_ms(timeframe)
+        self.rows: deque = deque(maxlen=capacity)
+        self.updated_at: Optional[float] = None
+
+    def seed(self, ohlcv: List[List[float]], now: float):
+        """用 REST 结果替换缓冲区"""
+        self.rows.clear()
+        for row in sorted(ohlcv, key=lambda r: r[0]):
+            self.rows.append([int(row[0])] + [float(v) for v in row[1:6]])
+        self.updated_at = now
+
+    def update(self, row: List[float], now: float) -> bool:
+        """合并一条推送；出现缺口时清空并返回 False"""
+        timestamp = row[0]
+        if self.rows:
+            last = self.rows[-1][0]
+            if timestamp == last:
+                self.rows[-1] = row
+            elif timestamp == last + self.timeframe_ms:
+                self.rows.append(row)
+            elif timestamp < last:
+                # 旧K线的迟到推送，只更新仍在缓冲区中的那一根
+                for i in range(len(self.rows) - 1, -1, -1):
+                    if self.rows[i][0] == timestamp:
+                        self.rows[i] = row
+                        break
+            else:
+                self.rows.clear()
+                self.rows.append(row)
+                self.updated_at = now
+                return False
+        else:
+            self.rows.append(row)
+        self.updated_at = now
+        return True
+
+    def tail(self, limit: int) -> Optional[List[List[float]]]:
+        if len(self.rows) < limit:
+            return None
+        return [list(row) for row in list(self.rows)[len(self.rows) - limit:]]
+
+
+class _ChannelConnection:
+    """一条 WebSocket 连接：断线自动重连并恢复订阅"""
+
+    def __init__(self, name: str, url: str, on_message: Callable, on_disconnect: Callable):
+        self.name = name
+        self.url = url
+        self.on_message = on_message
+        self.on_disconnect = on_disconnect
+        self.subscriptions: Set[ChannelArg] = set()
+        self.connected = False
+        self.reconnects = 0
+        self._ws = None
+        self._task: Optional[asyncio.Task] = None
+        self._send_lock = asyncio.Lock()
+
+    async def _send_args(self, op: str, args: Iterable[ChannelArg]):
+        args = sorted(args)
+        if not args or self._ws is None:
+            return
+        async with self._send_lock:
+            for start in range(0, len(args), MAX_ARGS_PER_MESSAGE):
+                batch = args[start:start + MAX_ARGS_PER_MESSAGE]
+                await self._ws.send(json.dumps({
+                    'op': op,
+                    'args': [{'channel': channel, 'instId': inst_id} for channel, inst_id in batch],
+                }))
+
+    async def update(self, desired: Set[ChannelArg]):
+        """把订阅调整为 desired；未连接时只记录，连上后统一订阅"""
+        added, removed = desired - self.subscriptions, self.subscriptions - desired
+        self.subscriptions = set(desired)
+        if not self.connected:
+            return
+        try:
+            await self._send_args('unsubscribe', removed)
+            await self._send_args('subscribe', added)
+        except websockets.exceptions.ConnectionClosed:
+            # 重连后会按 self.subscriptions 重新订阅
+            pass
+
+    async def _ping(self, ws):
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            await ws.send('ping')
+
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=None, max_size=2 ** 22) as ws:
+                    self._ws, self.connected, delay = ws, True, 1.0
+                    logger.info(f"行情 WebSocket 已连接: {self.name} ({len(self.subscriptions)} 个订阅)")
+                    await self._send_args('subscribe', self.subscriptions)
+                    pinger = asyncio.create_task(self._ping(ws))
+                    try:
+                        async for raw in ws:
+                            if raw != 'pong':
+                                self.on_message(self.name, raw)
+                    finally:
+                        pinger.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"行情 WebSocket 连接异常 ({self.name}): {e}")
+            finally:
+                if self.connected:
+                    self.on_disconnect(self.name)
+                self._ws, self.connected = None, False
+
+            self.reconnects += 1
+            logger.info(f"{delay:.0f} 秒后重连行情 WebSocket: {self.name}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class MarketDataStream:
+    """活跃策略交易对的实时行情与K线"""
+
+    def __init__(self, public_url: str = OKX_WS_PUBLIC_URL, business_url: str = OKX_WS_BUSINESS_URL,
+                 candle_buffer_size: int = CANDLE_BUFFER_SIZE, ticker_max_age: float = TICKER_MAX_AGE,
+                 clock: Callable[[], float] = time.time):
+        self.candle_buffer_size = candle_buffer_size
+        self.ticker_max_age = ticker_max_age
+        self.clock = clock
+        self.connections = {
+            'public': _ChannelConnection('public', public_url, self._handle_message, self._handle_disconnect),
+            'business': _ChannelConnection('business', business_url, self._handle_message, self._handle_disconnect),
+        }
+        self.is_running = False
+
+        # strategy_id -> (instId, 周期)
+        self._strategy_keys: Dict[int, Tuple[str, str]] = {}
+        self.tickers: Dict[str, dict] = {}
+        self._ticker_received_at: Dict[str, float] = {}
+        self.candles: Dict[Tuple[str, str], CandleBuffer] = {}
+        self._apply_task: Optional[asyncio.Task] = None
+        self._apply_pending = False
+        self.stats = {
+            'messages': 0,
+            'ticker_updates': 0,
+            'candle_updates': 0,
+            'candle_gaps': 0,
+            'errors': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # 订阅管理
+    # ------------------------------------------------------------------
+
+    def desired_subscriptions(self) -> Dict[str, Set[ChannelArg]]:
+        inst_ids = {inst_id for inst_id, _ in self._strategy_keys.values()}
+        return {
+            'public': {('tickers', inst_id) for inst_id in inst_ids},
+            'business': {(candle_channel(timeframe), inst_id) for inst_id, timeframe in self._strategy_keys.values()},
+        }
+
+    async def apply_subscriptions(self):
+        desired = self.desired_subscriptions()
+        for name, connection in self.connections.items():
+            await connection.update(desired[name])
+        # 不再订阅的K线释放缓冲区
+        wanted = set(self._strategy_keys.values())
+        for key in [key for key in self.candles if key not in wanted]:
+            del self.candles[key]
+
+    async def _apply_until_clean(self):
+        while self._apply_pending:
+            self._apply_pending = False
+            await self.apply_subscriptions()
+
+    def _schedule_apply(self):
+        if not self.is_running:
+            return
+        # 连续多次启停合并为一次订阅变更；执行期间的新变更在下一轮处理
+        self._apply_pending = True
+        if self._apply_task is None or self._apply_task.done():
+            self._apply_task = asyncio.get_running_loop().create_task(self._apply_until_clean())
+
+    def track_strategy(self, strategy):
+        """策略启用：订阅其交易对的 ticker 和对应周期的K线（模拟盘 / 非 OKX 账户不订阅）"""
+        if not _streamable(strategy):
+            self.untrack_strategy(strategy.id)
+            return
+        self._strategy_keys[strategy.id] = (to_inst_id(strategy.symbol), strategy.timeframe)
+        self._schedule_apply()
+
+    def untrack_strategy(self, strategy_id: int):
+        """策略停用或删除：没有其他策略使用时取消订阅"""
+        if self._strategy_keys.pop(strategy_id, None) is not None:
+            self._schedule_apply()
+
+    def set_strategies(self, strategies: Iterable):
+        """用一组活跃策略整体替换订阅"""
+        self._strategy_keys = {s.id: (to_inst_id(s.symbol), s.timeframe) for s in strategies if _streamable(s)}
+        self._schedule_apply()
+
+    # ------------------------------------------------------------------
+    # 消息处理
+    # ------------------------------------------------------------------
+
+    def _handle_message(self, connection_name: str, raw: str):
+        self.stats['messages'] += 1
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.warning(f"无法解析的行情消息: {raw[:200]}")
+            return
+
+        event = message.get('event')
+        if event == 'error':
+            self.stats['errors'] += 1
+            logger.error(f"行情订阅错误: {message.get('code')} {message.get('msg')}")
+            return
+        if event is not None:
+            return
+
+        arg, data = message.get('arg') or {}, message.get('data') or []
+        channel, inst_id = arg.get('channel', ''), arg.get('instId')
+        now = self.clock()
+        if channel == 'tickers':
+            for ticker in data:
+                self.tickers[inst_id] = ticker
+                self._ticker_received_at[inst_id] = now
+                self.stats['ticker_updates'] += 1
+        elif channel.startswith('candle'):
+            key = (inst_id, channel_timeframe(channel))
+            buffer = self.candles.get(key)
+            if buffer is None:
+                buffer = self.candles[key] = CandleBuffer(key[1], self.candle_buffer_size)
+            for row in sorted(data, key=lambda r: int(r[0])):
+                if not buffer.update(parse_candle(row), now):
+                    self.stats['candle_gaps'] += 1
+                self.stats['candle_updates'] += 1
+
+    def _handle_disconnect(self, connection_name: str):
+        # 断线期间可能漏掉推送：行情视为过期，K线等待重新播种
+        if connection_name == 'public':
+            self._ticker_received_at.clear()
+        else:
+            self.candles.clear()
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def get_ticker(self, symbol: str) -> Optional[dict]:
+        """最新推送的 ticker（OKX 格式）；未订阅、断线或过期时返回 None"""
+        inst_id = to_inst_id(symbol)
+        received_at = self._ticker_received_at.get(inst_id)
+        if received_at is None or not self.connections['public'].connected:
+            return None
+        if self.clock() - received_at > self.ticker_max_age:
+            return None
+        return self.tickers.get(inst_id)
+
+    def ticker_response(self, exchange_name: str, inst_id: str) -> Optional[dict]:
+        """TickerCache 的实时数据源：返回与 REST 相同格式的响应"""
+        if exchange_name != 'okx':
+            return None
+        ticker = self.get_ticker(inst_id)
+        return {'code': '0', 'msg': '', 'data': [ticker]} if ticker else None
+
+    def get_candles(self, symbol: str, timeframe: str, limit: int) -> Optional[List[List[float]]]:
+        """最近 limit 根K线；缓冲区不足、断线或最近没有推送时返回 None（调用方回退到 REST）"""
+        if not self.connections['business'].connected:
+            return None
+        buffer = self.candles.get((to_inst_id(symbol), timeframe))
+        if buffer is None or buffer.updated_at is None:
+            return None
+        # 每根K线周期内至少应有一次推送
+        if (self.clock() - buffer.updated_at) * 1000 > 2 * buffer.timeframe_ms:
+            return None
+        return buffer.tail(limit)
+
+    def seed_candles(self, symbol: str, timeframe: str, ohlcv: List[List[float]]):
+        """用 REST 结果播种已订阅的K线缓冲区"""
+        key = (to_inst_id(symbol), timeframe)
+        if not ohlcv or key not in set(self._strategy_keys.values()):
+            return
+        buffer = self.candles.get(key)
+        if buffer is None:
+            buffer = self.candles[key] = CandleBuffer(timeframe, self.candle_buffer_size)
+        pending = list(buffer.rows)
+        buffer.seed(ohlcv, self.clock())
+        # 播种前已经收到的推送更新更及时，合并回去
+        for row in pending:
+            if row[0] >= buffer.rows[0][0]:
+                buffer.update(row, self.clock())
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    async def start(self, strategies: Iterable = ()):
+        if self.is_running:
+            return
+        self.is_running = True
+        self._strategy_keys.update({s.id: (to_inst_id(s.symbol), s.timeframe) for s in strategies if _streamable(s)})
+        await self.apply_subscriptions()
+        for connection in self.connections.values():
+            connection.start()
+        logger.info(f"行情 WebSocket 服务已启动: {len(self._strategy_keys)} 个策略")
+
+    async def stop(self):
+        self.is_running = False
+        for connection in self.connections.values():
+            await connection.stop()
+
+    def get_stats(self) -> dict:
+        desired = self.desired_subscriptions()
+        return {
+            **self.stats,
+            'running': self.is_running,
+            'connected': {name: c.connected for name, c in self.connections.items()},
+            'reconnects': {name: c.reconnects for name, c in self.connections.items()},
+            'subscriptions': {name: len(args) for name, args in desired.items()},
+            'tickers': len(self.tickers),
+            'candle_buffers': len(self.candles),
+        }
+
+
+# 全局实例
+market_data_stream = MarketDataStream()
@@ -0,0 +1,275 @@
+"""
+列式内存映射K线归档 - 长历史版本
+每个 (交易所, 交易对, 周期) 一个文件：64 字节文件头 + 6 个定长列块
+(timestamp:int64, open/high/low/close/volume:float64)，通过 np.memmap 打开，
+支持追加写入、按时间戳二分查找，读取时返回零拷贝的连续列切片
+
+与 CandleStore 接口一致（db 参数保留但不使用），可以直接替换给回测和策略引擎使用：
+环境变量 CANDLE_BACKEND=archive 时，K线拉取合并器和回测接口都改用归档（默认 database，即 MarketData 表）。
+单进程写入；多个读取进程可以同时打开同一文件。
+"""
+import os
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from candle_store import CandleStore, DEFAULT_EXCHANGE, OHLCV_COLUMNS, candle_store, datetime_to_ms
+
+logger = logging.getLogger(__name__)
+
+HEADER_WORDS = 8
+HEADER_BYTES = HEADER_WORDS * 8
+MAGIC = 0x31564843_4C4F  # "OLCHV1"
+VERSION = 1
+INITIAL_CAPACITY = 4096
+
+# K线来源: database（MarketData 表）或 archive（本模块的列式归档）
+CANDLE_BACKEND = os.getenv('CANDLE_BACKEND', 'database').lower()
+
+# 文件头字段位置
+_H_MAGIC, _H_VERSION, _H_COUNT, _H_CAPACITY = 0, 1, 2, 3
+
+
+def _column_dtype(name: str):
+    return np.int64 if name == 'timestamp' else np.float64
+
+
+class _SeriesFile:
+    """单个K线序列文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        if not os.path.exists(path):
+            self._create(path, INITIAL_CAPACITY)
+        self._open()
+
+    @staticmethod
+    def _create(path: str, capacity: int, columns: Optional[Dict[str, np.ndarray]] = None):
+        size = HEADER_BYTES + len(OHLCV_COLUMNS) * capacity * 8
+        raw = np.memmap(path, dtype=np.uint8, mode='w+', shape=(size,))
+        del raw
+
+        header = np.memmap(path, dtype=np.int64, mode='r+', shape=(HEADER_WORDS,))
+        count = len(columns['timestamp']) if columns else 0
+        for i, name in enumerate(OHLCV_COLUMNS):
+            block = np.memmap(path, dtype=_column_dtype(name), mode='r+',
+                              offset=HEADER_BYTES + i * capacity * 8, shape=(capacity,))
+            if count:
+                block[:count] = columns[name]
+            block.flush()
+            del block
+
+        header[_H_MAGIC] = MAGIC
+        header[_H_VERSION] = VERSION
+        header[_H_COUNT] = count
+        header[_H_CAPACITY] = capacity
+        header.flush()
+        del header
+
+    def _open(self):
+        self.header = np.memmap(self.path, dtype=np.int64, mode='r+', shape=(HEADER_WORDS,))
+        if self.header[_H_MAGIC] != MAGIC:
+            raise ValueError(f"不是有效的K线归档文件: {self.path}")
+        capacity = int(self.header[_H_CAPACITY])
+        self.columns = {
+            name: np.memmap(self.path, dtype=_column_dtype(name), mode='r+',
+                            offset=HEADER_BYTES + i * capacity * 8, shape=(capacity,))
+            for i, name in enumerate(OHLCV_COLUMNS)
+        }
+
+    def close(self):
+        for column in self.columns.values():
+            column.flush()
+        self.header.flush()
+        self.columns = {}
+        self.header = None
+
+    @property
+    def count(self) -> int:
+        return int(self.header[_H_COUNT])
+
+    @property
+    def capacity(self) -> int:
+        return int(self.header[_H_CAPACITY])
+
+    def column(self, name: str) -> np.ndarray:
+        """零拷贝的有效数据视图"""
+        return self.columns[name][:self.count]
+
+    def _rewrite(self, columns: Dict[str, np.ndarray], capacity: int):
+        """以新容量重写整个文件（扩容或中间插入时），原子替换"""
+        tmp_path = self.path + '.tmp'
+        self._create(tmp_path, capacity, columns)
+        self.close()
+        os.replace(tmp_path, self.path)
+        self._open()
+
+    def write(self, rows: np.ndarray):
+        """写入按时间戳升序、去重后的K线 (N, 6)"""
+        if len(rows) == 0:
+            return
+
+        count = self.count
+        timestamps = self.column('timestamp')
+        new_ts = rows[:, 0].astype(np.int64)
+
+        if count == 0 or new_ts[0] > timestamps[-1]:
+            self._append(rows)
+            return
+
+        # 与已有时间戳重叠：重叠部分原地覆盖，尾部追加
+        positions = np.searchsorted(timestamps, new_ts)
+        in_range = positions < count
+        exists = np.zeros(len(rows), dtype=bool)
+        exists[in_range] = timestamps[positions[in_range]] == new_ts[in_range]
+        tail = ~exists & (new_ts > timestamps[-1])
+
+        if np.all(exists | tail):
+            for i, name in enumerate(OHLCV_COLUMNS):
+                values = new_ts if name == 'timestamp' else rows[:, i]
+                self.columns[name][positions[exists]] = values[exists]
+            self._append(rows[tail])
+            return
+
+        # 补齐历史中间的缺口：合并后重写（回填时才会发生）
+        merged = {name: np.concatenate((self.column(name),
+                                        new_ts[~exists] if name == 'timestamp' else rows[~exists, i]))
+                  for i, name in enumerate(OHLCV_COLUMNS)}
+        order = np.argsort(merged['timestamp'], kind='stable')
+        merged = {name: values[order] for name, values in merged.items()}
+        for i, name in enumerate(OHLCV_COLUMNS):
+            if name != 'timestamp':
+                merged[name][np.searchsorted(merged['timestamp'], new_ts[exists])] = rows[exists, i]
+        self._rewrite(merged, max(self.capacity, 2 * len(merged['timestamp'])))
+
+    def _append(self, rows: np.ndarray):
+        if len(rows) == 0:
+            return
+        count = self.count
+        needed = count + len(rows)
+        if needed > self.capacity:
+            current = {name: np.array(self.column(name)) for name in OHLCV_COLUMNS}
+            self._rewrite(current, max(2 * self.capacity, needed))
+
+        for i, name in enumerate(OHLCV_COLUMNS):
+            values = rows[:, i].astype(_column_dtype(name))
+            self.columns[name][count:needed] = values
+            self.columns[name].flush()
+
+        # 数据落盘后再更新行数，读取方不会看到写了一半的行
+        self.header[_H_COUNT] = needed
+        self.header.flush()
+
+
+class OHLCVArchive(CandleStore):
+    """列式K线归档，沿用 CandleStore 的增量同步逻辑；模拟盘K线存放在 <交易所>-testnet 目录"""
+
+    def __init__(self, root_dir: str, exchange_name: str = DEFAULT_EXCHANGE, exchange_manager=None):
+        super().__init__(exchange_manager)
+        self.root_dir = root_dir
+        # 未指定交易所时使用的默认市场
+        self.exchange_name = exchange_name.lower()
+        self._series: Dict[Tuple[str, bool, str, str], _SeriesFile] = {}
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _path(self, exchange: str, is_testnet: bool, symbol: str, timeframe: str) -> str:
+        safe_symbol = symbol.replace('/', '-').replace(':', '_')
+        market_dir = f"{exchange}-testnet" if is_testnet else exchange
+        return os.path.join(self.root_dir, market_dir, f"{safe_symbol}_{timeframe}.ohlcv")
+
+    def _get_series(self, symbol: str, timeframe: str, create: bool = False,
+                    exchange: Optional[str] = None, is_testnet: bool = False) -> Optional[_SeriesFile]:
+        exchange = exchange or self.exchange_name
+        key = (exchange, is_testnet, symbol, timeframe)
+        if key not in self._series:
+            path = self._path(*key)
+            if not create and not os.path.exists(path):
+                return None
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._series[key] = _SeriesFile(path)
+        return self._series[key]
+
+    def close(self):
+        for series in self._series.values():
+            series.close()
+        self._series.clear()
+
+    def _range_slice(self, series: _SeriesFile, start_ms: Optional[int], end_ms: Optional[int]) -> slice:
+        """按时间戳二分查找 [start_ms, end_ms] 对应的行区间"""
+        timestamps = series.column('timestamp')
+        lo = 0 if start_ms is None else int(np.searchsorted(timestamps, start_ms, side='left'))
+        hi = len(timestamps) if end_ms is None else int(np.searchsorted(timestamps, end_ms, side='right'))
+        return slice(lo, hi)
+
+    def upsert_candles(self, db, symbol: str, timeframe: str, ohlcv: List[List[float]],
+                       exchange: Optional[str] = None, is_testnet: bool = False) -> int:
+        """写入K线：新K线追加，已存在的时间戳原地覆盖"""
+        if not ohlcv:
+            return 0
+        rows = np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+        rows = rows[np.argsort(rows[:, 0], kind='stable')]
+        # 同一时间戳保留最后一条
+        keep = np.append(rows[1:, 0] != rows[:-1, 0], True)
+        rows = rows[keep]
+        self._get_series(symbol, timeframe, True, exchange, is_testnet).write(rows)
+        return len(rows)
+
+    def _stored_timestamps(self, db, symbol: str, timeframe: str, start, end,
+                           exchange: Optional[str] = None, is_testnet: bool = False) -> List[int]:
+        series = self._get_series(symbol, timeframe, exchange=exchange, is_testnet=is_testnet)
+        if series is None:
+            return []
+        window = self._range_slice(series, datetime_to_ms(start), datetime_to_ms(end))
+        return series.column('timestamp')[window].tolist()
+
+    def read_candles(self, db, symbol: str, timeframe: str, limit: int, end_ms: Optional[int] = None,
+                     exchange: Optional[str] = None, is_testnet: bool = False) -> List[List[float]]:
+        series = self._get_series(symbol, timeframe, exchange=exchange, is_testnet=is_testnet)
+        if series is None:
+            return []
+        window = self._range_slice(series, None, end_ms)
+        start = max(window.start, window.stop - limit)
+        columns = [series.column(name)[start:window.stop] for name in OHLCV_COLUMNS]
+        return [[int(ts), o, h, l, c, v] for ts, o, h, l, c, v in
+                zip(*(col.tolist() for col in columns))]
+
+    def load_arrays(self, db, symbol: str, timeframe: str,
+                    start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                    exchange: Optional[str] = None, is_testnet: bool = False) -> Dict[str, np.ndarray]:
+        """返回区间内各列的零拷贝 memmap 切片"""
+        series = self._get_series(symbol, timeframe, exchange=exchange, is_testnet=is_testnet)
+        if series is None:
+            return {name: np.empty(0, dtype=_column_dtype(name)) for name in OHLCV_COLUMNS}
+        window = self._range_slice(series, start_ms, end_ms)
+        return {name: series.column(name)[window] for name in OHLCV_COLUMNS}
+
+    def import_from_store(self, db, store: CandleStore, symbol: str, timeframe: str,
+                          batch_size: int = 100_000, exchange: Optional[str] = None,
+                          is_testnet: bool = False) -> int:
+        """从 MarketData 表迁移历史K线到归档"""
+        exchange = exchange or self.exchange_name
+        arrays = store.load_arrays(db, symbol, timeframe, exchange=exchange, is_testnet=is_testnet)
+        total = len(arrays['timestamp'])
+        for start in range(0, total, batch_size):
+            rows = np.column_stack([arrays[name][start:start + batch_size] for name in OHLCV_COLUMNS])
+            self.upsert_candles(db, symbol, timeframe, rows.tolist(), exchange, is_testnet)
+        logger.info(f"导入 {symbol} {timeframe} 共 {total} 根K线到归档")
+        return total
+
+
+def open_archive(exchange_name: str, exchange_manager=None) -> OHLCVArchive:
+    """按环境变量 OHLCV_ARCHIVE_DIR 打开归档（默认 ./data/ohlcv）"""
+    root_dir = os.getenv('OHLCV_ARCHIVE_DIR', os.path.join('.', 'data', 'ohlcv'))
+    return OHLCVArchive(root_dir, exchange_name, exchange_manager)
+
+
+def select_candle_source(backend: str, exchange_manager=None) -> CandleStore:
+    """按配置选择K线来源，供K线拉取合并器、回测和参数优化共用"""
+    if backend == 'archive':
+        return open_archive(DEFAULT_EXCHANGE, exchange_manager)
+    if backend != 'database':
+        raise ValueError(f"未知的 CANDLE_BACKEND: {backend}")
+    return candle_store
+
+
+# 全局实例
+candle_source = select_candle_source(CANDLE_BACKEND, candle_store.exchange_manager)
@@ -14,9 +14,13 @@ import logging
 from typing import Dict, Any, Optional
 from datetime import datetime
 from okx_compliance_manager import OKXComplianceManager, ValidationResult
+from okx_http_client import OKXRestClient
 
 logger = logging.getLogger(__name__)
 
+# 同步调用方共用的 keep-alive 会话，避免每次请求重新握手
+_session = requests.Session()
+
 class OKXAPIManager:
     """OKX API管理器 - 修复版"""
     
@@ -45,6 +49,12 @@ class OKXAPIManager:
             for key in ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy']:
                 if key in os.environ:
                     del os.environ[key]
+        
+        # 异步请求走共享连接池（httpx 的 SOCKS 代理使用 socks5:// 前缀）
+        async_proxy = proxy_url.replace('socks5h://', 'socks5://') if use_proxy else None
+        # 时间戳由客户端在限速等待之后生成，排队不会让签名过期
+        self.client = OKXRestClient(api_key, secret_key, passphrase, proxy_url=async_proxy, base_url=self.base_url,
+                                    timestamp_source=self._get_server_timestamp)
     
     async def validate_credentials(self, is_testnet: bool = False) -> ValidationResult:
         """验证API凭据并获取权限信息"""
@@ -75,8 +85,8 @@ class OKXAPIManager:
         logger.debug(f"使用本地时间戳: {local_ts}")
         return str(local_ts)
     
-    def _make_request(self, method: str, endpoint: str, params: Dict = None, data: Dict = None) -> Dict:
-        """发送API请求"""
+    def _build_request(self, method: str, endpoint: str, params: Dict = None, data: Dict = None):
+        """生成签名路径、请求体和请求头"""
         timestamp = self._get_server_timestamp()
         
         # 处理查询参数
@@ -106,6 +116,40 @@ class OKXAPIManager:
             'Content-Type': 'application/json'
         }
         
+        return sign_path, body, headers
+    
+    @staticmethod
+    def _parse_response(status_code: int, json_fn, text: str) -> Dict:
+        """将HTTP响应转换为OKX格式的结果"""
+        logger.debug(f"OKX API响应状态: {status_code}")
+        
+        if status_code == 200:
+            result = json_fn()
+            logger.debug(f"OKX API响应: {result}")
+            return result
+        else:
+            error_response = {
+                'code': str(status_code),
+                'msg': f'HTTP错误: {status_code}',
+                'data': None
+            }
+            
+            # 尝试解析错误响应体
+            try:
+                error_data = json_fn()
+                if 'msg' in error_data:
+                    error_response['msg'] = f"HTTP {status_code}: {error_data['msg']}"
+                    error_response['code'] = error_data.get('code', str(status_code))
+                logger.error(f"OKX API错误响应: {error_data}")
+            except:
+                logger.error(f"OKX API错误: HTTP {status_code}, 响应体: {text}")
+            
+            return error_response
+    
+    def _make_request(self, method: str, endpoint: str, params: Dict = None, data: Dict = None) -> Dict:
+        """发送API请求"""
+        sign_path, body, headers = self._build_request(method, endpoint, params, data)
+        
         # 构建完整URL
         url = f'{self.base_url}{sign_path}'
         
@@ -114,36 +158,13 @@ class OKXAPIManager:
             logger.debug(f"Headers: {dict((k, v if k != 'OK-ACCESS-SIGN' else '***') for k, v in headers.items())}")
             
             if method.upper() == 'GET':
-                response = requests.get(url, headers=headers, proxies=self.proxies, timeout=10)
+                response = _session.get(url, headers=headers, proxies=self.proxies, timeout=10)
             elif method.upper() == 'POST':
-                response = requests.post(url, headers=headers, data=body, proxies=self.proxies, timeout=10)
+                response = _session.post(url, headers=headers, data=body, proxies=self.proxies, timeout=10)
             else:
                 raise ValueError(f"不支持的HTTP方法: {method}")
             
-            logger.debug(f"OKX API响应状态: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                logger.debug(f"OKX API响应: {result}")
-                return result
-            else:
-                error_response = {
-                    'code': str(response.status_code),
-                    'msg': f'HTTP错误: {response.status_code}',
-                    'data': None
-                }
-                
-                # 尝试解析错误响应体
-                try:
-                    error_data = response.json()
-                    if 'msg' in error_data:
-                        error_response['msg'] = f"HTTP {response.status_code}: {error_data['msg']}"
-                        error_response['code'] = error_data.get('code', str(response.status_code))
-                    logger.error(f"OKX API错误响应: {error_data}")
-                except:
-                    logger.error(f"OKX API错误: HTTP {response.status_code}, 响应体: {response.text}")
-                
-                return error_response
+            return self._parse_response(response.status_code, response.json, response.text)
                 
         except Exception as e:
             logger.error(f"API请求失败: {e}")
@@ -153,10 +174,29 @@ class OKXAPIManager:
                 'data': None
             }
     
+    async def _make_request_async(self, method: str, endpoint: str, params: Dict = None, data: Dict = None) -> Dict:
+        """发送API请求（异步，共享连接池）"""
+        if method.upper() not in ('GET', 'POST'):
+            raise ValueError(f"不支持的HTTP方法: {method}")
+        
+        try:
+            response = await self.client.request(
+                method, endpoint, params=params, data=data
+            )
+            return self._parse_response(response.status_code, response.json, response.text)
+        
+        except Exception as e:
+            logger.error(f"API请求失败: {e}")
+            return {
+                'code': '-1',
+                'msg': f'请求失败: {str(e)}',
+                'data': None
+            }
+    
     def get_server_time(self) -> Dict:
         """获取服务器时间（公开API）"""
         try:
-            response = requests.get(f'{self.base_url}/api/v5/public/time', 
+            response = _session.get(f'{self.base_url}/api/v5/public/time', 
                                   proxies=self.proxies, 
                                   timeout=10)
             if response.status_code == 200:
@@ -166,10 +206,21 @@ class OKXAPIManager:
         except Exception as e:
             return {'code': '-1', 'msg': str(e), 'data': None}
     
+    async def get_server_time_async(self) -> Dict:
+        """获取服务器时间（公开API，异步）"""
+        try:
+            response = await self.client.get_server_time()
+            if response.status_code == 200:
+                return response.json()
+            else:
+                return {'code': str(response.status_code), 'msg': 'API访问失败', 'data': None}
+        except Exception as e:
+            return {'code': '-1', 'msg': str(e), 'data': None}
+    
     def get_ticker(self, symbol: str = 'BTC-USDT') -> Dict:
         """获取价格信息（公开API）"""
         try:
-            response = requests.get(f'{self.base_url}/api/v5/market/ticker',
+            response = _session.get(f'{self.base_url}/api/v5/market/ticker',
                                   params={'instId': symbol},
                                   proxies=self.proxies, 
                                   timeout=10)
@@ -180,10 +231,25 @@ class OKXAPIManager:
         except Exception as e:
             return {'code': '-1', 'msg': str(e), 'data': None}
     
+    async def get_ticker_async(self, symbol: str = 'BTC-USDT') -> Dict:
+        """获取价格信息（公开API，异步）"""
+        try:
+            response = await self.client.get_ticker(symbol)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                return {'code': str(response.status_code), 'msg': 'API访问失败', 'data': None}
+        except Exception as e:
+            return {'code': '-1', 'msg': str(e), 'data': None}
+    
     def get_balance(self) -> Dict:
         """获取账户余额（私有API）"""
         return self._make_request('GET', '/api/v5/account/balance')
     
+    async def get_balance_async(self) -> Dict:
+        """获取账户余额（私有API，异步）"""
+        return await self._make_request_async('GET', '/api/v5/account/balance')
+    
     def get_balance_with_retry(self, max_retries: int = 3) -> Dict:
         """获取账户余额（带重试机制和详细错误信息）"""
         last_error = None
@@ -2,20 +2,20 @@
 OKX API 认证修复器
 解决时间戳和权限验证问题
 """
-import hmac
-import hashlib
-import base64
-import time
-import json
-from datetime import datetime, timezone
-import requests
 import os
+import httpx
+import requests
 from dotenv import load_dotenv
+from okx_http_client import OKXRestClient, iso_timestamp, sign_request
+
+# 同步调用方（脚本、测试工具）共用的 keep-alive 会话
+_session = requests.Session()
 
 class OKXAuthFixer:
     """OKX API认证修复器"""
     
-    def __init__(self, api_key: str, secret_key: str, passphrase: str, is_testnet: bool = False):
+    def __init__(self, api_key: str, secret_key: str, passphrase: str, is_testnet: bool = False,
+                 account_id: int = None):
         self.api_key = api_key
         self.secret_key = secret_key
         self.passphrase = passphrase
@@ -26,78 +26,114 @@ class OKXAuthFixer:
             self.base_url = "https://www.okx.com"  # OKX实际没有公开的测试网
         else:
             self.base_url = "https://www.okx.com"
+        
+        # 异步请求走共享连接池
+        self.client = OKXRestClient(api_key, secret_key, passphrase, is_testnet, base_url=self.base_url,
+                                    account_id=account_id)
     
     def get_timestamp(self) -> str:
         """获取正确格式的时间戳"""
         # OKX需要ISO格式的时间戳
-        return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        return iso_timestamp()
     
     def sign(self, timestamp: str, method: str, request_path: str, body: str = '') -> str:
         """生成OKX API签名"""
-        # 构建签名字符串
-        message = timestamp + method.upper() + request_path + body
-        
-        # 使用HMAC-SHA256生成签名
-        signature = hmac.new(
-            self.secret_key.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).digest()
-        
-        # Base64编码
-        return base64.b64encode(signature).decode('utf-8')
+        return sign_request(self.secret_key, timestamp, method, request_path, body)
     
     def get_headers(self, method: str, request_path: str, body: str = '') -> dict:
         """获取完整的请求头"""
-        timestamp = self.get_timestamp()
-        signature = self.sign(timestamp, method, request_path, body)
-        
-        return {
-            'Content-Type': 'application/json',
-            'OK-ACCESS-KEY': self.api_key,
-            'OK-ACCESS-SIGN': signature,
-            'OK-ACCESS-TIMESTAMP': timestamp,
-            'OK-ACCESS-PASSPHRASE': self.passphrase,
-            'x-simulated-trading': '1' if self.is_testnet else '0'
-        }
+        return self.client.signed_headers(method, request_path, body, self.get_timestamp())
     
-    def test_auth(self) -> dict:
-        """测试API认证"""
-        try:
-            # 使用账户信息接口测试认证
-            request_path = '/api/v5/account/config'
-            headers = self.get_headers('GET', request_path)
-            
-            # 设置代理（如果需要）
-            proxies = self._get_proxies()
-            
-            response = requests.get(
-                f"{self.base_url}{request_path}",
-                headers=headers,
-                proxies=proxies,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('code') == '0':
-                    return {
-                        'success': True,
-                        'message': '认证成功',
-                        'data': data.get('data', [])
-                    }
-                else:
-                    return {
-                        'success': False,
-                        'message': f"API错误: {data.get('msg', 'Unknown error')}",
-                        'code': data.get('code')
-                    }
+    @staticmethod
+    def _auth_result(status_code: int, json_fn, text: str) -> dict:
+        """解析认证接口响应"""
+        if status_code == 200:
+            data = json_fn()
+            if data.get('code') == '0':
+                return {
+                    'success': True,
+                    'message': '认证成功',
+                    'data': data.get('data', [])
+                }
             else:
                 return {
                     'success': False,
-                    'message': f"HTTP错误: {response.status_code}",
-                    'response': response.text[:200]
+                    'message': f"API错误: {data.get('msg', 'Unknown error')}",
+                    'code': data.get('code')
                 }
+        else:
+            return {
+                'success': False,
+                'message': f"HTTP错误: {status_code}",
+                'response': text[:200]
+            }
+    
+    @staticmethod
+    def _balance_result(status_code: int, json_fn, text: str) -> dict:
+        """解析余额接口响应"""
+        if status_code == 200:
+            data = json_fn()
+            if data.get('code') == '0':
+                return {
+                    'success': True,
+                    'message': '获取余额成功',
+                    'data': data.get('data', [])
+                }
+            else:
+                # 提供详细的错误信息和建议
+                error_code = data.get('code', '')
+                error_msg = data.get('msg', 'Unknown error')
+                
+                suggestion = ""
+                if error_code == '50111':
+                    suggestion = "请检查API Key是否正确"
+                elif error_code == '50112':
+                    suggestion = "请检查时间戳和系统时间"
+                elif error_code == '50113':
+                    suggestion = "请检查API签名算法"
+                elif error_code == '50114':
+                    suggestion = "请检查请求头中的Passphrase"
+                elif error_code == '50102':
+                    suggestion = "时间戳错误，请检查系统时间"
+                elif error_code == '50001':
+                    suggestion = "API密钥权限不足，请检查API设置"
+                
+                return {
+                    'success': False,
+                    'message': f"API错误 {error_code}: {error_msg}",
+                    'code': error_code,
+                    'suggestion': suggestion
+                }
+        elif status_code == 401:
+            return {
+                'success': False,
+                'message': "API认证失败，请检查API密钥、Secret和Passphrase是否正确",
+                'code': '401',
+                'suggestion': "请确认API密钥有效并且具有读取权限，检查IP白名单设置"
+            }
+        else:
+            return {
+                'success': False,
+                'message': f"HTTP错误: {status_code}",
+                'response': text[:200],
+                'suggestion': "请检查网络连接和API端点"
+            }
+    
+    def _get(self, request_path: str) -> requests.Response:
+        """同步签名 GET（复用会话连接）"""
+        return _session.get(
+            f"{self.base_url}{request_path}",
+            headers=self.get_headers('GET', request_path),
+            proxies=self._get_proxies(),
+            timeout=10
+        )
+    
+    def test_auth(self) -> dict:
+        """测试API认证"""
+        try:
+            # 使用账户信息接口测试认证
+            response = self._get('/api/v5/account/config')
+            return self._auth_result(response.status_code, response.json, response.text)
                 
         except Exception as e:
             return {
@@ -105,6 +141,18 @@ class OKXAuthFixer:
                 'message': f"连接错误: {str(e)}"
             }
     
+    async def test_auth_async(self) -> dict:
+        """测试API认证（异步，共享连接池）"""
+        try:
+            response = await self.client.get_account_config()
+            return self._auth_result(response.status_code, response.json, response.text)
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f"连接错误: {str(e)}"
+            }
+    
     def _get_proxies(self) -> dict:
         """获取代理设置"""
         load_dotenv()
@@ -130,64 +178,8 @@ class OKXAuthFixer:
     def get_balance(self) -> dict:
         """获取账户余额"""
         try:
-            request_path = '/api/v5/account/balance'
-            headers = self.get_headers('GET', request_path)
-            proxies = self._get_proxies()
-            
-            response = requests.get(
-                f"{self.base_url}{request_path}",
-                headers=headers,
-                proxies=proxies,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('code') == '0':
-                    return {
-                        'success': True,
-                        'message': '获取余额成功',
-                        'data': data.get('data', [])
-                    }
-                else:
-                    # 提供详细的错误信息和建议
-                    error_code = data.get('code', '')
-                    error_msg = data.get('msg', 'Unknown error')
-                    
-                    suggestion = ""
-                    if error_code == '50111':
-                        suggestion = "请检查API Key是否正确"
-                    elif error_code == '50112':
-                        suggestion = "请检查时间戳和系统时间"
-                    elif error_code == '50113':
-                        suggestion = "请检查API签名算法"
-                    elif error_code == '50114':
-                        suggestion = "请检查请求头中的Passphrase"
-                    elif error_code == '50102':
-                        suggestion = "时间戳错误，请检查系统时间"
-                    elif error_code == '50001':
-                        suggestion = "API密钥权限不足，请检查API设置"
-                    
-                    return {
-                        'success': False,
-                        'message': f"API错误 {error_code}: {error_msg}",
-                        'code': error_code,
-                        'suggestion': suggestion
-                    }
-            elif response.status_code == 401:
-                return {
-                    'success': False,
-                    'message': "API认证失败，请检查API密钥、Secret和Passphrase是否正确",
-                    'code': '401',
-                    'suggestion': "请确认API密钥有效并且具有读取权限，检查IP白名单设置"
-                }
-            else:
-                return {
-                    'success': False,
-                    'message': f"HTTP错误: {response.status_code}",
-                    'response': response.text[:200],
-                    'suggestion': "请检查网络连接和API端点"
-                }
+            response = self._get('/api/v5/account/balance')
+            return self._balance_result(response.status_code, response.json, response.text)
                 
         except requests.exceptions.Timeout:
             return {
@@ -201,6 +193,25 @@ class OKXAuthFixer:
                 'message': f"获取余额失败: {str(e)}",
                 'suggestion': "请检查网络连接和API配置"
             }
+    
+    async def get_balance_async(self) -> dict:
+        """获取账户余额（异步，共享连接池）"""
+        try:
+            response = await self.client.get_balance()
+            return self._balance_result(response.status_code, response.json, response.text)
+        
+        except httpx.TimeoutException:
+            return {
+                'success': False,
+                'message': "请求超时",
+                'suggestion': "请检查网络连接或代理设置"
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f"获取余额失败: {str(e)}",
+                'suggestion': "请检查网络连接和API配置"
+            }
 
 def test_okx_auth_fix():
     """测试OKX认证修复"""
@@ -13,6 +13,8 @@ from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 from sqlalchemy.orm import Session
 from database import ExchangeAccount
+from exchange_io import exchange_io
+from rate_limiter import rate_limiter
 import logging
 
 logger = logging.getLogger(__name__)
@@ -131,7 +133,7 @@ class OKXComplianceManager:
     async def _test_balance_permission(self, exchange) -> bool:
         """测试读取权限（获取余额）"""
         try:
-            await exchange.fetch_balance()
+            await exchange_io.call(exchange.fetch_balance)
             return True
         except:
             return False
@@ -140,7 +142,7 @@ class OKXComplianceManager:
         """测试交易权限（获取订单历史）"""
         try:
             # 尝试获取订单历史，这需要交易权限
-            await exchange.fetch_orders('BTC/USDT', limit=1)
+            await exchange_io.call(exchange.fetch_orders, 'BTC/USDT', limit=1)
             return True
         except ccxt.PermissionDenied:
             return False
@@ -152,7 +154,7 @@ class OKXComplianceManager:
         """测试提币权限"""
         try:
             # 尝试获取提币地址，这需要提币权限
-            await exchange.fetch_deposit_address('BTC')
+            await exchange_io.call(exchange.fetch_deposit_address, 'BTC')
             return True
         except ccxt.PermissionDenied:
             return False
@@ -165,13 +167,13 @@ class OKXComplianceManager:
         try:
             if self.proxy_config:
                 # 通过代理获取IP
-                response = requests.get('https://httpbin.org/ip', 
-                                      proxies=self.proxy_config, 
-                                      timeout=10)
+                response = await exchange_io.run(requests.get, 'https://httpbin.org/ip',
+                                                 proxies=self.proxy_config,
+                                                 timeout=10)
                 return response.json().get('origin', '').split(',')[0].strip()
             else:
                 # 直接获取IP
-                response = requests.get('https://httpbin.org/ip', timeout=10)
+                response = await exchange_io.run(requests.get, 'https://httpbin.org/ip', timeout=10)
                 return response.json().get('origin', '').split(',')[0].strip()
         except Exception as e:
             logger.error(f"获取IP地址失败: {e}")
@@ -219,32 +221,35 @@ class OKXComplianceManager:
             return False
     
     def check_rate_limit(self, account: ExchangeAccount) -> Tuple[bool, Optional[datetime]]:
-        """检查是否超过速率限制"""
-        if not account.rate_limit_reset or not account.rate_limit_remaining:
+        """检查是否超过速率限制（优先使用限速器的内存状态）"""
+        status = rate_limiter.account_status(account.id)
+        remaining, reset_time = status if status is not None else \
+            (account.rate_limit_remaining, account.rate_limit_reset)
+        if not reset_time or remaining is None:
             return True, None
         
         now = datetime.utcnow()
         
         # 如果重置时间已过，允许请求
-        if now >= account.rate_limit_reset:
+        if now >= reset_time:
             return True, None
         
         # 如果还有剩余次数，允许请求
-        if account.rate_limit_remaining > 0:
-            return True, account.rate_limit_reset
+        if remaining > 0:
+            return True, reset_time
         
         # 超过限制
-        return False, account.rate_limit_reset
+        return False, reset_time
     
     def update_rate_limit_info(self, 
                               db: Session, 
                               account: ExchangeAccount, 
                               remaining: int, 
                               reset_time: datetime):
-        """更新速率限制信息"""
+        """更新速率限制信息；只更新内存，由限速器定时批量写回数据库"""
         account.rate_limit_remaining = remaining
         account.rate_limit_reset = reset_time
-        db.commit()
+        rate_limiter.record_remaining(account.id, remaining, reset_time)
     
     def update_validation_status(self, 
                                 db: Session, 
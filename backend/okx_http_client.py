@@ -0,0 +1,172 @@
+"""
+OKX REST 异步客户端 - 连接池版本
+所有 OKX REST 调用共用按 (主机, 代理) 缓存的 httpx.AsyncClient：
+keep-alive 复用 TCP/TLS（以及 SOCKS）握手，安装了 h2 时启用 HTTP/2 多路复用，
+每个主机的连接数受 OKX_HTTP_MAX_CONNECTIONS 限制，代理沿用 USE_PROXY / PROXY_* 环境变量；
+发送前按 (账户, 接口组) 从 rate_limiter 取令牌
+"""
+import os
+import hmac
+import json
+import base64
+import asyncio
+import hashlib
+import logging
+import weakref
+import httpx
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from rate_limiter import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+OKX_BASE_URL = "https://www.okx.com"
+
+# 每个 (主机, 代理) 连接池的上限
+MAX_CONNECTIONS = int(os.getenv('OKX_HTTP_MAX_CONNECTIONS', '20'))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OKX_HTTP_MAX_KEEPALIVE', '10'))
+KEEPALIVE_EXPIRY = 60.0
+REQUEST_TIMEOUT = 10.0
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 未传入 proxy_url 时从环境变量读取
+USE_ENV_PROXY = object()
+
+
+def proxy_url_from_env() -> Optional[str]:
+    """按 USE_PROXY / PROXY_HOST / PROXY_PORT / PROXY_TYPE 生成代理地址，未启用时返回 None"""
+    load_dotenv()
+
+    if os.getenv('USE_PROXY', 'false').lower() != 'true':
+        return None
+
+    proxy_host = os.getenv('PROXY_HOST', '127.0.0.1')
+    proxy_port = os.getenv('PROXY_PORT', '1080')
+    proxy_type = os.getenv('PROXY_TYPE', 'socks5')
+    # httpx 的 SOCKS 代理只接受 socks5:// 前缀
+    if proxy_type in ('socks5', 'socks5h'):
+        proxy_type = 'socks5'
+    return f"{proxy_type}://{proxy_host}:{proxy_port}"
+
+
+# 事件循环 -> {(base_url, proxy_url): AsyncClient}；httpx 连接绑定创建它的事件循环
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, Optional[str]], httpx.AsyncClient]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def get_http_client(base_url: str = OKX_BASE_URL, proxy_url: Optional[str] = None) -> httpx.AsyncClient:
+    """当前事件循环中共享的连接池客户端（须在协程内调用）"""
+    loop = asyncio.get_running_loop()
+    pool = _clients.setdefault(loop, {})
+    key = (base_url, proxy_url)
+    client = pool.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=HTTP2_AVAILABLE,
+            proxies=proxy_url,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=REQUEST_TIMEOUT,
+            # 代理只由 proxy_url 决定，不受进程级 HTTP(S)_PROXY 影响
+            trust_env=False,
+        )
+        pool[key] = client
+        logger.info(f"创建 OKX HTTP 连接池: {base_url} (proxy: {proxy_url or '无'}, http2: {HTTP2_AVAILABLE})")
+    return client
+
+
+async def close_http_clients():
+    """关闭当前事件循环中的所有连接池（应用关闭时调用）"""
+    loop = asyncio.get_running_loop()
+    pool = _clients.pop(loop, {})
+    for client in pool.values():
+        await client.aclose()
+
+
+def sign_request(secret_key: str, timestamp: str, method: str, request_path: str, body: str = '') -> str:
+    """OKX API 签名: Base64(HMAC-SHA256(timestamp + method + path + body))"""
+    message = timestamp + method.upper() + request_path + body
+    digest = hmac.new(secret_key.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('utf-8')
+
+
+def iso_timestamp() -> str:
+    """OKX 要求的 ISO 8601 毫秒时间戳"""
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+class OKXRestClient:
+    """OKX REST 异步客户端，底层连接按主机和代理共享"""
+
+    def __init__(self, api_key: str = None, secret_key: str = None, passphrase: str = None,
+                 is_testnet: bool = False, proxy_url=USE_ENV_PROXY, base_url: str = OKX_BASE_URL,
+                 account_id: int = None, limiter=rate_limiter,
+                 timestamp_source: Callable[[], str] = iso_timestamp):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.is_testnet = is_testnet
+        self.base_url = base_url
+        self.proxy_url = proxy_url_from_env() if proxy_url is USE_ENV_PROXY else proxy_url
+        # 私有接口按账户限速；没有数据库账户 id 时以 API key 区分
+        self.account_id = account_id
+        self.limiter = limiter
+        # 签名时间戳在拿到令牌后才取，默认本地 ISO 时间
+        self.timestamp_source = timestamp_source
+
+    @property
+    def rate_limit_key(self):
+        return self.account_id if self.account_id is not None else self.api_key
+
+    def signed_headers(self, method: str, request_path: str, body: str = '', timestamp: str = None) -> dict:
+        """私有接口请求头"""
+        timestamp = timestamp or self.timestamp_source()
+        return {
+            'Content-Type': 'application/json',
+            'OK-ACCESS-KEY': self.api_key,
+            'OK-ACCESS-SIGN': sign_request(self.secret_key, timestamp, method, request_path, body),
+            'OK-ACCESS-TIMESTAMP': timestamp,
+            'OK-ACCESS-PASSPHRASE': self.passphrase,
+            'x-simulated-trading': '1' if self.is_testnet else '0'
+        }
+
+    async def request(self, method: str, path: str, params: Dict = None, data: Dict = None,
+                      signed: bool = True, timestamp: str = None) -> httpx.Response:
+        """发送请求并返回原始响应；签名路径包含查询字符串"""
+        # 先等令牌再签名，排队时间不计入签名时间戳的有效期
+        if self.limiter is not None:
+            await self.limiter.acquire(self.rate_limit_key, path)
+        request_path = path
+        if params:
+            request_path += '?' + '&'.join(f"{k}={v}" for k, v in params.items())
+        body = json.dumps(data) if data else ''
+
+        headers = self.signed_headers(method, request_path, body, timestamp) if signed else {}
+        client = get_http_client(self.base_url, self.proxy_url)
+        logger.debug(f"OKX API请求: {method.upper()} {self.base_url}{request_path}")
+        response = await client.request(method.upper(), request_path, headers=headers, content=body or None)
+        if response.status_code == 429 and self.limiter is not None:
+            self.limiter.penalize(self.rate_limit_key, path)
+        return response
+
+    async def get_server_time(self) -> httpx.Response:
+        return await self.request('GET', '/api/v5/public/time', signed=False)
+
+    async def get_ticker(self, inst_id: str) -> httpx.Response:
+        return await self.request('GET', '/api/v5/market/ticker', params={'instId': inst_id}, signed=False)
+
+    async def get_balance(self) -> httpx.Response:
+        return await self.request('GET', '/api/v5/account/balance')
+
+    async def get_account_config(self) -> httpx.Response:
+        return await self.request('GET', '/api/v5/account/config')
@@ -0,0 +1,308 @@
+"""
+策略参数优化 - 网格/随机搜索
+在同一段K线上并行评估成千上万组 bb_period / bb_deviation / ma_period / 止损 / 止盈 组合，返回排序后的结果表
+
+- K线和收盘价前缀和（cumsum / cumsq）只在主进程计算一次，放入共享内存，工作进程零拷贝读取
+- 任意周期的滚动均值/标准差由前缀和 O(n) 相减得到，同一进程内按周期缓存，
+  参数组合按 (bb_period, ma_period) 分组派发，组内只剩比较和成交模拟
+- 各进程之间没有共享的可写状态，核数增加时接近线性扩展
+"""
+import os
+import itertools
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from backtest_engine import BacktestEngine, BacktestConfig
+from candle_store import OHLCV_COLUMNS
+from strategy_registry import get_strategy_plugin
+
+logger = logging.getLogger(__name__)
+
+PARAMETER_NAMES = ('bb_period', 'bb_deviation', 'ma_period', 'stop_loss_percent', 'take_profit_percent')
+
+# 排名指标及排序方向（True 表示越大越好）
+RANK_METRICS = {
+    'sharpe_ratio': True,
+    'total_profit_loss': True,
+    'return_percent': True,
+    'win_rate': True,
+    'max_drawdown_percent': False,
+}
+
+
+@dataclass(frozen=True)
+class ParameterSet:
+    """一组待评估的策略参数"""
+    bb_period: int
+    bb_deviation: float
+    ma_period: int
+    stop_loss_percent: Optional[float] = None
+    take_profit_percent: Optional[float] = None
+
+
+@dataclass
+class _SweepStrategy:
+    """回测引擎需要的策略字段"""
+    id: Optional[int]
+    strategy_type: str
+    symbol: str
+    timeframe: str
+    entry_amount: float
+    bb_period: int
+    bb_deviation: float
+    ma_period: int
+    stop_loss_percent: Optional[float]
+    take_profit_percent: Optional[float]
+
+
+def grid_parameters(space: Dict[str, Sequence]) -> List[ParameterSet]:
+    """参数空间的笛卡尔积；未给出的止损/止盈视为不设置"""
+    values = [list(space.get(name, [None])) for name in PARAMETER_NAMES]
+    return [ParameterSet(*combo) for combo in itertools.product(*values)]
+
+
+def random_parameters(space: Dict[str, Sequence], n: int, seed: Optional[int] = None) -> List[ParameterSet]:
+    """从参数空间中不重复地随机抽取 n 组"""
+    grid = grid_parameters(space)
+    if n >= len(grid):
+        return grid
+    rng = np.random.default_rng(seed)
+    return [grid[i] for i in rng.choice(len(grid), size=n, replace=False)]
+
+
+class SharedCandles:
+    """放在共享内存中的K线列和收盘价前缀和
+
+    布局：len(OHLCV_COLUMNS) 列 × n 行的 float64，之后是两段长度 n+1 的前缀和。
+    前缀和以收盘价中位数为中心累加，降低大数相减的舍入误差
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, n: int, anchor: float, owner: bool):
+        self.shm = shm
+        self.n = n
+        self.anchor = anchor
+        self.owner = owner
+        n_cols = len(OHLCV_COLUMNS)
+        buffer = np.ndarray((n_cols * n + 2 * (n + 1),), dtype=np.float64, buffer=shm.buf)
+        self.columns = {name: buffer[i * n:(i + 1) * n] for i, name in enumerate(OHLCV_COLUMNS)}
+        self.cumsum = buffer[n_cols * n:n_cols * n + n + 1]
+        self.cumsq = buffer[n_cols * n + n + 1:]
+
+    @classmethod
+    def create(cls, candles: Dict[str, np.ndarray]) -> 'SharedCandles':
+        n = len(candles['close'])
+        size = (len(OHLCV_COLUMNS) * n + 2 * (n + 1)) * 8
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        close = np.asarray(candles['close'], dtype=np.float64)
+        anchor = float(np.median(close)) if n else 0.0
+        shared = cls(shm, n, anchor, owner=True)
+        for name in OHLCV_COLUMNS:
+            # 毫秒时间戳在 float64 中可以精确表示
+            shared.columns[name][:] = candles[name]
+        deviation = close - anchor
+        shared.cumsum[0] = 0.0
+        shared.cumsq[0] = 0.0
+        np.cumsum(deviation, out=shared.cumsum[1:])
+        np.cumsum(deviation * deviation, out=shared.cumsq[1:])
+        return shared
+
+    @classmethod
+    def attach(cls, name: str, n: int, anchor: float) -> 'SharedCandles':
+        return cls(shared_memory.SharedMemory(name=name), n, anchor, owner=False)
+
+    @property
+    def handle(self) -> Tuple[str, int, float]:
+        return self.shm.name, self.n, self.anchor
+
+    def candles(self) -> Dict[str, np.ndarray]:
+        return dict(self.columns)
+
+    def rolling_mean_std(self, period: int) -> Tuple[np.ndarray, np.ndarray]:
+        """由前缀和得到与K线对齐的滚动均值/标准差（前 period-1 个为 NaN）"""
+        n = self.n
+        mean = np.full(n, np.nan)
+        std = np.full(n, np.nan)
+        if n >= period:
+            centered_mean = (self.cumsum[period:] - self.cumsum[:-period]) / period
+            variance = (self.cumsq[period:] - self.cumsq[:-period]) / period - centered_mean ** 2
+            mean[period - 1:] = centered_mean + self.anchor
+            std[period - 1:] = np.sqrt(np.maximum(variance, 0.0))
+        return mean, std
+
+    def close(self):
+        # 先释放 numpy 视图，否则共享内存无法关闭
+        self.columns = {}
+        self.cumsum = self.cumsq = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # 异常回溯仍持有视图时，映射随进程退出释放；共享内存名照常删除
+            logger.warning(f"共享内存 {self.shm.name} 仍有视图引用，延迟释放")
+        if self.owner:
+            self.shm.unlink()
+
+
+class _SweepEvaluator:
+    """在一段共享K线上评估参数组合，按周期缓存滚动指标"""
+
+    def __init__(self, shared: SharedCandles, base: Dict, config: BacktestConfig):
+        self.shared = shared
+        self.candles = shared.candles()
+        self.base = base
+        self.config = config
+        self.engine = BacktestEngine()
+        self.plugin = get_strategy_plugin(base['strategy_type'])
+        self._rolling: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _mean_std(self, period: int) -> Tuple[np.ndarray, np.ndarray]:
+        if period not in self._rolling:
+            self._rolling[period] = self.shared.rolling_mean_std(period)
+        return self._rolling[period]
+
+    def signals(self, strategy: '_SweepStrategy') -> np.ndarray:
+        values = {}
+        for key in self.plugin.required_indicators(strategy):
+            if key.kind not in ('mean', 'std'):
+                raise ValueError(f"参数优化不支持的指标类型: {key.kind}")
+            mean, std = self._mean_std(key.period)
+            values[key] = mean if key.kind == 'mean' else std
+        return self.plugin.signal(self.candles, values, strategy)
+
+    def evaluate(self, params: ParameterSet) -> Dict:
+        strategy = _SweepStrategy(**self.base, **asdict(params))
+        result = self.engine.run_signals(strategy, self.candles, self.signals(strategy),
+                                         self.config, include_trades=False)
+        row = asdict(params)
+        row.update(result.stats)
+        return row
+
+
+# 工作进程内的评估器（进程初始化时挂载共享内存）
+_worker_evaluator: Optional[_SweepEvaluator] = None
+
+
+def _init_worker(handle: Tuple[str, int, float], base: Dict, config: BacktestConfig):
+    global _worker_evaluator
+    _worker_evaluator = _SweepEvaluator(SharedCandles.attach(*handle), base, config)
+
+
+def _evaluate_batch(batch: List[ParameterSet]) -> List[Dict]:
+    return [_worker_evaluator.evaluate(params) for params in batch]
+
+
+def _make_batches(parameters: Iterable[ParameterSet], n_batches: int) -> List[List[ParameterSet]]:
+    """按 (bb_period, ma_period) 分组后切分，同一批内的滚动指标缓存可以复用"""
+    ordered = sorted(parameters, key=lambda p: (p.bb_period, p.ma_period))
+    if not ordered:
+        return []
+    size = max(1, -(-len(ordered) // n_batches))
+    return [ordered[i:i + size] for i in range(0, len(ordered), size)]
+
+
+def rank_results(rows: List[Dict], metric: str = 'sharpe_ratio', min_trades: int = 1,
+                 top_n: Optional[int] = None) -> List[Dict]:
+    """按指标排序，过滤交易次数过少的组合"""
+    if metric not in RANK_METRICS:
+        raise ValueError(f"不支持的排序指标: {metric}")
+    descending = RANK_METRICS[metric]
+    ranked = sorted((r for r in rows if r['total_trades'] >= min_trades),
+                    key=lambda r: r[metric], reverse=descending)
+    ranked = ranked[:top_n] if top_n else ranked
+    for rank, row in enumerate(ranked, start=1):
+        row['rank'] = rank
+    return ranked
+
+
+def optimize(strategy, candles: Dict[str, np.ndarray], parameters: List[ParameterSet],
+             config: BacktestConfig = None, metric: str = 'sharpe_ratio', min_trades: int = 1,
+             top_n: Optional[int] = None, max_workers: Optional[int] = None) -> List[Dict]:
+    """并行评估参数组合并返回排名表
+
+    strategy 只提供策略类型、交易对、周期和下单数量，待优化的参数来自 parameters；
+    max_workers=1 时在当前进程内串行执行（不创建进程池）
+    """
+    config = config or BacktestConfig()
+    if metric not in RANK_METRICS:
+        raise ValueError(f"不支持的排序指标: {metric}")
+    longest = max((max(p.bb_period, p.ma_period) for p in parameters), default=0)
+    if len(candles['close']) < longest + 1:
+        raise ValueError(f"K线数量不足: {len(candles['close'])}")
+
+    base = {
+        'id': getattr(strategy, 'id', None),
+        'strategy_type': strategy.strategy_type,
+        'symbol': strategy.symbol,
+        'timeframe': strategy.timeframe,
+        'entry_amount': float(strategy.entry_amount),
+    }
+    max_workers = max_workers or os.cpu_count() or 1
+
+    shared = SharedCandles.create(candles)
+    try:
+        if max_workers == 1:
+            evaluator = _SweepEvaluator(shared, base, config)
+            rows = [evaluator.evaluate(params) for params in parameters]
+            del evaluator
+        else:
+            # 每个进程分几批，平衡不同周期组合之间的耗时差异
+            batches = _make_batches(parameters, max_workers * 4)
+            rows = []
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(shared.handle, base, config)) as executor:
+                for batch_rows in executor.map(_evaluate_batch, batches):
+                    rows.extend(batch_rows)
+    finally:
+        shared.close()
+
+    logger.info(f"参数优化完成: {len(rows)} 组参数, {max_workers} 个进程")
+    return rank_results(rows, metric, min_trades, top_n)
+
+
+def format_table(rows: List[Dict]) -> str:
+    """排名表的文本形式"""
+    headers = ('rank',) + PARAMETER_NAMES + ('total_trades', 'win_rate', 'total_profit_loss',
+                                            'max_drawdown_percent', 'sharpe_ratio')
+    lines = ['\t'.join(headers)]
+    for row in rows:
+        cells = []
+        for name in headers:
+            value = row.get(name)
+            cells.append(f"{value:.4f}" if isinstance(value, float) else str(value))
+        lines.append('\t'.join(cells))
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    # 用法: python parameter_optimizer.py <strategy_id> [workers]
+    import sys
+    from database import SessionLocal, Strategy
+    from candle_store import market_of
+    from ohlcv_archive import candle_source
+
+    logging.basicConfig(level=logging.INFO)
+    strategy_id = int(sys.argv[1])
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    db = SessionLocal()
+    try:
+        strategy = db.query(Strategy).filter(Strategy.id == strategy_id).first()
+        if not strategy:
+            sys.exit(f"策略不存在: {strategy_id}")
+        exchange, is_testnet = market_of(strategy.exchange_account)
+        candles = candle_source.load_arrays(db, strategy.symbol, strategy.timeframe,
+                                            exchange=exchange, is_testnet=is_testnet)
+    finally:
+        db.close()
+
+    space = {
+        'bb_period': range(10, 41, 5),
+        'bb_deviation': [1.5, 2.0, 2.5, 3.0],
+        'ma_period': range(30, 121, 15),
+        'stop_loss_percent': [None, 1.0, 2.0, 3.0],
+        'take_profit_percent': [None, 2.0, 4.0, 6.0],
+    }
+    results = optimize(strategy, candles, grid_parameters(space), max_workers=workers, top_n=20)
+    print(format_table(results))
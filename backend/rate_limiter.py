@@ -0,0 +1,346 @@
+"""
+OKX 接口限速器
+按 (账户, 接口组) 维护内存中的异步令牌桶，预置 OKX 文档中各接口的限速：
+- 调用方发请求前 await acquire()，令牌不足时排队等待，不再撞上 429
+- 公开行情接口（market/*、public/*）按 IP 限速，所有账户共用一个桶；私有接口按账户（UserID）限速
+- 收到 429 / 50011 时调用 penalize() 让该桶暂停一个窗口
+- 账户剩余次数只在内存中更新，由后台任务每 RATE_LIMIT_FLUSH_INTERVAL 秒批量写回
+  ExchangeAccount.rate_limit_remaining / rate_limit_reset，不再每次更新都提交事务；
+  写库在线程中执行，不阻塞事件循环
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.getenv('RATE_LIMIT_FLUSH_INTERVAL', '10'))
+# 单次 acquire 最长等待秒数，超过则抛出 RateLimitExceeded
+MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '30'))
+
+# 按 IP 限速的接口共用的账户键
+PUBLIC = 'ip'
+
+
+@dataclass(frozen=True)
+class EndpointLimit:
+    """每 window 秒最多 requests 次；scope 为 'ip' 或 'user'"""
+    requests: int
+    window: float
+    scope: str = 'user'
+
+    @property
+    def rate(self) -> float:
+        return self.requests / self.window
+
+
+# OKX v5 文档中的限速（接口组 = 去掉 /api/v5/ 前缀的路径）
+OKX_ENDPOINT_LIMITS: Dict[str, EndpointLimit] = {
+    'market/ticker': EndpointLimit(20, 2.0, 'ip'),
+    'market/tickers': EndpointLimit(20, 2.0, 'ip'),
+    'market/books': EndpointLimit(40, 2.0, 'ip'),
+    'market/candles': EndpointLimit(40, 2.0, 'ip'),
+    'market/history-candles': EndpointLimit(20, 2.0, 'ip'),
+    'market/trades': EndpointLimit(100, 2.0, 'ip'),
+    'public/instruments': EndpointLimit(20, 2.0, 'ip'),
+    'public/time': EndpointLimit(10, 2.0, 'ip'),
+    'account/balance': EndpointLimit(10, 2.0),
+    'account/config': EndpointLimit(5, 2.0),
+    'account/positions': EndpointLimit(10, 2.0),
+    'asset/balances': EndpointLimit(6, 1.0),
+    'trade/order': EndpointLimit(60, 2.0),
+    'trade/cancel-order': EndpointLimit(60, 2.0),
+    'trade/orders-pending': EndpointLimit(60, 2.0),
+    'trade/orders-history': EndpointLimit(40, 2.0),
+    'trade/fills': EndpointLimit(60, 2.0),
+}
+# 未列出的接口按最保守的私有接口限速
+DEFAULT_LIMIT = EndpointLimit(5, 2.0)
+# 这些前缀下的接口不签名、按 IP 限速，未列出时同样共用 IP 桶
+PUBLIC_PREFIXES = ('market', 'public')
+
+
+def endpoint_group(path: str) -> str:
+    """'/api/v5/market/ticker?instId=BTC-USDT' -> 'market/ticker'"""
+    path = path.split('?', 1)[0].strip('/')
+    if path.startswith('api/v5/'):
+        path = path[len('api/v5/'):]
+    return path
+
+
+class RateLimitExceeded(Exception):
+    """等待令牌超过 max_wait"""
+
+    def __init__(self, group: str, wait: float):
+        super().__init__(f"接口 {group} 限速，需等待 {wait:.2f} 秒")
+        self.group = group
+        self.wait = wait
+
+
+class TokenBucket:
+    """令牌桶；令牌可预支为负数，后到的调用方按顺序排在前面的预约之后"""
+
+    def __init__(self, limit: EndpointLimit, clock: Callable[[], float] = time.monotonic):
+        self.limit = limit
+        self.clock = clock
+        self.tokens = float(limit.requests)
+        self.updated_at = clock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.limit.requests, self.tokens + (now - self.updated_at) * self.limit.rate)
+        self.updated_at = now
+
+    def wait_time(self, cost: float = 1.0) -> float:
+        """取 cost 个令牌需要等待的秒数（不扣减）"""
+        self._refill(self.clock())
+        return max(0.0, (cost - self.tokens) / self.limit.rate)
+
+    def reserve(self, cost: float = 1.0) -> float:
+        """扣减令牌并返回需要等待的秒数"""
+        wait = self.wait_time(cost)
+        self.tokens -= cost
+        return wait
+
+    def refund(self, cost: float = 1.0):
+        self.tokens = min(self.limit.requests, self.tokens + cost)
+
+    def drain(self, seconds: float):
+        """清空并透支 seconds 秒的令牌（交易所返回 429 时）"""
+        self._refill(self.clock())
+        self.tokens = min(self.tokens, -seconds * self.limit.rate)
+
+    def remaining(self) -> int:
+        self._refill(self.clock())
+        return max(0, math.floor(self.tokens))
+
+    def seconds_until_full(self) -> float:
+        self._refill(self.clock())
+        return (self.limit.requests - self.tokens) / self.limit.rate
+
+
+class RateLimiter:
+    """(账户, 接口组) -> 令牌桶"""
+
+    def __init__(self, limits: Dict[str, EndpointLimit] = None, default_limit: EndpointLimit = DEFAULT_LIMIT,
+                 max_wait: Optional[float] = MAX_WAIT, flush_interval: float = FLUSH_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limits = OKX_ENDPOINT_LIMITS if limits is None else limits
+        self.default_limit = default_limit
+        self.max_wait = max_wait
+        self.flush_interval = flush_interval
+        self.clock = clock
+
+        self.buckets: Dict[Tuple[Hashable, str], TokenBucket] = {}
+        # 交易所返回的剩余次数（update_rate_limit_info），账户 id -> (剩余, 重置时间)
+        self._reported: Dict[int, Tuple[int, datetime]] = {}
+        # 有变化、待写回数据库的账户 id
+        self._dirty: Set[int] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            'acquired': 0,
+            'throttled': 0,
+            'total_wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'rejected': 0,
+            'penalties': 0,
+            'flushes': 0,
+            'flushed_accounts': 0,
+            'flush_errors': 0,
+        }
+        self.group_stats: Dict[str, Dict[str, int]] = {}
+
+    def limit_for(self, group: str) -> EndpointLimit:
+        limit = self.limits.get(group)
+        if limit is not None:
+            return limit
+        if group.split('/', 1)[0] in PUBLIC_PREFIXES:
+            # 未签名的请求没有账户，不能落进 (None, 接口组) 这样的“账户”桶
+            return replace(self.default_limit, scope='ip')
+        return self.default_limit
+
+    def bucket(self, account: Hashable, path: str) -> Tuple[TokenBucket, str]:
+        """path 可以是完整路径或接口组；按 IP 限速的接口忽略 account"""
+        group = endpoint_group(path)
+        limit = self.limit_for(group)
+        key = (PUBLIC if limit.scope == 'ip' else account, group)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(limit, self.clock)
+        return bucket, group
+
+    def _mark_dirty(self, account: Hashable):
+        # 只有数据库中的账户（整数 id）需要写回
+        if isinstance(account, int):
+            self._dirty.add(account)
+
+    async def acquire(self, account: Hashable, path: str, cost: float = 1.0, max_wait: float = None):
+        """取得一个令牌后返回；需要等待超过 max_wait 秒时抛出 RateLimitExceeded"""
+        bucket, group = self.bucket(account, path)
+        max_wait = self.max_wait if max_wait is None else max_wait
+        group_stats = self.group_stats.setdefault(group, {'acquired': 0, 'throttled': 0, 'rejected': 0})
+
+        wait = bucket.wait_time(cost)
+        if max_wait is not None and wait > max_wait:
+            self.stats['rejected'] += 1
+            group_stats['rejected'] += 1
+            raise RateLimitExceeded(group, wait)
+
+        bucket.reserve(cost)
+        if bucket.limit.scope != 'ip':
+            self._mark_dirty(account)
+        if wait > 0:
+            self.stats['throttled'] += 1
+            group_stats['throttled'] += 1
+            self.stats['total_wait_time'] += wait
+            self.stats['max_wait_time'] = max(self.stats['max_wait_time'], wait)
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # 调用方取消，归还预约的令牌
+                bucket.refund(cost)
+                raise
+        self.stats['acquired'] += 1
+        group_stats['acquired'] += 1
+
+    def penalize(self, account: Hashable, path: str, retry_after: float = None):
+        """交易所仍返回限速错误时，让该桶暂停 retry_after 秒（默认一个窗口）"""
+        bucket, group = self.bucket(account, path)
+        bucket.drain(bucket.limit.window if retry_after is None else retry_after)
+        self.stats['penalties'] += 1
+        if bucket.limit.scope != 'ip':
+            self._mark_dirty(account)
+        logger.warning(f"OKX 接口 {group} 触发限速，暂停 {retry_after or bucket.limit.window:.1f} 秒")
+
+    def record_remaining(self, account_id: int, remaining: int, reset_time: datetime):
+        """记录交易所报告的剩余次数；剩余为 0 时该账户的私有接口暂停到重置时间"""
+        self._reported[account_id] = (remaining, reset_time)
+        self._mark_dirty(account_id)
+        if remaining is not None and remaining <= 0 and reset_time is not None:
+            pause = (reset_time - datetime.utcnow()).total_seconds()
+            if pause > 0:
+                for (account, _), bucket in self.buckets.items():
+                    if account == account_id:
+                        bucket.drain(pause)
+
+    def account_status(self, account_id: int) -> Optional[Tuple[int, datetime]]:
+        """账户最紧张的私有接口的 (剩余次数, 重置时间)；没有记录时返回 None"""
+        now = datetime.utcnow()
+        candidates = []
+        for (account, _), bucket in self.buckets.items():
+            if account == account_id:
+                candidates.append((bucket.remaining(), now + timedelta(seconds=bucket.seconds_until_full())))
+        reported = self._reported.get(account_id)
+        if reported is not None and reported[1] is not None and reported[1] > now:
+            candidates.append(reported)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda status: (status[0], -status[1].timestamp()))
+
+    # ------------------------------------------------------------------
+    # 批量写回数据库
+    # ------------------------------------------------------------------
+
+    def _collect_dirty(self) -> Tuple[Set[int], List[Dict]]:
+        dirty, self._dirty = self._dirty, set()
+        mappings = []
+        for account_id in dirty:
+            status = self.account_status(account_id)
+            if status is not None:
+                mappings.append({'id': account_id, 'rate_limit_remaining': status[0],
+                                 'rate_limit_reset': status[1]})
+        return dirty, mappings
+
+    @staticmethod
+    def _write_mappings(session_factory: Optional[Callable], mappings: List[Dict]):
+        """同步写库，可在线程中执行"""
+        if session_factory is None:
+            from database import SessionLocal
+            session_factory = SessionLocal
+        from database import ExchangeAccount
+
+        db = session_factory()
+        try:
+            db.bulk_update_mappings(ExchangeAccount, mappings)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _record_flush(self, dirty: Set[int], mappings: List[Dict], error: Optional[Exception]) -> int:
+        if error is not None:
+            # 下次再写
+            self._dirty |= dirty
+            self.stats['flush_errors'] += 1
+            logger.error(f"写回限速状态失败: {error}")
+            return 0
+        self.stats['flushes'] += 1
+        self.stats['flushed_accounts'] += len(mappings)
+        return len(mappings)
+
+    def flush(self, session_factory: Callable = None) -> int:
+        """把有变化的账户状态在一个事务中写回，返回写入的账户数"""
+        if not self._dirty:
+            return 0
+        dirty, mappings = self._collect_dirty()
+        error = None
+        try:
+            self._write_mappings(session_factory, mappings)
+        except Exception as e:
+            error = e
+        return self._record_flush(dirty, mappings, error)
+
+    async def flush_async(self, session_factory: Callable = None) -> int:
+        """同 flush，但数据库写入放到线程中，不阻塞事件循环；桶状态仍在事件循环中读取"""
+        if not self._dirty:
+            return 0
+        dirty, mappings = self._collect_dirty()
+        error = None
+        try:
+            await asyncio.to_thread(self._write_mappings, session_factory, mappings)
+        except asyncio.CancelledError:
+            # 停止时被取消：结果未知，留待下次写回
+            self._dirty |= dirty
+            raise
+        except Exception as e:
+            error = e
+        return self._record_flush(dirty, mappings, error)
+
+    async def _flush_loop(self, session_factory: Callable = None):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_async(session_factory)
+
+    async def start(self, session_factory: Callable = None):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop(session_factory))
+            logger.info(f"限速状态定时写回已启动（间隔 {self.flush_interval:.0f} 秒）")
+
+    async def stop(self, session_factory: Callable = None):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush_async(session_factory)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'buckets': len(self.buckets),
+            'pending_flush': len(self._dirty),
+            'groups': {group: dict(stats) for group, stats in self.group_stats.items()},
+        }
+
+
+# 全局实例
+rate_limiter = RateLimiter()
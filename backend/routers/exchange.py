@@ -11,6 +11,7 @@ from database import get_db, User, ExchangeAccount
 from auth import verify_token
 from simple_real_trading_engine import real_exchange_manager
 from okx_compliance_manager import okx_compliance
+from exchange_io import exchange_io
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -78,7 +79,8 @@ async def create_exchange_account(
                 )
         
         # 首先验证真实API连接
-        connection_result = real_exchange_manager.test_connection(
+        connection_result = await exchange_io.run(
+            real_exchange_manager.test_connection,
             exchange_name=account.exchange_name,
             api_key=account.api_key,
             api_secret=account.api_secret,
@@ -317,7 +319,7 @@ async def get_ticker(
     
     try:
         # 使用真实API获取价格
-        result = real_exchange_manager.get_real_ticker(
+        result = await real_exchange_manager.get_real_ticker(
             user_id=current_user.id,
             exchange_name=account.exchange_name,
             symbol=symbol,
@@ -384,7 +386,8 @@ async def test_real_api_connection(
 ):
     """测试真实API连接 - 不使用任何模拟数据"""
     try:
-        result = real_exchange_manager.test_connection(
+        result = await exchange_io.run(
+            real_exchange_manager.test_connection,
             exchange_name=connection_data.exchange_name,
             api_key=connection_data.api_key,
             api_secret=connection_data.api_secret,
@@ -455,7 +458,8 @@ async def validate_exchange_permissions(
             }
         else:
             # 对于其他交易所，使用基本验证
-            connection_result = real_exchange_manager.test_connection(
+            connection_result = await exchange_io.run(
+                real_exchange_manager.test_connection,
                 exchange_name=account.exchange_name,
                 api_key=account.api_key,
                 api_secret=account.api_secret,
@@ -5,6 +5,12 @@ from typing import List
 import schemas
 from database import get_db, User, Strategy, ExchangeAccount
 from auth import verify_token
+from backtest_engine import backtest_engine, BacktestConfig
+from candle_store import datetime_to_ms, market_of
+from market_data_stream import market_data_stream
+from ohlcv_archive import candle_source
+from strategy_registry import get_strategy_plugin
+from trading_engine import strategy_engine
 
 router = APIRouter(prefix="/strategies", tags=["strategies"])
 security = HTTPBearer()
@@ -22,6 +28,18 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+def _sync_activation(strategy: Strategy):
+    """Resolve the strategy plugin when activated, release it when deactivated"""
+    if not strategy.is_active:
+        strategy_engine.deactivate_strategy(strategy.id)
+        market_data_stream.untrack_strategy(strategy.id)
+        return
+    try:
+        strategy_engine.activate_strategy(strategy)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    market_data_stream.track_strategy(strategy)
+
 @router.post("", response_model=schemas.StrategyResponse)
 async def create_strategy(
     strategy: schemas.StrategyCreate,
@@ -38,6 +56,11 @@ async def create_strategy(
     if not exchange_account:
         raise HTTPException(status_code=404, detail="Exchange account not found")
     
+    try:
+        get_strategy_plugin(strategy.strategy_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     db_strategy = Strategy(
         user_id=current_user.id,
         exchange_account_id=strategy.exchange_account_id,
@@ -105,6 +128,9 @@ async def update_strategy(
     for field, value in update_data.items():
         setattr(strategy, field, value)
     
+    if "is_active" in update_data:
+        _sync_activation(strategy)
+    
     db.commit()
     db.refresh(strategy)
     return strategy
@@ -124,6 +150,8 @@ async def delete_strategy(
     if not strategy:
         raise HTTPException(status_code=404, detail="Strategy not found")
     
+    strategy_engine.deactivate_strategy(strategy.id)
+    market_data_stream.untrack_strategy(strategy.id)
     db.delete(strategy)
     db.commit()
     return {"message": "Strategy deleted successfully"}
@@ -144,7 +172,53 @@ async def toggle_strategy(
         raise HTTPException(status_code=404, detail="Strategy not found")
     
     strategy.is_active = not strategy.is_active
+    _sync_activation(strategy)
     db.commit()
     db.refresh(strategy)
     
     return {"message": f"Strategy {'activated' if strategy.is_active else 'deactivated'}", "is_active": strategy.is_active}
+
+@router.post("/{strategy_id}/backtest", response_model=schemas.BacktestResponse)
+def backtest_strategy(
+    strategy_id: int,
+    request: schemas.BacktestRequest = schemas.BacktestRequest(),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Backtest a strategy over stored candles (MarketData or the OHLCV archive, per CANDLE_BACKEND)
+    
+    A plain def: FastAPI runs it in the threadpool, so the candle load and the
+    CPU-bound simulation do not block the event loop.
+    """
+    strategy = db.query(Strategy).filter(
+        Strategy.id == strategy_id,
+        Strategy.user_id == current_user.id
+    ).first()
+    
+    if not strategy:
+        raise HTTPException(status_code=404, detail="Strategy not found")
+    
+    exchange, is_testnet = market_of(strategy.exchange_account)
+    candles = candle_source.load_arrays(
+        db, strategy.symbol, strategy.timeframe,
+        start_ms=datetime_to_ms(request.start) if request.start else None,
+        end_ms=datetime_to_ms(request.end) if request.end else None,
+        exchange=exchange, is_testnet=is_testnet
+    )
+    config = BacktestConfig(
+        fee_rate=request.fee_rate,
+        slippage=request.slippage,
+        initial_capital=request.initial_capital
+    )
+    try:
+        result = backtest_engine.run(strategy, candles, config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "strategy_id": strategy.id,
+        "symbol": strategy.symbol,
+        "timeframe": strategy.timeframe,
+        "stats": result.stats,
+        "trades": result.trades
+    }
@@ -1,7 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import io
+import os
+import csv
+import json
+import base64
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Iterator, List, Optional, Tuple
 import schemas
 from database import get_db, User, Trade, Strategy, ExchangeAccount
 from auth import verify_token
@@ -9,6 +17,11 @@ from auth import verify_token
 router = APIRouter(prefix="/trades", tags=["trades"])
 security = HTTPBearer()
 
+DEFAULT_PAGE_SIZE = int(os.getenv("TRADES_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = 500
+# Rows fetched from the database per export chunk
+EXPORT_BATCH_SIZE = int(os.getenv("TRADES_EXPORT_BATCH_SIZE", "1000"))
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
     username = verify_token(credentials.credentials)
     if username is None:
@@ -22,21 +35,126 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+def encode_cursor(trade) -> str:
+    """Opaque keyset cursor: the (created_at, id) of the last trade on a page"""
+    raw = f"{trade.created_at.isoformat()}|{trade.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, trade_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(trade_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def filtered_trades(
+    user_id: int,
+    strategy_id: Optional[int] = None,
+    symbol: Optional[str] = None,
+    side: Optional[str] = None,
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """SELECT over the user's trades, newest first, with the optional filters applied"""
+    query = select(Trade).where(Trade.user_id == user_id)
+    if strategy_id:
+        query = query.where(Trade.strategy_id == strategy_id)
+    if symbol:
+        query = query.where(Trade.symbol == symbol)
+    if side:
+        query = query.where(Trade.side == side)
+    if status:
+        query = query.where(Trade.status == status)
+    if start:
+        query = query.where(Trade.created_at >= start)
+    if end:
+        query = query.where(Trade.created_at < end)
+    # (created_at, id) is unique and matches ix_trades_user_id_created_at_id
+    return query.order_by(Trade.created_at.desc(), Trade.id.desc())
+
+class TradeFilters:
+    def __init__(
+        self,
+        strategy_id: int = None,
+        symbol: Optional[str] = None,
+        side: Optional[str] = Query(None, pattern="^(buy|sell)$"),
+        status: Optional[str] = Query(None, pattern="^(pending|filled|cancelled|failed)$"),
+        start: Optional[datetime] = Query(None, description="created_at >= start (UTC)"),
+        end: Optional[datetime] = Query(None, description="created_at < end (UTC)"),
+    ):
+        self.params = dict(strategy_id=strategy_id, symbol=symbol, side=side, status=status, start=start, end=end)
+
 @router.get("", response_model=List[schemas.TradeResponse])
 async def get_trades(
-    strategy_id: int = None,
+    response: Response,
+    filters: TradeFilters = Depends(),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get user's trades, optionally filtered by strategy"""
-    query = db.query(Trade).filter(Trade.user_id == current_user.id)
-    
-    if strategy_id:
-        query = query.filter(Trade.strategy_id == strategy_id)
+    """Get one page of the user's trades, newest first.
+
+    Keyset pagination on (created_at, id): when more trades exist the response
+    carries an X-Next-Cursor header to pass back as ``cursor``.
+    """
+    query = filtered_trades(current_user.id, **filters.params)
+    if cursor:
+        query = query.where(tuple_(Trade.created_at, Trade.id) < tuple_(*decode_cursor(cursor)))
     
-    trades = query.order_by(Trade.created_at.desc()).all()
+    trades = db.execute(query.limit(limit + 1)).scalars().all()
+    if len(trades) > limit:
+        trades = trades[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(trades[-1])
     return trades
 
+EXPORT_COLUMNS = list(schemas.TradeResponse.model_fields)
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def stream_trades(bind, query, fmt: str) -> Iterator[str]:
+    """Yield the export one batch at a time; only EXPORT_BATCH_SIZE rows are held in memory"""
+    columns = [getattr(Trade, name) for name in EXPORT_COLUMNS]
+    statement = query.with_only_columns(*columns).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    # Own session: the request's session may be closed before the body is fully sent
+    with Session(bind=bind) as session:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue()
+        for batch in session.execute(statement).partitions():
+            if fmt == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([_export_value(value) for value in row] for row in batch)
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    json.dumps({name: _export_value(value) for name, value in zip(EXPORT_COLUMNS, row)}) + "\n"
+                    for row in batch
+                )
+
+@router.get("/export")
+async def export_trades(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    filters: TradeFilters = Depends(),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stream all matching trades as NDJSON or CSV, newest first"""
+    query = filtered_trades(current_user.id, **filters.params)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"trades.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        stream_trades(db.get_bind(), query, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/{trade_id}", response_model=schemas.TradeResponse)
 async def get_trade(
     trade_id: int,
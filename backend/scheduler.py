@@ -2,16 +2,40 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 import asyncio
 import logging
+import os
+import time
+from collections import deque
 from datetime import datetime
+from typing import Dict, List, Optional
 from database import SessionLocal, Strategy
 from trading_engine import strategy_engine
+from candle_fetcher import candle_coalescer
 
 logger = logging.getLogger(__name__)
 
+MONITOR_INTERVAL_SECONDS = 30
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of durations"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
 class StrategyScheduler:
-    def __init__(self):
+    def __init__(self, max_concurrency: int = None, per_account_concurrency: int = None):
         self.scheduler = AsyncIOScheduler()
         self.is_running = False
+        
+        # Bounded parallelism: global cap plus a cap per exchange account (rate limits are per account)
+        self.max_concurrency = max_concurrency or int(os.getenv('STRATEGY_MAX_CONCURRENCY', '20'))
+        self.per_account_concurrency = per_account_concurrency or int(os.getenv('STRATEGY_ACCOUNT_CONCURRENCY', '2'))
+        self._account_semaphores: Dict[int, asyncio.Semaphore] = {}
+        
+        self._tick_in_progress = False
+        self.skipped_ticks = 0
+        self.tick_stats = deque(maxlen=100)
     
     async def start(self):
         """Start the strategy scheduler"""
@@ -19,13 +43,16 @@ class StrategyScheduler:
             self.scheduler.start()
             self.is_running = True
             
-            # Add strategy monitoring job - check every 30 seconds
+            # Add strategy monitoring job - check every 30 seconds.
+            # max_instances/coalesce: an overrunning tick makes the next ones merge instead of stacking
             self.scheduler.add_job(
                 self.monitor_strategies,
-                IntervalTrigger(seconds=30),
+                IntervalTrigger(seconds=MONITOR_INTERVAL_SECONDS),
                 id="strategy_monitor",
                 name="Monitor active strategies",
-                replace_existing=True
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
             )
             
             logger.info("Strategy scheduler started")
@@ -37,39 +64,145 @@ class StrategyScheduler:
             self.is_running = False
             logger.info("Strategy scheduler stopped")
     
+    def _account_semaphore(self, account_id: int) -> asyncio.Semaphore:
+        if account_id not in self._account_semaphores:
+            self._account_semaphores[account_id] = asyncio.Semaphore(self.per_account_concurrency)
+        return self._account_semaphores[account_id]
+    
+    async def _execute_signal(self, strategy: Strategy, signal: str,
+                              global_semaphore: asyncio.Semaphore, durations: List[float]):
+        """Execute the trade for one strategy that signalled
+        
+        Each execution gets its own session: concurrent trades must not share a
+        unit of work, and one failed commit must not roll back the others.
+        """
+        async with global_semaphore, self._account_semaphore(strategy.exchange_account_id):
+            started = time.perf_counter()
+            db = SessionLocal()
+            try:
+                logger.info(f"Signal detected for strategy {strategy.id}: {signal}")
+                
+                # Execute trade
+                trade = await strategy_engine.execute_trade(strategy, signal, db)
+                
+                if trade:
+                    logger.info(f"Trade executed: {trade.id}")
+                else:
+                    logger.error(f"Failed to execute trade for strategy {strategy.id}")
+            
+            except Exception as e:
+                logger.error(f"Error monitoring strategy {strategy.id}: {e}")
+            
+            finally:
+                db.close()
+                durations.append(time.perf_counter() - started)
+    
+    def _evaluate_groups(self, groups: List, strategies_by_id: Dict[int, Strategy],
+                         eval_durations: List[float]) -> Dict[int, str]:
+        """Evaluate every strategy sharing a candle array in one batched pass per group"""
+        signals: Dict[int, str] = {}
+        for strategy_ids, ohlcv in groups:
+            members = [strategies_by_id[i] for i in strategy_ids]
+            started = time.perf_counter()
+            try:
+                group_signals = strategy_engine.evaluate_strategies(members, ohlcv)
+            except Exception as e:
+                logger.error(f"Error evaluating strategies {strategy_ids}: {e}")
+                continue
+            finally:
+                eval_durations.append(time.perf_counter() - started)
+            signals.update({i: signal for i, signal in group_signals.items() if signal})
+        return signals
+    
     async def monitor_strategies(self):
         """Monitor all active strategies and execute trades if signals are generated"""
+        if self._tick_in_progress:
+            # Never stack ticks: the running one will pick up the latest candles anyway
+            self.skipped_ticks += 1
+            logger.warning("Previous strategy monitoring tick still running, skipping this one")
+            return
+        
+        self._tick_in_progress = True
+        tick_started = time.perf_counter()
+        durations: List[float] = []
+        eval_durations: List[float] = []
+        evaluated = 0
+        signal_time = 0.0
         db = SessionLocal()
         try:
             # Get all active strategies
             active_strategies = db.query(Strategy).filter(Strategy.is_active == True).all()
             
             logger.info(f"Monitoring {len(active_strategies)} active strategies")
+            strategy_engine.prune_indicator_states({s.id for s in active_strategies})
+            active_accounts = {s.exchange_account_id for s in active_strategies}
+            for account_id in list(self._account_semaphores):
+                if account_id not in active_accounts:
+                    del self._account_semaphores[account_id]
             
+            # One OHLCV fetch per (exchange, symbol, timeframe) shared by every strategy in the group;
+            # the fetches share the global cap with trade execution
+            global_semaphore = asyncio.Semaphore(self.max_concurrency)
+            groups = await candle_coalescer.fetch_groups(active_strategies, db, global_semaphore)
+            strategies_by_id = {s.id: s for s in active_strategies}
+            served = {i for strategy_ids, _ in groups for i in strategy_ids}
             for strategy in active_strategies:
-                try:
-                    # Check for trading signal
-                    signal = await strategy_engine.check_strategy_signal(strategy, db)
-                    
-                    if signal:
-                        logger.info(f"Signal detected for strategy {strategy.id}: {signal}")
-                        
-                        # Execute trade
-                        trade = await strategy_engine.execute_trade(strategy, signal, db)
-                        
-                        if trade:
-                            logger.info(f"Trade executed: {trade.id}")
-                        else:
-                            logger.error(f"Failed to execute trade for strategy {strategy.id}")
-                
-                except Exception as e:
-                    logger.error(f"Error monitoring strategy {strategy.id}: {e}")
+                if strategy.id not in served:
+                    logger.warning(f"No candle data for strategy {strategy.id}, skipping this tick")
+            
+            # Signal CPU scales with the number of groups, not strategies
+            signal_started = time.perf_counter()
+            signals = self._evaluate_groups(groups, strategies_by_id, eval_durations)
+            signal_time = time.perf_counter() - signal_started
+            evaluated = len(served)
+            
+            await asyncio.gather(*(
+                self._execute_signal(strategies_by_id[i], signal, global_semaphore, durations)
+                for i, signal in signals.items()
+            ))
         
         except Exception as e:
             logger.error(f"Error in strategy monitoring: {e}")
         
         finally:
             db.close()
+            self._tick_in_progress = False
+            self._record_tick(time.perf_counter() - tick_started, durations, evaluated, signal_time, eval_durations)
+    
+    def _record_tick(self, wall_time: float, durations: List[float], evaluated: int = 0, signal_time: float = 0.0,
+                     eval_durations: Optional[List[float]] = None):
+        """p50/p99 cover trade execution; eval_p50/eval_p99 cover signal evaluation per candle group"""
+        eval_durations = eval_durations or []
+        stats = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'strategies_evaluated': evaluated,
+            'groups_evaluated': len(eval_durations),
+            'signal_time': signal_time,
+            'eval_p50': _percentile(eval_durations, 50),
+            'eval_p99': _percentile(eval_durations, 99),
+            'trades_executed': len(durations),
+            'wall_time': wall_time,
+            'p50': _percentile(durations, 50),
+            'p99': _percentile(durations, 99),
+            'overrun': wall_time > MONITOR_INTERVAL_SECONDS,
+        }
+        self.tick_stats.append(stats)
+        
+        log = logger.warning if stats['overrun'] else logger.info
+        log(f"Tick finished: {evaluated} strategies in {len(eval_durations)} groups evaluated in "
+            f"{signal_time * 1000:.1f}ms (group p99 {stats['eval_p99'] * 1000:.1f}ms), "
+            f"{len(durations)} trades in {wall_time:.3f}s "
+            f"(p50 {stats['p50'] * 1000:.1f}ms, p99 {stats['p99'] * 1000:.1f}ms)")
+    
+    def get_tick_stats(self) -> Dict:
+        """Timing of recent monitoring ticks"""
+        return {
+            'max_concurrency': self.max_concurrency,
+            'per_account_concurrency': self.per_account_concurrency,
+            'skipped_ticks': self.skipped_ticks,
+            'last_tick': self.tick_stats[-1] if self.tick_stats else None,
+            'recent_ticks': list(self.tick_stats),
+        }
 
 # Global scheduler instance
 scheduler = StrategyScheduler()
@@ -119,6 +119,50 @@ class StrategyResponse(StrategyBase):
     class Config:
         from_attributes = True
 
+# Backtest models
+class BacktestRequest(BaseModel):
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    fee_rate: float = 0.001
+    slippage: float = 0.0005
+    initial_capital: Optional[float] = None
+
+class BacktestTrade(BaseModel):
+    symbol: str
+    side: str
+    order_type: str
+    amount: float
+    price: float
+    filled_amount: float
+    filled_price: float
+    status: str
+    fee: float
+    profit_loss: float
+    created_at: datetime
+    filled_at: datetime
+    exit_reason: Optional[str] = None
+
+class BacktestStats(BaseModel):
+    bars: int
+    start: datetime
+    end: datetime
+    total_trades: int
+    winning_trades: int
+    win_rate: float
+    total_profit_loss: float
+    total_fees: float
+    return_percent: float
+    max_drawdown: float
+    max_drawdown_percent: float
+    sharpe_ratio: float
+
+class BacktestResponse(BaseModel):
+    strategy_id: int
+    symbol: str
+    timeframe: str
+    stats: BacktestStats
+    trades: List[BacktestTrade] = []
+
 # Trade models
 class TradeBase(BaseModel):
     symbol: str
@@ -153,6 +197,7 @@ class AccountBalance(BaseModel):
     free: float
     used: float
     total: float
+    stale: bool = False  # 未能在本次刷新中更新，显示的是上一次的快照
 
 class DashboardStats(BaseModel):
     total_strategies: int
@@ -4,6 +4,9 @@
 import logging
 from typing import Dict, List
 from okx_api_manager import OKXAPIManager
+from exchange_io import exchange_io
+from instrument_catalog import DEFAULT_SUGGESTIONS, instrument_catalog
+from ticker_cache import ticker_cache
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +16,8 @@ class SimpleRealExchangeManager:
     def __init__(self):
         self.exchanges = {}
         self.okx_managers = {}  # 存储每个用户的OKX管理器
+        self.instrument_catalog = instrument_catalog
+        self.ticker_cache = ticker_cache
         logger.info("初始化简化真实交易所管理器（支持OKX API）")
     
     def add_okx_account(self, user_id: int, api_key: str, secret_key: str, passphrase: str):
@@ -26,9 +31,9 @@ class SimpleRealExchangeManager:
             logger.error(f"添加OKX账户失败: {e}")
             return False
     
-    def get_real_ticker(self, user_id: int, exchange_name: str, 
+    async def get_real_ticker(self, user_id: int, exchange_name: str, 
                        symbol: str, is_testnet: bool = False) -> Dict:
-        """获取真实价格信息 - 集成OKX API"""
+        """获取真实价格信息 - 集成OKX API（异步，同一交易对的并发请求合并为一次上游调用）"""
         try:
             # 安全的键生成，防止None值
             user_id_str = str(user_id) if user_id is not None else "unknown"
@@ -46,10 +51,9 @@ class SimpleRealExchangeManager:
             # 如果是OKX且有对应的管理器
             if exchange_name_str.lower() in ['okx', 'okex'] and user_id in self.okx_managers:
                 try:
-                    manager = self.okx_managers[user_id]
-                    
                     logger.info(f"使用OKX symbol: {validated_symbol}")
-                    result = manager.get_ticker(validated_symbol)
+                    # 行情是公开数据：走进程级缓存，不按用户请求上游
+                    result = await self.ticker_cache.get_ticker(exchange_name_str, validated_symbol)
                     
                     if result.get('code') == '0' and result.get('data'):
                         ticker_data = result['data'][0]
@@ -75,8 +79,8 @@ class SimpleRealExchangeManager:
                         # 如果是交易对不存在，提供更友好的错误信息和建议
                         if "doesn't exist" in error_msg.lower() or "instrument" in error_msg.lower():
                             # 获取建议的交易对
-                            valid_symbols = self.get_valid_symbols(exchange_name_str)
-                            suggestions = valid_symbols[:5] if valid_symbols else ['BTC-USDT', 'ETH-USDT']
+                            await self.instrument_catalog.ensure_loaded()
+                            suggestions = self.instrument_catalog.suggest(validated_symbol)
                             
                             return {
                                 "success": False,
@@ -136,7 +140,7 @@ class SimpleRealExchangeManager:
                     manager = self.okx_managers[user_id]
                     
                     # 使用带重试机制的余额获取方法
-                    result = manager.get_balance_with_retry()
+                    result = await exchange_io.run(manager.get_balance_with_retry)
                     
                     if result.get('code') == '0' and result.get('data'):
                         balance_data = result['data'][0]['details'] if result['data'] else []
@@ -409,7 +413,7 @@ class SimpleRealExchangeManager:
                 "data": None
             }
     
-    def get_valid_symbols(self, exchange_name: str) -> List[str]:
+    async def get_valid_symbols(self, exchange_name: str) -> List[str]:
         """获取交易所支持的有效交易对列表"""
         try:
             exchange_name = exchange_name.lower()
@@ -417,20 +421,13 @@ class SimpleRealExchangeManager:
             if exchange_name in ['okx', 'okex']:
                 # 获取OKX支持的现货交易对
                 try:
-                    import requests
-                    response = requests.get('https://www.okx.com/api/v5/public/instruments?instType=SPOT', 
-                                          proxies={"http": None, "https": None}, timeout=10)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        if data.get('code') == '0' and data.get('data'):
-                            symbols = [inst['instId'] for inst in data['data']]
-                            logger.info(f"获取到 {len(symbols)} 个OKX现货交易对")
-                            return symbols
+                    # 目录常驻内存并在后台刷新，只有冷启动且没有磁盘缓存时才等待下载
+                    if await self.instrument_catalog.ensure_loaded():
+                        return self.instrument_catalog.symbols()
                     
                     # 如果API调用失败，返回常用交易对
                     logger.warning("获取OKX交易对列表失败，使用默认列表")
-                    return ['BTC-USDT', 'ETH-USDT', 'BTC-USD', 'ETH-USD', 'SOL-USDT', 'ADA-USDT']
+                    return list(DEFAULT_SUGGESTIONS)
                     
                 except Exception as e:
                     logger.error(f"获取OKX交易对失败: {e}")
@@ -463,6 +460,11 @@ class SimpleRealExchangeManager:
             symbol = symbol.strip().upper()
             
             if exchange_name in ['okx', 'okex']:
+                # 目录已加载时直接查索引（BTC/USDT、BTCUSDT、BTC_USDT → BTC-USDT）
+                inst_id = self.instrument_catalog.normalize(symbol)
+                if inst_id:
+                    return inst_id
+                
                 # OKX格式: BTC-USDT
                 if '/' in symbol:
                     # 从 BTC/USDT 转换为 BTC-USDT
@@ -0,0 +1,58 @@
+"""
+请求合并（single-flight）
+同一个 key 同时只有一个上游调用在进行，期间到达的请求等待同一个结果；
+调用结束后立即移除，下一次请求重新发起
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """按 key 合并并发的异步调用"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {
+            'calls': 0,
+            'executions': 0,
+            'shared': 0,
+        }
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待者都被取消时，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """执行 func() 或等待同一 key 上正在进行的调用
+
+        上游调用在独立任务中运行，单个等待者被取消不会影响其他等待者
+        """
+        self.stats['calls'] += 1
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            self.stats['executions'] += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        else:
+            self.stats['shared'] += 1
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def pending(self, key: Hashable) -> bool:
+        """该 key 是否有正在进行的调用"""
+        task = self._inflight.get(key)
+        return task is not None and not task.done()
+
+    def get_stats(self) -> dict:
+        return {**self.stats, 'in_flight': self.in_flight()}
@@ -0,0 +1,211 @@
+"""
+策略插件注册表
+每种 strategy_type 声明所需K线深度和指标，并提供一个基于 numpy 数组的纯信号函数；
+同一 (交易对, 周期) 上的多个策略可以共用一次指标计算。
+引擎在策略激活时解析一次插件，之后每个 tick 直接使用，不再查表
+"""
+import logging
+import numpy as np
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Sequence
+import indicators
+
+logger = logging.getLogger(__name__)
+
+
+class IndicatorKey(NamedTuple):
+    """指标标识：kind 为 'mean' / 'std' / 'ema'，period 为窗口长度"""
+    kind: str
+    period: int
+
+
+# 信号函数: (K线列, 指标, 策略) -> 与K线对齐的 int8 数组，1 = buy, -1 = sell, 0 = 无信号
+SignalFunction = Callable[[Mapping[str, np.ndarray], Mapping[IndicatorKey, np.ndarray], object], np.ndarray]
+
+SIGNAL_NAMES = {1: "buy", -1: "sell"}
+
+
+@dataclass(frozen=True)
+class StrategyPlugin:
+    """一种策略类型的定义"""
+    strategy_type: str
+    required_indicators: Callable[[object], FrozenSet[IndicatorKey]]
+    candle_depth: Callable[[object], int]
+    signal: SignalFunction
+    # 可选：基于 IncrementalIndicatorState 快照的 O(1) 实时信号
+    incremental_signal: Optional[Callable[[object], Optional[str]]] = None
+    # 可选：(收盘价, 同一K线上的多个策略) -> 每个策略在最后一根K线上的信号（int8 数组）
+    batch_signal: Optional[Callable[[np.ndarray, Sequence], np.ndarray]] = None
+
+    def warmup(self, strategy) -> int:
+        """所有指标都有值之前的K线数"""
+        return max((key.period for key in self.required_indicators(strategy)), default=1) - 1
+
+
+_registry: Dict[str, StrategyPlugin] = {}
+
+
+def register_strategy(plugin: StrategyPlugin) -> StrategyPlugin:
+    """注册策略插件，同名插件会被覆盖"""
+    if plugin.strategy_type in _registry:
+        logger.warning(f"覆盖已注册的策略类型: {plugin.strategy_type}")
+    _registry[plugin.strategy_type] = plugin
+    return plugin
+
+
+def get_strategy_plugin(strategy_type: str) -> StrategyPlugin:
+    """按类型查找插件，未注册时抛出 ValueError"""
+    plugin = _registry.get(strategy_type)
+    if plugin is None:
+        raise ValueError(f"未注册的策略类型: {strategy_type}")
+    return plugin
+
+
+def registered_strategy_types() -> List[str]:
+    return sorted(_registry)
+
+
+def _align(values: np.ndarray, n: int) -> np.ndarray:
+    """将 'valid' 长度的指标数组前补 NaN，使下标与K线对齐"""
+    aligned = np.full(n, np.nan)
+    if len(values):
+        aligned[n - len(values):] = values
+    return aligned
+
+
+def compute_indicators(close: np.ndarray, keys: Iterable[IndicatorKey]) -> Dict[IndicatorKey, np.ndarray]:
+    """一次性计算一组指标，结果与K线对齐（前 period-1 个为 NaN）
+
+    同周期的 mean 和 std 共用一次滚动累加
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    keys = set(keys)
+    result: Dict[IndicatorKey, np.ndarray] = {}
+
+    for period in sorted({key.period for key in keys if key.kind in ('mean', 'std')}):
+        mean_key, std_key = IndicatorKey('mean', period), IndicatorKey('std', period)
+        if std_key in keys:
+            mean, variance = indicators.rolling_mean_var(close, period)
+            result[std_key] = _align(np.sqrt(variance), n)
+            if mean_key in keys:
+                result[mean_key] = _align(mean, n)
+        else:
+            result[mean_key] = _align(indicators.sma(close, period), n)
+
+    for key in keys:
+        if key.kind == 'ema':
+            result[key] = _align(indicators.ema(close, key.period), n)
+        elif key.kind not in ('mean', 'std'):
+            raise ValueError(f"未知的指标类型: {key.kind}")
+
+    return result
+
+
+def latest_signal(plugin: StrategyPlugin, candles: Mapping[str, np.ndarray],
+                  values: Mapping[IndicatorKey, np.ndarray], strategy) -> Optional[str]:
+    """最后一根K线上的信号"""
+    if len(candles['close']) <= plugin.warmup(strategy):
+        return None
+    signals = plugin.signal(candles, values, strategy)
+    return SIGNAL_NAMES.get(int(signals[-1]))
+
+
+# ---------------------------------------------------------------------------
+# 内置策略：5分钟布林带 + MA60
+# ---------------------------------------------------------------------------
+
+def boll_ma_signal(price: float, bb_upper: float, bb_lower: float, ma: float) -> Optional[str]:
+    """布林带 + 均线入场规则（全量计算和增量快照共用）"""
+    if price <= bb_lower and price > ma:
+        return "buy"
+    elif price >= bb_upper:
+        return "sell"
+
+    return None
+
+
+def boll_ma_signals(prices: np.ndarray, bb_upper: np.ndarray, bb_lower: np.ndarray, ma: np.ndarray) -> np.ndarray:
+    """boll_ma_signal 的向量化版本：1 = buy, -1 = sell, 0 = 无信号（NaN 不产生信号）"""
+    buy = (prices <= bb_lower) & (prices > ma)
+    sell = ~buy & (prices >= bb_upper)
+    return buy.astype(np.int8) - sell.astype(np.int8)
+
+
+def boll_ma_batch_signals(close: np.ndarray, bb_periods: Sequence[int], bb_deviations: Sequence[float],
+                          ma_periods: Sequence[int]) -> np.ndarray:
+    """多组参数在最后一根K线上的信号，一次向量化计算
+
+    最近 max(period) 根收盘价以最新价格为中心做一次 cumsum / cumsq，
+    每组参数的窗口和只是两个前缀和之差，耗时与参数组数基本无关
+    """
+    close = np.asarray(close, dtype=np.float64)
+    bb_periods = np.asarray(bb_periods, dtype=np.int64)
+    bb_deviations = np.asarray(bb_deviations, dtype=np.float64)
+    ma_periods = np.asarray(ma_periods, dtype=np.int64)
+    n = len(close)
+    if n == 0 or len(bb_periods) == 0:
+        return np.zeros(len(bb_periods), dtype=np.int8)
+
+    length = int(min(n, max(bb_periods.max(), ma_periods.max())))
+    price = close[-1]
+    shifted = close[n - length:] - price
+    cumsum = np.concatenate(([0.0], np.cumsum(shifted)))
+    cumsq = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+
+    # 历史不足的参数组先按可用长度计算，最后统一置为无信号
+    ready = np.maximum(bb_periods, ma_periods) <= n
+    bb = np.minimum(bb_periods, length)
+    ma_p = np.minimum(ma_periods, length)
+
+    bb_mean = (cumsum[length] - cumsum[length - bb]) / bb
+    bb_var = (cumsq[length] - cumsq[length - bb]) / bb - bb_mean * bb_mean
+    width = np.sqrt(np.maximum(bb_var, 0.0)) * bb_deviations
+    middle = bb_mean + price
+    ma = (cumsum[length] - cumsum[length - ma_p]) / ma_p + price
+
+    signals = boll_ma_signals(np.full(len(bb), price), middle + width, middle - width, ma)
+    signals[~ready] = 0
+    return signals
+
+
+def _boll_ma_indicators(strategy) -> FrozenSet[IndicatorKey]:
+    return frozenset({
+        IndicatorKey('mean', strategy.bb_period),
+        IndicatorKey('std', strategy.bb_period),
+        IndicatorKey('mean', strategy.ma_period),
+    })
+
+
+def _boll_ma_signal_array(candles, values, strategy) -> np.ndarray:
+    close = candles['close']
+    middle = values[IndicatorKey('mean', strategy.bb_period)]
+    width = values[IndicatorKey('std', strategy.bb_period)] * strategy.bb_deviation
+    ma = values[IndicatorKey('mean', strategy.ma_period)]
+    signals = boll_ma_signals(close, middle + width, middle - width, ma)
+    # 只在布林带和均线都有值时判断信号
+    signals[:max(strategy.bb_period, strategy.ma_period) - 1] = 0
+    return signals
+
+
+def _boll_ma_snapshot_signal(snapshot) -> Optional[str]:
+    return boll_ma_signal(snapshot.price, snapshot.bb_upper, snapshot.bb_lower, snapshot.ma)
+
+
+def _boll_ma_batch_signal(close: np.ndarray, strategies: Sequence) -> np.ndarray:
+    return boll_ma_batch_signals(
+        close,
+        [s.bb_period for s in strategies],
+        [s.bb_deviation for s in strategies],
+        [s.ma_period for s in strategies],
+    )
+
+
+register_strategy(StrategyPlugin(
+    strategy_type='5m_boll_ma60',
+    required_indicators=_boll_ma_indicators,
+    candle_depth=lambda strategy: max(strategy.bb_period, strategy.ma_period) + 10,
+    signal=_boll_ma_signal_array,
+    incremental_signal=_boll_ma_snapshot_signal,
+    batch_signal=_boll_ma_batch_signal,
+))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+回测引擎测试
+验证向量化信号与实盘 _check_boll_ma_strategy 逐根一致、止损止盈成交、统计指标和回测耗时
+"""
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+from backtest_engine import BacktestEngine, BacktestConfig, compute_signals
+from benchmark_indicators import generate_prices
+from indicator_state import timeframe_to_ms
+from trading_engine import StrategyEngine
+
+TF = '5m'
+TF_MS = timeframe_to_ms(TF)
+START = 1_700_000_000_000 - 1_700_000_000_000 % TF_MS
+BARS_PER_YEAR = 365 * 24 * 12
+
+
+class FakeStrategy:
+    def __init__(self, stop_loss_percent=None, take_profit_percent=None):
+        self.id = 1
+        self.symbol = 'BTC/USDT'
+        self.timeframe = TF
+        self.strategy_type = '5m_boll_ma60'
+        self.entry_amount = 0.01
+        self.bb_period = 20
+        self.bb_deviation = 2.0
+        self.ma_period = 60
+        self.stop_loss_percent = stop_loss_percent
+        self.take_profit_percent = take_profit_percent
+
+
+def make_candles(n, seed=42):
+    close = generate_prices(n, seed=seed)
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = np.abs(close - open_) + close * 0.001
+    return {
+        'timestamp': START + np.arange(n, dtype=np.int64) * TF_MS,
+        'open': open_,
+        'high': np.maximum(open_, close) + spread * 0.5,
+        'low': np.minimum(open_, close) - spread * 0.5,
+        'close': close,
+        'volume': np.full(n, 10.0),
+    }
+
+
+def test_signals_match_live_strategy():
+    """抽样K线上的向量化信号与 StrategyEngine._check_boll_ma_strategy 一致"""
+    candles = make_candles(3000)
+    strategy = FakeStrategy()
+    signals = compute_signals(strategy, candles)
+
+    engine = StrategyEngine(None)
+    rng = np.random.default_rng(0)
+    bars = set(rng.integers(strategy.ma_period, len(signals), 150).tolist())
+    bars |= set(np.flatnonzero(signals != 0)[:100].tolist())
+    expected_map = {'buy': 1, 'sell': -1, None: 0}
+    for i in sorted(bars):
+        df = pd.DataFrame({'close': candles['close'][:i + 1]})
+        live = asyncio.run(engine._check_boll_ma_strategy(df, strategy))
+        assert signals[i] == expected_map[live], f"bar {i}: {signals[i]} != {live}"
+
+
+def test_fills_and_stats():
+    """下一根开盘价成交、手续费和收益统计自洽"""
+    candles = make_candles(5000)
+    config = BacktestConfig(fee_rate=0.001, slippage=0.0005)
+    result = BacktestEngine().run(FakeStrategy(), candles, config)
+    stats = result.stats
+
+    assert stats['total_trades'] > 0
+    assert len(result.trades) == 2 * stats['total_trades']
+    buys = result.trades[0::2]
+    sells = result.trades[1::2]
+    assert all(t['side'] == 'buy' for t in buys) and all(t['side'] == 'sell' for t in sells)
+    assert all(b['created_at'] <= s['created_at'] for b, s in zip(buys, sells))
+
+    realized = sum(t['profit_loss'] for t in sells)
+    assert abs(realized - stats['total_profit_loss']) < 1e-9
+    assert abs(sum(t['fee'] for t in result.trades) - stats['total_fees']) < 1e-9
+    assert 0.0 <= stats['win_rate'] <= 1.0
+    assert stats['max_drawdown'] >= 0.0
+    assert len(result.equity_curve) == len(candles['close'])
+
+
+def test_stop_loss_and_take_profit():
+    """止损/止盈在持仓K线内按最低/最高价触发，成交价不优于触发价"""
+    candles = make_candles(5000)
+    result = BacktestEngine().run(FakeStrategy(stop_loss_percent=0.5, take_profit_percent=0.5),
+                                  candles, BacktestConfig(fee_rate=0.0, slippage=0.0))
+    reasons = {t['exit_reason'] for t in result.trades[1::2]}
+    assert reasons & {'stop_loss', 'take_profit'}
+
+    for buy, sell in zip(result.trades[0::2], result.trades[1::2]):
+        change = (sell['price'] - buy['price']) / buy['price'] * 100
+        if sell['exit_reason'] == 'stop_loss':
+            assert change <= -0.5 + 1e-9
+        elif sell['exit_reason'] == 'take_profit':
+            assert change >= 0.5 - 1e-9
+
+
+def test_insufficient_history():
+    candles = make_candles(30)
+    try:
+        BacktestEngine().run(FakeStrategy(), candles)
+    except ValueError:
+        return
+    assert False, "K线不足时应抛出 ValueError"
+
+
+def test_year_of_5m_bars_under_one_second():
+    """一年5分钟K线（约10.5万根）单策略回测远低于1秒"""
+    candles = make_candles(BARS_PER_YEAR)
+    engine = BacktestEngine()
+    started = time.perf_counter()
+    result = engine.run(FakeStrategy(stop_loss_percent=2.0, take_profit_percent=3.0), candles)
+    elapsed = time.perf_counter() - started
+
+    assert result.stats['bars'] == BARS_PER_YEAR
+    assert elapsed < 1.0, f"回测耗时 {elapsed:.3f}s"
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
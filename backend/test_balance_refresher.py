@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+后台余额刷新测试
+验证快照存储（进程内 / Redis 退回）、并发刷新与限速预留、失败保留旧快照、
+多 worker 锁、仪表盘只读缓存不访问交易所、手动刷新的并发与截止时间，以及数据库出错时的降级响应
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+from async_balance_service import AsyncBalanceService, BalanceRefresher
+from balance_store import FallbackBalanceStore, MemoryBalanceStore, RedisBalanceStore
+from rate_limiter import EndpointLimit, RateLimiter
+
+
+def account(account_id):
+    return SimpleNamespace(id=account_id, exchange_name='okex', is_active=True)
+
+
+class FakeFetcher:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.fail = set()
+
+    async def __call__(self, acc):
+        self.calls.append(acc.id)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if acc.id in self.fail:
+                raise ConnectionError("exchange down")
+            return [{'currency': 'USDT', 'free': 100.0 + acc.id, 'used': 0.0, 'total': 100.0 + acc.id}]
+        finally:
+            self.active -= 1
+
+
+def test_memory_store_ttl_and_lock():
+    now = [1000.0]
+    store = MemoryBalanceStore(clock=lambda: now[0])
+
+    async def run():
+        await store.set(1, {'balances': []}, ttl=10)
+        fresh = await store.get_many([1, 2])
+        first, second = await store.acquire_lock('x', 5), await store.acquire_lock('x', 5)
+        now[0] += 11
+        return fresh, await store.get_many([1]), first, second, await store.acquire_lock('x', 5)
+
+    fresh, expired, first, second, later = asyncio.run(run())
+    assert list(fresh) == [1] and expired == {}
+    assert first and not second and later
+
+
+def test_unreachable_redis_falls_back_to_memory():
+    store = FallbackBalanceStore(RedisBalanceStore('redis://127.0.0.1:1/0'), MemoryBalanceStore(),
+                                 retry_interval=60)
+
+    async def run():
+        await store.set(1, {'balances': [], 'error': None}, ttl=60)
+        snapshots = await store.get_many([1])
+        lock = await store.acquire_lock('balance-refresh', 10)
+        await store.close()
+        return snapshots, lock
+
+    snapshots, lock = asyncio.run(run())
+    assert 1 in snapshots and lock
+    # 第一次失败后在重试间隔内不再访问 Redis
+    assert store.stats['primary_errors'] == 1 and not store.primary_available
+
+
+def test_refresh_all_is_concurrent_and_bounded():
+    fetcher = FakeFetcher(delay=0.05)
+    store = MemoryBalanceStore()
+    refresher = BalanceRefresher(store, fetcher, concurrency=10, limiter=None)
+
+    started = time.monotonic()
+    refreshed = asyncio.run(refresher.refresh_all([account(i) for i in range(30)]))
+    elapsed = time.monotonic() - started
+
+    assert refreshed == 30 and sorted(fetcher.calls) == list(range(30))
+    assert fetcher.peak == 10
+    # 3 批 × 0.05 秒，而不是串行的 1.5 秒
+    assert elapsed < 0.6
+    snapshots = asyncio.run(store.get_many([5]))
+    assert snapshots[5]['balances'][0]['total'] == 105.0
+
+
+def test_accounts_below_rate_reserve_are_skipped():
+    limiter = RateLimiter({'account/balance': EndpointLimit(10, 100.0)})
+    fetcher = FakeFetcher()
+    refresher = BalanceRefresher(MemoryBalanceStore(), fetcher, limiter=limiter, reserve=0.5)
+
+    async def run():
+        # 账户 1 已用掉 6 个令牌，低于 50% 预留线
+        for _ in range(6):
+            await limiter.acquire(1, 'account/balance')
+        return await refresher.refresh_all([account(1), account(2)])
+
+    assert asyncio.run(run()) == 1
+    assert fetcher.calls == [2]
+    assert refresher.stats['skipped_rate_budget'] == 1
+
+
+def test_failure_keeps_previous_snapshot():
+    fetcher = FakeFetcher()
+    store = MemoryBalanceStore()
+    refresher = BalanceRefresher(store, fetcher, limiter=None)
+
+    async def run():
+        await refresher.refresh_account(account(1))
+        fetcher.fail.add(1)
+        fetcher.fail.add(2)
+        kept = await refresher.refresh_account(account(1))
+        empty = await refresher.refresh_account(account(2))
+        return kept, empty
+
+    kept, empty = asyncio.run(run())
+    assert kept['balances'][0]['total'] == 101.0 and kept['error'] == 'exchange down'
+    assert empty['balances'] == [] and empty['error'] == 'exchange down'
+    assert refresher.stats['errors'] == 2
+
+
+def test_unreachable_okx_keeps_real_snapshot():
+    """OKX 不可达时 ExchangeManager 会退回模拟交易所，刷新器不能把模拟余额当成真实快照"""
+    import okx_auth_fixer
+    import trading_engine
+    from async_balance_service import fetch_account_balance
+
+    async def auth_failure(self):
+        return {'success': False, 'message': 'network unreachable'}
+
+    manager = trading_engine.ExchangeManager()
+    manager.connectivity = SimpleNamespace(is_reachable=lambda: False)
+    original_manager, original_fetch = trading_engine.exchange_manager, okx_auth_fixer.OKXAuthFixer.get_balance_async
+    trading_engine.exchange_manager = manager
+    okx_auth_fixer.OKXAuthFixer.get_balance_async = auth_failure
+    store = MemoryBalanceStore()
+    refresher = BalanceRefresher(store, fetch_account_balance, limiter=None)
+    acc = SimpleNamespace(id=1, exchange_name='okex', api_key='k', api_secret='s', api_passphrase='p',
+                          is_testnet=False, is_active=True)
+
+    async def run():
+        await store.set(1, {'account_id': 1, 'balances': [{'currency': 'USDT', 'free': 5.0, 'used': 0.0,
+                                                            'total': 5.0}], 'error': None}, ttl=60)
+        snapshot = await refresher.refresh_account(acc)
+        await manager.close()
+        return snapshot
+
+    try:
+        snapshot = asyncio.run(run())
+    finally:
+        trading_engine.exchange_manager = original_manager
+        okx_auth_fixer.OKXAuthFixer.get_balance_async = original_fetch
+    assert snapshot['balances'] == [{'currency': 'USDT', 'free': 5.0, 'used': 0.0, 'total': 5.0}]
+    assert 'unreachable' in snapshot['error']
+
+
+def test_only_lock_holder_refreshes():
+    store = MemoryBalanceStore()
+    fetchers = [FakeFetcher(), FakeFetcher()]
+    refreshers = [BalanceRefresher(store, fetcher, load_accounts=lambda: [account(1)], interval=10, limiter=None)
+                  for fetcher in fetchers]
+
+    async def run():
+        for refresher in refreshers:
+            await refresher.start()
+        await asyncio.sleep(0.05)
+        for refresher in refreshers:
+            await refresher.stop()
+
+    asyncio.run(run())
+    assert sorted(len(fetcher.calls) for fetcher in fetchers) == [0, 1]
+    assert sum(refresher.stats['rounds_skipped'] for refresher in refreshers) == 1
+
+
+def test_dashboard_reads_snapshots_without_exchange_calls():
+    fetcher = FakeFetcher()
+
+    class CountingStore(MemoryBalanceStore):
+        reads = 0
+
+        async def get_many(self, account_ids):
+            type(self).reads += 1
+            return await super().get_many(account_ids)
+
+    store = CountingStore()
+    refresher = BalanceRefresher(store, fetcher, limiter=None)
+    service = AsyncBalanceService(store, refresher)
+    accounts = [account(i) for i in range(1, 4)]
+
+    async def run():
+        before = await service.get_balances_fast(accounts)
+        await refresher.refresh_all(accounts[:2])
+        calls = len(fetcher.calls)
+        after = await service.get_balances_fast(accounts)
+        return before, calls, after
+
+    before, calls, after = asyncio.run(run())
+    assert [b.currency for b in before] == ["点击刷新获取余额"] * 3
+    assert calls == 2 and len(fetcher.calls) == 2
+    assert [(b.currency, b.total) for b in after] == [('USDT', 101.0), ('USDT', 102.0), ("点击刷新获取余额", 0.0)]
+    # 每次仪表盘请求只读一次缓存（Redis 下为一次 MGET）
+    assert CountingStore.reads == 2
+
+
+def test_refresh_balances_meets_deadline_with_stale_results():
+    """慢账户超过截止时间时返回旧快照并标记 stale，其余账户并发完成"""
+    class MixedFetcher(FakeFetcher):
+        async def __call__(self, acc):
+            self.delay = 1.0 if acc.id == 3 else 0.05
+            return await super().__call__(acc)
+
+    fetcher = MixedFetcher()
+    store = MemoryBalanceStore()
+    refresher = BalanceRefresher(store, fetcher, limiter=None)
+    service = AsyncBalanceService(store, refresher)
+    accounts = [account(i) for i in range(1, 5)]
+    fetcher.fail.add(4)
+
+    async def run():
+        await store.set(3, {'account_id': 3, 'balances': [{'currency': 'BTC', 'free': 1.0, 'used': 0.0,
+                                                            'total': 1.0}], 'error': None}, ttl=60)
+        started = time.monotonic()
+        balances = await service.refresh_balances(accounts, deadline=0.2)
+        elapsed = time.monotonic() - started
+        # 超时的刷新在后台完成并写入缓存
+        await asyncio.sleep(1.0)
+        return balances, elapsed, await store.get_many([3])
+
+    balances, elapsed, later = asyncio.run(run())
+    assert 0.2 <= elapsed < 0.5
+    assert [(b.currency, b.total, b.stale) for b in balances] == [
+        ('USDT', 101.0, False), ('USDT', 102.0, False), ('BTC', 1.0, True), ("获取失败", 0.0, True)]
+    assert later[3]['balances'][0]['total'] == 103.0
+
+
+def test_hybrid_refresh_queries_accounts_once():
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from database import Base, ExchangeAccount, User
+    import hybrid_dashboard_service
+    from hybrid_dashboard_service import HybridDashboardService
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = User(username="u", email="u@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    for _ in range(10):
+        db.add(ExchangeAccount(user_id=user.id, exchange_name="okex", api_key="k", api_secret="s"))
+    db.commit()
+
+    account_queries = []
+    event.listen(engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: account_queries.append(statement)
+                 if 'FROM exchange_accounts' in statement else None)
+
+    fetcher = FakeFetcher(delay=0.05)
+    store = MemoryBalanceStore()
+    original = hybrid_dashboard_service.async_balance_service
+    hybrid_dashboard_service.async_balance_service = AsyncBalanceService(
+        store, BalanceRefresher(store, fetcher, limiter=None))
+    try:
+        started = time.monotonic()
+        stats = asyncio.run(HybridDashboardService.refresh_balances_async(user.id, db, deadline=2.0))
+        elapsed = time.monotonic() - started
+    finally:
+        hybrid_dashboard_service.async_balance_service = original
+        db.close()
+
+    assert len(stats.account_balances) == 10 and not any(b.stale for b in stats.account_balances)
+    # 10 个账户并发刷新，而不是 10 × 0.05 秒串行
+    assert elapsed < 0.4
+    assert len(account_queries) == 1
+
+
+def test_hybrid_refresh_degrades_on_database_error():
+    """查询账户时数据库出错，返回空统计而不是抛出 500"""
+    from sqlalchemy.exc import OperationalError
+    from hybrid_dashboard_service import HybridDashboardService
+
+    def broken(*args, **kwargs):
+        raise OperationalError("SELECT", {}, Exception("database is locked"))
+
+    db = SimpleNamespace(query=broken, execute=broken)
+    stats = asyncio.run(HybridDashboardService.refresh_balances_async(1, db))
+    assert stats.account_balances == [] and stats.total_trades == 0
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+K线请求合并器测试
+200 个策略监控同一交易对时，每个tick只应请求一次交易所；
+模拟盘的组不读取也不播种 WebSocket 实盘K线缓冲区；
+每组使用独立会话，一组写入失败不影响其他组；并发拉取的组数受信号量限制
+"""
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base, User, ExchangeAccount, MarketData, Strategy
+from candle_fetcher import CandleFetchCoalescer
+from candle_store import CandleStore
+from trading_engine import StrategyEngine
+
+
+class CountingExchangeManager:
+    def __init__(self):
+        self.calls = []
+
+    async def get_ohlcv(self, exchange_account, symbol, timeframe, limit=100):
+        self.calls.append((symbol, timeframe, limit))
+        return [[i * 300_000, 100.0, 100.0, 100.0, 100.0 + i % 7, 1.0] for i in range(limit)]
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def seed(db, n_users=200):
+    strategies = []
+    for i in range(n_users):
+        user = User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        account = ExchangeAccount(user_id=user.id, exchange_name="okex", api_key="k", api_secret="s")
+        db.add(account)
+        db.flush()
+        strategy = Strategy(
+            user_id=user.id, exchange_account_id=account.id, name=f"s{i}",
+            strategy_type="5m_boll_ma60", symbol="BTC/USDT", timeframe="5m",
+            entry_amount=1.0, bb_period=20, bb_deviation=2.0,
+            ma_period=60 if i % 2 else 120, is_active=True,
+        )
+        db.add(strategy)
+        strategies.append(strategy)
+    db.commit()
+    return strategies
+
+
+def test_same_symbol_fetched_once_with_deepest_limit():
+    """同一交易对/周期只请求一次，深度取组内最大值"""
+    db = make_session()
+    strategies = seed(db)
+    manager = CountingExchangeManager()
+    coalescer = CandleFetchCoalescer(manager, StrategyEngine(manager))
+
+    candles = asyncio.run(coalescer.fetch_for_strategies(strategies, db))
+
+    assert len(manager.calls) == 1
+    assert manager.calls[0] == ("BTC/USDT", "5m", 130)
+    assert len(candles) == len(strategies)
+    assert candles[strategies[0].id] is candles[strategies[-1].id]
+
+
+def test_different_timeframes_are_separate_groups():
+    """不同周期分别请求"""
+    db = make_session()
+    strategies = seed(db, n_users=4)
+    strategies[0].timeframe = "15m"
+    db.commit()
+    manager = CountingExchangeManager()
+    coalescer = CandleFetchCoalescer(manager, StrategyEngine(manager))
+
+    asyncio.run(coalescer.fetch_for_strategies(strategies, db))
+    assert sorted(call[1] for call in manager.calls) == ["15m", "5m"]
+
+
+def test_failed_group_is_omitted():
+    """请求失败的组不返回数据，由调度器跳过"""
+
+    class FailingExchangeManager(CountingExchangeManager):
+        async def get_ohlcv(self, *args, **kwargs):
+            raise Exception("network down")
+
+    db = make_session()
+    strategies = seed(db, n_users=3)
+    manager = FailingExchangeManager()
+    coalescer = CandleFetchCoalescer(manager, StrategyEngine(manager))
+
+    assert asyncio.run(coalescer.fetch_for_strategies(strategies, db)) == {}
+    assert coalescer.get_stats()['failed_fetches'] == 1
+
+
+def test_testnet_group_never_touches_live_buffer():
+    """WebSocket 缓冲区只有 OKX 实盘K线：模拟盘组走 REST，结果也不写入实盘缓冲区"""
+
+    class LiveBuffer:
+        def __init__(self):
+            self.reads, self.seeds = [], []
+
+        def get_candles(self, symbol, timeframe, limit):
+            self.reads.append(symbol)
+            return [[0, 1.0, 1.0, 1.0, 1.0, 1.0]] * limit
+
+        def seed_candles(self, symbol, timeframe, ohlcv):
+            self.seeds.append(symbol)
+
+    manager = CountingExchangeManager()
+    live = LiveBuffer()
+    coalescer = CandleFetchCoalescer(manager, StrategyEngine(manager), None, live)
+    group = {'account': SimpleNamespace(exchange_name='okx', is_testnet=True), 'limit': 5, 'strategy_ids': [1]}
+
+    candles = asyncio.run(coalescer._fetch_group(('okex', True, 'BTC/USDT', '5m'), group))
+    assert len(manager.calls) == 1 and len(candles) == 5
+    assert live.reads == [] and live.seeds == []
+
+    group['account'] = SimpleNamespace(exchange_name='binance', is_testnet=False)
+    asyncio.run(coalescer._fetch_group(('binance', False, 'BTC/USDT', '5m'), group))
+    assert live.reads == [] and live.seeds == []
+
+    group['account'] = SimpleNamespace(exchange_name='okx', is_testnet=False)
+    asyncio.run(coalescer._fetch_group(('okex', False, 'BTC/USDT', '5m'), group))
+    assert live.reads == ['BTC/USDT'] and coalescer.get_stats()['live_hits'] == 1
+
+
+def test_failed_group_upsert_does_not_break_other_groups():
+    """一组K线写库失败时回滚自己的会话，其他组照常返回并写入"""
+
+    class SinceExchangeManager:
+        async def get_ohlcv(self, exchange_account, symbol, timeframe, limit=100, since=None):
+            return [[since + i * 300_000, 1.0, 1.0, 1.0, 1.0, 1.0] for i in range(limit)]
+
+    class FlakyStore(CandleStore):
+        def upsert_candles(self, db, symbol, timeframe, ohlcv, **market):
+            if symbol == 'ETH/USDT':
+                db.add(MarketData(symbol=symbol, timeframe=timeframe))  # 缺少必填列，flush 时失败
+                db.flush()
+            return super().upsert_candles(db, symbol, timeframe, ohlcv, **market)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'candles.db')}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+        db = session_factory()
+        strategies = seed(db, n_users=3)
+        for strategy, symbol in zip(strategies, ('BTC/USDT', 'ETH/USDT', 'SOL/USDT')):
+            strategy.symbol = symbol
+        db.commit()
+
+        manager = SinceExchangeManager()
+        coalescer = CandleFetchCoalescer(manager, StrategyEngine(manager), FlakyStore(manager),
+                                         session_factory=session_factory)
+        candles = asyncio.run(coalescer.fetch_for_strategies(strategies, db))
+
+        assert set(candles) == {strategies[0].id, strategies[2].id}
+        assert all(len(ohlcv) == 130 for ohlcv in candles.values())
+        assert coalescer.get_stats()['failed_fetches'] == 1
+        # tick 的会话没有被组内写入牵连
+        assert db.query(MarketData).filter(MarketData.symbol == 'SOL/USDT').count() == 130
+        assert db.query(MarketData).filter(MarketData.symbol == 'ETH/USDT').count() == 0
+        db.close()
+        engine.dispose()
+
+
+def test_group_fetches_are_bounded_by_semaphore():
+    """几十个交易对同时拉取时，在途请求不超过信号量上限"""
+
+    class SlowExchangeManager(CountingExchangeManager):
+        def __init__(self):
+            super().__init__()
+            self.in_flight = self.peak = 0
+
+        async def get_ohlcv(self, exchange_account, symbol, timeframe, limit=100):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            return await super().get_ohlcv(exchange_account, symbol, timeframe, limit)
+
+    db = make_session()
+    strategies = seed(db, n_users=30)
+    for i, strategy in enumerate(strategies):
+        strategy.symbol = f"COIN{i}/USDT"
+    db.commit()
+    manager = SlowExchangeManager()
+    coalescer = CandleFetchCoalescer(manager, StrategyEngine(manager))
+
+    async def run():
+        return await coalescer.fetch_for_strategies(strategies, db, asyncio.Semaphore(4))
+
+    candles = asyncio.run(run())
+    assert len(candles) == 30 and len(manager.calls) == 30
+    assert manager.peak == 4
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+本地K线存储测试
+验证时间戳换算（含带时区的输入）、upsert 去重与失败回滚、缺口检测、只补齐缺失尾部的增量同步，
+模拟盘与实盘K线互不覆盖，以及交易所永久缺失的K线不会每次重新回补
+"""
+import asyncio
+from datetime import timedelta, timezone
+from types import SimpleNamespace
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base, MarketData
+from candle_store import CandleStore, ms_to_datetime, datetime_to_ms
+from indicator_state import timeframe_to_ms
+
+TF = '5m'
+TF_MS = timeframe_to_ms(TF)
+NOW = 1_700_000_000_000 - 1_700_000_000_000 % TF_MS + 60_000  # 当前K线开盘后 1 分钟
+
+
+class FakeExchangeManager:
+    """按 since/limit 返回连续K线，收盘价等于K线序号"""
+
+    def __init__(self, missing=()):
+        self.calls = []
+        self.now = NOW
+        self.missing = set(missing)
+
+    async def get_ohlcv(self, exchange_account, symbol, timeframe, limit=100, since=None):
+        self.calls.append((since, limit))
+        return [[since + i * TF_MS, 1.0, 2.0, 0.5, float((since + i * TF_MS) // TF_MS), 10.0]
+                for i in range(limit) if since + i * TF_MS <= self.now and since + i * TF_MS not in self.missing]
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_datetime_roundtrip():
+    assert datetime_to_ms(ms_to_datetime(NOW)) == NOW
+    # 带时区的输入（如回测请求里的 +08:00）按实际时刻换算，而不是把本地时间当作 UTC
+    shanghai = timezone(timedelta(hours=8))
+    aware = ms_to_datetime(NOW).replace(tzinfo=timezone.utc).astimezone(shanghai)
+    assert datetime_to_ms(aware) == NOW
+
+
+def test_upsert_overwrites_existing_candle():
+    """重复写入同一根K线时覆盖而不是新增"""
+    db = make_session()
+    store = CandleStore(FakeExchangeManager())
+    store.upsert_candles(db, 'BTC/USDT', TF, [[NOW, 1, 1, 1, 1, 1]])
+    store.upsert_candles(db, 'BTC/USDT', TF, [[NOW, 1, 3, 1, 2, 5], [NOW + TF_MS, 1, 1, 1, 1, 1]])
+
+    assert db.query(MarketData).count() == 2
+    candles = store.read_candles(db, 'BTC/USDT', TF, 10)
+    assert candles[0] == [NOW, 1, 3, 1, 2, 5]
+
+
+def test_cold_then_warm_sync():
+    """首次全量拉取，之后只拉取最后一根（可能未收盘）K线"""
+    db = make_session()
+    manager = FakeExchangeManager()
+    store = CandleStore(manager)
+
+    candles = asyncio.run(store.get_candles(db, None, 'BTC/USDT', TF, 70, now_ms=NOW))
+    assert len(candles) == 70
+    assert manager.calls[-1][1] == 70
+
+    # 两根K线之后
+    later = NOW + 2 * TF_MS
+    manager.now = later
+    manager_calls_before = len(manager.calls)
+    candles = asyncio.run(store.get_candles(db, None, 'BTC/USDT', TF, 70, now_ms=later))
+    assert len(manager.calls) == manager_calls_before + 1
+    since, limit = manager.calls[-1]
+    assert since == NOW - NOW % TF_MS
+    assert limit == 3
+    assert candles[-1][0] == later - later % TF_MS
+    assert [c[0] for c in candles] == sorted({c[0] for c in candles})
+
+
+def test_gap_in_history_is_refetched():
+    """本地历史中间的缺口被检测并补齐"""
+    window_end = NOW - NOW % TF_MS
+    window_start = window_end - 9 * TF_MS
+    stored = [window_start + i * TF_MS for i in range(10) if i != 4]
+    assert CandleStore.find_sync_start(stored, window_start, window_end, TF_MS) == window_start + 4 * TF_MS
+    assert CandleStore.find_sync_start([], window_start, window_end, TF_MS) == window_start
+    complete = [window_start + i * TF_MS for i in range(9)]
+    assert CandleStore.find_sync_start(complete, window_start, window_end, TF_MS) == complete[-1]
+
+
+def test_failed_upsert_rolls_back_session():
+    """写入失败后会话已回滚，可以继续使用"""
+    db = make_session()
+    store = CandleStore(FakeExchangeManager())
+    db.add(MarketData(symbol='BTC/USDT', timeframe=TF))  # 缺少必填列
+    try:
+        store.upsert_candles(db, 'BTC/USDT', TF, [[NOW, 1, 1, 1, 1, 1]])
+    except Exception:
+        pass
+    else:
+        assert False, "写入应失败"
+    assert store.upsert_candles(db, 'BTC/USDT', TF, [[NOW, 1, 1, 1, 1, 1]]) == 1
+    assert db.query(MarketData).count() == 1
+
+def test_load_arrays_for_backtest():
+    """按列读取为 numpy 数组"""
+    db = make_session()
+    store = CandleStore(FakeExchangeManager())
+    rows = [[NOW + i * TF_MS, 1, 2, 0.5, float(i), 10] for i in range(100)]
+    store.upsert_candles(db, 'ETH/USDT', TF, rows)
+
+    arrays = store.load_arrays(db, 'ETH/USDT', TF, start_ms=NOW + 10 * TF_MS)
+    assert len(arrays['close']) == 90
+    assert arrays['close'][0] == 10.0
+    assert arrays['timestamp'][0] == NOW + 10 * TF_MS
+
+
+def test_testnet_and_live_candles_are_separate():
+    """同一交易对的模拟盘和实盘K线分别存储"""
+    db = make_session()
+    store = CandleStore(FakeExchangeManager())
+    store.upsert_candles(db, 'BTC/USDT', TF, [[NOW, 1, 1, 1, 100, 1]], exchange='okex', is_testnet=False)
+    store.upsert_candles(db, 'BTC/USDT', TF, [[NOW, 1, 1, 1, 200, 1]], exchange='okex', is_testnet=True)
+
+    assert db.query(MarketData).count() == 2
+    assert store.read_candles(db, 'BTC/USDT', TF, 1, is_testnet=False)[0][4] == 100
+    assert store.read_candles(db, 'BTC/USDT', TF, 1, is_testnet=True)[0][4] == 200
+
+    testnet = SimpleNamespace(exchange_name='okx', is_testnet=True)
+    candles = asyncio.run(store.get_candles(db, testnet, 'BTC/USDT', TF, 5, now_ms=NOW))
+    assert len(candles) == 5
+    assert store.read_candles(db, 'BTC/USDT', TF, 5, is_testnet=False) == [[NOW, 1, 1, 1, 100, 1]]
+
+
+def test_upstream_hole_is_not_refetched_every_tick():
+    """交易所缺失的K线记录为已知缺口，下次同步只拉取尾部"""
+    window_end = NOW - NOW % TF_MS
+    hole = window_end - 20 * TF_MS
+    db = make_session()
+    manager = FakeExchangeManager(missing={hole})
+    store = CandleStore(manager)
+
+    candles = asyncio.run(store.get_candles(db, None, 'BTC/USDT', TF, 70, now_ms=NOW))
+    assert len(candles) == 69 and hole not in {c[0] for c in candles}
+    assert store.get_stats()['known_holes'] == 1
+
+    candles = asyncio.run(store.get_candles(db, None, 'BTC/USDT', TF, 70, now_ms=NOW))
+    since, limit = manager.calls[-1]
+    assert since == window_end and limit == 1
+    assert len(candles) == 69
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+OKX 连通性监控测试
+验证延迟 / 成功率 EWMA、可达状态切换、探测超时、真实的 HTTP 与代理探测，
+以及 ExchangeManager 只读取监控状态、不在请求路径上探测
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import trading_engine
+from connectivity_monitor import ConnectivityMonitor, EndpointHealth
+from okx_http_client import close_http_clients
+
+URLS = ['https://a.example/api/v5/public/time', 'https://b.example/api/v5/public/time']
+
+
+class ScriptedProbe:
+    """按目标返回预设延迟；值为异常时抛出"""
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    async def __call__(self, target):
+        self.calls.append(target)
+        result = self.results[target]
+        if isinstance(result, Exception):
+            raise result
+        await asyncio.sleep(result)
+        return result
+
+
+def test_ewma_updates():
+    health = EndpointHealth('x')
+    health.record(0.1, None, 0.5, now=1)
+    health.record(0.3, None, 0.5, now=2)
+    assert abs(health.latency_ewma - 0.2) < 1e-9 and health.last_latency == 0.3
+    health.record(None, 'timeout', 0.5, now=3)
+    # 失败不改变延迟 EWMA，只降低成功率
+    assert abs(health.latency_ewma - 0.2) < 1e-9
+    assert health.success_ewma == 0.5 and health.consecutive_failures == 1 and not health.healthy
+
+
+def test_reachability_and_transitions():
+    probe = ScriptedProbe({URLS[0]: 0.02, URLS[1]: 0.01})
+    monitor = ConnectivityMonitor(URLS, proxy_url=None, http_probe=probe, timeout=1)
+    # 首次探测前视为可达
+    assert monitor.is_reachable() and monitor.get_stats()['reachable'] is None
+
+    async def run():
+        states = [await monitor.probe_once()]
+        probe.results = {url: ConnectionError("refused") for url in URLS}
+        states.append(await monitor.probe_once())
+        probe.results = {URLS[0]: 0.01, URLS[1]: ConnectionError("refused")}
+        states.append(await monitor.probe_once())
+        return states
+
+    assert asyncio.run(run()) == [True, False, True]
+    assert monitor.best_endpoint() == URLS[0]
+    stats = monitor.get_stats()
+    assert stats['transitions'] == 2 and stats['probe_failures'] == 3
+    assert stats['endpoints'][1]['consecutive_failures'] == 2
+
+
+def test_slow_probes_time_out_concurrently():
+    probe = ScriptedProbe({URLS[0]: 5.0, URLS[1]: 5.0})
+    monitor = ConnectivityMonitor(URLS, proxy_url=None, http_probe=probe, timeout=0.05)
+
+    started = time.monotonic()
+    assert asyncio.run(monitor.probe_once()) is False
+    assert time.monotonic() - started < 0.5
+    assert monitor.endpoints[URLS[0]].last_error == 'TimeoutError'
+
+
+class _TimeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = json.dumps({'code': '0', 'data': [{'ts': '1700000000000'}]}).encode()
+        self.send_response(200 if self.path == '/api/v5/public/time' else 404)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_real_http_and_proxy_probes():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _TimeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    async def run():
+        # 代理探测只做 TCP 连接：用本地监听端口模拟代理
+        proxy_server = await asyncio.start_server(lambda r, w: w.close(), '127.0.0.1', 0)
+        proxy_port = proxy_server.sockets[0].getsockname()[1]
+        monitor = ConnectivityMonitor([f"{base}/api/v5/public/time", f"{base}/missing"],
+                                      proxy_url=None, timeout=2)
+        reachable = await monitor.probe_once()
+        monitor.proxy = EndpointHealth(f"socks5://127.0.0.1:{proxy_port}")
+        await monitor.probe_once()
+        proxy_server.close()
+        await proxy_server.wait_closed()
+        await close_http_clients()
+        return reachable, monitor
+
+    try:
+        reachable, monitor = asyncio.run(run())
+    finally:
+        server.shutdown()
+    assert reachable
+    good, missing = monitor.endpoints.values()
+    assert good.healthy and good.latency_ewma > 0
+    assert not missing.healthy and 'HTTP 404' in missing.last_error
+    assert monitor.proxy.healthy
+
+
+def test_background_loop():
+    probe = ScriptedProbe({URLS[0]: 0.0, URLS[1]: 0.0})
+    monitor = ConnectivityMonitor(URLS, proxy_url=None, http_probe=probe, interval=0.02)
+
+    async def run():
+        await monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+    asyncio.run(run())
+    assert monitor.stats['rounds'] >= 3
+
+
+def test_exchange_manager_reads_monitor_state():
+    """不可达时直接使用模拟交易所，恢复后下一次请求重建真实实例；全程不在请求路径探测"""
+    class FakeAsyncExchange:
+        def __init__(self, config):
+            self.markets = {}
+
+        async def load_markets(self, reload=False):
+            self.markets, self.currencies = {'BTC/USDT': {}}, {}
+
+        def set_markets(self, markets, currencies=None):
+            self.markets = markets
+
+        async def close(self):
+            pass
+
+    def inline_probe():
+        raise AssertionError("请求路径不应同步探测")
+
+    original_ccxt, original_check = trading_engine.ccxt_async, trading_engine.check_okx_connectivity
+    trading_engine.ccxt_async = SimpleNamespace(okex=FakeAsyncExchange)
+    trading_engine.check_okx_connectivity = inline_probe
+    try:
+        state = {'reachable': False}
+        manager = trading_engine.ExchangeManager()
+        manager.connectivity = SimpleNamespace(is_reachable=lambda: state['reachable'])
+        account = SimpleNamespace(id=1, exchange_name='okex', api_key='k', api_secret='s',
+                                  api_passphrase='p', is_testnet=False)
+
+        async def run():
+            offline = await manager.get_exchange(account)
+            state['reachable'] = True
+            online = await manager.get_exchange(account)
+            await manager.close()
+            return offline, online
+
+        offline, online = asyncio.run(run())
+    finally:
+        trading_engine.ccxt_async, trading_engine.check_okx_connectivity = original_ccxt, original_check
+    assert isinstance(offline, trading_engine.MockOKXExchange)
+    assert isinstance(online, FakeAsyncExchange)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+仪表盘统计聚合测试
+验证单条 SQL 返回全部计数器（含今日交易数和今日盈亏）、只统计当前用户，
+以及交易计数读取汇总表主键而不是扫描交易历史
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from database import Base, ExchangeAccount, Strategy, Trade, User
+from hybrid_dashboard_service import HybridDashboardService
+from trade_stats import register_trade_stats
+
+NOW = datetime(2026, 10, 18, 15, 30)
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    register_trade_stats(session_factory)
+    db = session_factory()
+    users = [User(username=f"u{i}", email=f"u{i}@example.com", hashed_password="x") for i in range(2)]
+    db.add_all(users)
+    db.flush()
+    for user in users:
+        account = ExchangeAccount(user_id=user.id, exchange_name="okex", api_key="k", api_secret="s")
+        db.add(account)
+        db.flush()
+        for active in (True, False, True):
+            db.add(Strategy(user_id=user.id, exchange_account_id=account.id, name="s", strategy_type="5m_boll_ma60",
+                            symbol="BTC/USDT", timeframe="5m", entry_amount=10.0, is_active=active))
+    db.flush()
+    return engine, db, users
+
+
+def add_trade(db, user, status, profit_loss, created_at):
+    strategy = db.query(Strategy).filter(Strategy.user_id == user.id).first()
+    db.add(Trade(user_id=user.id, strategy_id=strategy.id, symbol="BTC/USDT", side="buy", order_type="market",
+                 amount=1.0, status=status, profit_loss=profit_loss, created_at=created_at))
+
+
+def test_counters_in_one_statement():
+    engine, db, (user, other) = make_session()
+    yesterday = NOW - timedelta(days=1)
+    add_trade(db, user, "filled", 10.0, yesterday)
+    add_trade(db, user, "filled", -2.5, NOW.replace(hour=0, minute=0))
+    add_trade(db, user, "filled", 4.0, NOW - timedelta(minutes=5))
+    add_trade(db, user, "cancelled", 99.0, NOW - timedelta(minutes=1))
+    add_trade(db, other, "filled", 1000.0, NOW)
+    db.commit()
+    user_id = user.id
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+    stats = HybridDashboardService._base_stats(user_id, db, [], now=NOW)
+
+    assert len(statements) == 1
+    assert (stats.total_strategies, stats.active_strategies) == (3, 2)
+    assert (stats.total_trades, stats.total_profit_loss) == (4, 11.5)
+    # 今日从 UTC 零点算起；今日盈亏只计已成交订单
+    assert (stats.today_trades, stats.today_profit_loss) == (3, 1.5)
+    db.close()
+
+
+def test_user_without_trades():
+    _, db, (user, _) = make_session()
+    db.commit()
+    stats = HybridDashboardService._base_stats(user.id, db, [], now=NOW)
+    assert (stats.total_trades, stats.total_profit_loss, stats.today_trades, stats.today_profit_loss) == (0, 0.0, 0, 0.0)
+    assert stats.total_strategies == 3
+    db.close()
+
+
+def test_trade_counters_are_primary_key_lookups():
+    engine, db, (user, _) = make_session()
+    db.commit()
+    query = HybridDashboardService._counters_query(user.id, NOW.date())
+    compiled = query.compile(engine, compile_kwargs={'literal_binds': True})
+    plan = " ".join(str(row[-1]) for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    # 交易计数来自汇总表，不扫描 trades
+    assert "SEARCH user_trade_stats USING INTEGER PRIMARY KEY" in plan
+    assert "sqlite_autoindex_user_trade_stats_daily_1" in plan
+    assert "SCAN trades" not in plan and "SEARCH trades" not in plan
+    assert "ix_strategies_user_id_is_active" in plan
+    db.close()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+交易所阻塞 I/O 线程池测试
+验证线程数上限、排队/活跃指标、开始前取消的任务不再计入排队、异步方法直接 await、失败计数以及事件循环不被阻塞
+"""
+import asyncio
+import threading
+import time
+from exchange_io import ExchangeIOExecutor
+
+
+def test_bounded_workers_and_saturation_metrics():
+    """并发数不超过 max_workers，多余任务排队并计入 peak_queued"""
+    io = ExchangeIOExecutor(max_workers=4)
+    release = threading.Event()
+    running = []
+    peak = [0]
+    lock = threading.Lock()
+
+    def blocking_call(i):
+        with lock:
+            running.append(i)
+            peak[0] = max(peak[0], len(running))
+        release.wait(5)
+        with lock:
+            running.remove(i)
+        return i
+
+    async def run():
+        tasks = [asyncio.create_task(io.run(blocking_call, i)) for i in range(10)]
+        await asyncio.sleep(0.2)
+        during = io.get_stats()
+        release.set()
+        results = await asyncio.gather(*tasks)
+        return during, results
+
+    try:
+        during, results = asyncio.run(run())
+    finally:
+        io.shutdown()
+
+    assert results == list(range(10))
+    assert peak[0] == 4
+    assert during['active'] == 4 and during['queued'] == 6
+    assert during['utilization'] == 1.0
+    stats = io.get_stats()
+    assert stats['completed'] == 10 and stats['active'] == 0 and stats['queued'] == 0
+    assert stats['peak_queued'] >= 6 and stats['peak_active'] == 4
+    assert stats['max_wait_ms'] > 100
+
+
+def test_threads_are_reused():
+    """多次调用复用同一组线程，不为每次请求新建线程池"""
+    io = ExchangeIOExecutor(max_workers=2)
+
+    async def run():
+        return {await io.run(lambda: threading.current_thread().name) for _ in range(50)}
+
+    try:
+        names = asyncio.run(run())
+    finally:
+        io.shutdown()
+    assert len(names) <= 2
+    assert all(name.startswith('exchange-io') for name in names)
+
+
+def test_call_awaits_coroutines_and_counts_failures():
+    io = ExchangeIOExecutor(max_workers=1)
+
+    async def async_fetch(symbol):
+        return f"async {symbol}"
+
+    def failing():
+        raise RuntimeError("boom")
+
+    async def run():
+        assert await io.call(async_fetch, 'BTC-USDT') == 'async BTC-USDT'
+        assert await io.call(lambda symbol: f"sync {symbol}", 'ETH-USDT') == 'sync ETH-USDT'
+        try:
+            await io.call(failing)
+        except RuntimeError:
+            pass
+        else:
+            assert False, "异常应传回调用方"
+
+    try:
+        asyncio.run(run())
+    finally:
+        io.shutdown()
+    stats = io.get_stats()
+    # 协程函数不占用线程池
+    assert stats['submitted'] == 2
+    assert stats['completed'] == 1 and stats['failed'] == 1
+
+
+def test_cancelled_before_start_leaves_queue():
+    """排队中的调用被取消后不再计入 queued"""
+    io = ExchangeIOExecutor(max_workers=1)
+    release = threading.Event()
+
+    async def run():
+        blocker = asyncio.create_task(io.run(release.wait, 1.0))
+        waiting = [asyncio.create_task(io.run(time.sleep, 0)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        queued_before = io.get_stats()['queued']
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+        release.set()
+        await blocker
+        return queued_before
+
+    try:
+        queued_before = asyncio.run(run())
+    finally:
+        io.shutdown()
+    stats = io.get_stats()
+    assert queued_before == 3
+    assert stats['cancelled'] == 3 and stats['queued'] == 0
+    assert stats['completed'] == 1 and stats['active'] == 0
+
+def test_event_loop_not_blocked():
+    """阻塞调用执行期间事件循环仍能按时调度其他协程"""
+    io = ExchangeIOExecutor(max_workers=2)
+
+    async def run():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(heartbeat())
+        await asyncio.gather(io.run(time.sleep, 0.3), io.run(time.sleep, 0.3))
+        task.cancel()
+        return ticks
+
+    try:
+        ticks = asyncio.run(run())
+    finally:
+        io.shutdown()
+    assert ticks >= 10
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+交易所实例管理测试
+验证每个账户复用一个 ccxt.async_support 实例、共享 aiohttp 会话、市场数据只加载一次，
+以及凭据变更、空闲超时淘汰和关闭
+"""
+import asyncio
+from types import SimpleNamespace
+import trading_engine
+from trading_engine import ExchangeManager
+
+
+class FakeAsyncExchange:
+    """ccxt.async_support 交易所的替身"""
+    instances = []
+    market_loads = 0
+
+    def __init__(self, config):
+        self.config = config
+        self.session = config['session']
+        self.markets = None
+        self.currencies = None
+        self.closed = False
+        type(self).instances.append(self)
+
+    async def load_markets(self, reload=False):
+        type(self).market_loads += 1
+        await asyncio.sleep(0.01)
+        self.markets = {'BTC/USDT': {'id': 'BTC-USDT', 'symbol': 'BTC/USDT'}}
+        self.currencies = {'BTC': {}, 'USDT': {}}
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        self.markets, self.currencies = markets, currencies
+
+    async def fetch_ticker(self, symbol):
+        return {'symbol': symbol, 'last': 43000.0, 'apiKey': self.config['apiKey']}
+
+    async def close(self):
+        self.closed = True
+
+
+def account(account_id, api_key='key'):
+    return SimpleNamespace(id=account_id, exchange_name='okex', api_key=api_key, api_secret='secret',
+                           api_passphrase='pass', is_testnet=False)
+
+
+def make_manager(**kwargs):
+    FakeAsyncExchange.instances = []
+    FakeAsyncExchange.market_loads = 0
+    trading_engine.ccxt_async = SimpleNamespace(okex=FakeAsyncExchange)
+    manager = ExchangeManager(**kwargs)
+    # 不依赖后台探测结果
+    manager.connectivity = SimpleNamespace(is_reachable=lambda: True)
+    return manager
+
+
+def teardown_module(module):
+    import ccxt.async_support
+    trading_engine.ccxt_async = ccxt.async_support
+
+
+def test_instances_are_reused_and_share_session_and_markets():
+    manager = make_manager()
+
+    async def run():
+        first = await manager.get_exchange(account(1))
+        again = await manager.get_exchange(account(1))
+        other = await manager.get_exchange(account(2))
+        ticker = await manager.get_ticker(account(2), 'BTC/USDT')
+        await manager.close()
+        return first, again, other, ticker
+
+    first, again, other, ticker = asyncio.run(run())
+    assert first is again and first is not other
+    assert first.session is other.session and first.session.closed
+    assert first.config['password'] == 'pass'
+    # 市场数据只加载一次，第二个实例直接复用
+    assert FakeAsyncExchange.market_loads == 1 and other.markets is first.markets
+    assert ticker['last'] == 43000.0
+    assert first.closed and other.closed
+    stats = manager.get_stats()
+    assert stats['created'] == 2 and stats['reused'] == 2 and stats['markets_shared'] == 1
+    assert stats['instances'] == 0
+
+
+def test_concurrent_creation_loads_markets_once():
+    manager = make_manager()
+
+    async def run():
+        exchanges = await asyncio.gather(*(manager.get_exchange(account(i)) for i in range(10)))
+        await manager.close()
+        return exchanges
+
+    exchanges = asyncio.run(run())
+    assert len({id(exchange) for exchange in exchanges}) == 10
+    assert FakeAsyncExchange.market_loads == 1
+    assert all(exchange.markets is exchanges[0].markets for exchange in exchanges)
+
+
+def test_credential_change_recreates_instance():
+    manager = make_manager()
+
+    async def run():
+        old = await manager.get_exchange(account(1, api_key='old'))
+        new = await manager.get_exchange(account(1, api_key='new'))
+        await manager.close()
+        return old, new
+
+    old, new = asyncio.run(run())
+    assert old is not new and old.closed
+    assert new.config['apiKey'] == 'new'
+    assert manager.stats['evicted_credentials'] == 1
+
+
+def test_idle_instances_are_evicted():
+    manager = make_manager(idle_timeout=0.05)
+
+    async def run():
+        idle = await manager.get_exchange(account(1))
+        await asyncio.sleep(0.06)
+        fresh = await manager.get_exchange(account(2))
+        remaining = list(manager.exchanges)
+        await manager.close()
+        return idle, fresh, remaining
+
+    idle, fresh, remaining = asyncio.run(run())
+    assert idle.closed
+    assert remaining == ['2_okex']
+    assert manager.stats['evicted_idle'] == 1
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    teardown_module(None)
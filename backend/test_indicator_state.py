@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+增量指标状态测试
+逐根推进K线，验证增量结果与全量重算一致，并验证缺口/参数变化时的重建逻辑
+"""
+import asyncio
+import numpy as np
+import indicators
+from indicator_state import IncrementalIndicatorState, timeframe_to_ms
+from benchmark_indicators import generate_prices
+
+TF = '5m'
+TF_MS = timeframe_to_ms(TF)
+START_TS = 1_700_000_000_000
+
+
+def make_candles(closes, start_ts=START_TS):
+    return [[start_ts + i * TF_MS, c, c, c, c, 1.0] for i, c in enumerate(closes)]
+
+
+def full_snapshot(closes, bb_period, bb_deviation, ma_period):
+    upper, middle, lower = indicators.bollinger_bands(closes, bb_period, bb_deviation)
+    ma = indicators.sma(closes, ma_period)
+    return upper[-1], middle[-1], lower[-1], ma[-1]
+
+
+def test_incremental_matches_full_recompute():
+    """逐根更新的结果与全量计算一致"""
+    closes = generate_prices(3000)
+    candles = make_candles(closes)
+    state = IncrementalIndicatorState(20, 2.0, 60, TF)
+
+    depth = 70
+    state.update(candles[:depth])
+    for end in range(depth, len(candles) + 1):
+        # 每个tick只提供最近几根K线，模拟 candles_needed 的小请求
+        state.update(candles[max(0, end - 3):end])
+        snap = state.snapshot()
+        upper, middle, lower, ma = full_snapshot(closes[:end], 20, 2.0, 60)
+        assert abs(snap.bb_upper - upper) < 1e-6
+        assert abs(snap.bb_middle - middle) < 1e-6
+        assert abs(snap.bb_lower - lower) < 1e-6
+        assert abs(snap.ma - ma) < 1e-6
+
+    assert state.full_recomputes == 1
+
+
+def test_forming_candle_updates_without_new_close():
+    """同一根未收盘K线价格变化时，快照随之变化但不追加收盘数据"""
+    closes = list(generate_prices(80))
+    state = IncrementalIndicatorState(20, 2.0, 60, TF)
+    state.update(make_candles(closes))
+    last_closed = state.last_closed_ts
+
+    closes[-1] *= 1.01
+    state.update(make_candles(closes)[-2:])
+    assert state.last_closed_ts == last_closed
+
+    upper, _, _, ma = full_snapshot(np.array(closes), 20, 2.0, 60)
+    snap = state.snapshot()
+    assert abs(snap.bb_upper - upper) < 1e-6
+    assert abs(snap.ma - ma) < 1e-6
+
+
+def test_gap_triggers_full_recompute():
+    """K线缺口触发全量重算"""
+    closes = generate_prices(200)
+    candles = make_candles(closes)
+    state = IncrementalIndicatorState(20, 2.0, 60, TF)
+    state.update(candles[:100])
+    assert state.full_recomputes == 1
+
+    # 跳过中间 10 根K线
+    state.update(candles[110:200])
+    assert state.full_recomputes == 2
+    upper, _, _, ma = full_snapshot(closes[110:200], 20, 2.0, 60)
+    assert abs(state.snapshot().bb_upper - upper) < 1e-6
+
+
+def test_not_ready_until_enough_history():
+    """历史数据不足时不输出快照"""
+    state = IncrementalIndicatorState(20, 2.0, 60, TF)
+    state.update(make_candles(generate_prices(30)))
+    assert not state.ready
+    assert state.snapshot() is None
+    assert state.candles_needed(START_TS) == 70
+
+
+def test_candles_needed_after_warmup():
+    """预热后只请求自上次收盘以来的新K线"""
+    state = IncrementalIndicatorState(20, 2.0, 60, TF)
+    state.update(make_candles(generate_prices(70)))
+    now = state.last_closed_ts + 3 * TF_MS + 1000
+    assert state.candles_needed(now) == 5
+
+
+class _FakeExchangeManager:
+    def __init__(self, candles):
+        self.candles = candles
+        self.limits = []
+
+    async def get_ohlcv(self, exchange_account, symbol, timeframe, limit=100):
+        self.limits.append(limit)
+        return self.candles[-limit:]
+
+
+class _FakeStrategy:
+    id = 1
+    exchange_account_id = 1
+    strategy_type = '5m_boll_ma60'
+    symbol = 'BTC/USDT'
+    timeframe = TF
+    bb_period = 20
+    bb_deviation = 2.0
+    ma_period = 60
+
+
+class _FakeQuery:
+    def filter(self, *args):
+        return self
+
+    def first(self):
+        return object()
+
+
+class _FakeDB:
+    def query(self, model):
+        return _FakeQuery()
+
+
+def test_strategy_engine_rebuilds_on_parameter_change():
+    """策略参数变化时重建状态"""
+    from trading_engine import StrategyEngine
+
+    candles = make_candles(generate_prices(200))
+    engine = StrategyEngine(_FakeExchangeManager(candles))
+    strategy = _FakeStrategy()
+
+    asyncio.run(engine.check_strategy_signal(strategy, _FakeDB()))
+    first_state = engine.get_indicator_state(strategy)
+    assert first_state.ready
+
+    strategy.bb_period = 30
+    asyncio.run(engine.check_strategy_signal(strategy, _FakeDB()))
+    assert engine.get_indicator_state(strategy) is not first_state
+
+    engine.prune_indicator_states(set())
+    assert not engine.indicator_states
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
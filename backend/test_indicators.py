@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+向量化指标模块测试
+验证 indicators 的输出与旧版逐窗口实现一致（误差 1e-9 以内）
+"""
+import numpy as np
+import pandas as pd
+import indicators
+from benchmark_indicators import legacy_bollinger_bands, generate_prices
+
+
+def test_bollinger_matches_legacy():
+    """布林带与旧实现一致"""
+    for n, period, deviation in [(70, 20, 2.0), (5000, 20, 2.5), (200_000, 55, 1.5)]:
+        prices = generate_prices(n)
+        expected = legacy_bollinger_bands(prices, period, deviation)
+        actual = indicators.bollinger_bands(prices, period, deviation)
+        for exp, act in zip(expected, actual):
+            assert exp.shape == act.shape
+            np.testing.assert_allclose(act, exp, rtol=0, atol=1e-9)
+
+
+def test_sma_matches_convolve():
+    """SMA 与 np.convolve 一致"""
+    prices = generate_prices(10_000)
+    for period in (1, 5, 60, 240):
+        expected = np.convolve(prices, np.ones(period), 'valid') / period
+        np.testing.assert_allclose(indicators.sma(prices, period), expected, rtol=0, atol=1e-9)
+
+
+def test_rolling_std_flat_series():
+    """常数序列的标准差应为 0 而不是 NaN 或负数开方"""
+    prices = np.full(100, 45000.123)
+    std = indicators.rolling_std(prices, 20)
+    assert np.all(std >= 0)
+    np.testing.assert_allclose(std, 0.0, atol=1e-9)
+
+
+def test_short_input_returns_empty():
+    """数据不足一个窗口时返回空数组"""
+    upper, middle, lower = indicators.bollinger_bands(np.arange(10, dtype=float), 20)
+    assert len(upper) == len(middle) == len(lower) == 0
+    assert len(indicators.ema(np.arange(10, dtype=float), 20)) == 0
+
+
+def test_ema_matches_recursive_definition():
+    """EMA 与逐步递推定义一致"""
+    prices = generate_prices(500)
+    period = 12
+    alpha = 2.0 / (period + 1)
+
+    expected = [prices[:period].mean()]
+    for price in prices[period:]:
+        expected.append(alpha * price + (1 - alpha) * expected[-1])
+
+    np.testing.assert_allclose(indicators.ema(prices, period), expected, rtol=0, atol=1e-9)
+
+
+def test_strategy_engine_uses_vectorized_indicators():
+    """StrategyEngine 的指标方法委托给 indicators 模块"""
+    from trading_engine import strategy_engine
+
+    prices = pd.Series(generate_prices(300)).values
+    expected = legacy_bollinger_bands(prices, 20, 2.0)
+    actual = strategy_engine.calculate_bollinger_bands(prices, 20, 2.0)
+    for exp, act in zip(expected, actual):
+        np.testing.assert_allclose(act, exp, rtol=0, atol=1e-9)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+交易对目录测试
+验证规范化、建议查找、磁盘缓存冷启动、刷新合并与失败保留、刷新失败退避（含冷启动下载失败），以及 SimpleRealExchangeManager 的接入
+"""
+import asyncio
+import json
+import os
+import tempfile
+from instrument_catalog import InstrumentCatalog, compact_symbol
+from simple_real_trading_engine import SimpleRealExchangeManager
+from ticker_cache import TickerCache
+
+INSTRUMENTS = [
+    {'instId': inst_id, 'baseCcy': inst_id.split('-')[0], 'quoteCcy': inst_id.split('-')[1], 'state': 'live'}
+    for inst_id in ('BTC-USDT', 'BTC-USDC', 'BTC-EUR', 'ETH-USDT', 'ETH-BTC', 'SOL-USDT', 'SOL-USDC',
+                    'DOGE-USDT', 'DOT-USDT', 'ADA-USDT', '1INCH-USDT')
+] + [{'instId': 'OLD-USDT', 'baseCcy': 'OLD', 'quoteCcy': 'USDT', 'state': 'suspend'}]
+
+
+class FakeFetcher:
+    def __init__(self, instruments=INSTRUMENTS, delay=0.0):
+        self.instruments = instruments
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("network down")
+        return self.instruments
+
+
+def loaded_catalog(cache_dir, fetcher=None):
+    catalog = InstrumentCatalog(fetch_instruments=fetcher or FakeFetcher(), cache_dir=cache_dir)
+    assert asyncio.run(catalog.ensure_loaded())
+    return catalog
+
+
+def test_normalize_and_validate():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        catalog = loaded_catalog(cache_dir)
+        for raw in ('BTC/USDT', 'BTCUSDT', 'btc_usdt', ' BTC-USDT ', 'btc usdt'):
+            assert catalog.normalize(raw) == 'BTC-USDT', raw
+        assert catalog.normalize('1inchusdt') == '1INCH-USDT'
+        assert catalog.normalize('XYZ-USDT') is None
+        # 非 live 状态的交易对不在目录中
+        assert not catalog.is_valid('OLD-USDT')
+        assert compact_symbol('eth/btc') == 'ETHBTC'
+
+
+def test_suggestions():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        catalog = loaded_catalog(cache_dir)
+        # 前缀：USDT 计价优先
+        assert catalog.suggest('BTC', limit=3) == ['BTC-USDT', 'BTC-USDC', 'BTC-EUR']
+        assert catalog.suggest('DO') == ['DOGE-USDT', 'DOT-USDT']
+        # 基础币种存在但计价币种不存在
+        assert catalog.suggest('SOL-EUR', limit=2) == ['SOL-USDT', 'SOL-USDC']
+        # 拼写错误走模糊匹配
+        assert catalog.suggest('ETHUSTD')[0] == 'ETH-USDT'
+        # 完全无关时返回默认常用交易对
+        assert catalog.suggest('ZZZZZZZZ', limit=2) == ['BTC-USDT', 'ETH-USDT']
+
+
+def test_disk_cache_cold_start():
+    """第二个实例从磁盘加载，不访问网络"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        loaded_catalog(cache_dir)
+        assert os.path.exists(os.path.join(cache_dir, 'okx_spot.json'))
+
+        fetcher = FakeFetcher()
+        catalog = InstrumentCatalog(fetch_instruments=fetcher, cache_dir=cache_dir)
+        assert asyncio.run(catalog.ensure_loaded())
+        assert fetcher.calls == 0
+        assert catalog.stats['disk_loads'] == 1
+        assert catalog.normalize('ETHBTC') == 'ETH-BTC'
+
+
+def test_corrupt_disk_cache_is_ignored():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        with open(os.path.join(cache_dir, 'okx_spot.json'), 'w') as f:
+            f.write('{"instruments": [')
+        fetcher = FakeFetcher()
+        catalog = InstrumentCatalog(fetch_instruments=fetcher, cache_dir=cache_dir)
+        assert asyncio.run(catalog.ensure_loaded())
+        assert fetcher.calls == 1
+        with open(catalog.cache_path) as f:
+            assert len(json.load(f)['instruments']) == len(INSTRUMENTS)
+
+
+def test_concurrent_refresh_downloads_once_and_failure_keeps_index():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        fetcher = FakeFetcher(delay=0.05)
+        catalog = InstrumentCatalog(fetch_instruments=fetcher, cache_dir=cache_dir)
+
+        async def run():
+            await asyncio.gather(*(catalog.ensure_loaded() for _ in range(20)))
+            fetcher.fail = True
+            return await catalog.refresh()
+
+        assert asyncio.run(run()) is False
+        assert fetcher.calls == 2
+        assert catalog.is_valid('BTC-USDT')
+        assert catalog.get_stats()['refresh_errors'] == 1
+
+
+def test_background_refresh_loop():
+    """start() 立即返回，过期目录在后台刷新"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        fetcher = FakeFetcher(delay=0.02)
+        catalog = InstrumentCatalog(fetch_instruments=fetcher, cache_dir=cache_dir, refresh_interval=3600)
+
+        async def run():
+            await catalog.start()
+            started_loaded = catalog.is_loaded
+            await asyncio.sleep(0.1)
+            await catalog.stop()
+            return started_loaded
+
+        assert asyncio.run(run()) is False
+        assert catalog.is_loaded and fetcher.calls == 1
+
+
+def test_failed_refresh_backs_off():
+    """过期目录刷新失败时按指数退避重试，不会每秒请求一次"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        fetcher = FakeFetcher()
+        catalog = InstrumentCatalog(fetch_instruments=fetcher, cache_dir=cache_dir,
+                                    refresh_interval=3600, retry_delay=0.02)
+        assert asyncio.run(catalog.ensure_loaded())
+        assert catalog._next_delay(1) == 0.02 and catalog._next_delay(3) == 0.08
+        assert catalog._next_delay(30) == 3600
+
+        catalog.loaded_at -= 7200
+        fetcher.fail = True
+        fetcher.calls = 0
+
+        async def run():
+            await catalog.start()
+            await asyncio.sleep(0.25)
+            await catalog.stop()
+
+        asyncio.run(run())
+        # 0, 0.02, 0.06, 0.14 秒各尝试一次
+        assert 3 <= fetcher.calls <= 5
+        assert catalog.stats['refresh_errors'] == fetcher.calls
+
+
+def test_cold_start_failure_is_not_retried_per_call():
+    """没有磁盘缓存且交易所不可达时，retry_delay 内的调用直接返回默认建议，不重复下载"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        now = [1000.0]
+        fetcher = FakeFetcher()
+        fetcher.fail = True
+        catalog = InstrumentCatalog(fetch_instruments=fetcher, cache_dir=cache_dir,
+                                    retry_delay=30, clock=lambda: now[0])
+
+        async def run(calls):
+            return [await catalog.ensure_loaded() for _ in range(calls)]
+
+        assert asyncio.run(run(10)) == [False] * 10
+        assert fetcher.calls == 1
+        assert catalog.stats['refresh_skips'] == 9
+        assert catalog.suggest('BTC', limit=2) == ['BTC-USDT', 'ETH-USDT']
+
+        # 退避时间过后再试一次，交易所恢复后正常加载
+        now[0] += 31
+        fetcher.fail = False
+        assert asyncio.run(run(1)) == [True]
+        assert fetcher.calls == 2 and not catalog.in_backoff()
+
+
+def test_manager_uses_catalog():
+    """validate_symbol 查索引；交易对不存在时建议来自目录，不再下载整个列表"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        fetcher = FakeFetcher()
+        manager = SimpleRealExchangeManager()
+        manager.instrument_catalog = loaded_catalog(cache_dir, fetcher)
+
+        async def missing(exchange_name, inst_id):
+            return {'code': '51001', 'msg': "Instrument ID doesn't exist", 'data': []}
+
+        manager.ticker_cache = TickerCache(missing)
+        manager.okx_managers[1] = object()
+
+        assert manager.validate_symbol('okx', 'ethbtc') == 'ETH-BTC'
+        assert manager.validate_symbol('okx', 'DOGEUSDT') == 'DOGE-USDT'
+
+        async def run():
+            symbols = await manager.get_valid_symbols('okx')
+            result = await manager.get_real_ticker(1, 'okx', 'SOL/EUR')
+            return symbols, result
+
+        symbols, result = asyncio.run(run())
+        assert 'BTC-USDT' in symbols
+        assert not result['success']
+        assert result['data']['suggestions'][:2] == ['SOL-USDT', 'SOL-USDC']
+        assert fetcher.calls == 1
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+WebSocket 行情订阅测试
+用本地 OKX 替身回放合成帧，验证订阅增减（模拟盘账户不订阅）、实时行情与K线缓冲、断线重连、
+以及行情缓存和K线合并器优先使用推送数据
+"""
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+from fake_okx_ws import FakeOKXWebSocketServer, generate_frames, load_frames, save_frames
+from market_data_stream import CandleBuffer, MarketDataStream, candle_channel, channel_timeframe
+from ticker_cache import TickerCache
+
+FIVE_MIN = 300_000
+
+
+def strategy(strategy_id, symbol='BTC/USDT', timeframe='5m'):
+    return SimpleNamespace(id=strategy_id, symbol=symbol, timeframe=timeframe)
+
+
+async def wait_for(condition, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("条件超时未满足")
+        await asyncio.sleep(0.01)
+
+
+def make_stream(server):
+    # 测试中不依赖真实时钟判断新鲜度
+    return MarketDataStream(public_url=server.url, business_url=server.url, ticker_max_age=3600)
+
+
+def test_channel_names():
+    assert candle_channel('5m') == 'candle5m'
+    assert candle_channel('1h') == 'candle1H'
+    assert candle_channel('1d') == 'candle1D'
+    assert channel_timeframe('candle1H') == '1h'
+    assert channel_timeframe('candle15m') == '15m'
+
+
+def test_candle_buffer_updates_and_gaps():
+    buffer = CandleBuffer('5m', capacity=3)
+    buffer.seed([[i * FIVE_MIN, 1, 2, 0.5, 1.5, 10] for i in range(3)], now=0)
+    assert buffer.update([2 * FIVE_MIN, 1, 3, 0.5, 2.5, 11], now=1)
+    assert buffer.rows[-1][4] == 2.5 and len(buffer.rows) == 3
+    assert buffer.update([3 * FIVE_MIN, 2.5, 2.5, 2.5, 2.5, 1], now=2)
+    assert [row[0] for row in buffer.rows] == [FIVE_MIN, 2 * FIVE_MIN, 3 * FIVE_MIN]
+    assert buffer.tail(2)[0][0] == 2 * FIVE_MIN
+    # 跳过一根：缺口，清空等待重新播种
+    assert not buffer.update([5 * FIVE_MIN, 1, 1, 1, 1, 1], now=3)
+    assert buffer.tail(2) is None
+
+
+def test_stream_subscribes_and_tracks_live_data():
+    frames = generate_frames(['BTC-USDT', 'ETH-USDT', 'SOL-USDT'], count=300, rate=1000)
+
+    async def run():
+        server = FakeOKXWebSocketServer(frames)
+        await server.start(replay=False)
+        stream = make_stream(server)
+        await stream.start([strategy(1), strategy(2, 'ETH/USDT')])
+        await wait_for(lambda: all(c.connected for c in stream.connections.values()))
+        await wait_for(lambda: server.stats['subscribe_requests'] >= 2)
+
+        server.start_replay()
+        await server.wait_replayed()
+        await wait_for(lambda: stream.stats['ticker_updates'] >= 200)
+        stats = stream.get_stats()
+        btc = stream.get_ticker('BTC/USDT')
+        candle_keys = set(stream.candles)
+        await stream.stop()
+        await server.stop()
+        return stream, stats, btc, candle_keys
+
+    stream, stats, btc, candle_keys = asyncio.run(run())
+    # 只收到订阅了的 BTC / ETH，SOL 未订阅
+    assert stats['ticker_updates'] == 200
+    assert stats['subscriptions'] == {'public': 2, 'business': 2}
+    assert btc['instId'] == 'BTC-USDT'
+    assert set(stream.tickers) == {'BTC-USDT', 'ETH-USDT'}
+    assert candle_keys == {('BTC-USDT', '5m'), ('ETH-USDT', '5m')}
+
+
+def test_toggle_adds_and_removes_subscriptions():
+    frames = generate_frames(['BTC-USDT', 'ETH-USDT'], count=10, rate=1000)
+
+    async def run():
+        server = FakeOKXWebSocketServer(frames)
+        await server.start(replay=False)
+        stream = make_stream(server)
+        await stream.start([strategy(1)])
+        await wait_for(lambda: all(c.connected for c in stream.connections.values()))
+
+        def server_subscriptions():
+            return set().union(*server._clients.values()) if server._clients else set()
+
+        await wait_for(lambda: ('tickers', 'BTC-USDT') in server_subscriptions())
+        # 同一交易对的第二个策略不产生新订阅；新交易对增加订阅
+        stream.track_strategy(strategy(2))
+        stream.track_strategy(strategy(3, 'ETH-USDT', '1h'))
+        await wait_for(lambda: ('candle1H', 'ETH-USDT') in server_subscriptions())
+        assert ('tickers', 'ETH-USDT') in server_subscriptions()
+
+        stream.untrack_strategy(1)
+        await asyncio.sleep(0.05)
+        still_btc = ('tickers', 'BTC-USDT') in server_subscriptions()
+        stream.untrack_strategy(2)
+        await wait_for(lambda: ('tickers', 'BTC-USDT') not in server_subscriptions())
+        remaining = server_subscriptions()
+        await stream.stop()
+        await server.stop()
+        return still_btc, remaining
+
+    still_btc, remaining = asyncio.run(run())
+    assert still_btc
+    assert remaining == {('tickers', 'ETH-USDT'), ('candle1H', 'ETH-USDT')}
+
+
+def test_testnet_strategies_are_not_streamed():
+    """行情流只推送 OKX 实盘：模拟盘和其他交易所账户的策略不订阅"""
+    stream = MarketDataStream()
+    live = strategy(1)
+    live.exchange_account = SimpleNamespace(exchange_name='okx', is_testnet=False)
+    testnet = strategy(2, 'ETH/USDT')
+    testnet.exchange_account = SimpleNamespace(exchange_name='okx', is_testnet=True)
+    other = strategy(3, 'SOL/USDT')
+    other.exchange_account = SimpleNamespace(exchange_name='binance', is_testnet=False)
+
+    stream.set_strategies([live, testnet, other])
+    assert stream.desired_subscriptions()['business'] == {('candle5m', 'BTC-USDT')}
+
+    # 账户切换到模拟盘后重新启用：取消订阅
+    stream.track_strategy(testnet)
+    live.exchange_account = SimpleNamespace(exchange_name='okx', is_testnet=True)
+    stream.track_strategy(live)
+    assert stream.desired_subscriptions()['business'] == set()
+
+def test_reconnect_restores_subscriptions():
+    frames = generate_frames(['BTC-USDT'], count=20, rate=1000)
+
+    async def run():
+        server = FakeOKXWebSocketServer(frames)
+        await server.start(replay=False)
+        stream = make_stream(server)
+        await stream.start([strategy(1)])
+        await wait_for(lambda: all(c.connected for c in stream.connections.values()))
+        await wait_for(lambda: len(server._clients) == 2 and all(server._clients.values()))
+
+        await server.disconnect_clients()
+        await wait_for(lambda: stream.connections['public'].reconnects >= 1, timeout=5)
+        await wait_for(lambda: all(c.connected for c in stream.connections.values()), timeout=5)
+        await wait_for(lambda: len(server._clients) == 2 and all(server._clients.values()))
+
+        server.start_replay()
+        await server.wait_replayed()
+        await wait_for(lambda: stream.get_ticker('BTC-USDT') is not None)
+        await stream.stop()
+        await server.stop()
+        return server.stats
+
+    stats = asyncio.run(run())
+    assert stats['connections'] == 4
+
+
+def test_consumers_prefer_live_data():
+    """行情缓存直接返回推送的 ticker；K线合并器由 REST 播种后从内存读取"""
+    from candle_fetcher import CandleFetchCoalescer
+
+    frames = generate_frames(['BTC-USDT'], count=50, rate=1000, start_ms=11 * FIVE_MIN)
+
+    class RestExchange:
+        def __init__(self):
+            self.calls = 0
+
+        async def get_ohlcv(self, account, symbol, timeframe, limit=100, since=None):
+            self.calls += 1
+            return [[i * FIVE_MIN, 100.0, 101.0, 99.0, 100.0, 1.0] for i in range(11 - limit, 11)]
+
+    class Engine:
+        def candles_required(self, strategy, now_ms):
+            return 5
+
+    async def upstream(exchange_name, inst_id):
+        raise AssertionError("有推送数据时不应请求 REST")
+
+    async def run():
+        server = FakeOKXWebSocketServer(frames)
+        await server.start(replay=False)
+        stream = make_stream(server)
+        rest = RestExchange()
+        coalescer = CandleFetchCoalescer(rest, Engine(), None, stream)
+        cache = TickerCache(upstream, live_source=stream.ticker_response)
+
+        await stream.start([strategy(1)])
+        await wait_for(lambda: all(c.connected for c in stream.connections.values()))
+        await wait_for(lambda: len(server._clients) == 2 and all(server._clients.values()))
+
+        account = SimpleNamespace(id=1, exchange_name='okx', is_testnet=False)
+        group = {'account': account, 'limit': 5, 'strategy_ids': [1]}
+        key = ('okex', False, 'BTC/USDT', '5m')
+        first = await coalescer._fetch_group(key, group)
+
+        server.start_replay()
+        await server.wait_replayed()
+        await wait_for(lambda: stream.stats['candle_updates'] >= 50)
+        second = await coalescer._fetch_group(key, group)
+        ticker = await cache.get_ticker('okex', 'BTC-USDT')
+        await stream.stop()
+        await server.stop()
+        return rest.calls, first, second, ticker, coalescer.stats, cache.stats
+
+    calls, first, second, ticker, coalescer_stats, cache_stats = asyncio.run(run())
+    assert calls == 1 and len(first) == 5
+    assert coalescer_stats['live_hits'] == 1
+    # 推送的第 11 根K线接在 REST 播种的 6..10 之后
+    assert [row[0] for row in second] == [i * FIVE_MIN for i in range(7, 12)]
+    assert ticker['data'][0]['instId'] == 'BTC-USDT'
+    assert cache_stats['live_hits'] == 1 and cache_stats['upstream_calls'] == 0
+
+
+def test_frames_round_trip_through_file():
+    frames = generate_frames(['BTC-USDT'], count=5)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'frames.jsonl')
+        save_frames(path, frames)
+        assert load_frames(path) == [(round(t, 6), frame) for t, frame in frames]
+
+
+def test_replay_throughput():
+    """离线压测：2 万帧加速回放，全部进入内存"""
+    inst_ids = [f"COIN{i}-USDT" for i in range(50)]
+    frames = generate_frames(inst_ids, count=10000, rate=1e9)
+
+    async def run():
+        server = FakeOKXWebSocketServer(frames)
+        await server.start(replay=False)
+        stream = make_stream(server)
+        await stream.start([strategy(i, inst_id) for i, inst_id in enumerate(inst_ids)])
+        await wait_for(lambda: all(c.connected for c in stream.connections.values()))
+        await wait_for(lambda: len(server._clients) == 2 and all(len(s) == 50 for s in server._clients.values()))
+        server.start_replay()
+        await server.wait_replayed()
+        await wait_for(lambda: stream.stats['messages'] >= 20000 + 100, timeout=30)
+        await stream.stop()
+        await server.stop()
+        return stream
+
+    stream = asyncio.run(run())
+    assert stream.stats['ticker_updates'] == 10000
+    assert stream.stats['candle_updates'] == 10000
+    assert len(stream.tickers) == 50
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+列式K线归档测试
+验证追加、扩容、覆盖、中间回填、二分查找、模拟盘独立存储、与 CandleStore 一致的接口
+以及 CANDLE_BACKEND 选择K线来源
+"""
+import asyncio
+import os
+import tempfile
+import numpy as np
+from candle_store import candle_store
+from ohlcv_archive import OHLCVArchive, INITIAL_CAPACITY, select_candle_source
+from indicator_state import timeframe_to_ms
+
+TF = '5m'
+TF_MS = timeframe_to_ms(TF)
+T0 = 1_600_000_000_000 - 1_600_000_000_000 % TF_MS
+
+
+def candles(start, count, close_offset=0.0):
+    return [[T0 + (start + i) * TF_MS, 1.0, 2.0, 0.5, float(start + i) + close_offset, 3.0]
+            for i in range(count)]
+
+
+def test_append_and_grow_beyond_capacity():
+    """追加超过初始容量后数据完整且连续"""
+    with tempfile.TemporaryDirectory() as root:
+        archive = OHLCVArchive(root, 'okex')
+        n = INITIAL_CAPACITY * 3 + 17
+        for start in range(0, n, 1000):
+            archive.upsert_candles(None, 'BTC/USDT', TF, candles(start, min(1000, n - start)))
+
+        arrays = archive.load_arrays(None, 'BTC/USDT', TF)
+        assert len(arrays['close']) == n
+        np.testing.assert_array_equal(arrays['close'], np.arange(n, dtype=float))
+        assert np.all(np.diff(arrays['timestamp']) == TF_MS)
+        assert isinstance(arrays['close'], np.memmap)
+        archive.close()
+
+
+def test_overwrite_last_candle_and_reopen():
+    """覆盖最后一根（未收盘）K线，重新打开后数据仍在"""
+    with tempfile.TemporaryDirectory() as root:
+        archive = OHLCVArchive(root, 'okex')
+        archive.upsert_candles(None, 'BTC/USDT', TF, candles(0, 10))
+        archive.upsert_candles(None, 'BTC/USDT', TF, candles(9, 3, close_offset=0.5))
+        archive.close()
+
+        reopened = OHLCVArchive(root, 'okex')
+        closes = reopened.load_arrays(None, 'BTC/USDT', TF)['close']
+        assert len(closes) == 12
+        assert closes[8] == 8.0
+        assert closes[9] == 9.5
+        reopened.close()
+
+
+def test_backfill_gap_in_middle():
+    """回填历史缺口"""
+    with tempfile.TemporaryDirectory() as root:
+        archive = OHLCVArchive(root, 'okex')
+        archive.upsert_candles(None, 'ETH/USDT', TF, candles(0, 5) + candles(10, 5))
+        archive.upsert_candles(None, 'ETH/USDT', TF, candles(4, 7, close_offset=0.25))
+        closes = archive.load_arrays(None, 'ETH/USDT', TF)['close']
+        assert len(closes) == 15
+        np.testing.assert_array_equal(closes[:4], [0, 1, 2, 3])
+        np.testing.assert_array_equal(closes[4:11], np.arange(4, 11) + 0.25)
+        archive.close()
+
+
+def test_range_and_read_candles():
+    """按时间区间二分查找，read_candles 返回 ccxt 格式"""
+    with tempfile.TemporaryDirectory() as root:
+        archive = OHLCVArchive(root, 'okex')
+        archive.upsert_candles(None, 'BTC/USDT', TF, candles(0, 1000))
+
+        arrays = archive.load_arrays(None, 'BTC/USDT', TF, start_ms=T0 + 100 * TF_MS, end_ms=T0 + 199 * TF_MS)
+        assert len(arrays['close']) == 100
+        assert arrays['close'][0] == 100.0
+
+        tail = archive.read_candles(None, 'BTC/USDT', TF, 5, end_ms=T0 + 500 * TF_MS)
+        assert [c[4] for c in tail] == [496.0, 497.0, 498.0, 499.0, 500.0]
+        assert tail[0][0] == T0 + 496 * TF_MS
+        assert archive.read_candles(None, 'XRP/USDT', TF, 5) == []
+        archive.close()
+
+
+def test_incremental_sync_through_candle_store_interface():
+    """继承 CandleStore.get_candles：只从交易所补齐尾部"""
+
+    class FakeExchangeManager:
+        def __init__(self):
+            self.calls = []
+
+        async def get_ohlcv(self, account, symbol, timeframe, limit=100, since=None):
+            self.calls.append((since, limit))
+            start = (since - T0) // TF_MS
+            return candles(start, limit)
+
+    with tempfile.TemporaryDirectory() as root:
+        manager = FakeExchangeManager()
+        archive = OHLCVArchive(root, 'okex', manager)
+        now = T0 + 200 * TF_MS + 1000
+
+        first = asyncio.run(archive.get_candles(None, None, 'BTC/USDT', TF, 70, now_ms=now))
+        assert len(first) == 70 and manager.calls[-1][1] == 70
+
+        second = asyncio.run(archive.get_candles(None, None, 'BTC/USDT', TF, 70, now_ms=now + TF_MS))
+        assert manager.calls[-1] == (T0 + 200 * TF_MS, 2)
+        assert second[-1][4] == 201.0
+        archive.close()
+
+
+def test_testnet_series_stored_separately():
+    """模拟盘K线写入独立目录，不覆盖实盘数据"""
+    with tempfile.TemporaryDirectory() as root:
+        archive = OHLCVArchive(root, 'okex')
+        archive.upsert_candles(None, 'BTC/USDT', TF, candles(0, 5))
+        archive.upsert_candles(None, 'BTC/USDT', TF, candles(0, 3, close_offset=0.5), is_testnet=True)
+
+        assert len(archive.load_arrays(None, 'BTC/USDT', TF)['close']) == 5
+        testnet = archive.load_arrays(None, 'BTC/USDT', TF, exchange='okex', is_testnet=True)['close']
+        np.testing.assert_array_equal(testnet, [0.5, 1.5, 2.5])
+        assert os.path.isdir(os.path.join(root, 'okex-testnet'))
+        archive.close()
+
+
+def test_candle_backend_selects_source():
+    """archive 时K线来源为 OHLCV_ARCHIVE_DIR 下的归档，database 时为 MarketData 表"""
+    assert select_candle_source('database') is candle_store
+    try:
+        select_candle_source('parquet')
+    except ValueError:
+        pass
+    else:
+        assert False, "未知的 CANDLE_BACKEND 应抛出 ValueError"
+
+    with tempfile.TemporaryDirectory() as root:
+        previous = os.environ.get('OHLCV_ARCHIVE_DIR')
+        os.environ['OHLCV_ARCHIVE_DIR'] = root
+        try:
+            source = select_candle_source('archive', exchange_manager='manager')
+        finally:
+            if previous is None:
+                os.environ.pop('OHLCV_ARCHIVE_DIR')
+            else:
+                os.environ['OHLCV_ARCHIVE_DIR'] = previous
+        assert isinstance(source, OHLCVArchive)
+        assert source.root_dir == root and source.exchange_manager == 'manager'
+        source.upsert_candles(None, 'BTC/USDT', TF, candles(0, 3))
+        assert len(source.load_arrays(None, 'BTC/USDT', TF)['close']) == 3
+        source.close()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+OKX 异步 REST 客户端测试
+用本地 HTTP/1.1 服务器验证连接复用、签名请求头（限速等待后才取时间戳）、响应解析以及代理环境变量
+"""
+import asyncio
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import okx_http_client
+from okx_http_client import OKXRestClient, close_http_clients, proxy_url_from_env, sign_request
+from okx_auth_fixer import OKXAuthFixer
+from okx_api_manager import OKXAPIManager
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    connections = 0
+    requests = []
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_GET(self):
+        type(self).requests.append((self.path, dict(self.headers)))
+        if self.path.startswith('/api/v5/account/balance'):
+            payload = {'code': '0', 'msg': '', 'data': [{'details': [{'ccy': 'USDT', 'eq': '12.5'}]}]}
+        elif self.path.startswith('/api/v5/market/ticker'):
+            payload = {'code': '0', 'data': [{'instId': 'BTC-USDT', 'last': '43000'}]}
+        else:
+            payload = {'code': '50111', 'msg': 'Invalid OK-ACCESS-KEY', 'data': []}
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    _Handler.connections = 0
+    _Handler.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_connections_are_reused():
+    """50 个顺序请求和 20 个并发请求复用少量长连接"""
+    server, base_url = start_server()
+    try:
+        client = OKXRestClient('key', 'secret', 'pass', proxy_url=None, base_url=base_url)
+
+        async def run():
+            for _ in range(50):
+                response = await client.get_ticker('BTC-USDT')
+                assert response.json()['data'][0]['last'] == '43000'
+            await asyncio.gather(*(client.get_balance() for _ in range(20)))
+            await close_http_clients()
+
+        asyncio.run(run())
+        assert len(_Handler.requests) == 70
+        assert _Handler.connections <= okx_http_client.MAX_CONNECTIONS
+        assert _Handler.connections < 25
+    finally:
+        server.shutdown()
+
+
+def test_signed_headers():
+    """签名覆盖 时间戳 + 方法 + 路径(含查询串) + 请求体"""
+    server, base_url = start_server()
+    try:
+        client = OKXRestClient('key', 'secret', 'pass', proxy_url=None, base_url=base_url)
+
+        async def run():
+            await client.request('GET', '/api/v5/account/balance', params={'ccy': 'USDT'},
+                                 timestamp='2024-01-01T00:00:00.000Z')
+            await close_http_clients()
+
+        asyncio.run(run())
+        path, headers = _Handler.requests[-1]
+        assert path == '/api/v5/account/balance?ccy=USDT'
+        assert headers['OK-ACCESS-KEY'] == 'key'
+        assert headers['OK-ACCESS-PASSPHRASE'] == 'pass'
+        assert headers['OK-ACCESS-SIGN'] == sign_request(
+            'secret', '2024-01-01T00:00:00.000Z', 'GET', '/api/v5/account/balance?ccy=USDT')
+    finally:
+        server.shutdown()
+
+
+def test_timestamp_taken_after_rate_limit_wait():
+    """限速排队之后才生成签名时间戳，等待时间不会让签名过期"""
+    server, base_url = start_server()
+    events = []
+
+    class SlowLimiter:
+        async def acquire(self, key, path):
+            events.append('wait')
+            await asyncio.sleep(0.2)
+            events.append('acquired')
+
+        def penalize(self, key, path):
+            pass
+
+    def clock():
+        events.append('timestamp')
+        return str(len(events))
+
+    try:
+        manager = OKXAPIManager('key', 'secret', 'pass', use_proxy=False)
+        manager.client.base_url = base_url
+        manager.client.limiter = SlowLimiter()
+        manager.client.timestamp_source = clock
+
+        async def run():
+            await manager.get_balance_async()
+            await close_http_clients()
+
+        asyncio.run(run())
+        _, headers = _Handler.requests[-1]
+        assert events == ['wait', 'acquired', 'timestamp']
+        assert headers['OK-ACCESS-TIMESTAMP'] == '3'
+    finally:
+        server.shutdown()
+
+def test_auth_fixer_and_manager_async():
+    """OKXAuthFixer / OKXAPIManager 的异步方法与同步版本返回格式一致"""
+    server, base_url = start_server()
+    try:
+        fixer = OKXAuthFixer('key', 'secret', 'pass')
+        fixer.client.base_url = base_url
+        fixer.client.proxy_url = None
+        manager = OKXAPIManager('key', 'secret', 'pass', use_proxy=False)
+        manager.client.base_url = base_url
+
+        async def run():
+            balance = await fixer.get_balance_async()
+            auth = await fixer.test_auth_async()
+            ticker = await manager.get_ticker_async('BTC-USDT')
+            manager_balance = await manager.get_balance_async()
+            await close_http_clients()
+            return balance, auth, ticker, manager_balance
+
+        balance, auth, ticker, manager_balance = asyncio.run(run())
+        assert balance['success'] and balance['data'][0]['details'][0]['ccy'] == 'USDT'
+        assert not auth['success'] and auth['code'] == '50111'
+        assert ticker['data'][0]['last'] == '43000'
+        assert manager_balance['code'] == '0'
+    finally:
+        server.shutdown()
+
+
+def test_clients_are_per_event_loop():
+    """每个事件循环使用自己的连接池"""
+    async def get():
+        client = okx_http_client.get_http_client('http://127.0.0.1:1')
+        await close_http_clients()
+        return client
+
+    assert asyncio.run(get()) is not asyncio.run(get())
+
+
+def test_proxy_from_env():
+    saved = {k: os.environ.get(k) for k in ('USE_PROXY', 'PROXY_HOST', 'PROXY_PORT', 'PROXY_TYPE')}
+    try:
+        os.environ.update({'USE_PROXY': 'true', 'PROXY_HOST': '10.0.0.1', 'PROXY_PORT': '1081', 'PROXY_TYPE': 'socks5'})
+        assert proxy_url_from_env() == 'socks5://10.0.0.1:1081'
+        os.environ['PROXY_TYPE'] = 'http'
+        assert proxy_url_from_env() == 'http://10.0.0.1:1081'
+        os.environ['USE_PROXY'] = 'false'
+        assert proxy_url_from_env() is None
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
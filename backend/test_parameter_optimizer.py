@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+参数优化器测试
+验证共享前缀和的指标与回测引擎一致、多进程与单进程结果相同、排名和参数空间生成
+"""
+import numpy as np
+from multiprocessing import shared_memory
+from backtest_engine import BacktestEngine, BacktestConfig
+from parameter_optimizer import (
+    ParameterSet, SharedCandles, grid_parameters, random_parameters, optimize, rank_results, format_table
+)
+from test_backtest_engine import FakeStrategy, make_candles
+
+SPACE = {
+    'bb_period': [15, 20],
+    'bb_deviation': [1.5, 2.0],
+    'ma_period': [40, 60],
+    'stop_loss_percent': [None, 1.0],
+    'take_profit_percent': [None, 2.0],
+}
+
+
+def test_grid_and_random_parameters():
+    grid = grid_parameters(SPACE)
+    assert len(grid) == 32
+    assert len(set(grid)) == 32
+    sample = random_parameters(SPACE, 10, seed=1)
+    assert len(sample) == 10 and len(set(sample)) == 10
+    assert set(sample) <= set(grid)
+    assert grid_parameters({'bb_period': [20], 'bb_deviation': [2.0], 'ma_period': [60]}) == [ParameterSet(20, 2.0, 60)]
+
+
+def test_shared_rolling_matches_indicators():
+    """共享前缀和得到的滚动均值/标准差与 indicators 一致"""
+    candles = make_candles(20000)
+    shared = SharedCandles.create(candles)
+    try:
+        import indicators
+        mean, std = shared.rolling_mean_std(20)
+        expected_mean, expected_var = indicators.rolling_mean_var(candles['close'], 20)
+        assert np.isnan(mean[:19]).all()
+        assert np.allclose(mean[19:], expected_mean, rtol=0, atol=1e-6)
+        assert np.allclose(std[19:], np.sqrt(expected_var), rtol=0, atol=1e-4)
+    finally:
+        shared.close()
+
+
+def test_sweep_matches_single_backtest():
+    """优化结果中的每一行与直接回测该参数的统计一致"""
+    candles = make_candles(8000)
+    config = BacktestConfig()
+    rows = optimize(FakeStrategy(), candles, grid_parameters(SPACE), config, min_trades=0, max_workers=1)
+    assert len(rows) == 32
+
+    engine = BacktestEngine()
+    for row in rows[:8]:
+        strategy = FakeStrategy(row['stop_loss_percent'], row['take_profit_percent'])
+        strategy.bb_period, strategy.bb_deviation, strategy.ma_period = row['bb_period'], row['bb_deviation'], row['ma_period']
+        stats = engine.run(strategy, candles, config).stats
+        assert stats['total_trades'] == row['total_trades']
+        assert abs(stats['total_profit_loss'] - row['total_profit_loss']) < 1e-6
+
+
+def test_parallel_matches_serial():
+    """多进程结果与单进程相同，共享内存用完即释放"""
+    candles = make_candles(8000)
+    params = grid_parameters(SPACE)
+    serial = optimize(FakeStrategy(), candles, params, max_workers=1, min_trades=0)
+    parallel = optimize(FakeStrategy(), candles, params, max_workers=2, min_trades=0)
+
+    key = lambda r: (r['bb_period'], r['bb_deviation'], r['ma_period'],
+                     r['stop_loss_percent'] or 0, r['take_profit_percent'] or 0)
+    assert sorted(map(key, serial)) == sorted(map(key, parallel))
+    by_key = {key(r): r for r in serial}
+    for row in parallel:
+        assert row['total_profit_loss'] == by_key[key(row)]['total_profit_loss']
+
+
+def test_shared_memory_is_unlinked():
+    candles = make_candles(1000)
+    shared = SharedCandles.create(candles)
+    name = shared.shm.name
+    shared.close()
+    try:
+        shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    assert False, "共享内存应当已删除"
+
+
+def test_rank_results():
+    rows = [
+        {'sharpe_ratio': 1.0, 'max_drawdown_percent': 5.0, 'total_trades': 3},
+        {'sharpe_ratio': 2.0, 'max_drawdown_percent': 9.0, 'total_trades': 3},
+        {'sharpe_ratio': 3.0, 'max_drawdown_percent': 1.0, 'total_trades': 0},
+    ]
+    ranked = rank_results([dict(r) for r in rows])
+    assert [r['sharpe_ratio'] for r in ranked] == [2.0, 1.0]
+    assert ranked[0]['rank'] == 1
+    ranked = rank_results([dict(r) for r in rows], metric='max_drawdown_percent', min_trades=0, top_n=1)
+    assert ranked[0]['max_drawdown_percent'] == 1.0
+    assert 'rank' in format_table(ranked).splitlines()[0]
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+OKX 接口限速器测试
+验证接口组解析、按 IP / 账户分桶、排队等待代替 429、超时拒绝与取消归还、
+429 惩罚、合规管理器的内存状态、未列出的公开接口按 IP 分桶，以及限速状态在线程中批量写回数据库
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base, ExchangeAccount, User
+from okx_compliance_manager import OKXComplianceManager
+import rate_limiter as rate_limiter_module
+from rate_limiter import EndpointLimit, RateLimiter, RateLimitExceeded, endpoint_group
+
+FAST_LIMITS = {
+    'market/ticker': EndpointLimit(5, 0.1, 'ip'),
+    'account/balance': EndpointLimit(4, 0.1),
+}
+
+
+def test_endpoint_groups_and_scopes():
+    assert endpoint_group('/api/v5/market/ticker?instId=BTC-USDT') == 'market/ticker'
+    assert endpoint_group('account/balance') == 'account/balance'
+
+    limiter = RateLimiter()
+    assert limiter.limit_for('trade/order') == EndpointLimit(60, 2.0)
+    assert limiter.limit_for('unknown/endpoint') == rate_limiter_module.DEFAULT_LIMIT
+    # 未列出的公开接口也按 IP 分桶，未签名请求不会落进 (None, 接口组) 的账户桶
+    assert limiter.limit_for('market/index-tickers').scope == 'ip'
+    assert limiter.bucket(None, 'market/index-tickers')[0] is limiter.bucket(3, '/api/v5/market/index-tickers')[0]
+    assert (None, 'market/index-tickers') not in limiter.buckets
+    # 公开接口所有账户共用一个桶，私有接口每个账户一个桶
+    assert limiter.bucket(1, '/api/v5/market/ticker')[0] is limiter.bucket(2, 'market/ticker')[0]
+    assert limiter.bucket(1, '/api/v5/account/balance')[0] is not limiter.bucket(2, 'account/balance')[0]
+
+
+def test_burst_waits_for_tokens():
+    """突发请求先消耗桶容量，其余按速率排队，而不是打到交易所"""
+    limiter = RateLimiter(FAST_LIMITS)
+
+    async def run():
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.acquire(1, '/api/v5/market/ticker') for _ in range(15)))
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    # 容量 5，之后每秒 50 个：剩下 10 个需要约 0.2 秒
+    assert 0.18 <= elapsed < 1.0
+    stats = limiter.get_stats()
+    assert stats['acquired'] == 15 and stats['throttled'] == 10
+    assert stats['groups']['market/ticker']['throttled'] == 10
+    assert stats['max_wait_time'] >= 0.19
+
+
+def test_accounts_do_not_share_private_buckets():
+    limiter = RateLimiter(FAST_LIMITS)
+
+    async def run():
+        await asyncio.gather(*(limiter.acquire(account, 'account/balance')
+                               for account in (1, 2, 3) for _ in range(4)))
+
+    asyncio.run(run())
+    assert limiter.stats['throttled'] == 0
+
+
+def test_max_wait_rejects_and_cancel_refunds():
+    limiter = RateLimiter({'account/balance': EndpointLimit(2, 10.0)}, max_wait=1.0)
+
+    async def run():
+        await limiter.acquire(1, 'account/balance')
+        await limiter.acquire(1, 'account/balance')
+        try:
+            await limiter.acquire(1, 'account/balance')
+        except RateLimitExceeded as e:
+            rejected = e.wait
+        else:
+            rejected = None
+
+        # 允许等待的调用被取消后归还令牌
+        bucket, _ = limiter.bucket(1, 'account/balance')
+        task = asyncio.create_task(limiter.acquire(1, 'account/balance', max_wait=60))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return rejected, bucket.tokens
+
+    rejected, tokens = asyncio.run(run())
+    assert rejected is not None and rejected > 1.0
+    assert -0.01 < tokens < 0.1
+    assert limiter.stats['rejected'] == 1
+
+
+def test_penalize_pauses_bucket():
+    limiter = RateLimiter(FAST_LIMITS)
+    limiter.penalize(1, '/api/v5/account/balance', retry_after=0.1)
+
+    async def run():
+        started = time.monotonic()
+        await limiter.acquire(1, 'account/balance')
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.1
+    assert limiter.stats['penalties'] == 1
+
+
+def test_compliance_manager_uses_limiter_state():
+    """update_rate_limit_info 不再提交事务；check_rate_limit 读取内存状态"""
+    limiter = RateLimiter(FAST_LIMITS)
+    original = rate_limiter_module.rate_limiter
+    import okx_compliance_manager
+    okx_compliance_manager.rate_limiter = limiter
+    try:
+        manager = OKXComplianceManager(use_proxy=False)
+        account = SimpleNamespace(id=7, rate_limit_remaining=None, rate_limit_reset=None)
+        db = SimpleNamespace(commits=0)
+        db.commit = lambda: setattr(db, 'commits', db.commits + 1)
+
+        assert manager.check_rate_limit(account) == (True, None)
+        reset = datetime.utcnow() + timedelta(seconds=30)
+        manager.update_rate_limit_info(db, account, 0, reset)
+        allowed, reset_time = manager.check_rate_limit(account)
+        assert not allowed and reset_time == reset
+        assert db.commits == 0
+        assert limiter.get_stats()['pending_flush'] == 1
+    finally:
+        okx_compliance_manager.rate_limiter = original
+
+
+def test_flush_writes_accounts_in_one_batch():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+
+    db = session_factory()
+    ids = []
+    for i in range(3):
+        user = User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        account = ExchangeAccount(user_id=user.id, exchange_name="okex", api_key="k", api_secret="s")
+        db.add(account)
+        db.flush()
+        ids.append(account.id)
+    db.commit()
+    db.close()
+
+    commits = []
+    event.listen(engine, 'commit', lambda conn: commits.append(1))
+
+    limiter = RateLimiter({'account/balance': EndpointLimit(10, 100.0)})
+
+    async def run():
+        for account_id in ids:
+            for _ in range(3):
+                await limiter.acquire(account_id, 'account/balance')
+        # API key 作为账户键的请求不写回
+        await limiter.acquire('api-key', 'account/balance')
+
+    asyncio.run(run())
+    assert limiter.flush(session_factory) == 3
+    assert len(commits) == 1
+    # 没有新变化时不访问数据库
+    assert limiter.flush(session_factory) == 0
+
+    db = session_factory()
+    rows = db.query(ExchangeAccount).order_by(ExchangeAccount.id).all()
+    assert [row.rate_limit_remaining for row in rows] == [7, 7, 7]
+    assert all(row.rate_limit_reset > datetime.utcnow() for row in rows)
+    db.close()
+    assert limiter.get_stats()['flushed_accounts'] == 3
+
+
+def test_flush_loop_writes_off_the_event_loop():
+    """定时写回在线程中执行数据库操作"""
+    threads = []
+
+    class RecordingSession:
+        def bulk_update_mappings(self, model, mappings):
+            threads.append(threading.get_ident())
+
+        def commit(self):
+            pass
+
+        def rollback(self):
+            pass
+
+        def close(self):
+            pass
+
+    limiter = RateLimiter({'account/balance': EndpointLimit(10, 100.0)}, flush_interval=0.01)
+
+    async def run():
+        await limiter.acquire(1, 'account/balance')
+        await limiter.start(RecordingSession)
+        await asyncio.sleep(0.05)
+        await limiter.stop(RecordingSession)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads and loop_thread not in threads
+    assert limiter.get_stats()['flushed_accounts'] == 1
+
+
+def test_rest_client_acquires_before_request():
+    """OKXRestClient 发请求前取令牌，公开接口不区分账户"""
+    from okx_http_client import OKXRestClient
+
+    limiter = RateLimiter(FAST_LIMITS)
+    client = OKXRestClient('key', 'secret', 'pass', proxy_url=None, base_url='http://127.0.0.1:9',
+                           account_id=3, limiter=limiter)
+    assert client.rate_limit_key == 3
+    assert OKXRestClient('key', proxy_url=None, limiter=limiter).rate_limit_key == 'key'
+
+    async def run():
+        try:
+            await client.get_ticker('BTC-USDT')
+        except Exception:
+            pass
+
+    asyncio.run(run())
+    assert limiter.get_stats()['groups'] == {'market/ticker': {'acquired': 1, 'throttled': 0, 'rejected': 0}}
+    assert ('ip', 'market/ticker') in limiter.buckets
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
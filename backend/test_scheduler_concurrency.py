@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+策略调度器并发测试
+验证信号按组批量计算、K线拉取与下单的全局/单账户并发上限、每笔下单独立会话、tick 统计（含每组信号计算耗时）以及重叠 tick 被跳过
+"""
+import asyncio
+import time
+import scheduler as scheduler_module
+from scheduler import StrategyScheduler, _percentile
+
+
+class FakeStrategy:
+    def __init__(self, strategy_id, account_id):
+        self.id = strategy_id
+        self.exchange_account_id = account_id
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, *args):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+
+    def query(self, model):
+        return FakeQuery(self.rows)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCoalescer:
+    """按交易对分组（每组10个策略），记录调度器传入的信号量"""
+
+    def __init__(self):
+        self.semaphore = None
+
+    async def fetch_groups(self, strategies, db, semaphore=None):
+        self.semaphore = semaphore
+        return [([s.id for s in strategies[i:i + 10]], []) for i in range(0, len(strategies), 10)]
+
+
+class SlowEngine:
+    """每组信号一次批量计算（全部发出买入信号），每次下单耗时 50ms，记录在途数量"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.per_account = {}
+        self.max_per_account = 0
+        self.batches = 0
+        self.sessions = []
+
+    def prune_indicator_states(self, ids):
+        pass
+
+    def evaluate_strategies(self, strategies, ohlcv_data):
+        self.batches += 1
+        return {s.id: 'buy' for s in strategies}
+
+    async def execute_trade(self, strategy, signal, db):
+        self.sessions.append(db)
+        self.in_flight += 1
+        account = strategy.exchange_account_id
+        self.per_account[account] = self.per_account.get(account, 0) + 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.max_per_account = max(self.max_per_account, self.per_account[account])
+        await asyncio.sleep(0.05)
+        self.per_account[account] -= 1
+        self.in_flight -= 1
+        return None
+
+
+def run_tick(strategies, max_concurrency=10, per_account=2):
+    engine = SlowEngine()
+    original = (scheduler_module.strategy_engine, scheduler_module.candle_coalescer, scheduler_module.SessionLocal)
+    scheduler_module.strategy_engine = engine
+    scheduler_module.candle_coalescer = engine.coalescer = FakeCoalescer()
+    sessions = []
+
+    def session_factory():
+        sessions.append(FakeSession(strategies))
+        return sessions[-1]
+
+    scheduler_module.SessionLocal = session_factory
+    try:
+        sched = StrategyScheduler(max_concurrency=max_concurrency, per_account_concurrency=per_account)
+        started = time.perf_counter()
+        asyncio.run(sched.monitor_strategies())
+        engine.tick_session = sessions[0]
+        return sched, engine, time.perf_counter() - started
+    finally:
+        scheduler_module.strategy_engine, scheduler_module.candle_coalescer, scheduler_module.SessionLocal = original
+
+
+def test_concurrency_is_bounded():
+    """在途数量不超过全局与单账户上限"""
+    strategies = [FakeStrategy(i, i % 5) for i in range(40)]
+    sched, engine, elapsed = run_tick(strategies, max_concurrency=8, per_account=2)
+
+    assert engine.batches == 4
+    assert engine.max_in_flight <= 8
+    assert engine.max_per_account <= 2
+    # K线拉取与下单共用同一个全局上限
+    assert engine.coalescer.semaphore._value == 8
+    # 串行需要 2 秒，5 个账户 × 2 并发 → 约 0.4 秒
+    assert elapsed < 1.0
+
+
+def test_each_trade_uses_its_own_session():
+    """并发下单不共用 tick 的会话，每笔交易的会话用完即关闭"""
+    strategies = [FakeStrategy(i, i % 5) for i in range(20)]
+    _, engine, _ = run_tick(strategies)
+
+    assert len(engine.sessions) == 20
+    assert len({id(db) for db in engine.sessions}) == 20
+    assert engine.tick_session not in engine.sessions
+    assert all(db.closed for db in engine.sessions) and engine.tick_session.closed
+
+def test_tick_stats_recorded():
+    """记录每个 tick 的策略数、耗时和分位数"""
+    strategies = [FakeStrategy(i, i) for i in range(10)]
+    sched, _, _ = run_tick(strategies)
+
+    stats = sched.get_tick_stats()['last_tick']
+    assert stats['strategies_evaluated'] == 10
+    assert stats['trades_executed'] == 10
+    assert stats['p50'] >= 0.04
+    assert stats['p99'] >= stats['p50']
+    assert not stats['overrun']
+
+
+def test_group_evaluation_time_recorded():
+    """信号计算耗时按K线分组记录，与下单耗时分开统计"""
+    strategies = [FakeStrategy(i, i % 3) for i in range(25)]
+    sched, _, _ = run_tick(strategies)
+
+    stats = sched.get_tick_stats()['last_tick']
+    assert stats['groups_evaluated'] == 3
+    assert 0 <= stats['eval_p50'] <= stats['eval_p99'] <= stats['signal_time']
+    assert stats['eval_p99'] < stats['p50']
+
+
+def test_overlapping_tick_is_skipped():
+    """上一个 tick 未结束时新 tick 被跳过而不是堆积"""
+    sched = StrategyScheduler(max_concurrency=1, per_account_concurrency=1)
+    sched._tick_in_progress = True
+    asyncio.run(sched.monitor_strategies())
+    assert sched.skipped_ticks == 1
+    assert not sched.tick_stats
+
+
+def test_percentile():
+    values = [i / 100 for i in range(1, 101)]
+    assert _percentile(values, 50) == 0.5
+    assert _percentile(values, 99) == 0.99
+    assert _percentile([], 99) == 0.0
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
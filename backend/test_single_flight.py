@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+请求合并与异步行情测试
+验证 SingleFlight 的合并、异常传播和取消隔离，以及 get_real_ticker 在并发下只发起一次上游调用
+"""
+import asyncio
+from single_flight import SingleFlight
+from simple_real_trading_engine import SimpleRealExchangeManager
+from ticker_cache import TickerCache
+
+TICKER = {
+    'instId': 'BTC-USDT', 'last': '43000', 'bidPx': '42999', 'askPx': '43001',
+    'high24h': '44000', 'low24h': '42000', 'vol24h': '1234', 'ts': '1700000000000'
+}
+
+
+class FakeUpstream:
+    """慢速公开行情接口：记录调用次数"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, exchange_name, inst_id):
+        self.calls.append(inst_id)
+        await asyncio.sleep(self.delay)
+        return {'code': '0', 'data': [dict(TICKER, instId=inst_id)]}
+
+
+def make_manager(upstream, users=(1,)):
+    manager = SimpleRealExchangeManager()
+    manager.ticker_cache = TickerCache(upstream)
+    for user_id in users:
+        manager.okx_managers[user_id] = object()
+    return manager
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def run():
+        first = await asyncio.gather(*(flight.do('k', fetch) for _ in range(100)))
+        second = await flight.do('k', fetch)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == [42] * 100 and second == 42
+    # 第一批合并为一次，结束后的新请求重新发起
+    assert len(calls) == 2
+    assert flight.get_stats() == {'calls': 101, 'executions': 2, 'shared': 99, 'in_flight': 0}
+
+
+def test_errors_propagate_and_are_not_cached():
+    flight = SingleFlight()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise ConnectionError("upstream down")
+        return 'ok'
+
+    async def run():
+        results = await asyncio.gather(*(flight.do('k', flaky) for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(r, ConnectionError) for r in results)
+        return await flight.do('k', flaky)
+
+    assert asyncio.run(run()) == 'ok'
+    assert len(attempts) == 2
+
+
+def test_cancelled_waiter_does_not_cancel_others():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def run():
+        first = asyncio.create_task(flight.do('k', fetch))
+        second = asyncio.create_task(flight.do('k', fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == 'done'
+
+
+def test_real_ticker_fan_out_is_coalesced():
+    """多个用户同时请求同一交易对只产生一次上游请求，不同交易对各一次"""
+    upstream = FakeUpstream()
+    manager = make_manager(upstream, users=range(10))
+
+    async def run():
+        requests = [manager.get_real_ticker(i % 10, 'okx', 'BTC/USDT') for i in range(200)]
+        requests += [manager.get_real_ticker(i, 'okx', 'ETH-USDT') for i in range(10)]
+        return await asyncio.gather(*requests)
+
+    results = asyncio.run(run())
+    assert all(r['success'] for r in results)
+    assert results[0]['data']['validated_symbol'] == 'BTC-USDT'
+    assert results[0]['data']['price'] == 43000.0
+    assert sorted(upstream.calls) == ['BTC-USDT', 'ETH-USDT']
+
+
+def test_ticker_does_not_block_event_loop():
+    """慢速上游期间事件循环继续调度其他协程"""
+    manager = make_manager(FakeUpstream(delay=0.3))
+
+    async def run():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(heartbeat())
+        result = await manager.get_real_ticker(1, 'okx', 'BTC-USDT')
+        task.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(run())
+    assert result['success']
+    assert ticks >= 10
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+策略插件注册表测试
+验证插件注册与查找、共享指标计算、多策略批量信号内核、按插件分发信号、
+分组评估时预热后的策略走增量内核、冷启动与缺口走批量内核以及激活时只解析一次
+"""
+import asyncio
+import dataclasses
+import time
+import numpy as np
+import indicators
+import trading_engine
+from strategy_registry import (
+    SIGNAL_NAMES, IndicatorKey, StrategyPlugin, boll_ma_batch_signals, boll_ma_signal, compute_indicators,
+    get_strategy_plugin, register_strategy, registered_strategy_types
+)
+from trading_engine import StrategyEngine
+from test_backtest_engine import FakeStrategy, make_candles
+
+
+def to_ohlcv(candles):
+    return np.column_stack([candles[name] for name in ('timestamp', 'open', 'high', 'low', 'close', 'volume')]).tolist()
+
+
+def _momentum_signal(candles, values, strategy):
+    """测试用插件：价格高于 EMA 买入，低于卖出"""
+    close = candles['close']
+    ema = values[IndicatorKey('ema', strategy.ma_period)]
+    return (close > ema).astype(np.int8) - (close < ema).astype(np.int8)
+
+
+register_strategy(StrategyPlugin(
+    strategy_type='test_ema_momentum',
+    required_indicators=lambda s: frozenset({IndicatorKey('ema', s.ma_period)}),
+    candle_depth=lambda s: s.ma_period * 3,
+    signal=_momentum_signal,
+))
+
+
+def test_lookup():
+    assert '5m_boll_ma60' in registered_strategy_types()
+    assert get_strategy_plugin('test_ema_momentum').candle_depth(FakeStrategy()) == 180
+    try:
+        get_strategy_plugin('does_not_exist')
+    except ValueError:
+        return
+    assert False, "未注册的类型应抛出 ValueError"
+
+
+def test_compute_indicators_aligned():
+    """指标与K线对齐，前 period-1 个为 NaN"""
+    close = make_candles(500)['close']
+    keys = {IndicatorKey('mean', 20), IndicatorKey('std', 20), IndicatorKey('mean', 60), IndicatorKey('ema', 10)}
+    values = compute_indicators(close, keys)
+    assert set(values) == keys
+    assert all(len(v) == len(close) for v in values.values())
+    assert np.isnan(values[IndicatorKey('mean', 60)][:59]).all()
+    assert np.allclose(values[IndicatorKey('mean', 60)][59:], indicators.sma(close, 60))
+    assert np.allclose(values[IndicatorKey('std', 20)][19:], indicators.rolling_std(close, 20))
+
+
+def test_group_evaluation_matches_incremental_path():
+    """同一K线上批量评估的结果与逐策略增量评估一致"""
+    candles = make_candles(400)
+    ohlcv = to_ohlcv(candles)
+    engine = StrategyEngine(None)
+
+    strategies = []
+    for i, (bb_period, deviation) in enumerate([(20, 2.0), (20, 1.0), (30, 1.5), (15, 0.5)]):
+        s = FakeStrategy()
+        s.id, s.bb_period, s.bb_deviation = i, bb_period, deviation
+        strategies.append(s)
+
+    for end in range(200, 400, 7):
+        batch = engine.evaluate_strategies(strategies, ohlcv[:end])
+        for s in strategies:
+            single = asyncio.run(engine.check_strategy_signal(s, None, ohlcv_data=ohlcv[max(0, end - 80):end]))
+            assert batch[s.id] == single, f"bar {end} strategy {s.id}"
+
+
+def test_group_evaluation_feeds_incremental_state():
+    """只有增量内核的插件在分组评估时更新指标状态，预热后每个 tick 只需要尾部K线"""
+    register_strategy(dataclasses.replace(get_strategy_plugin('5m_boll_ma60'),
+                                          strategy_type='test_boll_ma_incremental', batch_signal=None))
+    ohlcv = to_ohlcv(make_candles(300))
+    engine = StrategyEngine(None)
+    incremental, batched = FakeStrategy(), FakeStrategy()
+    incremental.id, incremental.strategy_type = 1, 'test_boll_ma_incremental'
+    batched.id = 2
+
+    end = 200
+    engine.evaluate_strategies([incremental], ohlcv[:end])
+    for end in range(201, 300, 3):
+        window = ohlcv[:end]
+        needed = engine.candles_required(incremental, int(window[-1][0]))
+        assert needed < 10
+        signals = engine.evaluate_strategies([incremental], window[-needed:])
+        assert signals[1] == engine.evaluate_strategies([batched], window)[2], f"bar {end}"
+    state = engine.indicator_states[(1, incremental.symbol, incremental.timeframe)]
+    assert state.full_recomputes == 1
+
+
+def test_warm_strategies_skip_batch_kernel():
+    """同时有两种内核的插件：冷启动批量评估并播种状态，之后每个 tick 走增量内核，缺口时回到批量"""
+    calls = []
+    plugin = get_strategy_plugin('5m_boll_ma60')
+
+    def counting_batch(close, strategies):
+        calls.append(len(close))
+        return plugin.batch_signal(close, strategies)
+
+    register_strategy(dataclasses.replace(plugin, strategy_type='test_boll_ma_both', batch_signal=counting_batch))
+    ohlcv = to_ohlcv(make_candles(300))
+    engine, reference = StrategyEngine(None), StrategyEngine(None)
+    strategy, baseline = FakeStrategy(), FakeStrategy()
+    strategy.strategy_type = 'test_boll_ma_both'
+    assert engine.candles_required(strategy, int(ohlcv[199][0])) == plugin.candle_depth(strategy)
+
+    engine.evaluate_strategies([strategy], ohlcv[:200])
+    assert calls == [200]
+    for end in range(201, 260, 3):
+        window = ohlcv[:end]
+        needed = engine.candles_required(strategy, int(window[-1][0]))
+        assert needed < 10
+        signals = engine.evaluate_strategies([strategy], window[-needed:])
+        assert signals[strategy.id] == reference.evaluate_strategies([baseline], window)[baseline.id], f"bar {end}"
+    assert len(calls) == 1
+
+    # 跳过若干根K线：状态失效，下一个 tick 重新请求完整窗口并批量评估
+    engine.evaluate_strategies([strategy], ohlcv[270:272])
+    needed = engine.candles_required(strategy, int(ohlcv[289][0]))
+    assert needed == plugin.candle_depth(strategy)
+    engine.evaluate_strategies([strategy], ohlcv[290 - needed:290])
+    assert calls[-1] == needed
+    assert engine.candles_required(strategy, int(ohlcv[289][0])) < 10
+
+def test_custom_plugin_is_dispatched():
+    """非增量插件通过信号函数计算最后一根K线"""
+    candles = make_candles(300)
+    strategy = FakeStrategy()
+    strategy.strategy_type = 'test_ema_momentum'
+    engine = StrategyEngine(None)
+
+    signal = asyncio.run(engine.check_strategy_signal(strategy, None, ohlcv_data=to_ohlcv(candles)))
+    ema = indicators.ema(candles['close'], strategy.ma_period)
+    expected = 'buy' if candles['close'][-1] > ema[-1] else 'sell'
+    assert signal == expected
+    assert engine.candles_required(strategy, 0) == 180
+
+
+def test_plugin_resolved_once_at_activation():
+    """激活后每个 tick 不再查注册表；停用后释放"""
+    calls = []
+    original = trading_engine.get_strategy_plugin
+
+    def counting_lookup(strategy_type):
+        calls.append(strategy_type)
+        return original(strategy_type)
+
+    trading_engine.get_strategy_plugin = counting_lookup
+    try:
+        engine = StrategyEngine(None)
+        strategy = FakeStrategy()
+        engine.activate_strategy(strategy)
+        ohlcv = to_ohlcv(make_candles(200))
+        for _ in range(5):
+            asyncio.run(engine.check_strategy_signal(strategy, None, ohlcv_data=ohlcv))
+        assert calls == ['5m_boll_ma60']
+
+        engine.deactivate_strategy(strategy.id)
+        assert strategy.id not in engine.active_plugins
+        assert not engine.indicator_states
+    finally:
+        trading_engine.get_strategy_plugin = original
+
+
+def test_unknown_type_returns_no_signal():
+    strategy = FakeStrategy()
+    strategy.strategy_type = 'does_not_exist'
+    engine = StrategyEngine(None)
+    assert asyncio.run(engine.check_strategy_signal(strategy, None, ohlcv_data=[])) is None
+    try:
+        engine.activate_strategy(strategy)
+    except ValueError:
+        return
+    assert False, "激活未注册的类型应抛出 ValueError"
+
+
+def test_batch_kernel_matches_full_computation():
+    """批量内核与逐组参数全量计算的最后一根K线信号一致"""
+    rng = np.random.default_rng(3)
+    bb_periods = rng.integers(5, 60, 300)
+    deviations = rng.uniform(0.2, 3.0, 300)
+    ma_periods = rng.integers(10, 120, 300)
+    candles = make_candles(2000)
+    for end in (50, 130, 700, 2000):
+        close = candles['close'][:end]
+        codes = boll_ma_batch_signals(close, bb_periods, deviations, ma_periods)
+        for bb_period, deviation, ma_period, code in zip(bb_periods, deviations, ma_periods, codes):
+            if max(bb_period, ma_period) > end:
+                assert code == 0
+                continue
+            upper, _, lower = indicators.bollinger_bands(close, bb_period, deviation)
+            ma = indicators.sma(close, ma_period)
+            expected = boll_ma_signal(close[-1], upper[-1], lower[-1], ma[-1])
+            assert SIGNAL_NAMES.get(int(code)) == expected
+
+
+def test_batch_cost_independent_of_strategy_count():
+    """同一交易对上 1000 个策略的批量评估耗时与 10 个同一量级"""
+    # 只保留批量内核，每个 tick 都走冷启动时的向量化路径
+    register_strategy(dataclasses.replace(get_strategy_plugin('5m_boll_ma60'),
+                                          strategy_type='test_boll_ma_batch', incremental_signal=None))
+    ohlcv = to_ohlcv(make_candles(200))
+    engine = StrategyEngine(None)
+
+    def timed(count):
+        strategies = []
+        for i in range(count):
+            s = FakeStrategy()
+            s.id, s.bb_period, s.bb_deviation, s.ma_period = i, 10 + i % 40, 1.0 + (i % 7) * 0.25, 30 + i % 90
+            s.strategy_type = 'test_boll_ma_batch'
+            strategies.append(s)
+        engine.evaluate_strategies(strategies, ohlcv)
+        started = time.perf_counter()
+        for _ in range(20):
+            engine.evaluate_strategies(strategies, ohlcv)
+        return (time.perf_counter() - started) / 20
+
+    small, large = timed(10), timed(1000)
+    # 逐策略计算时 100 倍策略数约为 100 倍耗时；批量时只剩结果映射的线性开销
+    assert large < small * 30, f"10: {small * 1000:.2f}ms, 1000: {large * 1000:.2f}ms"
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+行情批处理测试
+验证窗口内的并发交易对查询合并为一次批量请求、按 instType 分组、
+单个交易对走单个接口、错误分发，以及与 TickerCache 组合后的上游调用次数
+"""
+import asyncio
+from ticker_batcher import TickerBatcher, inst_type_of
+from ticker_cache import TickerCache
+
+SPOT = {f"COIN{i}-USDT": {'instId': f"COIN{i}-USDT", 'last': str(100 + i)} for i in range(100)}
+SWAP = {'BTC-USDT-SWAP': {'instId': 'BTC-USDT-SWAP', 'last': '43000'},
+        'ETH-USDT-SWAP': {'instId': 'ETH-USDT-SWAP', 'last': '2300'}}
+
+
+class FakeUpstream:
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.bulk_calls = []
+        self.single_calls = []
+        self.fail = False
+
+    async def bulk(self, inst_type):
+        self.bulk_calls.append(inst_type)
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("HTTP 503")
+        return SPOT if inst_type == 'SPOT' else SWAP
+
+    async def single(self, exchange_name, inst_id):
+        self.single_calls.append(inst_id)
+        await asyncio.sleep(self.delay)
+        return {'code': '0', 'data': [SPOT[inst_id]]}
+
+
+def test_inst_type_of():
+    assert inst_type_of('BTC-USDT') == 'SPOT'
+    assert inst_type_of('BTC-USDT-SWAP') == 'SWAP'
+    assert inst_type_of('BTC-USD-240628') == 'FUTURES'
+    assert inst_type_of('BTC-USD-240628-50000-C') == 'OPTION'
+
+
+def test_concurrent_lookups_share_one_bulk_fetch():
+    upstream = FakeUpstream()
+    batcher = TickerBatcher(upstream.bulk, upstream.single)
+
+    async def run():
+        symbols = [f"COIN{i}-USDT" for i in range(50)] + ['COIN0-USDT', 'NOPE-USDT']
+        return await asyncio.gather(*(batcher.get_ticker('okx', symbol) for symbol in symbols))
+
+    results = asyncio.run(run())
+    assert upstream.bulk_calls == ['SPOT'] and upstream.single_calls == []
+    assert results[7]['data'][0]['last'] == '107'
+    assert results[50] == results[0]
+    assert results[51]['code'] == '51001' and results[51]['data'] == []
+    stats = batcher.get_stats()
+    assert stats['max_batch_size'] == 51 and stats['requests_per_upstream_call'] == 52
+
+
+def test_inst_types_are_batched_separately():
+    upstream = FakeUpstream()
+    batcher = TickerBatcher(upstream.bulk, upstream.single)
+
+    async def run():
+        return await asyncio.gather(batcher.get_ticker('okx', 'COIN1-USDT'),
+                                    batcher.get_ticker('okx', 'COIN2-USDT'),
+                                    batcher.get_ticker('okx', 'BTC-USDT-SWAP'),
+                                    batcher.get_ticker('okx', 'ETH-USDT-SWAP'))
+
+    spot1, spot2, swap, _ = asyncio.run(run())
+    assert sorted(upstream.bulk_calls) == ['SPOT', 'SWAP']
+    assert spot2['data'][0]['last'] == '102' and swap['data'][0]['last'] == '43000'
+
+
+def test_single_symbol_uses_single_endpoint():
+    upstream = FakeUpstream()
+    batcher = TickerBatcher(upstream.bulk, upstream.single)
+
+    async def run():
+        first = await asyncio.gather(*(batcher.get_ticker('okx', 'COIN3-USDT') for _ in range(5)))
+        # 上一个窗口结束后到达的请求进入新的批次
+        second = await batcher.get_ticker('okx', 'COIN4-USDT')
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert upstream.single_calls == ['COIN3-USDT', 'COIN4-USDT'] and upstream.bulk_calls == []
+    assert all(result['data'][0]['last'] == '103' for result in first)
+    assert second['data'][0]['last'] == '104'
+
+
+def test_small_batch_fetches_every_symbol():
+    """窗口内交易对数少于 min_batch_size 但多于一个时，每个交易对都要单独请求并唤醒等待者"""
+    upstream = FakeUpstream()
+    batcher = TickerBatcher(upstream.bulk, upstream.single, min_batch_size=3)
+
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(batcher.get_ticker('okx', 'COIN1-USDT'),
+                                                     batcher.get_ticker('okx', 'COIN2-USDT')), 1.0)
+
+    first, second = asyncio.run(run())
+    assert sorted(upstream.single_calls) == ['COIN1-USDT', 'COIN2-USDT'] and upstream.bulk_calls == []
+    assert first['data'][0]['last'] == '101' and second['data'][0]['last'] == '102'
+
+
+def test_bulk_failure_reaches_every_waiter():
+    upstream = FakeUpstream()
+    upstream.fail = True
+    batcher = TickerBatcher(upstream.bulk, upstream.single)
+
+    async def run():
+        return await asyncio.gather(*(batcher.get_ticker('okx', f"COIN{i}-USDT") for i in range(10)))
+
+    results = asyncio.run(run())
+    assert all(result['code'] == '-1' and 'HTTP 503' in result['msg'] for result in results)
+    assert batcher.stats['errors'] == 1
+
+
+def test_cache_with_batcher_costs_one_upstream_call():
+    """100 个并发查询覆盖 20 个交易对：缓存按 key 合并，批处理再合并为一次上游调用"""
+    upstream = FakeUpstream()
+    batcher = TickerBatcher(upstream.bulk, upstream.single)
+    cache = TickerCache(batcher.get_ticker)
+
+    async def run():
+        lookups = [cache.get_ticker('okex', f"COIN{i % 20}-USDT") for i in range(100)]
+        results = await asyncio.gather(*lookups)
+        # TTL 内再次查询直接命中缓存
+        again = await cache.get_ticker('okx', 'COIN5-USDT')
+        return results, again
+
+    results, again = asyncio.run(run())
+    assert len(upstream.bulk_calls) == 1
+    assert cache.stats['upstream_calls'] == 20 and cache.stats['hits'] == 1
+    assert results[25]['data'][0]['last'] == '105' and again == results[5]
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+共享行情缓存测试
+用可控时钟验证 TTL 命中、stale-while-revalidate、错误不缓存、并发合并和计数器
+"""
+import asyncio
+from ticker_cache import TickerCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Upstream:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.fail = False
+
+    async def __call__(self, exchange_name, inst_id):
+        self.calls.append((exchange_name, inst_id))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            return {'code': '-1', 'msg': 'timeout', 'data': None}
+        return {'code': '0', 'data': [{'instId': inst_id, 'last': str(len(self.calls))}]}
+
+
+def last(result):
+    return result['data'][0]['last']
+
+
+def test_fresh_hits_within_ttl():
+    clock, upstream = Clock(), Upstream()
+    cache = TickerCache(upstream, ttl=1.0, stale_ttl=5.0, clock=clock)
+
+    async def run():
+        first = await cache.get_ticker('okx', 'BTC-USDT')
+        clock.now += 0.5
+        second = await cache.get_ticker('okex', 'BTC-USDT')
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert last(first) == last(second) == '1'
+    # okex 与 okx 是同一个 key
+    assert upstream.calls == [('okx', 'BTC-USDT')]
+    stats = cache.get_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['upstream_calls'] == 1
+
+
+def test_stale_value_served_while_revalidating():
+    """过期但在 stale 窗口内：立即返回旧值，后台只刷新一次"""
+    clock, upstream = Clock(), Upstream(delay=0.05)
+    cache = TickerCache(upstream, ttl=1.0, stale_ttl=5.0, clock=clock)
+
+    async def run():
+        await cache.get_ticker('okx', 'BTC-USDT')
+        clock.now += 2.0
+        stale = await asyncio.gather(*(cache.get_ticker('okx', 'BTC-USDT') for _ in range(20)))
+        await asyncio.sleep(0.1)
+        fresh = await cache.get_ticker('okx', 'BTC-USDT')
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+    assert all(last(r) == '1' for r in stale)
+    assert last(fresh) == '2'
+    assert len(upstream.calls) == 2
+    stats = cache.get_stats()
+    assert stats['stale_hits'] == 20 and stats['refreshes'] == 1 and stats['hits'] == 1
+
+
+def test_expired_entry_waits_for_upstream():
+    clock, upstream = Clock(), Upstream()
+    cache = TickerCache(upstream, ttl=1.0, stale_ttl=1.0, clock=clock)
+
+    async def run():
+        await cache.get_ticker('okx', 'BTC-USDT')
+        clock.now += 3.0
+        return await cache.get_ticker('okx', 'BTC-USDT')
+
+    assert last(asyncio.run(run())) == '2'
+    assert cache.get_stats()['misses'] == 2
+
+
+def test_concurrent_misses_share_one_fetch():
+    """冷启动时 100 个并发请求只调用一次上游，不同交易对互不影响"""
+    upstream = Upstream(delay=0.05)
+    cache = TickerCache(upstream, ttl=1.0, stale_ttl=5.0)
+
+    async def run():
+        requests = [cache.get_ticker('okx', 'BTC-USDT') for _ in range(100)]
+        requests += [cache.get_ticker('okx', 'ETH-USDT') for _ in range(100)]
+        return await asyncio.gather(*requests)
+
+    results = asyncio.run(run())
+    assert len(results) == 200
+    assert sorted(upstream.calls) == [('okx', 'BTC-USDT'), ('okx', 'ETH-USDT')]
+    assert cache.get_stats()['upstream_calls'] == 2
+
+
+def test_errors_are_not_cached():
+    clock, upstream = Clock(), Upstream()
+    upstream.fail = True
+    cache = TickerCache(upstream, ttl=1.0, stale_ttl=5.0, clock=clock)
+
+    async def run():
+        failed = await cache.get_ticker('okx', 'BTC-USDT')
+        upstream.fail = False
+        ok = await cache.get_ticker('okx', 'BTC-USDT')
+        return failed, ok
+
+    failed, ok = asyncio.run(run())
+    assert failed['code'] == '-1' and ok['code'] == '0'
+    stats = cache.get_stats()
+    assert stats['upstream_errors'] == 1 and stats['upstream_calls'] == 2 and stats['entries'] == 1
+
+
+def test_failed_refresh_keeps_stale_value():
+    clock, upstream = Clock(), Upstream()
+    cache = TickerCache(upstream, ttl=1.0, stale_ttl=5.0, clock=clock)
+
+    async def run():
+        await cache.get_ticker('okx', 'BTC-USDT')
+        upstream.fail = True
+        clock.now += 2.0
+        stale = await cache.get_ticker('okx', 'BTC-USDT')
+        await asyncio.sleep(0.01)
+        clock.now += 1.0
+        return stale, await cache.get_ticker('okx', 'BTC-USDT')
+
+    stale, still_stale = asyncio.run(run())
+    assert last(stale) == last(still_stale) == '1'
+    assert cache.get_stats()['refreshes'] == 2
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+交易统计汇总表测试
+验证新增 / 成交 / 撤单 / 删除交易时汇总表和每日分桶在同一事务内增量更新、回滚时不变，
+execute_trade 写入的交易计入汇总、只有注册过的 session 工厂维护汇总，以及重建任务从原始交易恢复汇总
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from database import Base, ExchangeAccount, Strategy, Trade, User, UserTradeStats, UserTradeStatsDaily
+from trade_stats import rebuild_trade_stats, register_trade_stats
+from trading_engine import StrategyEngine
+
+DAY = datetime(2026, 10, 18, 12, 0)
+
+
+def make_session(register=True):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    if register:
+        register_trade_stats(session_factory)
+        register_trade_stats(session_factory)
+    db = session_factory()
+    users = [User(username=f"u{i}", email=f"u{i}@example.com", hashed_password="x") for i in range(2)]
+    db.add_all(users)
+    db.flush()
+    strategies = []
+    for user in users:
+        account = ExchangeAccount(user_id=user.id, exchange_name="okex", api_key="k", api_secret="s")
+        db.add(account)
+        db.flush()
+        strategy = Strategy(user_id=user.id, exchange_account_id=account.id, name="s", strategy_type="5m_boll_ma60",
+                            symbol="BTC/USDT", timeframe="5m", entry_amount=10.0, is_active=True)
+        db.add(strategy)
+        strategies.append(strategy)
+    db.commit()
+    return db, [user.id for user in users], strategies
+
+
+def new_trade(user_id, strategy, status="pending", profit_loss=0.0, created_at=DAY):
+    return Trade(user_id=user_id, strategy_id=strategy.id, symbol="BTC/USDT", side="buy", order_type="market",
+                 amount=1.0, status=status, profit_loss=profit_loss, created_at=created_at)
+
+
+def snapshot(db):
+    """汇总表内容，便于与重建结果比较"""
+    totals = {row.user_id: (row.total_trades, row.filled_trades, round(row.total_profit_loss, 6))
+              for row in db.query(UserTradeStats)}
+    daily = {(row.user_id, row.day): (row.trades, row.filled_trades, round(row.profit_loss, 6))
+             for row in db.query(UserTradeStatsDaily)}
+    return totals, daily
+
+
+def test_trade_writes_update_rollups():
+    db, (user_id, other_id), (strategy, other_strategy) = make_session()
+    pending = new_trade(user_id, strategy)
+    filled = new_trade(user_id, strategy, "filled", 12.5, DAY - timedelta(days=1))
+    db.add_all([pending, filled, new_trade(other_id, other_strategy, "filled", 3.0)])
+    db.commit()
+    assert snapshot(db)[0] == {user_id: (2, 1, 12.5), other_id: (1, 1, 3.0)}
+
+    # 成交：挂单变为已成交并记入盈亏
+    pending.status, pending.profit_loss = "filled", -2.0
+    db.commit()
+    # 撤单：已成交的交易被改为取消（盈亏不再计入）
+    filled.status = "cancelled"
+    db.commit()
+    totals, daily = snapshot(db)
+    assert totals[user_id] == (2, 1, -2.0)
+    assert daily[(user_id, DAY.date())] == (1, 1, -2.0)
+    assert daily[(user_id, DAY.date() - timedelta(days=1))] == (1, 0, 0.0)
+
+    db.delete(pending)
+    db.commit()
+    assert snapshot(db)[0][user_id] == (1, 0, 0.0)
+
+    # 增量维护的结果与从原始交易重建的一致
+    incremental = snapshot(db)
+    rebuild_trade_stats(db)
+    db.commit()
+    assert snapshot(db) == incremental
+    db.close()
+
+
+def test_rollback_leaves_rollups_unchanged():
+    db, (user_id, _), (strategy, _) = make_session()
+    db.add(new_trade(user_id, strategy, "filled", 5.0))
+    db.commit()
+    before = snapshot(db)
+
+    db.add(new_trade(user_id, strategy, "filled", 100.0))
+    db.flush()
+    assert snapshot(db)[0][user_id] == (2, 2, 105.0)
+    db.rollback()
+    assert snapshot(db) == before
+    db.close()
+
+
+def test_execute_trade_counts_in_rollup():
+    db, (user_id, _), (strategy, _) = make_session()
+
+    async def place_order(account, symbol, order_type, side, amount):
+        return {'id': 'order-1'}
+
+    engine = StrategyEngine(SimpleNamespace(place_order=place_order))
+    trade = asyncio.run(engine.execute_trade(strategy, "buy", db))
+    assert trade is not None and trade.order_id == 'order-1'
+    today = trade.created_at.date()
+    totals, daily = snapshot(db)
+    assert totals[user_id] == (1, 0, 0.0) and daily[(user_id, today)] == (1, 0, 0.0)
+    db.close()
+
+
+def test_only_registered_factories_maintain_rollups():
+    """监听只注册在指定的 session 工厂上，重复注册不会重复累加"""
+    db, (user_id, _), (strategy, _) = make_session(register=False)
+    db.add(new_trade(user_id, strategy, "filled", 5.0))
+    db.commit()
+    assert snapshot(db) == ({}, {})
+    db.close()
+
+    db, (user_id, _), (strategy, _) = make_session()
+    db.add(new_trade(user_id, strategy, "filled", 5.0))
+    db.commit()
+    assert snapshot(db)[0] == {user_id: (1, 1, 5.0)}
+    db.close()
+
+def test_rebuild_repairs_bulk_inserted_history():
+    db, (user_id, other_id), (strategy, other_strategy) = make_session()
+    # 绕过 ORM 的批量导入不会触发增量维护
+    db.execute(insert(Trade), [
+        {'user_id': user_id, 'strategy_id': strategy.id, 'symbol': 'BTC/USDT', 'side': 'buy', 'order_type': 'market',
+         'amount': 1.0, 'status': status, 'profit_loss': pnl, 'created_at': DAY - timedelta(days=days)}
+        for status, pnl, days in [('filled', 1.0, 0), ('filled', 2.0, 0), ('failed', 9.0, 0), ('filled', 4.0, 3)]
+    ] + [{'user_id': other_id, 'strategy_id': other_strategy.id, 'symbol': 'BTC/USDT', 'side': 'sell',
+          'order_type': 'market', 'amount': 1.0, 'status': 'filled', 'profit_loss': 7.0, 'created_at': DAY}])
+    db.commit()
+    assert snapshot(db) == ({}, {})
+
+    assert rebuild_trade_stats(db, user_id) == 1
+    db.commit()
+    totals, daily = snapshot(db)
+    assert totals == {user_id: (4, 3, 7.0)}
+    assert daily == {(user_id, date(2026, 10, 18)): (3, 2, 3.0), (user_id, date(2026, 10, 15)): (1, 1, 4.0)}
+
+    assert rebuild_trade_stats(db) == 2
+    db.commit()
+    assert snapshot(db)[0][other_id] == (1, 1, 7.0)
+    db.close()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
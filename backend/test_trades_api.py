@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+交易记录接口测试
+验证 (created_at, id) 游标分页不重复不遗漏、created_at 不能为空、筛选条件、无效游标、使用新索引，
+以及 NDJSON / CSV 流式导出按批次输出
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base, ExchangeAccount, Strategy, Trade, User, get_db
+from routers import trades as trades_router
+
+BASE = datetime(2026, 10, 18, 12, 0)
+
+
+def make_client():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    users = [User(username=f"u{i}", email=f"u{i}@example.com", hashed_password="x") for i in range(2)]
+    db.add_all(users)
+    db.flush()
+    account = ExchangeAccount(user_id=users[0].id, exchange_name="okex", api_key="k", api_secret="s")
+    db.add(account)
+    db.flush()
+    strategy = Strategy(user_id=users[0].id, exchange_account_id=account.id, name="s", strategy_type="5m_boll_ma60",
+                        symbol="BTC/USDT", timeframe="5m", entry_amount=10.0)
+    db.add(strategy)
+    db.flush()
+    rows = []
+    for n in range(25):
+        # 每 3 笔共用一个时间戳，分页必须靠 id 区分
+        rows.append({'user_id': users[0].id, 'strategy_id': strategy.id,
+                     'symbol': 'BTC/USDT' if n % 2 else 'ETH/USDT', 'side': 'buy' if n % 3 else 'sell',
+                     'order_type': 'market', 'amount': 1.0, 'status': 'filled' if n % 4 else 'pending',
+                     'profit_loss': float(n), 'created_at': BASE + timedelta(minutes=n // 3)})
+    rows.append({'user_id': users[1].id, 'strategy_id': strategy.id, 'symbol': 'BTC/USDT', 'side': 'buy',
+                 'order_type': 'market', 'amount': 1.0, 'status': 'filled', 'profit_loss': 0.0, 'created_at': BASE})
+    db.execute(insert(Trade), rows)
+    db.commit()
+    current_user = SimpleNamespace(id=users[0].id)
+    db.close()
+
+    app = FastAPI()
+    app.include_router(trades_router.router, prefix="/api")
+
+    def override_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[trades_router.get_current_user] = lambda: current_user
+    return TestClient(app), engine
+
+
+def expected_order(engine, where="user_id = 1"):
+    with engine.connect() as conn:
+        return [row.id for row in conn.execute(text(f"SELECT id FROM trades WHERE {where} "
+                                                    f"ORDER BY created_at DESC, id DESC"))]
+
+
+def test_keyset_pages_cover_all_trades_once():
+    client, engine = make_client()
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {'limit': 10, **({'cursor': cursor} if cursor else {})}
+        response = client.get("/api/trades", params=params)
+        assert response.status_code == 200
+        seen.extend(trade['id'] for trade in response.json())
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert pages == 3
+    assert seen == expected_order(engine)
+
+
+def test_filters():
+    client, engine = make_client()
+    params = {'symbol': 'BTC/USDT', 'side': 'buy', 'status': 'filled',
+              'start': (BASE + timedelta(minutes=2)).isoformat(), 'end': (BASE + timedelta(minutes=6)).isoformat()}
+    ids = [trade['id'] for trade in client.get("/api/trades", params=params).json()]
+    assert ids and ids == expected_order(
+        engine, "user_id = 1 AND symbol = 'BTC/USDT' AND side = 'buy' AND status = 'filled' "
+                "AND created_at >= '2026-10-18 12:02:00' AND created_at < '2026-10-18 12:06:00'")
+    assert client.get("/api/trades", params={'side': 'long'}).status_code == 422
+
+
+def test_invalid_cursor_is_rejected():
+    client, _ = make_client()
+    assert client.get("/api/trades", params={'cursor': 'not-a-cursor'}).status_code == 400
+
+
+def test_trades_without_timestamp_are_rejected():
+    """游标依赖 created_at：没有时间戳的交易无法写入，批量写入未给出时取默认值"""
+    client, engine = make_client()
+    row = {'user_id': 1, 'strategy_id': 1, 'symbol': 'BTC/USDT', 'side': 'buy', 'order_type': 'market',
+           'amount': 1.0, 'status': 'filled'}
+    with engine.begin() as conn:
+        conn.execute(insert(Trade), [row])
+    try:
+        with engine.begin() as conn:
+            conn.execute(insert(Trade), [{**row, 'created_at': None}])
+    except IntegrityError:
+        pass
+    else:
+        assert False, "created_at 为 NULL 的交易应被拒绝"
+
+    seen, cursor = [], None
+    while True:
+        response = client.get("/api/trades", params={'limit': 10, **({'cursor': cursor} if cursor else {})})
+        seen += [trade['id'] for trade in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == expected_order(engine)
+
+def test_page_query_uses_keyset_index():
+    client, engine = make_client()
+    cursor = client.get("/api/trades", params={'limit': 5}).headers["X-Next-Cursor"]
+    created_at, trade_id = trades_router.decode_cursor(cursor)
+    query = trades_router.filtered_trades(1).where(
+        trades_router.tuple_(Trade.created_at, Trade.id) < trades_router.tuple_(created_at, trade_id)).limit(6)
+    compiled = query.compile(engine, compile_kwargs={'literal_binds': True})
+    with engine.connect() as conn:
+        plan = " ".join(str(row[-1]) for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "ix_trades_user_id_created_at_id" in plan and "TEMP B-TREE" not in plan
+
+
+def test_streaming_export_in_batches():
+    client, engine = make_client()
+    original = trades_router.EXPORT_BATCH_SIZE
+    trades_router.EXPORT_BATCH_SIZE = 10
+    try:
+        response = client.get("/api/trades/export")
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert [r['id'] for r in records] == expected_order(engine)
+        assert records[0]['created_at'] == (BASE + timedelta(minutes=8)).isoformat()
+
+        response = client.get("/api/trades/export", params={'format': 'csv', 'status': 'pending'})
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert [int(r['id']) for r in rows] == expected_order(engine, "user_id = 1 AND status = 'pending'")
+        assert set(rows[0]) == set(trades_router.EXPORT_COLUMNS)
+
+        # 生成器每批只取 EXPORT_BATCH_SIZE 行：25 行分 3 个块（CSV 另有表头块）
+        query = trades_router.filtered_trades(1)
+        assert len(list(trades_router.stream_trades(engine, query, "ndjson"))) == 3
+        assert len(list(trades_router.stream_trades(engine, query, "csv"))) == 4
+    finally:
+        trades_router.EXPORT_BATCH_SIZE = original
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -3,6 +3,7 @@
 测试更新后的交易引擎
 """
 import sys
+import asyncio
 sys.path.append('.')
 
 from simple_real_trading_engine import real_exchange_manager
@@ -26,7 +27,7 @@ def test_updated_engine():
         print(f"连接测试结果: {connection_result}")
         
         print("\n3. 测试获取价格")
-        ticker_result = real_exchange_manager.get_real_ticker(user_id, 'okx', 'BTC/USDT')
+        ticker_result = asyncio.run(real_exchange_manager.get_real_ticker(user_id, 'okx', 'BTC/USDT'))
         print(f"价格结果: {ticker_result}")
         
         print("\n4. 测试获取余额")
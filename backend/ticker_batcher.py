@@ -0,0 +1,150 @@
+"""
+行情请求批处理
+同一时间窗口（TICKER_BATCH_WINDOW，默认 5 毫秒）内到达的单个交易对行情请求合并为一次
+OKX /api/v5/market/tickers?instType=... 批量请求，响应只解析一次为 instId 索引，
+再分发给各个等待方：N 个并发交易对查询只消耗一次上游调用。
+窗口内只有一个交易对时仍走单个 ticker 接口，避免为一个交易对下载整张行情表。
+"""
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+from okx_http_client import OKXRestClient
+
+logger = logging.getLogger(__name__)
+
+BATCH_WINDOW = float(os.getenv('TICKER_BATCH_WINDOW', '0.005'))
+# 窗口内不同交易对数达到该值才使用批量接口
+MIN_BATCH_SIZE = int(os.getenv('TICKER_BATCH_MIN_SIZE', '2'))
+
+# 批量获取函数: instType -> {instId: ticker}
+BulkTickerFetcher = Callable[[str], Awaitable[Dict[str, Dict]]]
+# 单个获取函数: (交易所, instId) -> OKX 格式的响应
+SingleTickerFetcher = Callable[[str, str], Awaitable[Dict]]
+
+_public_client = None
+
+
+async def fetch_okx_tickers(inst_type: str) -> Dict[str, Dict]:
+    """下载某个产品类型的全部行情，解析为 instId -> ticker"""
+    global _public_client
+    if _public_client is None:
+        _public_client = OKXRestClient()
+
+    response = await _public_client.request('GET', '/api/v5/market/tickers',
+                                            params={'instType': inst_type}, signed=False)
+    if response.status_code != 200:
+        raise RuntimeError(f"批量行情请求失败: HTTP {response.status_code}")
+    payload = response.json()
+    if payload.get('code') != '0':
+        raise RuntimeError(f"批量行情请求失败: {payload.get('msg', '未知错误')}")
+    return {ticker['instId']: ticker for ticker in payload.get('data') or []}
+
+
+def inst_type_of(inst_id: str) -> str:
+    """BTC-USDT -> SPOT，BTC-USDT-SWAP -> SWAP，BTC-USD-240628 -> FUTURES"""
+    parts = inst_id.split('-')
+    if len(parts) >= 3:
+        if parts[2] == 'SWAP':
+            return 'SWAP'
+        if parts[2].isdigit():
+            return 'OPTION' if len(parts) > 3 else 'FUTURES'
+    return 'SPOT'
+
+
+def not_found_response(inst_id: str) -> Dict:
+    return {'code': '51001', 'msg': f"Instrument ID {inst_id} doesn't exist", 'data': []}
+
+
+class _Batch:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        # instId -> 等待该交易对的 future 列表
+        self.waiters: Dict[str, List[asyncio.Future]] = {}
+
+
+class TickerBatcher:
+    """按 instType 收集窗口内的行情请求，合并为一次批量请求"""
+
+    def __init__(self, fetch_bulk: BulkTickerFetcher = fetch_okx_tickers,
+                 fetch_single: Optional[SingleTickerFetcher] = None,
+                 window: float = BATCH_WINDOW, min_batch_size: int = MIN_BATCH_SIZE):
+        self.fetch_bulk = fetch_bulk
+        self.fetch_single = fetch_single
+        self.window = window
+        self.min_batch_size = min_batch_size
+        self._batches: Dict[str, _Batch] = {}
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+            'bulk_fetches': 0,
+            'single_fetches': 0,
+            'errors': 0,
+            'max_batch_size': 0,
+        }
+
+    async def get_ticker(self, exchange_name: str, inst_id: str) -> Dict:
+        """与 TickerCache 的 fetch_ticker 签名一致，返回 OKX 格式的单个交易对响应"""
+        if exchange_name != 'okx':
+            if self.fetch_single is not None:
+                return await self.fetch_single(exchange_name, inst_id)
+            return {'code': '-1', 'msg': f'不支持的交易所: {exchange_name}', 'data': None}
+
+        self.stats['requests'] += 1
+        loop = asyncio.get_running_loop()
+        inst_type = inst_type_of(inst_id)
+        batch = self._batches.get(inst_type)
+        if batch is None or batch.loop is not loop:
+            batch = self._batches[inst_type] = _Batch(loop)
+            loop.call_later(self.window, self._dispatch, inst_type, batch)
+
+        future = loop.create_future()
+        batch.waiters.setdefault(inst_id, []).append(future)
+        return await future
+
+    def _dispatch(self, inst_type: str, batch: _Batch):
+        """窗口结束：之后到达的请求进入新的批次"""
+        if self._batches.get(inst_type) is batch:
+            del self._batches[inst_type]
+        batch.loop.create_task(self._run(inst_type, batch))
+
+    async def _run(self, inst_type: str, batch: _Batch):
+        inst_ids = list(batch.waiters)
+        self.stats['batches'] += 1
+        self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(inst_ids))
+        results: Dict[str, Dict] = {}
+        error = {'code': '-1', 'msg': '行情请求未完成', 'data': None}
+        try:
+            if len(inst_ids) < self.min_batch_size and self.fetch_single is not None:
+                # 批次太小时逐个请求单个行情，不值得拉取整个 instType
+                self.stats['single_fetches'] += len(inst_ids)
+                responses = await asyncio.gather(*(self.fetch_single('okx', inst_id) for inst_id in inst_ids))
+                results = dict(zip(inst_ids, responses))
+            else:
+                self.stats['bulk_fetches'] += 1
+                tickers = await self.fetch_bulk(inst_type)
+                results = {
+                    inst_id: {'code': '0', 'msg': '', 'data': [tickers[inst_id]]}
+                    if inst_id in tickers else not_found_response(inst_id)
+                    for inst_id in inst_ids
+                }
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning(f"批量获取 {inst_type} 行情失败: {e}")
+            error = {'code': '-1', 'msg': str(e), 'data': None}
+        finally:
+            # 无论成功与否都唤醒所有等待者
+            for inst_id, futures in batch.waiters.items():
+                for future in futures:
+                    # 调用方可能已取消
+                    if not future.done():
+                        future.set_result(results.get(inst_id, error))
+
+    def get_stats(self) -> Dict:
+        requests = self.stats['requests']
+        upstream = self.stats['bulk_fetches'] + self.stats['single_fetches']
+        return {
+            **self.stats,
+            'window': self.window,
+            'requests_per_upstream_call': requests / upstream if upstream else 0.0,
+        }
@@ -0,0 +1,169 @@
+"""
+进程级行情缓存
+行情是公开数据，所有用户共用按 (交易所, instId) 缓存的最新 ticker：
+- TTL 内直接返回缓存（TICKER_CACHE_TTL，默认 1 秒）
+- 过期但仍在 stale 窗口内（TICKER_CACHE_STALE_TTL）时先返回旧值，后台刷新
+- 完全过期或没有缓存时等待上游；同一 key 的并发请求只发起一次上游调用，
+  不同交易对的并发请求由 TickerBatcher 合并为一次批量请求
+"""
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from market_data_stream import market_data_stream
+from okx_http_client import OKXRestClient
+from single_flight import SingleFlight
+from ticker_batcher import TickerBatcher
+
+logger = logging.getLogger(__name__)
+
+TICKER_TTL = float(os.getenv('TICKER_CACHE_TTL', '1.0'))
+TICKER_STALE_TTL = float(os.getenv('TICKER_CACHE_STALE_TTL', '5.0'))
+
+# 行情获取函数: (交易所, instId) -> OKX 格式的响应 {'code': '0', 'data': [...]}
+TickerFetcher = Callable[[str, str], Awaitable[Dict]]
+# 实时数据源（WebSocket 推送）: (交易所, instId) -> 同格式响应，没有新鲜数据时返回 None
+LiveTickerSource = Callable[[str, str], Optional[Dict]]
+
+_public_client = None
+
+
+def normalize_exchange(exchange_name: str) -> str:
+    exchange_name = (exchange_name or '').lower()
+    return 'okx' if exchange_name == 'okex' else exchange_name
+
+
+async def fetch_public_ticker(exchange_name: str, inst_id: str) -> Dict:
+    """从交易所公开接口获取行情（不带用户凭据）"""
+    global _public_client
+    if exchange_name != 'okx':
+        return {'code': '-1', 'msg': f'不支持的交易所: {exchange_name}', 'data': None}
+
+    if _public_client is None:
+        _public_client = OKXRestClient()
+    try:
+        response = await _public_client.get_ticker(inst_id)
+        if response.status_code == 200:
+            return response.json()
+        return {'code': str(response.status_code), 'msg': 'API访问失败', 'data': None}
+    except Exception as e:
+        return {'code': '-1', 'msg': str(e), 'data': None}
+
+
+def _is_cacheable(result: Dict) -> bool:
+    """只缓存成功的响应，错误每次都重新请求"""
+    return result.get('code') == '0' and bool(result.get('data'))
+
+
+@dataclass
+class _Entry:
+    value: Any
+    fetched_at: float
+
+
+class TickerCache:
+    """带 stale-while-revalidate 和请求合并的短 TTL 行情缓存"""
+
+    def __init__(self, fetch_ticker: TickerFetcher = fetch_public_ticker, ttl: float = TICKER_TTL,
+                 stale_ttl: float = TICKER_STALE_TTL, clock: Callable[[], float] = time.monotonic,
+                 live_source: Optional[LiveTickerSource] = None):
+        self.fetch_ticker = fetch_ticker
+        self.live_source = live_source
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._flight = SingleFlight()
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {
+            'live_hits': 0,
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'upstream_calls': 0,
+            'upstream_errors': 0,
+        }
+
+    async def get_ticker(self, exchange_name: str, inst_id: str) -> Dict:
+        """按 (交易所, instId) 获取行情，返回 OKX 格式的响应"""
+        exchange_name = normalize_exchange(exchange_name)
+        key = (exchange_name, inst_id)
+        if self.live_source is not None:
+            live = self.live_source(exchange_name, inst_id)
+            if live is not None:
+                self.stats['live_hits'] += 1
+                return live
+
+        entry = self._entries.get(key)
+
+        if entry is not None:
+            age = self.clock() - entry.fetched_at
+            if age < self.ttl:
+                self.stats['hits'] += 1
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                self.stats['stale_hits'] += 1
+                self._revalidate(key)
+                return entry.value
+
+        self.stats['misses'] += 1
+        return await self._flight.do(key, lambda: self._fetch(key))
+
+    async def _fetch(self, key: Tuple[str, str]) -> Dict:
+        self.stats['upstream_calls'] += 1
+        result = await self.fetch_ticker(*key)
+        if _is_cacheable(result):
+            self._entries[key] = _Entry(result, self.clock())
+        else:
+            self.stats['upstream_errors'] += 1
+        return result
+
+    def _revalidate(self, key: Tuple[str, str]):
+        """后台刷新；已有同 key 的请求在进行时不再发起"""
+        refreshing = self._refreshing.get(key)
+        if refreshing is not None and not refreshing.done() and refreshing.get_loop() is asyncio.get_running_loop():
+            return
+        if self._flight.pending(key):
+            return
+        self.stats['refreshes'] += 1
+        task = asyncio.ensure_future(self._flight.do(key, lambda: self._fetch(key)))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda t, key=key: self._refresh_done(key, t))
+
+    def _refresh_done(self, key: Hashable, task: asyncio.Task):
+        if self._refreshing.get(key) is task:
+            del self._refreshing[key]
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.stats['refresh_errors'] += 1
+            logger.warning(f"后台刷新行情失败: {error}")
+
+    def invalidate(self, exchange_name: str = None, inst_id: str = None):
+        """清除缓存；不传参数时清空全部"""
+        if exchange_name is None:
+            self._entries.clear()
+        else:
+            self._entries.pop((normalize_exchange(exchange_name), inst_id), None)
+
+    def get_stats(self) -> Dict:
+        served = self.stats['live_hits'] + self.stats['hits'] + self.stats['stale_hits']
+        lookups = served + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self._entries),
+            'in_flight': self._flight.in_flight(),
+            'hit_rate': served / lookups if lookups else 0.0,
+            'ttl': self.ttl,
+            'stale_ttl': self.stale_ttl,
+        }
+
+
+# 全局实例（WebSocket 服务运行时优先使用推送的行情，未命中时批量请求上游）
+ticker_batcher = TickerBatcher(fetch_single=fetch_public_ticker)
+ticker_cache = TickerCache(ticker_batcher.get_ticker, live_source=market_data_stream.ticker_response)
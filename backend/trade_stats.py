@@ -0,0 +1,172 @@
+"""
+用户交易统计汇总表维护
+- user_trade_stats: 每个用户一行（总交易数、已成交数、已成交盈亏）
+- user_trade_stats_daily: 每个用户每个 UTC 日一行，按 Trade.created_at 分桶
+register_trade_stats 在 session 工厂（应用启动时为 SessionLocal）上注册 flush 监听，
+根据新增 / 修改 / 删除的 Trade 计算增量，在同一事务内 upsert 到汇总表，
+execute_trade 下单、成交、撤单等任何经 ORM 的写入都随交易一起提交或回滚；
+绕过 ORM 的批量写入（以及历史数据）由 rebuild_trade_stats 从原始交易重建
+
+用法: python trade_stats.py [用户ID]   # 重建全部或指定用户的汇总
+"""
+import sys
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import Date, DateTime, case, cast, delete, event, func, insert, inspect, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, sessionmaker
+from database import Trade, UserTradeStats, UserTradeStatsDaily
+
+logger = logging.getLogger(__name__)
+
+FILLED = "filled"
+
+# 增量: (交易数, 已成交数, 已成交盈亏)
+Delta = Tuple[int, int, float]
+
+
+def _contribution(status: Optional[str], profit_loss: Optional[float]) -> Delta:
+    filled = status == FILLED
+    return 1, int(filled), float(profit_loss or 0.0) if filled else 0.0
+
+
+def _previous(trade: Trade, attr: str):
+    history = inspect(trade).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else getattr(trade, attr)
+
+
+def _day(value: Optional[datetime]) -> date:
+    return (value or datetime.utcnow()).date()
+
+
+def collect_deltas(session: Session) -> Tuple[Dict[int, list], Dict[Tuple[int, date], list]]:
+    """根据 session 中待写入的 Trade 计算汇总表增量"""
+    totals: Dict[int, list] = defaultdict(lambda: [0, 0, 0.0])
+    daily: Dict[Tuple[int, date], list] = defaultdict(lambda: [0, 0, 0.0])
+
+    def add(user_id, day, delta: Delta, sign: int):
+        for bucket in (totals[user_id], daily[(user_id, day)]):
+            for i, value in enumerate(delta):
+                bucket[i] += sign * value
+
+    for trade in session.new:
+        if isinstance(trade, Trade):
+            add(trade.user_id, _day(trade.created_at), _contribution(trade.status, trade.profit_loss), 1)
+    for trade in session.deleted:
+        if isinstance(trade, Trade):
+            add(_previous(trade, 'user_id'), _day(_previous(trade, 'created_at')),
+                _contribution(_previous(trade, 'status'), _previous(trade, 'profit_loss')), -1)
+    for trade in session.dirty:
+        if not isinstance(trade, Trade) or not session.is_modified(trade):
+            continue
+        state = inspect(trade)
+        if not any(state.attrs[attr].history.has_changes()
+                   for attr in ('user_id', 'status', 'profit_loss', 'created_at')):
+            continue
+        add(_previous(trade, 'user_id'), _day(_previous(trade, 'created_at')),
+            _contribution(_previous(trade, 'status'), _previous(trade, 'profit_loss')), -1)
+        add(trade.user_id, _day(trade.created_at), _contribution(trade.status, trade.profit_loss), 1)
+
+    is_zero = lambda delta: delta[0] == 0 and delta[1] == 0 and delta[2] == 0.0
+    return ({k: v for k, v in totals.items() if not is_zero(v)},
+            {k: v for k, v in daily.items() if not is_zero(v)})
+
+
+def _upsert(connection, model, keys: Dict, increments: Dict, assignments: Optional[Dict] = None):
+    """按主键累加：行不存在时插入增量，存在时在原值上相加（单条语句，无读后写竞争）"""
+    assignments = assignments or {}
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert_ = pg_insert if dialect == 'postgresql' else sqlite_insert
+        stmt = insert_(model).values(**keys, **increments, **assignments)
+        set_ = {col: getattr(model, col) + stmt.excluded[col] for col in increments}
+        set_.update({col: stmt.excluded[col] for col in assignments})
+        connection.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=set_))
+        return
+    # 其他数据库：先更新，不存在时再插入
+    conditions = [getattr(model, col) == value for col, value in keys.items()]
+    result = connection.execute(update(model).where(*conditions).values(
+        **{col: getattr(model, col) + value for col, value in increments.items()}, **assignments))
+    if result.rowcount == 0:
+        connection.execute(insert(model).values(**keys, **increments, **assignments))
+
+
+def apply_deltas(connection, totals: Dict[int, list], daily: Dict[Tuple[int, date], list]):
+    now = datetime.utcnow()
+    for user_id, (trades, filled, profit_loss) in totals.items():
+        _upsert(connection, UserTradeStats, {'user_id': user_id},
+                {'total_trades': trades, 'filled_trades': filled, 'total_profit_loss': profit_loss},
+                {'updated_at': now})
+        if trades < 0:
+            connection.execute(delete(UserTradeStats).where(
+                UserTradeStats.user_id == user_id, UserTradeStats.total_trades <= 0))
+    for (user_id, day), (trades, filled, profit_loss) in daily.items():
+        _upsert(connection, UserTradeStatsDaily, {'user_id': user_id, 'day': day},
+                {'trades': trades, 'filled_trades': filled, 'profit_loss': profit_loss})
+        if trades < 0:
+            # 删除交易后清掉空行，与重建结果保持一致
+            connection.execute(delete(UserTradeStatsDaily).where(
+                UserTradeStatsDaily.user_id == user_id, UserTradeStatsDaily.day == day,
+                UserTradeStatsDaily.trades <= 0))
+
+
+def _maintain_trade_stats(session: Session, flush_context):
+    # after_flush 中 new / dirty / deleted 和属性历史仍是 flush 前的状态，且新交易已带上默认值
+    totals, daily = collect_deltas(session)
+    if totals or daily:
+        apply_deltas(session.connection(), totals, daily)
+
+
+def register_trade_stats(session_factory: sessionmaker):
+    """让该工厂创建的 session 在 flush 时维护汇总表；重复调用无副作用"""
+    if not event.contains(session_factory, 'after_flush', _maintain_trade_stats):
+        event.listen(session_factory, 'after_flush', _maintain_trade_stats)
+
+
+def _day_expr(dialect: str):
+    # SQLite 的 Date 列以 'YYYY-MM-DD' 文本存储
+    return func.date(Trade.created_at) if dialect == 'sqlite' else cast(Trade.created_at, Date)
+
+
+def rebuild_trade_stats(db: Session, user_id: Optional[int] = None) -> int:
+    """从 trades 表重建全部（或单个用户的）汇总行，调用方负责提交；返回重建的用户数"""
+    filled = Trade.status == FILLED
+    filled_count = func.count(case((filled, 1)))
+    filled_pnl = func.coalesce(func.sum(case((filled, Trade.profit_loss))), 0.0)
+    scope = (lambda model: [] if user_id is None else [model.user_id == user_id])
+
+    db.execute(delete(UserTradeStats).where(*scope(UserTradeStats)))
+    db.execute(delete(UserTradeStatsDaily).where(*scope(UserTradeStatsDaily)))
+
+    totals = select(Trade.user_id, func.count(), filled_count, filled_pnl, literal(datetime.utcnow(), DateTime)) \
+        .where(*scope(Trade)).group_by(Trade.user_id)
+    db.execute(insert(UserTradeStats).from_select(
+        ['user_id', 'total_trades', 'filled_trades', 'total_profit_loss', 'updated_at'], totals))
+
+    day = _day_expr(db.bind.dialect.name)
+    daily = select(Trade.user_id, day, func.count(), filled_count, filled_pnl) \
+        .where(*scope(Trade)).group_by(Trade.user_id, day)
+    db.execute(insert(UserTradeStatsDaily).from_select(
+        ['user_id', 'day', 'trades', 'filled_trades', 'profit_loss'], daily))
+
+    rebuilt = db.scalar(select(func.count()).select_from(UserTradeStats).where(*scope(UserTradeStats)))
+    logger.info(f"交易统计汇总已重建: {rebuilt} 个用户")
+    return rebuilt
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        count = rebuild_trade_stats(session, int(sys.argv[1]) if len(sys.argv) > 1 else None)
+        session.commit()
+        print(f"✅ 已重建 {count} 个用户的交易统计")
+    finally:
+        session.close()
@@ -1,19 +1,41 @@
-import ccxt
+import ccxt.async_support as ccxt_async
+import aiohttp
+import certifi
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+import os
+import ssl
+import time
 import asyncio
+import hashlib
 import logging
+import weakref
 import requests
 import random
 from database import SessionLocal, ExchangeAccount, Strategy, Trade, MarketData
+import indicators
+from rate_limiter import rate_limiter
+from connectivity_monitor import connectivity_monitor
+from single_flight import SingleFlight
+from indicator_state import IncrementalIndicatorState
+from strategy_registry import (
+    SIGNAL_NAMES, StrategyPlugin, boll_ma_signal, compute_indicators, get_strategy_plugin, latest_signal
+)
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
+# Close an account's exchange instance after this many idle seconds
+EXCHANGE_IDLE_TIMEOUT = float(os.getenv('EXCHANGE_IDLE_TIMEOUT', '900'))
+# Reload markets for newly created instances after this many seconds
+EXCHANGE_MARKETS_TTL = float(os.getenv('EXCHANGE_MARKETS_TTL', '3600'))
+EXCHANGE_HTTP_MAX_CONNECTIONS = int(os.getenv('EXCHANGE_HTTP_MAX_CONNECTIONS', '100'))
+
 def check_okx_connectivity() -> bool:
-    """Check if OKX API is accessible"""
+    """Check if OKX API is accessible (blocking, for scripts; the app reads connectivity_monitor)"""
     import os
     from dotenv import load_dotenv
     
@@ -58,6 +80,10 @@ def check_okx_connectivity() -> bool:
     logger.warning("OKX API not accessible, will use mock exchange for testing")
     return False
 
+class MockBalanceRefused(Exception):
+    """Raised by get_balance(allow_mock=False) instead of returning mock balances"""
+
+
 class MockOKXExchange:
     """Mock OKX exchange for testing purposes"""
     
@@ -124,89 +150,214 @@ class MockOKXExchange:
         """Mock close method"""
         pass
 
+@dataclass
+class _ExchangeEntry:
+    exchange: object
+    fingerprint: str
+    loop: asyncio.AbstractEventLoop
+    last_used: float
+
+
+def _credentials_fingerprint(exchange_account: ExchangeAccount) -> str:
+    """Hash of the credentials an instance was built with, to detect key rotation"""
+    material = '\0'.join(str(value) for value in (
+        exchange_account.api_key, exchange_account.api_secret,
+        exchange_account.api_passphrase, bool(exchange_account.is_testnet)))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
 class ExchangeManager:
-    def __init__(self):
-        self.exchanges: Dict[str, ccxt.Exchange] = {}
-        self._connection_cache = {}  # Cache connection status
+    """One long-lived ccxt.async_support instance per account.
+
+    Instances share one aiohttp session per event loop, markets are loaded once per
+    (exchange, sandbox) and handed to every other instance, and an instance is closed
+    when its account's credentials change or it has been idle for `idle_timeout` seconds.
+    """
+
+    def __init__(self, idle_timeout: float = EXCHANGE_IDLE_TIMEOUT, markets_ttl: float = EXCHANGE_MARKETS_TTL):
+        self.exchanges: Dict[str, _ExchangeEntry] = {}
         self._mock_mode = {}  # Track which exchanges are in mock mode
+        self.connectivity = connectivity_monitor
+        self.idle_timeout = idle_timeout
+        self.markets_ttl = markets_ttl
+        # event loop -> aiohttp session shared by all instances on that loop
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = \
+            weakref.WeakKeyDictionary()
+        # (exchange name, sandbox) -> (markets, currencies, loaded_at)
+        self._markets: Dict[Tuple[str, bool], Tuple[Dict, Dict, float]] = {}
+        self._markets_flight = SingleFlight()
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'evicted_idle': 0,
+            'evicted_credentials': 0,
+            'markets_loads': 0,
+            'markets_shared': 0,
+        }
         
     def _should_use_mock(self, exchange_name: str) -> bool:
-        """Determine if we should use mock exchange"""
+        """Use the mock exchange while the background monitor reports OKX unreachable (never probes inline)"""
         if exchange_name.lower() in ['okx', 'okex']:
-            # Check cache first (cache for 5 minutes)
-            cache_key = f"{exchange_name}_connectivity"
-            if cache_key in self._connection_cache:
-                cached_time, cached_result = self._connection_cache[cache_key]
-                if datetime.now().timestamp() - cached_time < 300:  # 5 minutes
-                    return not cached_result
-            
-            # Test connectivity
-            connectivity = check_okx_connectivity()
-            self._connection_cache[cache_key] = (datetime.now().timestamp(), connectivity)
-            
-            if not connectivity:
+            use_mock = not self.connectivity.is_reachable()
+            if use_mock and not self._mock_mode.get(exchange_name):
                 logger.warning(f"OKX API not accessible, enabling mock mode for {exchange_name}")
-                self._mock_mode[exchange_name] = True
-                return True
-            else:
-                self._mock_mode[exchange_name] = False
-                
+            self._mock_mode[exchange_name] = use_mock
+            return use_mock
         return False
     
-    def get_exchange(self, exchange_account: ExchangeAccount) -> ccxt.Exchange:
-        """Get exchange instance for a user's exchange account"""
+    def _get_session(self) -> aiohttp.ClientSession:
+        """aiohttp session shared by every exchange instance on the running loop"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                ssl=ssl.create_default_context(cafile=certifi.where()),
+                limit=EXCHANGE_HTTP_MAX_CONNECTIONS,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True,
+            )
+            session = self._sessions[loop] = aiohttp.ClientSession(connector=connector)
+        return session
+    
+    async def get_exchange(self, exchange_account: ExchangeAccount):
+        """Get the long-lived exchange instance for a user's exchange account"""
         key = f"{exchange_account.id}_{exchange_account.exchange_name}"
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        await self.evict_idle(now)
+        
+        fingerprint = _credentials_fingerprint(exchange_account)
+        entry = self.exchanges.get(key)
+        if entry is not None:
+            recovered = isinstance(entry.exchange, MockOKXExchange) and self.connectivity.is_reachable()
+            if entry.fingerprint == fingerprint and entry.loop is loop and not recovered:
+                entry.last_used = now
+                self.stats['reused'] += 1
+                return entry.exchange
+            if entry.fingerprint != fingerprint:
+                logger.info(f"Credentials changed for {key}, recreating exchange instance")
+                self.stats['evicted_credentials'] += 1
+            await self._discard(key)
         
-        if key not in self.exchanges:
-            exchange_name = exchange_account.exchange_name.lower()
-            exchange_class = getattr(ccxt, exchange_name)
+        exchange = await self._create_exchange(exchange_account)
+        self.exchanges[key] = _ExchangeEntry(exchange, fingerprint, loop, now)
+        self.stats['created'] += 1
+        return exchange
+    
+    async def _create_exchange(self, exchange_account: ExchangeAccount):
+        exchange_name = exchange_account.exchange_name.lower()
+        exchange_class = getattr(ccxt_async, exchange_name)
+        
+        config = {
+            'apiKey': exchange_account.api_key,
+            'secret': exchange_account.api_secret,
+            'sandbox': exchange_account.is_testnet,
+            'enableRateLimit': True,
+            'timeout': 30000,
+            'session': self._get_session(),
+            'asyncio_loop': asyncio.get_running_loop(),
+        }
+        # Special handling for OKX
+        if exchange_name == 'okex':
+            if exchange_account.api_passphrase:
+                # ccxt reads the OKX passphrase from `password`
+                config['password'] = exchange_account.api_passphrase
+            
+            # Check if we should use mock mode
+            if self._should_use_mock(exchange_name):
+                logger.info("Using mock OKX exchange due to connectivity issues")
+                mock_config = {
+                    'apiKey': exchange_account.api_key,
+                    'secret': exchange_account.api_secret,
+                    'passphrase': exchange_account.api_passphrase,
+                    'sandbox': exchange_account.is_testnet,
+                }
+                return MockOKXExchange(mock_config)
             
-            config = {
-                'apiKey': exchange_account.api_key,
-                'secret': exchange_account.api_secret,
-                'sandbox': exchange_account.is_testnet,
-                'enableRateLimit': True,
-                'timeout': 30000,
+            # Real OKX configuration
+            config['hostname'] = 'www.okx.com'
+            config['options'] = {
+                'defaultType': 'spot',
             }
-              # Special handling for OKX
+        
+        try:
+            exchange = exchange_class(config)
+            logger.info(f"Created exchange instance for {exchange_account.exchange_name}")
+        except Exception as e:
+            logger.error(f"Failed to create exchange instance: {e}")
+            # For OKX, fallback to mock if real exchange fails
             if exchange_name == 'okex':
-                if exchange_account.api_passphrase:
-                    config['passphrase'] = exchange_account.api_passphrase
-                
-                # Check if we should use mock mode
-                if self._should_use_mock(exchange_name):
-                    logger.info("Using mock OKX exchange due to connectivity issues")
-                    mock_config = {
-                        'apiKey': exchange_account.api_key,
-                        'secret': exchange_account.api_secret,
-                        'passphrase': exchange_account.api_passphrase,
-                        'sandbox': exchange_account.is_testnet,
-                    }
-                    self.exchanges[key] = MockOKXExchange(mock_config)
-                    return self.exchanges[key]
-                
-                # Real OKX configuration
-                config['hostname'] = 'www.okx.com'
-                config['options'] = {
-                    'defaultType': 'spot',
-                }
-            
+                logger.warning("OKX real exchange failed, using mock exchange")
+                config['passphrase'] = exchange_account.api_passphrase
+                return MockOKXExchange(config)
+            raise
+        
+        await self._share_markets(exchange, (exchange_name, bool(exchange_account.is_testnet)))
+        return exchange
+    
+    async def _share_markets(self, exchange, markets_key: Tuple[str, bool]):
+        """Give a new instance the markets already loaded for its exchange, loading them once if needed"""
+        cached = self._markets.get(markets_key)
+        if cached is None or time.monotonic() - cached[2] >= self.markets_ttl:
+            try:
+                cached = await self._markets_flight.do(markets_key, lambda: self._load_markets(exchange, markets_key))
+            except Exception as e:
+                # ccxt falls back to loading markets lazily on the first call
+                logger.warning(f"Failed to preload markets for {markets_key[0]}: {e}")
+                return
+        if exchange.markets is not cached[0]:
+            exchange.set_markets(cached[0], cached[1])
+            self.stats['markets_shared'] += 1
+    
+    async def _load_markets(self, exchange, markets_key: Tuple[str, bool]) -> Tuple[Dict, Dict, float]:
+        await exchange.load_markets(reload=True)
+        self.stats['markets_loads'] += 1
+        self._markets[markets_key] = (exchange.markets, exchange.currencies, time.monotonic())
+        return self._markets[markets_key]
+    
+    async def _discard(self, key: str):
+        entry = self.exchanges.pop(key, None)
+        # Instances created on a loop that has since finished cannot be closed from here
+        if entry is not None and entry.loop is asyncio.get_running_loop():
             try:
-                self.exchanges[key] = exchange_class(config)
-                logger.info(f"Created exchange instance for {exchange_account.exchange_name}")
+                await entry.exchange.close()
             except Exception as e:
-                logger.error(f"Failed to create exchange instance: {e}")
-                  # For OKX, fallback to mock if real exchange fails
-                if exchange_name == 'okex':
-                    logger.warning("OKX real exchange failed, using mock exchange")
-                    self.exchanges[key] = MockOKXExchange(config)
-                    return self.exchanges[key]
-                else:
-                    raise        
-        return self.exchanges[key]
-    
-    async def get_balance(self, exchange_account: ExchangeAccount) -> Dict:
-        """Get account balance from exchange"""
+                logger.warning(f"Error closing exchange instance {key}: {e}")
+    
+    async def evict_idle(self, now: Optional[float] = None):
+        """Close instances that have not been used for `idle_timeout` seconds"""
+        now = time.monotonic() if now is None else now
+        for key, entry in list(self.exchanges.items()):
+            if now - entry.last_used >= self.idle_timeout:
+                self.stats['evicted_idle'] += 1
+                await self._discard(key)
+    
+    async def close(self):
+        """Close every instance and the shared session on the running loop (application shutdown)"""
+        for key in list(self.exchanges):
+            await self._discard(key)
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+    
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'instances': len(self.exchanges),
+            'markets_cached': len(self._markets),
+        }
+    
+    async def _throttle(self, exchange_account: ExchangeAccount, exchange, path: str):
+        """Wait for an OKX rate-limit token before a real (non-mock) ccxt call"""
+        if exchange_account.exchange_name.lower() in ['okx', 'okex'] and not isinstance(exchange, MockOKXExchange):
+            await rate_limiter.acquire(exchange_account.id, path)
+    
+    async def get_balance(self, exchange_account: ExchangeAccount, allow_mock: bool = True) -> Dict:
+        """Get account balance from exchange
+        
+        With allow_mock=False the mock-exchange fallbacks (OKX unreachable, timeouts,
+        network errors) raise instead, so callers never mistake demo balances for real ones.
+        """
         try:
             # 对于OKX，优先使用OKXAuthFixer获取真实余额
             if exchange_account.exchange_name.lower() == 'okex':
@@ -220,17 +371,11 @@ class ExchangeManager:
                         exchange_account.api_key,
                         exchange_account.api_secret,
                         exchange_account.api_passphrase,
-                        exchange_account.is_testnet
+                        exchange_account.is_testnet,
+                        account_id=exchange_account.id
                     )
-                      # 获取余额 - 在执行器中运行同步代码
-                    import asyncio
-                    import concurrent.futures
-                    
-                    loop = asyncio.get_event_loop()
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                        balance_result = await loop.run_in_executor(
-                            executor, auth_fixer.get_balance
-                        )
+                    # 获取余额 - 异步请求，复用共享连接池
+                    balance_result = await auth_fixer.get_balance_async()
                     
                     if balance_result['success']:
                         # 转换OKX API格式为CCXT格式
@@ -270,8 +415,11 @@ class ExchangeManager:
                     logger.warning(f"OKXAuthFixer failed: {e}, using CCXT fallback")
             
             # 使用原来的CCXT方法（包括其他交易所和OKX回退）
-            exchange = self.get_exchange(exchange_account)
+            exchange = await self.get_exchange(exchange_account)
+            if not allow_mock and isinstance(exchange, MockOKXExchange):
+                raise MockBalanceRefused(f"{exchange_account.exchange_name} is unreachable, no real balance available")
             logger.info(f"Fetching balance for {exchange_account.exchange_name}")
+            await self._throttle(exchange_account, exchange, '/api/v5/account/balance')
             
             # Add timeout for balance fetching
             balance = await asyncio.wait_for(
@@ -280,7 +428,11 @@ class ExchangeManager:
             )
             logger.info(f"Balance fetched successfully")
             return balance
+        except MockBalanceRefused:
+            raise
         except asyncio.TimeoutError:
+            if not allow_mock:
+                raise
             logger.warning(f"Balance fetch timeout for {exchange_account.exchange_name}, using mock")
             # Use mock exchange for timeout
             config = {
@@ -296,7 +448,7 @@ class ExchangeManager:
             logger.error(error_msg)
             
             # For OKX network errors, try mock exchange
-            if (exchange_account.exchange_name.lower() == 'okex' and 
+            if (allow_mock and exchange_account.exchange_name.lower() == 'okex' and 
                 ("okex GET https://www.okx.com" in str(e) or 
                  "timeout" in str(e).lower() or
                  "exceeded" in str(e).lower())):
@@ -326,8 +478,9 @@ class ExchangeManager:
     async def get_ticker(self, exchange_account: ExchangeAccount, symbol: str) -> Dict:
         """Get ticker data for a symbol"""
         try:
-            exchange = self.get_exchange(exchange_account)
+            exchange = await self.get_exchange(exchange_account)
             logger.info(f"Fetching ticker {symbol} for {exchange_account.exchange_name}")
+            await self._throttle(exchange_account, exchange, '/api/v5/market/ticker')
             ticker = await exchange.fetch_ticker(symbol)
             logger.info(f"Ticker {symbol} fetched successfully")
             return ticker
@@ -357,11 +510,13 @@ class ExchangeManager:
             else:
                 raise Exception(error_msg)
     
-    async def get_ohlcv(self, exchange_account: ExchangeAccount, symbol: str, timeframe: str, limit: int = 100) -> List:
-        """Get OHLCV data for a symbol"""
+    async def get_ohlcv(self, exchange_account: ExchangeAccount, symbol: str, timeframe: str, limit: int = 100,
+                        since: Optional[int] = None) -> List:
+        """Get OHLCV data for a symbol, optionally starting at `since` (ms)"""
         try:
-            exchange = self.get_exchange(exchange_account)
-            ohlcv = await exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+            exchange = await self.get_exchange(exchange_account)
+            await self._throttle(exchange_account, exchange, '/api/v5/market/candles')
+            ohlcv = await exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
             return ohlcv
         except Exception as e:
             logger.error(f"Error fetching OHLCV for {symbol}: {e}")
@@ -371,7 +526,8 @@ class ExchangeManager:
                          side: str, amount: float, price: Optional[float] = None) -> Dict:
         """Place an order on the exchange"""
         try:
-            exchange = self.get_exchange(exchange_account)
+            exchange = await self.get_exchange(exchange_account)
+            await self._throttle(exchange_account, exchange, '/api/v5/trade/order')
             
             if order_type == 'market':
                 order = await exchange.create_market_order(symbol, side, amount)
@@ -398,11 +554,11 @@ class ExchangeManager:
                     auth_fixer = OKXAuthFixer(api_key, secret_key, passphrase, is_testnet)
                     
                     # 测试认证
-                    auth_result = auth_fixer.test_auth()
+                    auth_result = await auth_fixer.test_auth_async()
                     
                     if auth_result['success']:
                         # 获取余额信息
-                        balance_result = auth_fixer.get_balance()
+                        balance_result = await auth_fixer.get_balance_async()
                         
                         if balance_result['success']:
                             balance_data = balance_result.get('data', [])
@@ -484,7 +640,7 @@ class ExchangeManager:
                                       passphrase: Optional[str] = None, is_testnet: bool = False) -> Dict:
         """传统的连接测试方法（回退方案）"""
         # Check if OKX API is accessible first
-        if not check_okx_connectivity():
+        if not self.connectivity.is_reachable():
             logger.warning("OKX API not accessible, using mock exchange for test")
             config = {
                 'apiKey': api_key,
@@ -511,22 +667,24 @@ class ExchangeManager:
             config = {
                 'apiKey': api_key,
                 'secret': secret_key,
-                'passphrase': passphrase,
+                'password': passphrase,
                 'sandbox': is_testnet,
                 'enableRateLimit': True,
                 'hostname': 'www.okx.com',
                 'timeout': 10000,
                 'options': {
                     'defaultType': 'spot',
-                }
+                },
+                'session': self._get_session(),
             }
             
-            exchange_class = getattr(ccxt, 'okex')
-            test_exchange = exchange_class(config)
+            test_exchange = ccxt_async.okex(config)
             
             # Test by fetching balance
-            balance = await test_exchange.fetch_balance()
-            await test_exchange.close()
+            try:
+                balance = await test_exchange.fetch_balance()
+            finally:
+                await test_exchange.close()
             
             return {
                 'status': 'success',
@@ -565,53 +723,177 @@ class ExchangeManager:
 class StrategyEngine:
     def __init__(self, exchange_manager: ExchangeManager):
         self.exchange_manager = exchange_manager
+        # (strategy_id, symbol, timeframe) -> IncrementalIndicatorState
+        self.indicator_states: Dict[Tuple[int, str, str], IncrementalIndicatorState] = {}
+        # strategy_id -> plugin resolved when the strategy was activated
+        self.active_plugins: Dict[int, StrategyPlugin] = {}
     
     def calculate_bollinger_bands(self, prices: np.array, period: int = 20, deviation: float = 2.0) -> Tuple[np.array, np.array, np.array]:
-        """Calculate Bollinger Bands using numpy"""
-        middle = np.convolve(prices, np.ones(period), 'valid') / period
-        std_dev = np.array([np.std(prices[i:i+period]) for i in range(len(prices) - period + 1)])
-        upper = middle + (std_dev * deviation)
-        lower = middle - (std_dev * deviation)
-        return upper, middle, lower
+        """Calculate Bollinger Bands using vectorized rolling mean/variance"""
+        return indicators.bollinger_bands(prices, period, deviation)
     
     def calculate_ma(self, prices: np.array, period: int = 60) -> np.array:
-        """Calculate Moving Average using numpy"""
-        return np.convolve(prices, np.ones(period), 'valid') / period
+        """Calculate Moving Average using vectorized rolling sums"""
+        return indicators.sma(prices, period)
     
-    async def check_strategy_signal(self, strategy: Strategy, db: Session) -> Optional[str]:
-        """Check if strategy should generate a trading signal"""
+    def get_indicator_state(self, strategy: Strategy) -> IncrementalIndicatorState:
+        """Get (or rebuild on parameter change) the incremental indicator state for a strategy"""
+        key = (strategy.id, strategy.symbol, strategy.timeframe)
+        state = self.indicator_states.get(key)
+        
+        if state is None or not state.matches(strategy.bb_period, strategy.bb_deviation,
+                                              strategy.ma_period, strategy.timeframe):
+            if state is not None:
+                logger.info(f"Parameters changed for strategy {strategy.id}, rebuilding indicator state")
+            state = IncrementalIndicatorState(
+                strategy.bb_period, strategy.bb_deviation, strategy.ma_period, strategy.timeframe
+            )
+            self.indicator_states[key] = state
+        
+        return state
+    
+    def activate_strategy(self, strategy: Strategy) -> StrategyPlugin:
+        """Resolve the strategy's plugin once; raises ValueError for unregistered types"""
+        plugin = get_strategy_plugin(strategy.strategy_type)
+        self.active_plugins[strategy.id] = plugin
+        return plugin
+    
+    def deactivate_strategy(self, strategy_id: int):
+        """Forget the resolved plugin and indicator state of a stopped strategy"""
+        self.active_plugins.pop(strategy_id, None)
+        for key in [key for key in self.indicator_states if key[0] == strategy_id]:
+            del self.indicator_states[key]
+    
+    def get_plugin(self, strategy: Strategy) -> Optional[StrategyPlugin]:
+        """Plugin resolved at activation; strategies first seen by this process are activated lazily"""
+        plugin = self.active_plugins.get(strategy.id)
+        if plugin is not None and plugin.strategy_type == strategy.strategy_type:
+            return plugin
         try:
-            exchange_account = db.query(ExchangeAccount).filter(
-                ExchangeAccount.id == strategy.exchange_account_id
-            ).first()
-            
-            if not exchange_account:
-                logger.error(f"Exchange account not found for strategy {strategy.id}")
+            return self.activate_strategy(strategy)
+        except ValueError as e:
+            logger.warning(f"Strategy {strategy.id}: {e}")
+            return None
+    
+    def prune_indicator_states(self, active_strategy_ids: set):
+        """Drop indicator states and plugins of strategies that are no longer active"""
+        for key in list(self.indicator_states):
+            if key[0] not in active_strategy_ids:
+                del self.indicator_states[key]
+        for strategy_id in list(self.active_plugins):
+            if strategy_id not in active_strategy_ids:
+                del self.active_plugins[strategy_id]
+    
+    def candles_required(self, strategy: Strategy, now_ms: int) -> int:
+        """Number of most recent candles this strategy needs on the next tick"""
+        plugin = self.get_plugin(strategy)
+        if plugin is None:
+            return 0
+        # Incremental plugins only need the new tail once their state is warm; batched plugins
+        # take the whole window for cold start and resync (served from the local candle store)
+        if plugin.incremental_signal is not None:
+            state = self.get_indicator_state(strategy)
+            if state.ready or plugin.batch_signal is None:
+                return state.candles_needed(now_ms)
+        return plugin.candle_depth(strategy)
+    
+    async def check_strategy_signal(self, strategy: Strategy, db: Session,
+                                    ohlcv_data: Optional[List] = None) -> Optional[str]:
+        """Check if strategy should generate a trading signal
+        
+        ohlcv_data may be supplied by the scheduler when candles were fetched once
+        for every strategy sharing the same symbol/timeframe.
+        """
+        try:
+            plugin = self.get_plugin(strategy)
+            if plugin is None:
                 return None
             
-            ohlcv_data = await self.exchange_manager.get_ohlcv(
-                exchange_account, 
-                strategy.symbol, 
-                strategy.timeframe, 
-                limit=max(strategy.bb_period, strategy.ma_period) + 10
-            )
-            
-            if len(ohlcv_data) < max(strategy.bb_period, strategy.ma_period):
+            if ohlcv_data is None:
+                exchange_account = db.query(ExchangeAccount).filter(
+                    ExchangeAccount.id == strategy.exchange_account_id
+                ).first()
+                
+                if not exchange_account:
+                    logger.error(f"Exchange account not found for strategy {strategy.id}")
+                    return None
+                
+                # Once warmed up, only the candles closed since the last tick are fetched
+                ohlcv_data = await self.exchange_manager.get_ohlcv(
+                    exchange_account,
+                    strategy.symbol,
+                    strategy.timeframe,
+                    limit=self.candles_required(strategy, int(datetime.now().timestamp() * 1000))
+                )
+            
+            if plugin.incremental_signal is None:
+                return self.evaluate_strategies([strategy], ohlcv_data).get(strategy.id)
+            
+            state = self.get_indicator_state(strategy)
+            state.update(ohlcv_data)
+            
+            snapshot = state.snapshot()
+            if snapshot is None:
                 logger.warning(f"Not enough data for strategy {strategy.id}")
                 return None
             
-            df = pd.DataFrame(ohlcv_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            
-            if strategy.strategy_type == '5m_boll_ma60':
-                return await self._check_boll_ma_strategy(df, strategy)
-            
-            return None
+            return plugin.incremental_signal(snapshot)
             
         except Exception as e:
             logger.error(f"Error checking strategy signal: {e}")
             return None
     
+    def evaluate_strategies(self, strategies: List[Strategy], ohlcv_data: List) -> Dict[int, Optional[str]]:
+        """Evaluate strategies watching the same symbol/timeframe on one candle array
+        
+        Strategies with a warm incremental state take the O(1) path on the new tail
+        (so candles_required shrinks to a couple of candles). Cold or resyncing
+        strategies of plugins with a batch kernel are evaluated in one vectorized
+        pass over the full window, which also seeds their state for the next tick.
+        For the others the union of their indicators is computed once and each
+        signal function only runs comparisons over the shared arrays.
+        """
+        signals = {s.id: None for s in strategies}
+        if not ohlcv_data:
+            return signals
+        
+        batched: Dict[str, Tuple[StrategyPlugin, List[Strategy]]] = {}
+        others: List[Tuple[StrategyPlugin, Strategy]] = []
+        for s in strategies:
+            plugin = self.get_plugin(s)
+            if plugin is None:
+                continue
+            if plugin.incremental_signal is not None:
+                state = self.get_indicator_state(s)
+                warm = state.ready
+                state.update(ohlcv_data)
+                if plugin.batch_signal is None or (warm and state.ready):
+                    snapshot = state.snapshot()
+                    signals[s.id] = plugin.incremental_signal(snapshot) if snapshot is not None else None
+                    continue
+            if plugin.batch_signal is not None:
+                batched.setdefault(plugin.strategy_type, (plugin, []))[1].append(s)
+            else:
+                others.append((plugin, s))
+        
+        rows = np.asarray(ohlcv_data, dtype=np.float64)
+        candles = {name: rows[:, i] for i, name in enumerate(('timestamp', 'open', 'high', 'low', 'close', 'volume'))}
+        
+        for plugin, members in batched.values():
+            codes = plugin.batch_signal(candles['close'], members)
+            for s, code in zip(members, codes):
+                signals[s.id] = SIGNAL_NAMES.get(int(code))
+        
+        if others:
+            keys = set()
+            for plugin, s in others:
+                keys |= plugin.required_indicators(s)
+            values = compute_indicators(candles['close'], keys)
+            for plugin, s in others:
+                signals[s.id] = latest_signal(plugin, candles, values, s)
+        
+        return signals
+    
     async def _check_boll_ma_strategy(self, df: pd.DataFrame, strategy: Strategy) -> Optional[str]:
         """Check Bollinger Bands + MA strategy"""
         prices = df['close'].values
@@ -621,17 +903,7 @@ class StrategyEngine:
         )
         ma = self.calculate_ma(prices, strategy.ma_period)
         
-        current_price = prices[-1]
-        current_bb_upper = bb_upper[-1]
-        current_bb_lower = bb_lower[-1]
-        current_ma = ma[-1]
-        
-        if current_price <= current_bb_lower and current_price > current_ma:
-            return "buy"
-        elif current_price >= current_bb_upper:
-            return "sell"
-        
-        return None
+        return boll_ma_signal(prices[-1], bb_upper[-1], bb_lower[-1], ma[-1])
     
     async def execute_trade(self, strategy: Strategy, signal: str, db: Session) -> Optional[Trade]:
         """Execute a trade based on strategy signal"""